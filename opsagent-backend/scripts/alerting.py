@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+alerting.py -- Percolate log documents against alert-rules as they stream past.
+
+An AlertStream buffers log documents and percolates each full batch with one
+multi-document percolate search against the enabled rules in alert-rules
+(`documents: [...]`; every matching rule comes back once with the slots of
+the documents it matched). Only the fields rules can reference
+(PERCOLATE_FIELDS) are sent, so a batch costs one small search however many
+rules match.
+
+Matches are replayed in timestamp order against each rule's cooldown: a rule
+fires on a document when it has never triggered or the document is at least
+cooldown_minutes after its last_triggered; later matches inside the cooldown
+are counted as suppressed. Fired alerts go to the alerts index with ids of the
+form <rule id>|<epoch ms>, so percolating the same logs twice rewrites the
+same alerts, and close() writes each fired rule's new last_triggered back to
+alert-rules.
+
+Each rule also carries a `prefilter` object: the service.name, error.type
+and log.level values a document must have for the rule to match, extracted
+from its query by rule_prefilter() ("*" where the query does not pin the
+field). The percolate search filters on those fields with the values present
+in the batch before any stored query runs, so its cost follows the number of
+rules relevant to the batch rather than the size of alert-rules. Rules
+indexed without a prefilter are always candidates.
+
+Batches are percolated on a small thread pool while the next one fills;
+results are applied in submission order, so cooldowns see documents in the
+order they were added. The generators tap their log bulk streams through an
+AlertStream (ingest-time percolation); their documents are not time-ordered,
+and a match earlier than a rule's last firing counts as suppressed, so an
+unordered stream fires a rule at most once per cooldown, never more.
+percolate-logs.py covers logs that arrive any other way.
+
+Usage (from a sibling script):
+    import alerting
+
+    if alerting.has_rules():
+        with alerting.AlertStream() as alerts:
+            es_bulk.bulk_index("logs-opsagent", alerts.tap(docs))
+        print(alerts.summary())
+"""
+
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import es_bulk
+
+RULES_INDEX = "alert-rules"
+ALERTS_INDEX = "alerts"
+BATCH_DOCS = 500
+WORKERS = 2
+MAX_RULES = 10000           # percolate hits per batch (one per matching rule)
+PERCOLATE_FIELDS = ("@timestamp", "message", "log.level", "service.name", "error.type",
+                    "http.response.status_code")
+RULE_FIELDS = ("rule_name", "severity", "category", "owner_team", "notification_channel")
+PREFILTER_FIELDS = {"service.name": "service_name", "error.type": "error_type", "log.level": "log_level"}
+ANY = "*"
+
+
+def epoch_ms(timestamp):
+    """ISO string or epoch ms -> epoch ms."""
+    if isinstance(timestamp, str):
+        return int(datetime.fromisoformat(timestamp.replace("Z", "+00:00")).timestamp() * 1000)
+    return int(timestamp)
+
+
+def iso(ms):
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def alert_doc(rule_id, rule, doc, ts_ms):
+    """One alert: the rule that fired plus the log fields that triggered it."""
+    alert = {"@timestamp": iso(ts_ms), "rule_id": rule_id, "status": "open",
+             "cooldown_minutes": rule.get("cooldown_minutes", 0)}
+    alert.update({f: rule[f] for f in RULE_FIELDS if rule.get(f) is not None})
+    alert.update({f: doc[f] for f in PERCOLATE_FIELDS[1:] if doc.get(f) is not None})
+    return alert
+
+
+# ---------------------------------------------------------------------------
+# Rule pre-filtering
+# ---------------------------------------------------------------------------
+def required_terms(query):
+    """
+    {field: set of values} a document must carry one of for `query` to match,
+    for the PREFILTER_FIELDS the query pins down. Conservative: anything it
+    cannot reason about (ranges, match, must_not) constrains nothing.
+    """
+    (kind, spec), = query.items()
+    if kind in ("term", "terms"):
+        (field, value), = spec.items()
+        if field not in PREFILTER_FIELDS:
+            return {}
+        if kind == "term":
+            value = [value.get("value") if isinstance(value, dict) else value]
+        return {field: set(value)}
+    if kind != "bool":
+        return {}
+    required = {}
+    for key in ("must", "filter"):
+        clauses = spec.get(key) or []
+        for clause in clauses if isinstance(clauses, list) else [clauses]:
+            for field, values in required_terms(clause).items():
+                required[field] = required[field] & values if field in required else values
+    should = spec.get("should") or []
+    should = should if isinstance(should, list) else [should]
+    minimum = spec.get("minimum_should_match", 0 if "must" in spec or "filter" in spec else 1)
+    if should and str(minimum) not in ("0", "0%"):
+        # at least one should clause must match: a field is pinned only if every clause pins it
+        options = [required_terms(clause) for clause in should]
+        for field in set.intersection(*(set(o) for o in options)):
+            values = set().union(*(o[field] for o in options))
+            required[field] = required[field] & values if field in required else values
+    return required
+
+
+def rule_prefilter(query):
+    """The `prefilter` object stored with a rule: sorted values per field, or ["*"]."""
+    required = required_terms(query)
+    return {name: sorted(required[field]) if field in required else [ANY]
+            for field, name in PREFILTER_FIELDS.items()}
+
+
+def with_prefilter(rule):
+    """A copy of an alert-rules document with its prefilter filled in from its query."""
+    return {**rule, "prefilter": rule_prefilter(rule["query"])}
+
+
+def candidate_filter(docs):
+    """
+    Filter clauses selecting the rules that could match any of `docs`: per
+    prefilter field, rules wanting one of the values present, any value, or
+    indexed without a prefilter.
+    """
+    clauses = []
+    for field, name in PREFILTER_FIELDS.items():
+        values = sorted({doc[field] for doc in docs if doc.get(field) is not None})
+        path = f"prefilter.{name}"
+        clauses.append({"bool": {"should": [
+            {"terms": {path: values + [ANY]}},
+            {"bool": {"must_not": {"exists": {"field": path}}}},
+        ]}})
+    return clauses
+
+
+# ---------------------------------------------------------------------------
+# Streaming percolation
+# ---------------------------------------------------------------------------
+def has_rules(es_url=None):
+    """
+    True if alert-rules holds enabled rules to percolate against. False when
+    exporting a corpus (es_bulk.EXPORT_DIR): there is no cluster to ask.
+    Refreshes the index first so rules loaded moments ago by the same run
+    (generate-all-data.py, generate-demo-data.py) are searchable.
+    """
+    if es_bulk.EXPORT_DIR:
+        return False
+    session = es_bulk.get_session(1)
+    try:
+        session.post(f"{es_url or es_bulk.ES_URL}/{RULES_INDEX}/_refresh", timeout=es_bulk.REQUEST_TIMEOUT)
+        resp = session.post(f"{es_url or es_bulk.ES_URL}/{RULES_INDEX}/_count",
+                            json={"query": {"term": {"enabled": True}}}, timeout=es_bulk.REQUEST_TIMEOUT)
+    finally:
+        session.close()
+    return resp.status_code == 200 and resp.json().get("count", 0) > 0
+
+
+class AlertStream:
+    """Batches log documents, percolates them against alert-rules and writes alerts."""
+
+    def __init__(self, batch_size=BATCH_DOCS, workers=WORKERS, es_url=None, session=None, prefilter=True):
+        self.batch_size = batch_size
+        self.prefilter = prefilter
+        self.workers = workers
+        self.es_url = es_url or es_bulk.ES_URL
+        self.session = session or es_bulk.get_session(workers)
+        self.writer = es_bulk.BulkClient(es_url=self.es_url)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.pending = deque()
+        self.buffer = []
+        self.last_fired = {}     # rule id -> epoch ms of the newest alert
+        self.fired_rules = set()
+        self.docs = self.batches = self.matches = self.fired = self.suppressed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def add(self, doc):
+        """Queue one log document (flat dotted keys, as the generators build them)."""
+        self.buffer.append({f: doc[f] for f in PERCOLATE_FIELDS if doc.get(f) is not None})
+        self.docs += 1
+        if len(self.buffer) >= self.batch_size:
+            self._submit()
+
+    def tap(self, docs, raw=False):
+        """
+        Yield `docs` unchanged, queueing each one for percolation on the way
+        through. With `raw`, docs are rendered JSON source lines (decoded here).
+        """
+        for doc in docs:
+            self.add(json.loads(doc) if raw else doc)
+            yield doc
+
+    def flush(self):
+        """Percolate everything queued so far and apply the results."""
+        if self.buffer:
+            self._submit()
+        while self.pending:
+            self._apply(*self.pending.popleft().result())
+
+    def close(self):
+        """Flush, write the alerts and the rules' last_triggered, and release the pool."""
+        self.flush()
+        for rule_id in sorted(self.fired_rules):
+            self.writer.index(RULES_INDEX, {"doc": {"last_triggered": iso(self.last_fired[rule_id])}},
+                              doc_id=rule_id, op="update")
+        self.fired_rules.clear()
+        self.writer.close()
+        self.pool.shutdown()
+        return self.writer.stats
+
+    def summary(self):
+        return (f"{self.docs:,} docs in {self.batches:,} batches -> {self.matches:,} rule matches, "
+                f"{self.fired:,} alerts fired, {self.suppressed:,} suppressed by cooldown")
+
+    # -- internals ---------------------------------------------------------
+    def _submit(self):
+        batch, self.buffer = self.buffer, []
+        self.pending.append(self.pool.submit(self._percolate, batch))
+        while len(self.pending) > self.workers:
+            self._apply(*self.pending.popleft().result())
+
+    def _percolate(self, batch):
+        """One multi-document percolate search. Returns (batch, hits)."""
+        body = {
+            "size": MAX_RULES,
+            "_source": {"excludes": ["query"]},
+            "query": {"bool": {"filter": [
+                {"term": {"enabled": True}},
+                *(candidate_filter(batch) if self.prefilter else []),
+                {"percolate": {"field": "query", "documents": batch}},
+            ]}},
+        }
+        resp = self.session.post(f"{self.es_url}/{RULES_INDEX}/_search", json=body,
+                                 timeout=es_bulk.REQUEST_TIMEOUT)
+        if resp.status_code != 200:
+            raise RuntimeError(f"percolate HTTP {resp.status_code}: {resp.text[:200]}")
+        return batch, resp.json()["hits"]["hits"]
+
+    def _apply(self, batch, hits):
+        """Fire each matching rule on the documents outside its cooldown."""
+        self.batches += 1
+        for hit in hits:
+            rule_id, rule = hit["_id"], hit["_source"]
+            cooldown_ms = (rule.get("cooldown_minutes") or 0) * 60_000
+            last = self.last_fired.get(rule_id)
+            if rule.get("last_triggered"):
+                last = max(last or 0, epoch_ms(rule["last_triggered"]))
+            slots = hit.get("fields", {}).get("_percolator_document_slot", [0])
+            self.matches += len(slots)
+            for ts, slot in sorted((epoch_ms(batch[s]["@timestamp"]), s) for s in slots):
+                if last is not None and ts < last + cooldown_ms:
+                    self.suppressed += 1
+                    continue
+                self.writer.index(ALERTS_INDEX, alert_doc(rule_id, rule, batch[slot], ts),
+                                  doc_id=f"{rule_id}|{ts}")
+                self.fired += 1
+                last = ts
+                self.fired_rules.add(rule_id)
+            if last is not None:
+                self.last_fired[rule_id] = last
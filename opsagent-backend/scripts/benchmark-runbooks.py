@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+benchmark-runbooks.py -- Latency and hit quality of the runbook tools, before and after.
+
+Builds --runbooks N synthetic runbooks from load-runbooks.py's built-in ones
+(symptom clauses shuffled and thinned, sometimes one borrowed from another
+runbook; categories spelled the way hand-written runbooks spell them --
+"Database", " DB", "micro_services") and loads them into two scratch indices:
+
+  - runbooks-bench-before: the previous mapping (plain keyword category, plain
+    text symptoms), documents as written
+  - runbooks-bench-after: setup/mappings/runbooks.json, documents through
+    load-runbooks.py's prepare() (normalised category, semantic_symptoms)
+
+Each tool variant -- the previous queries (BEFORE) against the first, the
+current tools/*.json (every search_runbooks_by_symptom tier) against the
+second -- runs --runs times over:
+
+  - search_runbooks: each category in three casings. Recall is the share of
+    that category's runbooks the WHERE clause matches (run as a COUNT).
+  - search_runbooks_by_symptom: SYMPTOM_QUERIES, symptom descriptions (whole
+    phrases, partial words) labelled with the runbook they describe. hit@1 is
+    the share of queries whose first row is that runbook (any of its
+    variants), precision@5 the share of the top five that are.
+
+and reports client latency and server `took` (p50 / p95, ms). A variant the
+cluster cannot run (FORK/FUSE, or semantic_text on local_es) is reported as
+failed. local_es scans every document either way, so its latencies only
+show the relative cost of the queries; the term-index benefit of comparing
+the stored category needs a real cluster.
+
+Usage:
+    python3 benchmark-runbooks.py --local --runbooks 5000
+    export ES_URL="https://your-es-instance.elastic.cloud:443"
+    export ES_API_KEY="your-api-key"
+    python3 benchmark-runbooks.py --runbooks 5000 --runs 20 --output runbooks-bench.json
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import re
+import sys
+import time
+
+import es_bulk
+
+ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
+ES_API_KEY = os.environ.get("ES_API_KEY", "")
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+TOOLS_DIR = os.path.join(SCRIPT_DIR, "..", "tools")
+MAPPING_FILE = os.path.join(SCRIPT_DIR, "..", "setup", "mappings", "runbooks.json")
+
+BEFORE_INDEX = "runbooks-bench-before"
+AFTER_INDEX = "runbooks-bench-after"
+BORROW_RATE = 0.3           # share of runbooks given a symptom clause of another
+MESSY_RATE = 0.5            # share of runbooks whose category is not written canonically
+KEEP_RUNBOOK = "KEEP title, severity, symptoms, root_cause, remediation_steps, prevention"
+
+# The runbooks index and tool queries as they were before ingest normalisation.
+BEFORE_MAPPING = {
+    "settings": {"number_of_shards": 1, "number_of_replicas": 1},
+    "mappings": {
+        "properties": {
+            "title": {"type": "text", "fields": {"keyword": {"type": "keyword"}}},
+            "category": {"type": "keyword"},
+            "severity": {"type": "keyword"},
+            "symptoms": {"type": "text"},
+            "root_cause": {"type": "text"},
+            "remediation_steps": {"type": "text"},
+            "prevention": {"type": "text"},
+            "tags": {"type": "keyword"},
+        }
+    },
+}
+BEFORE = {
+    "search_runbooks": f"FROM runbooks | WHERE TO_LOWER(category) == TO_LOWER(?search_term) | {KEEP_RUNBOOK} | LIMIT 5",
+    "search_runbooks_by_symptom": "FROM runbooks METADATA _score | WHERE MATCH(symptoms, ?symptom_text) "
+                                  f"| {KEEP_RUNBOOK}, _score | SORT _score DESC | LIMIT 5",
+}
+
+# Other spellings of each category, as found in hand-written runbooks.
+SPELLINGS = {
+    "database": ["Database", "DB", " database", "Databases"],
+    "microservices": ["Microservices", "micro_services", "Micro Services", "microservice"],
+    "application": ["Application", "APP", "application "],
+    "infrastructure": ["Infrastructure", "infra", "INFRA"],
+    "security": ["Security", "SEC", " security"],
+}
+
+SYMPTOM_QUERIES = [
+    ("connection pool exhausted", "Database Connection Pool Exhaustion"),
+    ("conn pool at 100% utilization", "Database Connection Pool Exhaustion"),
+    ("full table scans and replication lag", "High CPU Usage on Database Server"),
+    ("slow queries io wait", "High CPU Usage on Database Server"),
+    ("circuit breakers tripped across the mesh", "Cascading Service Failures"),
+    ("5xx errors on multiple services simultaneously", "Cascading Service Failures"),
+    ("OOMKilled pods and long garbage collection pauses", "Memory Pressure and GC Pauses"),
+    ("garbage collect pause", "Memory Pressure and GC Pauses"),
+    ("container evictions from disk pressure", "Disk Space Exhaustion"),
+    ("cannot write WAL", "Disk Space Exhaustion"),
+    ("dns resolution failures", "Network Connectivity Issues"),
+    ("intermittent packet loss", "Network Connectivity Issues"),
+    ("cert errors on mtls", "SSL/TLS Certificate Expiration"),
+    ("browser security warnings", "SSL/TLS Certificate Expiration"),
+    ("429 too many requests", "API Rate Limiting / Throttling"),
+    ("throttl by third-party api", "API Rate Limiting / Throttling"),
+]
+
+
+def _load_module(filename):
+    """Import a sibling script by filename (supports hyphens in names)."""
+    filepath = os.path.join(SCRIPT_DIR, filename)
+    module_name = filename.replace("-", "_").removesuffix(".py")
+    spec = importlib.util.spec_from_file_location(module_name, filepath)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+bench = _load_module("benchmark-tools.py")
+runbooks = _load_module("load-runbooks.py")
+
+
+# ---------------------------------------------------------------------------
+# Corpus
+# ---------------------------------------------------------------------------
+def family(title):
+    """The built-in runbook a synthetic one was made from."""
+    return title.rsplit(" #", 1)[0]
+
+
+def synthesize(count, seed):
+    """`count` runbook variants, as a hand-written collection would hold them."""
+    rng = random.Random(seed)
+    clauses = [rb["symptoms"].split(", ") for rb in runbooks.RUNBOOKS]
+    out = []
+    for i in range(count):
+        b = i % len(runbooks.RUNBOOKS)
+        base = runbooks.RUNBOOKS[b]
+        kept = rng.sample(clauses[b], max(2, round(len(clauses[b]) * rng.uniform(0.6, 1.0))))
+        if rng.random() < BORROW_RATE:
+            other = rng.choice([c for j, c in enumerate(clauses) if j != b])
+            kept.insert(rng.randrange(len(kept) + 1), rng.choice(other))
+        category = base["category"]
+        if rng.random() < MESSY_RATE:
+            category = rng.choice(SPELLINGS.get(category, [category]))
+        out.append(dict(base, title=f"{base['title']} #{i}", category=category, symptoms=", ".join(kept)))
+    return out
+
+
+def load(session, es_url, index, mapping, docs):
+    """(Re)create `index` with `mapping` and bulk load `docs`. Returns seconds taken."""
+    session.delete(f"{es_url}/{index}", timeout=es_bulk.REQUEST_TIMEOUT)
+    resp = session.put(f"{es_url}/{index}", json=mapping, timeout=es_bulk.REQUEST_TIMEOUT)
+    if resp.status_code != 200:
+        raise SystemExit(f"Creating {index} failed: HTTP {resp.status_code}: {resp.text[:200]}")
+    started = time.monotonic()
+    with es_bulk.BulkClient(es_url=es_url, refresh=True) as client:
+        for doc in docs:
+            client.index(index, doc, doc_id=runbooks.runbook_id(doc))
+    if client.stats.total_failed:
+        raise SystemExit(f"{index}: {client.stats.total_failed} documents failed: {client.stats.errors[:1]}")
+    session.post(f"{es_url}/{index}/_refresh", timeout=es_bulk.REQUEST_TIMEOUT)
+    return time.monotonic() - started
+
+
+# ---------------------------------------------------------------------------
+# Variants and measurement
+# ---------------------------------------------------------------------------
+def tool_query(filename):
+    with open(os.path.join(TOOLS_DIR, filename)) as f:
+        return json.load(f)["configuration"]["query"]
+
+
+def retarget(query, index):
+    return re.sub(r"^FROM runbooks\b", f"FROM {index}", query)
+
+
+def variants():
+    """[(tool, variant name, index, query)] in report order."""
+    return [
+        ("search_runbooks", "before", BEFORE_INDEX, retarget(BEFORE["search_runbooks"], BEFORE_INDEX)),
+        ("search_runbooks", "after", AFTER_INDEX, retarget(tool_query("search_runbooks.json"), AFTER_INDEX)),
+        ("search_runbooks_by_symptom", "before", BEFORE_INDEX,
+         retarget(BEFORE["search_runbooks_by_symptom"], BEFORE_INDEX)),
+        ("search_runbooks_by_symptom", "after", AFTER_INDEX,
+         retarget(tool_query("search_runbooks_by_symptom.json"), AFTER_INDEX)),
+        ("search_runbooks_by_symptom", "after-lexical", AFTER_INDEX,
+         retarget(tool_query("search_runbooks_by_symptom_fallback.json"), AFTER_INDEX)),
+    ]
+
+
+def esql(session, es_url, query, params):
+    """(rows, took) of one ES|QL call; raises RuntimeError on failure."""
+    body = {"query": query, "params": [{k: v} for k, v in params.items()]}
+    resp = session.post(f"{es_url}/_query", json=body, timeout=es_bulk.REQUEST_TIMEOUT)
+    if resp.status_code != 200:
+        try:
+            error = resp.json()["error"]
+            raise RuntimeError(f"{error.get('type')}: {error.get('reason')}"[:200])
+        except (ValueError, KeyError, TypeError):
+            raise RuntimeError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+    data = resp.json()
+    names = [c["name"] for c in data["columns"]]
+    return [dict(zip(names, row)) for row in data["values"]], data.get("took")
+
+
+def quality(session, es_url, tool, query, corpus, results):
+    """Hit-quality figures for one variant, from the rows of its first timed pass."""
+    if tool == "search_runbooks":
+        counted = re.sub(r"\| KEEP .*$", "| STATS matched = COUNT(*)", query)
+        recalls = []
+        for params, _ in results:
+            category = params["search_term"].lower()
+            truth = sum(1 for doc in corpus if runbooks.normalise_category(doc["category"]) == category)
+            rows, _ = esql(session, es_url, counted, params)
+            recalls.append(rows[0]["matched"] / truth if truth else 1.0)
+        return {"category_recall": round(sum(recalls) / len(recalls), 4)}
+    hits, precision = 0, 0.0
+    for (params, rows), (_, expected) in zip(results, SYMPTOM_QUERIES):
+        families = [family(row["title"]) for row in rows]
+        hits += bool(families) and families[0] == expected
+        precision += sum(f == expected for f in families[:5]) / 5
+    return {"hit_at_1": round(hits / len(results), 4), "precision_at_5": round(precision / len(results), 4)}
+
+
+def measure(session, es_url, tool, name, query, corpus, runs, warmup):
+    """Time one variant over its parameter sets and score its hits."""
+    if tool == "search_runbooks":
+        param_sets = [{"search_term": spelling} for category in sorted(SPELLINGS)
+                      for spelling in (category, category.title(), category.upper())]
+    else:
+        param_sets = [{"symptom_text": text} for text, _ in SYMPTOM_QUERIES]
+    result = {"tool": tool, "variant": name, "error": None}
+    latencies, took, first = [], [], []
+    try:
+        for i in range(warmup + runs):
+            for params in param_sets:
+                started = time.perf_counter()
+                rows, server_ms = esql(session, es_url, query, params)
+                elapsed = (time.perf_counter() - started) * 1000
+                if i < warmup:
+                    continue
+                latencies.append(elapsed)
+                if server_ms is not None:
+                    took.append(server_ms)
+                if i == warmup:
+                    first.append((params, rows))
+        result.update(quality(session, es_url, tool, query, corpus, first))
+    except RuntimeError as exc:
+        result["error"] = str(exc)
+    result["latency_ms"] = bench.summarize(latencies)
+    result["took_ms"] = bench.summarize(took)
+    return result
+
+
+def print_result(result):
+    label = f"{result['tool']} [{result['variant']}]"
+    if result["error"]:
+        print(f"  {label:<44} FAILED  {result['error'][:70]}")
+        return
+    lat, took = result["latency_ms"], result["took_ms"] or {}
+    figures = ", ".join(f"{k} {result[k]:.3f}" for k in ("category_recall", "hit_at_1", "precision_at_5")
+                        if k in result)
+    print(f"  {label:<44} {lat['p50']:>7.1f} {lat['p95']:>7.1f} {took.get('p50', float('nan')):>7.1f}   {figures}")
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+def run(count=2000, seed=42, runs=10, warmup=1, local=False, keep=False, output=None):
+    server = None
+    es_url = ES_URL
+    if local:
+        import local_es
+        server, es_url = local_es.start()
+    session = es_bulk.get_session(1)
+    corpus = synthesize(count, seed)
+    with open(MAPPING_FILE) as f:
+        after_mapping = json.load(f)
+    results = []
+    try:
+        print(f"\n--- Loading {count:,} runbooks twice ---")
+        seconds = load(session, es_url, BEFORE_INDEX, BEFORE_MAPPING, corpus)
+        print(f"  {BEFORE_INDEX:<24} {seconds:.1f}s")
+        seconds = load(session, es_url, AFTER_INDEX, after_mapping, (runbooks.prepare(doc) for doc in corpus))
+        print(f"  {AFTER_INDEX:<24} {seconds:.1f}s")
+
+        print(f"\n--- Tools ({runs} runs, ms) ---")
+        print(f"  {'tool [variant]':<44} {'p50':>7} {'p95':>7} {'took50':>7}   quality")
+        for tool, name, _, query in variants():
+            result = measure(session, es_url, tool, name, query, corpus, runs, warmup)
+            results.append(result)
+            print_result(result)
+    finally:
+        if not keep:
+            for index in (BEFORE_INDEX, AFTER_INDEX):
+                session.delete(f"{es_url}/{index}", timeout=es_bulk.REQUEST_TIMEOUT)
+        session.close()
+        if server:
+            server.shutdown()
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({"meta": {"target": "local_es" if local else ES_URL, "runbooks": count, "seed": seed,
+                                "runs": runs, "warmup": warmup}, "results": results}, f, indent=2)
+        print(f"\nWrote {output}")
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the runbook tools before and after ingest normalisation.")
+    parser.add_argument("--runbooks", type=int, default=2000, help="Synthetic runbooks to load (default: 2000)")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the synthetic runbooks (default: 42)")
+    parser.add_argument("--runs", type=int, default=10, help="Timed passes over the queries (default: 10)")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed passes first (default: 1)")
+    parser.add_argument("--local", action="store_true",
+                        help="Run against an in-process local_es.py stand-in instead of ES_URL")
+    parser.add_argument("--keep", action="store_true", help="Leave the two scratch indices in place")
+    parser.add_argument("--output", metavar="FILE", help="Write results as JSON")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print("=" * 60)
+    print("  Runbook Tool Benchmark")
+    print("=" * 60)
+    print(f"  Target:   {'local_es stand-in' if args.local else ES_URL}")
+    if not args.local:
+        print(f"  Auth:     {'API Key configured' if ES_API_KEY else 'No auth (local dev)'}")
+    print(f"  Runbooks: {args.runbooks:,} (seed {args.seed})")
+    print(f"  Runs:     {args.runs} (+{args.warmup} warmup)")
+    print("=" * 60)
+    results = run(args.runbooks, args.seed, args.runs, args.warmup, args.local, args.keep, args.output)
+    sys.exit(0 if any(not r["error"] for r in results) else 1)
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+benchmark-tools.py -- Latency benchmark for the ES|QL tool catalogue in ../tools.
+
+Loads every ES|QL tool definition (tools/*.json, fallbacks included), binds
+representative parameters (PARAMS, overridable with --param), runs each query
+--runs times after --warmup untimed runs, and reports per tool:
+
+  - client latency p50 / p95 / p99 (ms, round trip)
+  - server `took` p50 / p95 / p99 (ms)
+  - rows scanned (`documents_found`, where the cluster reports it) and rows returned
+
+Corpus sizes: with --sizes, each size is loaded before it is measured by
+running create-indices.py, the reference-data loaders and
+generate-incident-data.py --scale N (one cell is ~2,200 logs and metrics). Loading
+recreates the indices, so only point --sizes at a disposable cluster: against
+ES_URL it asks for confirmation first (--yes skips the prompt). Without
+--sizes the data already in the cluster is measured as-is.
+
+--local runs everything against an in-process local_es.py stand-in (a fresh
+one per size, NOW() pinned to the corpus anchor), so no cluster is needed.
+
+--output writes the results as JSON; --baseline compares against an earlier
+--output file so runs can be diffed.
+
+Usage:
+    python3 benchmark-tools.py --local --sizes 1,10,50 --output bench-local.json
+    export ES_URL="https://your-es-instance.elastic.cloud:443"
+    export ES_API_KEY="your-api-key"
+    python3 benchmark-tools.py --runs 50 --output bench.json
+    python3 benchmark-tools.py --runs 50 --baseline bench.json --tool error_trend_analysis
+"""
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import datagen
+import es_bulk
+
+ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
+ES_API_KEY = os.environ.get("ES_API_KEY", "")
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+TOOLS_DIR = os.path.join(SCRIPT_DIR, "..", "tools")
+
+# Representative values for every parameter the tools declare (incident scenario).
+PARAMS = {
+    "service_name": "payment-service",
+    "time_range": "6 hours",
+    "bucket_size": "5 minutes",
+    "result_count": 10,
+    "host_name": "db-primary-01",
+    "query": "database connection pool exhausted",
+    "search_term": "database",
+    "symptom_text": "connection timeout",
+}
+
+# Loaders run (in order) before each --sizes corpus is measured. {scale} is the size.
+LOADERS = [
+    ["create-indices.py", "--no-confirm"],
+    ["generate-service-owners.py"],
+    ["generate-knowledge-base.py", "--seed", "{seed}", "--anchor-time", "{anchor}"],
+    ["load-runbooks.py"],
+    ["generate-incident-data.py", "--scale", "{scale}", "--seed", "{seed}", "--anchor-time", "{anchor}"],
+]
+COUNTED_INDICES = "logs-opsagent*,infra-metrics*"
+
+
+# ---------------------------------------------------------------------------
+# Tools
+# ---------------------------------------------------------------------------
+def load_tools(only=None):
+    """
+    Return ES|QL tool definitions from tools/*.json, each tagged with "name" (the
+    file name, since a *_fallback file reuses its primary's id), optionally
+    filtered to the names in `only`.
+    """
+    tools = []
+    for path in sorted(glob.glob(os.path.join(TOOLS_DIR, "*.json"))):
+        with open(path) as f:
+            tool = json.load(f)
+        if "query" not in tool.get("configuration", {}):
+            continue  # index_search tools have no ES|QL to time
+        tool["name"] = os.path.basename(path).removesuffix(".json")
+        if only and tool["name"] not in only:
+            continue
+        tools.append(tool)
+    return tools
+
+
+def bind_params(tool, overrides):
+    """ES|QL request params for the parameters `tool` declares."""
+    values = dict(PARAMS, **overrides)
+    missing = [name for name in tool["configuration"]["params"] if name not in values]
+    if missing:
+        raise SystemExit(f"No value for {tool['name']} param(s) {', '.join(missing)}; pass --param NAME=VALUE")
+    return [{name: values[name]} for name in tool["configuration"]["params"]]
+
+
+def parse_param(text):
+    name, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {text!r}")
+    return name, int(value) if value.isdigit() else value
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+def percentile(values, q):
+    """Linear-interpolated percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    lo = int(rank)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (rank - lo)
+
+
+def summarize(values):
+    if not values:
+        return None
+    return {"p50": round(percentile(values, 50), 2), "p95": round(percentile(values, 95), 2),
+            "p99": round(percentile(values, 99), 2), "mean": round(sum(values) / len(values), 2),
+            "min": round(min(values), 2), "max": round(max(values), 2)}
+
+
+def bench_tool(session, es_url, tool, params, runs, warmup):
+    """Run one tool warmup + runs times. Returns a result dict (error set if the query fails)."""
+    body = {"query": tool["configuration"]["query"], "params": params}
+    result = {"tool": tool["name"], "id": tool["id"], "runs": 0, "error": None}
+    latencies, took = [], []
+    for i in range(warmup + runs):
+        started = time.perf_counter()
+        resp = session.post(f"{es_url}/_query", json=body, timeout=es_bulk.REQUEST_TIMEOUT)
+        elapsed = (time.perf_counter() - started) * 1000
+        if resp.status_code != 200:
+            try:
+                error = resp.json()["error"]
+                result["error"] = f"{error.get('type')}: {error.get('reason')}"[:300]
+            except (ValueError, KeyError, TypeError):
+                result["error"] = f"HTTP {resp.status_code}: {resp.text[:200]}"
+            break
+        data = resp.json()
+        if i < warmup:
+            continue
+        latencies.append(elapsed)
+        if "took" in data:
+            took.append(data["took"])
+        result["rows"] = len(data.get("values", []))
+        result["documents_found"] = data.get("documents_found")
+    result["runs"] = len(latencies)
+    result["latency_ms"] = summarize(latencies)
+    result["took_ms"] = summarize(took)
+    return result
+
+
+def count_docs(session, es_url):
+    resp = session.get(f"{es_url}/{COUNTED_INDICES}/_count")
+    return resp.json().get("count") if resp.status_code == 200 else None
+
+
+# ---------------------------------------------------------------------------
+# Corpus loading
+# ---------------------------------------------------------------------------
+def load_corpus(es_url, scale, seed, anchor):
+    """(Re)create the indices and load a scale-`scale` corpus into `es_url`."""
+    env = dict(os.environ, ES_URL=es_url)
+    env.pop("ES_BULK_EXPORT_DIR", None)
+    for loader in LOADERS:
+        script, *args = loader
+        args = [a.format(scale=scale, seed=seed, anchor=anchor.isoformat()) for a in args]
+        proc = subprocess.run([sys.executable, os.path.join(SCRIPT_DIR, script), *args],
+                              env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(proc.stdout[-2000:] + proc.stderr[-2000:])
+            raise SystemExit(f"{script} failed while loading scale {scale}")
+
+
+def confirm_load(yes=False):
+    """True if loading may recreate the indices on ES_URL: --yes, or a 'y' at the prompt."""
+    if yes:
+        return True
+    print(f"\n--sizes DELETES and recreates the OpsAgent indices on {ES_URL}. Data will be lost.")
+    if not sys.stdin.isatty():
+        print("Not a terminal; pass --yes to confirm.")
+        return False
+    return input("Continue? [y/N] ").strip().lower() == "y"
+
+
+def run(sizes=None, local=False, runs=20, warmup=2, tools=None, overrides=None, seed=42,
+        anchor_time=None, output=None, baseline=None, yes=False):
+    """Benchmark every selected tool at every corpus size. Returns the result document."""
+    selected = load_tools(tools)
+    if not selected:
+        raise SystemExit("No ES|QL tools selected")
+    anchor = datagen.anchor(anchor_time).replace(second=0, microsecond=0)
+    if local and not sizes:
+        sizes = [1]  # a fresh stand-in is empty
+
+    print("=" * 60)
+    print("  ES|QL Tool Benchmark")
+    print("=" * 60)
+    print(f"  Target:  {'local_es stand-in' if local else ES_URL}")
+    if not local:
+        print(f"  Auth:    {'API Key configured' if ES_API_KEY else 'No auth (local dev)'}")
+    print(f"  Tools:   {len(selected)}")
+    print(f"  Sizes:   {', '.join(map(str, sizes)) if sizes else 'existing data'}")
+    print(f"  Runs:    {runs} (+{warmup} warmup)")
+    if sizes:
+        print(f"  Corpus:  {datagen.describe(seed, anchor)}")
+    print("=" * 60)
+    if sizes and not local and not confirm_load(yes):
+        print("Aborted.")
+        return None
+
+    results = []
+    for size in sizes or [None]:
+        server = None
+        es_url = ES_URL
+        if local:
+            import local_es
+            cluster = local_es.Cluster(now=int(anchor.timestamp() * 1000))
+            server, es_url = local_es.start(cluster=cluster)
+        session = es_bulk.get_session(1)
+        try:
+            if size is not None:
+                print(f"\n--- Loading scale {size} ---")
+                started = time.monotonic()
+                load_corpus(es_url, size, seed, anchor)
+                print(f"  Loaded in {time.monotonic() - started:.1f}s")
+            docs = count_docs(session, es_url)
+            label = "existing" if size is None else size
+            print(f"\n--- Scale {label}: {docs if docs is not None else '?'} log/metric docs ---")
+            print(f"  {'tool':<36} {'p50':>8} {'p95':>8} {'p99':>8} {'took50':>7} {'scanned':>9} {'rows':>5}")
+            for tool in selected:
+                result = bench_tool(session, es_url, tool, bind_params(tool, overrides or {}), runs, warmup)
+                result.update(size=label, docs=docs)
+                results.append(result)
+                print_result(result)
+        finally:
+            session.close()
+            if server:
+                server.shutdown()
+
+    report = {
+        "meta": {
+            "target": "local_es" if local else ES_URL,
+            "runs": runs,
+            "warmup": warmup,
+            "seed": seed if sizes else None,
+            "anchor_time": anchor.isoformat() if sizes else None,
+            "params": dict(PARAMS, **(overrides or {})),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+        },
+        "results": results,
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {output}")
+    if baseline:
+        compare(baseline, results)
+    return report
+
+
+def print_result(result):
+    if result["error"]:
+        print(f"  {result['tool']:<36} FAILED  {result['error'][:80]}")
+        return
+    lat, took = result["latency_ms"], result["took_ms"] or {}
+    scanned = result.get("documents_found")
+    print(f"  {result['tool']:<36} {lat['p50']:>8.1f} {lat['p95']:>8.1f} {lat['p99']:>8.1f} "
+          f"{took.get('p50', float('nan')):>7.0f} {scanned if scanned is not None else '-':>9} {result['rows']:>5}")
+
+
+def compare(path, results):
+    """Print p50/p95 latency change against an earlier --output file."""
+    with open(path) as f:
+        before = {(str(r["size"]), r["tool"]): r for r in json.load(f)["results"]}
+    print(f"\n--- Compared with {path} (client latency) ---")
+    print(f"  {'size':>8} {'tool':<36} {'p50':>16} {'p95':>16}")
+    for result in results:
+        old = before.get((str(result["size"]), result["tool"]))
+        if not old or not old.get("latency_ms") or not result.get("latency_ms"):
+            continue
+        cells = []
+        for q in ("p50", "p95"):
+            a, b = old["latency_ms"][q], result["latency_ms"][q]
+            change = (b - a) / a * 100 if a else 0.0
+            cells.append(f"{b:>7.1f} ({change:+5.0f}%)")
+        print(f"  {result['size']:>8} {result['tool']:<36} {cells[0]:>16} {cells[1]:>16}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ES|QL tools in ../tools.")
+    parser.add_argument("--local", action="store_true",
+                        help="Run against an in-process local_es.py stand-in instead of ES_URL")
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=None,
+                        metavar="N,N,...",
+                        help="Load and measure these corpus scales (generate-incident-data.py --scale); "
+                             "recreates the indices")
+    parser.add_argument("--runs", type=int, default=20, help="Timed runs per tool (default: 20)")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed runs per tool first (default: 2)")
+    parser.add_argument("--tool", action="append", dest="tools", metavar="NAME",
+                        help="Only benchmark this tool (file name without .json; repeatable)")
+    parser.add_argument("--param", action="append", type=parse_param, default=[], metavar="NAME=VALUE",
+                        help="Override a parameter value (repeatable)")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for --sizes corpora (default: 42)")
+    parser.add_argument("--anchor-time", type=datagen.parse_anchor_time, default=None, metavar="ISO8601",
+                        help="Timeline anchor for --sizes corpora (default: now)")
+    parser.add_argument("--yes", action="store_true",
+                        help="Let --sizes recreate the indices on ES_URL without asking")
+    parser.add_argument("--output", default=None, metavar="FILE", help="Write results as JSON")
+    parser.add_argument("--baseline", default=None, metavar="FILE",
+                        help="Compare against an earlier --output file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(sizes=args.sizes, local=args.local, runs=args.runs, warmup=args.warmup, tools=args.tools,
+        overrides=dict(args.param), seed=args.seed, anchor_time=args.anchor_time,
+        output=args.output, baseline=args.baseline, yes=args.yes)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+changepoint.py -- Streaming onset detection over many metric series at once.
+
+An OnsetDetector follows any number of series (a host's CPU, a service's error
+rate, ...) one time step at a time. Each series is a handful of numbers in
+numpy arrays indexed by slot -- an EWMA baseline mean and variance and a
+two-sided CUSUM of the residuals against it -- so memory is O(series) however
+long the stream runs, and a step costs a few vector operations however many
+series it carries:
+
+  - residual z = (x - mean) / max(std, min_sigma); min_sigma keeps a series
+    that has been flat (an error rate of 0) from alarming on noise.
+  - S+ = max(0, S+ + z - k) and S- = max(0, S- - z - k). A series alarms when
+    either exceeds h, once `warmup` samples have built its baseline.
+  - the baseline only learns from samples that leave both CUSUMs at rest, so
+    a shift is not absorbed into the baseline it is measured against.
+  - the onset reported is the step at which the alarming CUSUM last left zero
+    (the CUSUM change-point estimate), not the alarm step, so detection delay
+    does not move the onset. shift_sigma is the mean residual since then.
+  - confidence is 1 - n exp(-2 k S) at the alarm: exp(-2 k S) is Siegmund's
+    approximation of the chance that an unchanged series' CUSUM climbs to S
+    in one excursion, and n, the samples watched since the series was last
+    baselined, bounds how many chances it had. A borderline alarm on a long
+    quiet series scores low; a jump of many sigmas scores ~1.
+  - after an alarm the series re-learns its baseline from the new level
+    (another `warmup` samples) and re-arms, so a later phase change fires
+    again.
+
+Missing samples (NaN, or a series absent from a step) leave its state alone.
+
+NumPy is required: pip install numpy.
+
+Usage (from a sibling script):
+    import changepoint
+
+    detector = changepoint.OnsetDetector(min_sigma=0.02)
+    for ts, keys, values in steps:            # time order; keys name the series
+        for onset in detector.update(ts, keys, values):
+            print(onset["series"], onset["onset"], onset["confidence"])
+"""
+
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+K = 0.5                     # CUSUM allowance, in standard deviations
+H = 8.0                     # CUSUM alarm threshold
+SPAN = 30                   # EWMA span of the baseline, in samples
+WARMUP = 30                 # samples before a (re-)baselined series may alarm
+
+
+def require_numpy():
+    """Exit with an install hint when NumPy is missing."""
+    if np is None:
+        print("Install numpy for onset detection: pip install numpy")
+        sys.exit(1)
+
+
+class OnsetDetector:
+    """Two-sided CUSUM over EWMA-standardised residuals, for many series at once."""
+
+    STATE = ("mean", "var", "n", "hi", "lo", "hi_start", "lo_start", "hi_steps", "lo_steps")
+
+    def __init__(self, k=K, h=H, span=SPAN, warmup=WARMUP, min_sigma=0.0, capacity=1024):
+        require_numpy()
+        self.k, self.h, self.warmup, self.min_sigma = k, h, warmup, min_sigma
+        self.alpha = 2.0 / (span + 1)
+        self.slots = {}          # series key -> slot
+        self.keys = []
+        self.onsets = 0
+        self._allocate(capacity)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def nbytes(self):
+        """Bytes held by the per-series state arrays."""
+        return sum(getattr(self, name).nbytes for name in self.STATE)
+
+    def update(self, ts, keys, values):
+        """
+        Feed one time step: values[i] is series keys[i] at `ts` (epoch ms).
+        Returns the onsets that alarmed at this step, as dicts.
+        """
+        slot = np.fromiter((self._slot(key) for key in keys), dtype=np.int64, count=len(keys))
+        x = np.asarray(values, dtype=np.float64)
+        seen = ~np.isnan(x)
+        slot, x = slot[seen], x[seen]
+        if not len(slot):
+            return []
+
+        mean, var, n = self.mean[slot], self.var[slot], self.n[slot]
+        first = n == 0
+        mean = np.where(first, x, mean)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = (x - mean) / np.maximum(np.sqrt(var), self.min_sigma)
+        z = np.clip(np.nan_to_num(z, nan=0.0), -1e6, 1e6)    # a flat series with no floor: any move is a jump
+        armed = n >= self.warmup
+        hi = np.where(armed, np.maximum(0.0, self.hi[slot] + z - self.k), 0.0)
+        lo = np.where(armed, np.maximum(0.0, self.lo[slot] - z - self.k), 0.0)
+        self.hi_start[slot] = np.where(self.hi[slot] == 0, ts, self.hi_start[slot])
+        self.lo_start[slot] = np.where(self.lo[slot] == 0, ts, self.lo_start[slot])
+        self.hi_steps[slot] = np.where(hi > 0, self.hi_steps[slot] + 1, 0)
+        self.lo_steps[slot] = np.where(lo > 0, self.lo_steps[slot] + 1, 0)
+
+        # baseline: cumulative average while warming up, EWMA after; frozen once an
+        # excursion is half way to an alarm, and fed residuals clipped to 3 sigma
+        learn = np.maximum(hi, lo) < self.h / 2
+        alpha = np.maximum(self.alpha, 1.0 / (n + 1))
+        delta = x - mean
+        delta = np.where(armed, np.clip(delta, -3 * np.sqrt(var), 3 * np.sqrt(var)), delta)
+        self.mean[slot] = np.where(learn, mean + alpha * delta, mean)
+        self.var[slot] = np.where(learn, (1 - alpha) * (var + alpha * delta * delta), var)
+        self.n[slot] = np.where(learn, n + 1, n)
+        self.hi[slot], self.lo[slot] = hi, lo
+
+        alarm = (hi > self.h) | (lo > self.h)
+        if not alarm.any():
+            return []
+        onsets = [self._onset(s, ts, level) for s, level in zip(slot[alarm], x[alarm])]
+        self._rebaseline(slot[alarm], x[alarm])
+        return onsets
+
+    # -- internals ---------------------------------------------------------
+    def _allocate(self, capacity):
+        grown = {name: np.zeros(capacity, dtype=np.int64 if name in ("n", "hi_steps", "lo_steps") else np.float64)
+                 for name in self.STATE}
+        for name, array in grown.items():
+            if hasattr(self, name):
+                array[:len(getattr(self, name))] = getattr(self, name)
+            setattr(self, name, array)
+
+    def _slot(self, key):
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = self.slots[key] = len(self.keys)
+            self.keys.append(key)
+            if slot >= len(self.mean):
+                self._allocate(2 * len(self.mean))
+        return slot
+
+    def _onset(self, slot, ts, level):
+        up = self.hi[slot] >= self.lo[slot]
+        score = self.hi[slot] if up else self.lo[slot]
+        steps = self.hi_steps[slot] if up else self.lo_steps[slot]
+        self.onsets += 1
+        return {
+            "series": self.keys[slot],
+            "onset": int(self.hi_start[slot] if up else self.lo_start[slot]),
+            "detected": int(ts),
+            "direction": "up" if up else "down",
+            "baseline": float(self.mean[slot]),
+            "level": float(level),
+            "shift_sigma": round(float(score / max(steps, 1) + self.k) * (1 if up else -1), 2),
+            "confidence": round(float(max(0.0, 1 - self.n[slot] * np.exp(-2 * self.k * score))), 4),
+        }
+
+    def _rebaseline(self, slots, levels):
+        self.mean[slots] = levels
+        self.var[slots] = 0.0
+        self.n[slots] = 1
+        self.hi[slots] = self.lo[slots] = 0.0
+        self.hi_steps[slots] = self.lo_steps[slots] = 0
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+columnar.py -- Optional NumPy engine for synthetic log and metric generation.
+
+The default generators build one dict per document, drawing every field with
+its own random.choice / random.randint call, then json.dumps it. This module
+lets a generator draw whole columns at once (timestamps, services, hosts,
+levels, status codes, durations, ...) and only turns them into NDJSON source
+lines at serialization time:
+
+    rng = columnar.make_rng(seed)
+    ts = columnar.iso_timestamps(epoch_ms)
+    svc = columnar.choice(rng, SERVICES, n)
+    cpu = columnar.rounded(rng.uniform(0.12, 0.40, n), 3)
+    rows = columnar.render_rows([("@timestamp", ts), ("service.name", svc),
+                                 ("system.cpu.total.pct", cpu, "%s"), ...])
+    client.index_many("logs-opsagent", rows, raw=True)
+
+Columns are either ready-to-embed JSON fragments or raw numbers with a format
+spec, so rendering a row is a single %-format with no per-document dict or
+json.dumps.
+
+NumPy is an optional dependency: scripts only import it when --engine numpy
+is requested.
+"""
+
+import json
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def require_numpy():
+    """Exit with an install hint when NumPy is missing."""
+    if np is None:
+        print("Install numpy for --engine numpy: pip install numpy")
+        sys.exit(1)
+
+
+def make_rng(seed=None):
+    """Return a NumPy Generator seeded with `seed` (None = OS entropy)."""
+    require_numpy()
+    return np.random.default_rng(seed)
+
+
+# ---------------------------------------------------------------------------
+# Column builders (each returns an array of JSON fragments)
+# ---------------------------------------------------------------------------
+def json_vocab(values):
+    """JSON-encode a small vocabulary once so columns can be built by fancy indexing."""
+    return np.array([json.dumps(v) for v in values], dtype=object)
+
+
+def _probabilities(weights):
+    p = np.asarray(weights, dtype=float)
+    return p / p.sum()
+
+
+def choice_indices(rng, n_options, n, weights=None):
+    """Vectorized random.choices: indices into an option list."""
+    p = None if weights is None else _probabilities(weights)
+    return rng.choice(n_options, size=n, p=p)
+
+
+def choice(rng, values, n, weights=None):
+    """Column of JSON-encoded values drawn from `values` (optionally weighted)."""
+    return json_vocab(values)[choice_indices(rng, len(values), n, weights)]
+
+
+def randint(rng, low, high, n):
+    """Vectorized random.randint (inclusive of `high`)."""
+    return rng.integers(low, high + 1, size=n)
+
+
+def rounded(values, decimals):
+    """Round a float column so it renders like round(x, decimals) would."""
+    return np.round(values, decimals)
+
+
+def iso_timestamps(epoch_ms):
+    """Render epoch milliseconds as quoted ISO-8601 UTC timestamps."""
+    iso = np.datetime_as_string(np.asarray(epoch_ms, dtype="datetime64[ms]"), unit="ms", timezone="UTC")
+    return np.char.add(np.char.add('"', iso), '"').astype(object)
+
+
+def template_messages(rng, templates, values, weights=None):
+    """
+    Column of messages: a template from `templates` per row with every "{}"
+    replaced by that row's entry in `values`. Templates are split into literal
+    parts once, so formatting is a concatenation per template, not per row.
+    """
+    n = len(values)
+    idx = choice_indices(rng, len(templates), n, weights)
+    vals = values.astype(str).astype(object)
+    out = np.empty(n, dtype=object)
+    for t, template in enumerate(templates):
+        rows = idx == t
+        if not rows.any():
+            continue
+        parts = [json.dumps(p)[1:-1] for p in template.split("{}")]
+        col = np.full(rows.sum(), '"' + parts[0], dtype=object)
+        for part in parts[1:]:
+            col = col + vals[rows] + part
+        out[rows] = col + '"'
+    return out
+
+
+def pick_messages(rng, options, n, weights=None):
+    """
+    Column of messages, one of `options` per row (optionally weighted). An
+    option is a plain string or (template, draw, ...): each draw(k) returns k
+    values for the template's next "{}", so placeholders are drawn
+    independently, e.g. ("GC pause: {}ms", lambda k: randint(rng, 3000, 8000, k)).
+    Values are embedded as they print (numbers, plain names), not escaped.
+    """
+    idx = choice_indices(rng, len(options), n, weights)
+    out = np.empty(n, dtype=object)
+    for t, option in enumerate(options):
+        rows = idx == t
+        k = int(rows.sum())
+        if not k:
+            continue
+        template, *draws = (option,) if isinstance(option, str) else option
+        parts = [json.dumps(p)[1:-1] for p in template.split("{}")]
+        col = np.full(k, '"' + parts[0], dtype=object)
+        for part, draw in zip(parts[1:], draws):
+            col = col + np.asarray(draw(k)).astype(str).astype(object) + part
+        out[rows] = col + '"'
+    return out
+
+
+def where(mask, a, b):
+    """Element-wise select between two fragment columns (or scalars)."""
+    return np.where(mask, a, b).astype(object)
+
+
+# ---------------------------------------------------------------------------
+# Row rendering
+# ---------------------------------------------------------------------------
+def render_rows(fields):
+    """
+    Render columns into JSON document strings with one %-format per row.
+
+    `fields` is a list of (name, column) or (name, column, fmt) entries:
+      - column is an array of JSON fragments (fmt defaults to "%s"), or a raw
+        numeric array / tuple of arrays with a matching fmt, e.g.
+        ("trace.id", ids, '"trace-%06d"') or ("host.ip", (a, b), '"10.0.%d.%d"')
+      - names ending in "?" are optional: the column holds fragments with ""
+        meaning "omit" (e.g. ("error.type?", col)); the first field must not
+        be optional.
+    Rendering every field in the same format call keeps per-document Python
+    work to a single string operation.
+    """
+    fmt = []
+    cols = []
+    for field in fields:
+        name, col = field[0], field[1]
+        spec = field[2] if len(field) > 2 else "%s"
+        if name.endswith("?"):
+            key = json.dumps(name[:-1])
+            col = np.where(col == "", "", "," + key + ":" + col).astype(object)
+            fmt.append("%s")
+        else:
+            fmt.append(("," if fmt else "") + json.dumps(name) + ":" + spec)
+        for c in (col if isinstance(col, tuple) else (col,)):
+            cols.append(c.tolist())
+    template = "{" + "".join(fmt) + "}"
+    return [template % row for row in zip(*cols)]
+
+
+# ---------------------------------------------------------------------------
+# Scenario curves: database connection pool exhaustion
+# (the --engine numpy paths of generate-infra-metrics.py and generate-incident-data.py)
+# ---------------------------------------------------------------------------
+def incident_host_curves(rng, host, minutes):
+    """
+    Vectorized per-minute (cpu, mem, disk) for `host` during the incident hour
+    (`minutes` may repeat, one run per cell), matching the scalar branches in
+    generate_incident_metrics: db-primary-01
+    climbs to 98% CPU, the replica follows, app hosts degrade after minute 12
+    and web hosts after minute 25.
+    """
+    n = len(minutes)
+    cpu = rng.uniform(0.15, 0.40, n)
+    mem = rng.uniform(0.40, 0.60, n)
+    disk = rng.uniform(0.30, 0.50, n)
+
+    if host == "db-primary-01":
+        cpu = np.minimum(0.45 + minutes * 0.009 + rng.uniform(-0.02, 0.03, n), 0.98)
+        mem = np.minimum(0.55 + minutes * 0.006 + rng.uniform(-0.02, 0.02, n), 0.96)
+        disk = np.minimum(0.42 + minutes * 0.001, 0.62)
+    elif host == "db-replica-01":
+        cpu = np.minimum(0.30 + minutes * 0.004 + rng.uniform(-0.02, 0.02, n), 0.70)
+        mem = rng.uniform(0.50, 0.65, n)
+    elif host in ("app-01", "app-02"):
+        stressed = minutes > 12
+        cpu = np.where(stressed, np.minimum(0.35 + minutes * 0.006 + rng.uniform(-0.03, 0.03, n), 0.85), cpu)
+        mem = np.where(stressed, np.minimum(0.50 + minutes * 0.004 + rng.uniform(-0.02, 0.02, n), 0.88), mem)
+    elif host in ("web-01", "web-02"):
+        stressed = minutes > 25
+        cpu = np.where(stressed, rng.uniform(0.35, 0.55, n), cpu)
+        mem = np.where(stressed, rng.uniform(0.50, 0.70, n), mem)
+
+    return rounded(cpu, 3), rounded(mem, 3), rounded(disk, 3)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+corpus.py -- Offline NDJSON corpora: write generator output to files, read it back.
+
+A corpus is a directory with one sub-directory per target index, each holding
+sharded, compressed bulk NDJSON (action line + source line per document):
+
+    corpus/
+      logs-opsagent/part-00000.ndjson.gz
+      logs-opsagent/part-00001.ndjson.gz
+      infra-metrics/part-00000.ndjson.gz
+
+Files are exactly what would have been POSTed to _bulk, so replay-corpus.py
+streams them back without re-serializing anything. Generators write corpora
+through CorpusWriter, which es_bulk.open_writer() returns instead of a
+BulkClient when ES_BULK_EXPORT_DIR is set (--export-dir on every generator).
+
+Codecs: gzip (stdlib, default), zstd (pip install zstandard), none.
+gzip headers carry no timestamp, so a seeded run (--seed/--anchor-time)
+produces byte-identical files.
+"""
+
+import gzip
+import io
+import os
+import sys
+import zlib
+
+import es_bulk
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODECS = {"gzip": ".ndjson.gz", "zstd": ".ndjson.zst", "none": ".ndjson"}
+SHARD_BYTES = int(os.environ.get("ES_EXPORT_SHARD_BYTES", 64 * 1024 * 1024))  # uncompressed
+ZSTD_LEVEL = 3
+
+
+def require_codec(codec):
+    """Exit with an install hint when `codec` needs a missing package."""
+    if codec not in CODECS:
+        print(f"Unknown corpus codec '{codec}' (choose from {', '.join(CODECS)})")
+        sys.exit(1)
+    if codec == "zstd" and zstandard is None:
+        print("Install zstandard for zstd corpora: pip install zstandard")
+        sys.exit(1)
+
+
+def codec_for(path):
+    """Infer the codec from a shard file name."""
+    for codec, ext in CODECS.items():
+        if codec != "none" and path.endswith(ext):
+            return codec
+    return "none"
+
+
+# ---------------------------------------------------------------------------
+# Writing
+# ---------------------------------------------------------------------------
+class _ShardFile:
+    """One output shard: an exclusive-create file behind a streaming compressor."""
+
+    def __init__(self, path, codec):
+        self.path = path
+        self.raw = open(path, "xb")
+        self.bytes_in = 0
+        if codec == "gzip":
+            self.compressor = zlib.compressobj(es_bulk.GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif codec == "zstd":
+            self.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        else:
+            self.compressor = None
+
+    def write(self, data):
+        self.bytes_in += len(data)
+        self.raw.write(self.compressor.compress(data) if self.compressor else data)
+
+    def close(self):
+        if self.compressor:
+            self.raw.write(self.compressor.flush())
+        self.raw.close()
+
+
+class CorpusWriter(es_bulk.BulkWriter):
+    """
+    BulkWriter that appends batches to per-index shard files instead of POSTing
+    them. Shards roll over every SHARD_BYTES of uncompressed NDJSON and are named
+    <tag>-<seq>; give concurrent writers (e.g. process-pool workers) distinct
+    tags so their shard names are stable and never collide.
+    """
+
+    def __init__(self, out_dir, codec="gzip", tag=None, shard_bytes=SHARD_BYTES,
+                 max_bytes=es_bulk.MAX_BYTES, max_docs=es_bulk.MAX_DOCS):
+        require_codec(codec)
+        super().__init__(max_bytes=max_bytes, max_docs=max_docs)
+        self.out_dir = out_dir
+        self.codec = codec
+        self.tag = tag or "part"
+        self.shard_bytes = shard_bytes
+        self._shards = {}  # index -> open _ShardFile
+        self._next_seq = {}
+
+    def _open_shard(self, index):
+        directory = os.path.join(self.out_dir, index)
+        os.makedirs(directory, exist_ok=True)
+        seq = self._next_seq.get(index, 0)
+        while True:
+            path = os.path.join(directory, f"{self.tag}-{seq:05d}{CODECS[self.codec]}")
+            try:
+                shard = _ShardFile(path, self.codec)
+                break
+            except FileExistsError:
+                seq += 1  # another writer with the same tag got here first
+        self._next_seq[index] = seq + 1
+        self._shards[index] = shard
+        return shard
+
+    def _submit(self):
+        batch, self._buffer, self._buffer_bytes = self._buffer, [], 0
+        counts = {}
+        nbytes = 0
+        for index, action, source in batch:
+            shard = self._shards.get(index) or self._open_shard(index)
+            shard.write(action + source)
+            nbytes += len(action) + len(source)
+            counts[index] = counts.get(index, 0) + 1
+            if shard.bytes_in >= self.shard_bytes:
+                shard.close()
+                del self._shards[index]
+        for index, n in counts.items():
+            self.stats.record(index, ok=n)
+        self.stats.record_batch(nbytes)
+
+    def close(self):
+        """Flush and close every open shard."""
+        try:
+            self.flush()
+        finally:
+            for shard in self._shards.values():
+                shard.close()
+            self._shards = {}
+
+
+# ---------------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------------
+def list_shards(corpus_dir, indices=None):
+    """Return sorted (index, path) pairs for every shard in a corpus directory."""
+    shards = []
+    for index in sorted(os.listdir(corpus_dir)):
+        directory = os.path.join(corpus_dir, index)
+        if not os.path.isdir(directory) or (indices and index not in indices):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if any(name.endswith(ext) for ext in CODECS.values()):
+                shards.append((index, os.path.join(directory, name)))
+    return shards
+
+
+def open_shard(path):
+    """Open a shard for line-by-line binary reading, decompressing on the fly."""
+    codec = codec_for(path)
+    require_codec(codec)
+    if codec == "gzip":
+        return gzip.open(path, "rb")
+    if codec == "zstd":
+        raw = open(path, "rb")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True))
+    return open(path, "rb")
+
+
+def iter_pairs(path):
+    """Yield (action_line, source_line) byte pairs, newlines included, from one shard."""
+    with open_shard(path) as fh:
+        lines = iter(fh)
+        for action in lines:
+            yield action, next(lines)
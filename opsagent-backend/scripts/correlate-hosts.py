@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+correlate-hosts.py -- Rank which hosts' stress precedes which services' errors.
+
+Answering "is a host behind this service's errors?" with the agent tools
+takes one correlate_host_timeline call per host and one error_trend_analysis
+call per service, and the model lines the series up by eye. This stage does
+the whole matrix at once:
+
+  - two ES|QL STATS queries, issued concurrently, pull every host's average
+    CPU and memory (infra-metrics) and every service's error rate
+    (opsagent-error-rollup) over the newest --window in --bucket buckets. A
+    query that fills the 10,000-row result cap is split in half on a bucket
+    boundary and retried (one bucket that fills it on its own is an error).
+  - both are laid out on one time grid: a hosts x buckets and a
+    services x buckets array. Host gaps are filled from the previous bucket
+    (then the next); a bucket with no traffic has an error rate of 0.
+  - every (host metric, service) pair is correlated at every lag from
+    0 to --max-lag buckets, host series leading, as one matrix product per
+    lag over z-scored rows. The same is done with the service leading, so a
+    host that only reacts to errors does not rank as their cause.
+  - the best lag of every pair is written to host-error-correlation (one
+    document per host, metric and service, overwritten each run) and the top
+    --top pairs are printed. The rank_host_correlation tool reads that index.
+
+A pair's correlation is Pearson's r between the host metric and the service
+error rate `lag_minutes` later; host_leads is set when the host-leading r at
+that lag beats the best service-leading one.
+
+Usage:
+    export ES_URL="https://your-es-instance.elastic.cloud:443"
+    export ES_API_KEY="your-api-key"
+    python3 correlate-hosts.py                                   # newest 3 hours, 5-minute buckets
+    python3 correlate-hosts.py --window "6 hours" --bucket "1 minute" --max-lag 30
+    python3 correlate-hosts.py --follow 300                      # refresh every 5 minutes
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import es_bulk
+
+try:
+    import numpy as np
+except ImportError:
+    print("Install numpy: pip install numpy")
+    sys.exit(1)
+
+ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
+ES_API_KEY = os.environ.get("ES_API_KEY", "")
+
+CORRELATION_INDEX = "host-error-correlation"
+MAX_ROWS = 10000            # ES|QL result cap; a full window is split on bucket boundaries
+WINDOW = "3 hours"
+BUCKET = "5 minutes"
+MAX_LAG_MINUTES = 30
+MIN_OVERLAP = 6             # buckets a lag must leave in common to be scored
+TOP = 10
+METRICS = {"cpu": "system.cpu.total.pct", "memory": "system.memory.used.pct"}
+
+HOST_QUERY = (
+    "FROM infra-metrics | WHERE @timestamp >= ?start AND @timestamp < ?end "
+    "| EVAL bucket = DATE_TRUNC(?bucket, @timestamp) "
+    f"| STATS {', '.join(f'{name} = AVG({field})' for name, field in METRICS.items())} BY host.name, bucket "
+    f"| LIMIT {MAX_ROWS}"
+)
+SERVICE_QUERY = (
+    "FROM opsagent-error-rollup | WHERE @timestamp >= ?start AND @timestamp < ?end "
+    "| EVAL bucket = DATE_TRUNC(?bucket, @timestamp) "
+    "| STATS error_count = SUM(error_count), total_count = SUM(total_count) BY service.name, bucket "
+    f"| LIMIT {MAX_ROWS}"
+)
+UNITS = {"minute": 1, "hour": 60, "day": 1440, "week": 10080}
+
+
+def iso(ms):
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def epoch_ms(timestamp):
+    return int(datetime.fromisoformat(timestamp.replace("Z", "+00:00")).timestamp() * 1000)
+
+
+def parse_minutes(text):
+    """'3 hours' / '5 minutes' -> minutes."""
+    match = re.fullmatch(r"\s*(\d+)\s*([a-z]+?)s?\s*", text.lower())
+    unit = match and next((u for u in UNITS if u.startswith(match.group(2))), None)
+    if not unit:
+        raise argparse.ArgumentTypeError(f"expected e.g. '3 hours' or '5 minutes', got {text!r}")
+    return int(match.group(1)) * UNITS[unit]
+
+
+def duration(text):
+    """Validate a duration and return it in the ES|QL form ('5 minutes')."""
+    minutes = parse_minutes(text)
+    for unit in ("week", "day", "hour"):
+        if minutes % UNITS[unit] == 0:
+            count = minutes // UNITS[unit]
+            return f"{count} {unit}{'s' if count > 1 else ''}"
+    return f"{minutes} minute{'s' if minutes > 1 else ''}"
+
+
+def esql(session, query, params=None):
+    """Run an ES|QL query. Returns a list of row dicts; raises RuntimeError on failure."""
+    body = {"query": query}
+    if params:
+        body["params"] = [{k: v} for k, v in params.items()]
+    resp = session.post(f"{ES_URL}/_query", json=body, timeout=es_bulk.REQUEST_TIMEOUT)
+    if resp.status_code != 200:
+        raise RuntimeError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+    data = resp.json()
+    names = [c["name"] for c in data["columns"]]
+    return [dict(zip(names, row)) for row in data["values"]]
+
+
+# ---------------------------------------------------------------------------
+# Fetch and align
+# ---------------------------------------------------------------------------
+def read_window(session, query, start_ms, end_ms, bucket, bucket_ms):
+    """
+    Rows of [start_ms, end_ms), splitting windows that hit MAX_ROWS on bucket
+    boundaries (so no bucket is summed from two halves). Raises RuntimeError
+    when a single bucket still fills the cap: its series would be truncated.
+    """
+    rows = esql(session, query, {"start": iso(start_ms), "end": iso(end_ms), "bucket": bucket})
+    if len(rows) < MAX_ROWS:
+        return rows
+    if end_ms - start_ms <= bucket_ms:
+        raise RuntimeError(f"{MAX_ROWS:,}-row cap reached by the single {bucket} bucket at {iso(start_ms)}; "
+                           "too many series to read in one bucket")
+    middle = start_ms + (end_ms - start_ms) // 2
+    middle = max(middle - middle % bucket_ms, start_ms - start_ms % bucket_ms + bucket_ms)
+    return (read_window(session, query, start_ms, middle, bucket, bucket_ms)
+            + read_window(session, query, middle, end_ms, bucket, bucket_ms))
+
+
+def fetch(session, window, bucket, bucket_ms):
+    """(host rows, service rows) for the newest window, both queries in flight at once."""
+    now_ms = int(time.time() * 1000)
+    start_ms = now_ms - parse_minutes(window) * 60_000
+    end_ms = now_ms - now_ms % bucket_ms + bucket_ms
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        hosts = pool.submit(read_window, session, HOST_QUERY, start_ms, end_ms, bucket, bucket_ms)
+        services = pool.submit(read_window, session, SERVICE_QUERY, start_ms, end_ms, bucket, bucket_ms)
+        return hosts.result(), services.result()
+
+
+def time_grid(host_rows, service_rows, bucket_ms):
+    """Epoch-ms bucket starts covering every row of both series."""
+    starts = [epoch_ms(r["bucket"]) for r in host_rows + service_rows]
+    if not starts:
+        return np.zeros(0, dtype=np.int64)
+    return np.arange(min(starts), max(starts) + 1, bucket_ms, dtype=np.int64)
+
+
+def fill_gaps(series):
+    """Forward-fill NaNs along each row, then back-fill the leading ones."""
+    for row in series:
+        valid = ~np.isnan(row)
+        if not valid.any():
+            continue
+        index = np.where(valid, np.arange(len(row)), 0)
+        np.maximum.accumulate(index, out=index)
+        row[:] = row[index]
+        row[:valid.argmax()] = row[valid.argmax()]
+    return series
+
+
+def host_series(rows, grid, bucket_ms):
+    """(labels, array): one row per (host, metric), one column per bucket."""
+    hosts = sorted({r["host.name"] for r in rows if r["host.name"] is not None})
+    series = np.full((len(hosts) * len(METRICS), len(grid)), np.nan)
+    position = {host: i for i, host in enumerate(hosts)}
+    for r in rows:
+        if r["host.name"] is None:
+            continue
+        column = (epoch_ms(r["bucket"]) - grid[0]) // bucket_ms
+        for m, metric in enumerate(METRICS):
+            if r[metric] is not None:
+                series[position[r["host.name"]] * len(METRICS) + m, column] = r[metric]
+    labels = [(host, metric) for host in hosts for metric in METRICS]
+    return labels, fill_gaps(series)
+
+
+def service_series(rows, grid, bucket_ms):
+    """(services, array): error rate % per service and bucket, 0 where there was no traffic."""
+    services = sorted({r["service.name"] for r in rows if r["service.name"] is not None})
+    position = {service: i for i, service in enumerate(services)}
+    errors = np.zeros((len(services), len(grid)))
+    totals = np.zeros((len(services), len(grid)))
+    for r in rows:
+        if r["service.name"] is None:
+            continue
+        column = (epoch_ms(r["bucket"]) - grid[0]) // bucket_ms
+        errors[position[r["service.name"]], column] += r["error_count"] or 0
+        totals[position[r["service.name"]], column] += r["total_count"] or 0
+    rate = np.divide(errors * 100.0, totals, out=np.zeros_like(errors), where=totals > 0)
+    return services, rate
+
+
+# ---------------------------------------------------------------------------
+# Lagged correlation
+# ---------------------------------------------------------------------------
+def zscore(rows):
+    """Standardise each row; constant rows become all zeros (they correlate with nothing)."""
+    centred = rows - rows.mean(axis=1, keepdims=True)
+    std = centred.std(axis=1, keepdims=True)
+    return np.divide(centred, std, out=np.zeros_like(centred), where=std > 0)
+
+
+def lagged_correlation(leading, following, max_lag):
+    """
+    Pearson r of every `leading` row against every `following` row shifted
+    0..max_lag buckets later: an array of shape (max_lag + 1, leading, following).
+    """
+    length = leading.shape[1]
+    out = np.full((max_lag + 1, len(leading), len(following)), np.nan)
+    for lag in range(min(max_lag, length - MIN_OVERLAP) + 1):
+        a = zscore(leading[:, :length - lag])
+        b = zscore(following[:, lag:])
+        out[lag] = a @ b.T / (length - lag)
+    return out
+
+
+def rank(host_labels, hosts, services, rates, max_lag, bucket_minutes):
+    """One result per (host, metric, service), best first."""
+    forward = lagged_correlation(hosts, rates, max_lag)                      # host leads
+    reverse = lagged_correlation(rates, hosts, max_lag).transpose(0, 2, 1)   # service leads
+    forward = np.where(np.isnan(forward), -np.inf, forward)
+    best_lag = forward.argmax(axis=0)
+    best = np.take_along_axis(forward, best_lag[None], axis=0)[0]
+    reverse_best = np.nan_to_num(reverse, nan=-np.inf).max(axis=0)
+    results = []
+    for i, (host, metric) in enumerate(host_labels):
+        for j, service in enumerate(services):
+            if not np.isfinite(best[i, j]):
+                continue
+            results.append({
+                "host.name": host,
+                "metric": metric,
+                "service.name": service,
+                "correlation": round(float(best[i, j]), 4),
+                "lag_minutes": int(best_lag[i, j]) * bucket_minutes,
+                "correlation_at_zero": round(float(forward[0, i, j]), 4),
+                "reverse_correlation": round(float(reverse_best[i, j]), 4) if np.isfinite(reverse_best[i, j]) else None,
+                "host_leads": bool(best_lag[i, j] > 0 and best[i, j] > reverse_best[i, j]),
+                "samples": hosts.shape[1] - int(best_lag[i, j]),
+            })
+    results.sort(key=lambda r: (-r["correlation"], r["host.name"], r["metric"], r["service.name"]))
+    for position, result in enumerate(results, 1):
+        result["rank"] = position
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Write
+# ---------------------------------------------------------------------------
+def write(session, results, grid, bucket_ms, window, bucket):
+    """Overwrite this run's pairs, then drop pairs an earlier run wrote that are gone now."""
+    computed_at = iso(time.time() * 1000)
+    common = {"@timestamp": iso(int(grid[-1])), "computed_at": computed_at, "window_start": iso(int(grid[0])),
+              "window_end": iso(int(grid[-1]) + bucket_ms), "window": window, "bucket": bucket}
+    with es_bulk.BulkClient(es_url=ES_URL, refresh=True) as client:
+        for result in results:
+            doc_id = f"{result['host.name']}|{result['metric']}|{result['service.name']}"
+            client.index(CORRELATION_INDEX, {**common, **result}, doc_id=doc_id)
+    stats = client.stats
+    resp = session.post(f"{ES_URL}/{CORRELATION_INDEX}/_delete_by_query?refresh=true",
+                        json={"query": {"range": {"computed_at": {"lt": computed_at}}}},
+                        timeout=es_bulk.REQUEST_TIMEOUT)
+    if resp.status_code != 200:
+        raise RuntimeError(f"stale pair cleanup HTTP {resp.status_code}: {resp.text[:200]}")
+    return stats
+
+
+def run(window=WINDOW, bucket=BUCKET, max_lag=MAX_LAG_MINUTES, top=TOP, dry_run=False):
+    """One correlation pass. Returns True on success."""
+    bucket_minutes = parse_minutes(bucket)
+    bucket_ms = bucket_minutes * 60_000
+    session = es_bulk.get_session(2)
+    started = time.monotonic()
+    try:
+        host_rows, service_rows = fetch(session, window, bucket, bucket_ms)
+        fetched = time.monotonic()
+        grid = time_grid(host_rows, service_rows, bucket_ms)
+        host_labels, hosts = host_series(host_rows, grid, bucket_ms)
+        services, rates = service_series(service_rows, grid, bucket_ms)
+        if len(grid) < MIN_OVERLAP or not host_labels or not services:
+            print(f"  [--] not enough data: {len(grid)} buckets, {len(host_labels) // len(METRICS)} hosts, "
+                  f"{len(services)} services")
+            return True
+        results = rank(host_labels, hosts, services, rates, max_lag // bucket_minutes, bucket_minutes)
+        computed = time.monotonic()
+        print(f"  [OK] {len(host_labels) // len(METRICS)} hosts x {len(services)} services x {len(grid)} buckets "
+              f"({iso(int(grid[0]))} .. {iso(int(grid[-1]) + bucket_ms)}): fetch {fetched - started:.2f}s, "
+              f"correlate {computed - fetched:.3f}s")
+        print(f"\n  {'host':<18} {'metric':<7} {'service':<22} {'r':>6} {'lag':>7}  leads")
+        for r in results[:top]:
+            print(f"  {r['host.name']:<18} {r['metric']:<7} {r['service.name']:<22} {r['correlation']:>6.3f} "
+                  f"{r['lag_minutes']:>4} min  {'yes' if r['host_leads'] else 'no'}")
+        if dry_run:
+            return True
+        stats = write(session, results, grid, bucket_ms, window, bucket)
+        if stats.total_failed:
+            print(f"  [ERR] {stats.total_failed} of {len(results)} pairs failed to write ({stats.errors[:1]})")
+            return False
+        print(f"\n  [OK] {len(results)} pairs -> {CORRELATION_INDEX}")
+        return True
+    except RuntimeError as exc:
+        print(f"  [ERR] {exc}")
+        return False
+    finally:
+        session.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rank host CPU/memory against service error rates by lagged correlation.")
+    parser.add_argument("--window", type=duration, default=WINDOW,
+                        help=f"How far back to correlate (default: {WINDOW})")
+    parser.add_argument("--bucket", type=duration, default=BUCKET,
+                        help=f"Time grid resolution (default: {BUCKET})")
+    parser.add_argument("--max-lag", type=parse_minutes, default=MAX_LAG_MINUTES, metavar="DURATION",
+                        help=f"Longest host-to-error delay to test (default: {MAX_LAG_MINUTES} minutes)")
+    parser.add_argument("--top", type=int, default=TOP, help=f"Pairs to print (default: {TOP})")
+    parser.add_argument("--dry-run", action="store_true", help=f"Print the ranking without writing {CORRELATION_INDEX}")
+    parser.add_argument("--follow", type=float, default=0, metavar="SECONDS",
+                        help="Repeat every SECONDS (Ctrl+C to stop)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print("=" * 60)
+    print("  Host / Service Error Correlation")
+    print("=" * 60)
+    print(f"  ES URL: {ES_URL}")
+    print(f"  Auth:   {'API Key configured' if ES_API_KEY else 'No auth (local dev)'}")
+    print(f"  Window: newest {args.window} in {args.bucket} buckets, lags up to {args.max_lag} minutes")
+    print("=" * 60)
+    ok = run(args.window, args.bucket, args.max_lag, args.top, args.dry_run)
+    while args.follow:
+        try:
+            time.sleep(args.follow)
+        except KeyboardInterrupt:
+            break
+        ok = run(args.window, args.bucket, args.max_lag, args.top, args.dry_run)
+    sys.exit(0 if ok else 1)
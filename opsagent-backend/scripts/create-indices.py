@@ -3,44 +3,74 @@
 create-indices.py -- Create all Elasticsearch indices and templates for OpsAgent.
 
 Creates:
+  - opsagent-timeseries ILM policy (hot rollover -> warm -> delete)
   - logs-opsagent-* index template
   - infra-metrics index template
+  - logs-opsagent / infra-metrics rollover aliases: a higher-priority template
+    per series attaches the ILM policy to <alias>-000001, -000002, ... backing
+    indices, and the alias points writes at the newest one. Generators keep
+    writing to "logs-opsagent" / "infra-metrics"; time-bounded queries only
+    touch the backing indices whose @timestamp range overlaps.
   - incident-knowledge index (semantic_text)
   - alert-rules index (percolator)
   - service-owners index
   - service-health-realtime index (transform destination)
   - runbooks index
   - incidents index (incident records)
+  - opsagent-error-rollup index (per-service, per-minute error counts; see rollup.py)
+  - alerts index (alert-rules matches fired by percolate-logs.py / alerting.py)
+  - host-error-correlation index (host/service lagged correlations; see correlate-hosts.py)
+  - series-onsets index (host metric / error rate changepoints; see detect-onsets.py)
 
-Idempotent: deletes existing indices/templates before recreating them
-(with optional --no-confirm flag to skip confirmation).
+Independent template/index operations run concurrently over one pooled
+connection (ES_BOOTSTRAP_CONCURRENCY, default 8).
+
+By default every index/template is deleted and recreated (with optional
+--no-confirm flag to skip confirmation). --diff instead compares the live
+mappings/settings against setup/mappings/*.json and only touches what changed:
+  create    the index is missing
+  update    only new fields or dynamic settings -> PUT _mapping / _settings in place
+  recreate  a field type or static setting changed -> delete + create, only
+            with --allow-recreate (asks first); otherwise the index is left
+            as it is and reported
+Indices whose definition is unchanged keep their data. Confirmation prompts
+need a terminal: without one (and without --no-confirm) the script exits 1
+instead of guessing.
 
 Usage:
     export ES_URL="https://your-es-instance.elastic.cloud:443"
     export ES_API_KEY="your-api-key"
     python3 create-indices.py             # interactive confirmation
     python3 create-indices.py --no-confirm  # skip confirmation (for CI/scripts)
+    python3 create-indices.py --diff        # non-destructive: only apply what changed
+    python3 create-indices.py --diff --dry-run  # print the plan, change nothing
+    python3 create-indices.py --diff --allow-recreate  # also recreate indices whose mapping broke
+    python3 create-indices.py --diff --logs-daily-gb 200  # size log shards for ~200 GB/day
+    python3 create-indices.py --diff --migrate-legacy     # move old concrete indices behind aliases
 """
 
+import argparse
 import json
+import math
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-try:
-    import requests
-except ImportError:
-    print("Install requests: pip install requests")
-    sys.exit(1)
+import es_bulk
 
 ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
 ES_API_KEY = os.environ.get("ES_API_KEY", "")
 
-HEADERS = {"Content-Type": "application/json"}
-if ES_API_KEY:
-    HEADERS["Authorization"] = f"ApiKey {ES_API_KEY}"
+CONCURRENCY = int(os.environ.get("ES_BOOTSTRAP_CONCURRENCY", 8))
+SESSION = es_bulk.get_session(CONCURRENCY)
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 MAPPINGS_DIR = os.path.join(SCRIPT_DIR, "..", "setup", "mappings")
+ILM_DIR = os.path.join(SCRIPT_DIR, "..", "setup", "ilm")
+
+# Settings that cannot change on an existing index (anything else is dynamic)
+STATIC_SETTINGS = ("number_of_shards", "codec", "mode", "sort.", "analysis.", "similarity.")
 
 # ---------------------------------------------------------------------------
 # Index and template definitions
@@ -91,8 +121,51 @@ INDICES = [
         "file": "incidents-mapping.json",
         "description": "Incident records",
     },
+    {
+        "name": "opsagent-error-rollup",
+        "file": "opsagent-error-rollup.json",
+        "description": "Per-service, per-minute error rollup (error_trend_analysis)",
+    },
+    {
+        "name": "alerts",
+        "file": "alerts.json",
+        "description": "Alerts fired by percolating logs at ingest (alerting.py) or stored logs (percolate-logs.py)",
+    },
+    {
+        "name": "host-error-correlation",
+        "file": "host-error-correlation.json",
+        "description": "Host metric vs service error-rate correlations (rank_host_correlation)",
+    },
+    {
+        "name": "series-onsets",
+        "file": "series-onsets.json",
+        "description": "Onsets detected in host metrics and error rates (detect_onsets)",
+    },
 ]
 
+# ILM policies (setup/ilm)
+ILM_POLICIES = [
+    {
+        "name": "opsagent-timeseries",
+        "file": "opsagent-timeseries.json",
+        "description": "rollover daily or at 30gb/shard, warm at 2d, delete at 14d",
+    },
+]
+
+# Rollover series: write alias -> <alias>-NNNNNN backing indices managed by ILM.
+# Each gets its own template (base mappings + ILM settings) at ROLLOVER_PRIORITY,
+# matching only the backing indices, so e.g. logs-opsagent-demo keeps the plain
+# logs template. The priority is fixed rather than derived from the base: it has
+# to clear both our base templates and Elasticsearch's built-in data-stream
+# templates (logs-*-* at 100), or logs-opsagent-000001 is created as a data
+# stream and the PUT of an overlapping template at equal priority is rejected.
+ROLLOVER_SERIES = [
+    {"alias": "logs-opsagent", "base": "logs-template.json", "policy": "opsagent-timeseries"},
+    {"alias": "infra-metrics", "base": "infra-metrics-mapping.json", "policy": "opsagent-timeseries"},
+]
+TARGET_SHARD_GB = 30  # keep in step with the policy's max_primary_shard_size
+ROLLOVER_PRIORITY = 500
+
 
 def load_mapping(filename):
     """Load a JSON mapping file from the mappings directory."""
@@ -101,127 +174,426 @@ def load_mapping(filename):
         return json.load(f)
 
 
-def delete_index(name):
-    """Delete an index if it exists. Returns True if deleted."""
-    resp = requests.head(f"{ES_URL}/{name}", headers=HEADERS)
-    if resp.status_code == 200:
-        del_resp = requests.delete(f"{ES_URL}/{name}", headers=HEADERS)
-        if del_resp.status_code == 200:
-            print(f"    Deleted existing index: {name}")
-            return True
-        else:
-            print(f"    Warning: failed to delete {name} (HTTP {del_resp.status_code})")
-    return False
+def template_body(tmpl):
+    """A template's body: built in memory for rollover templates, else loaded from setup/mappings."""
+    return tmpl["body"] if "body" in tmpl else load_mapping(tmpl["file"])
 
 
-def delete_template(name):
-    """Delete an index template if it exists."""
-    resp = requests.head(f"{ES_URL}/_index_template/{name}", headers=HEADERS)
-    if resp.status_code == 200:
-        del_resp = requests.delete(f"{ES_URL}/_index_template/{name}", headers=HEADERS)
-        if del_resp.status_code == 200:
-            print(f"    Deleted existing template: {name}")
-            return True
-        else:
-            print(f"    Warning: failed to delete template {name} (HTTP {del_resp.status_code})")
-    return False
+def load_policy(filename):
+    """Load an ILM policy from setup/ilm."""
+    with open(os.path.join(ILM_DIR, filename), "r") as f:
+        return json.load(f)
+
+
+def shards_for(daily_gb):
+    """Primary shards per backing index so a day of data stays near TARGET_SHARD_GB per shard."""
+    return max(1, math.ceil(daily_gb / TARGET_SHARD_GB))
+
+
+def rollover_templates(daily_gb):
+    """Build the per-series rollover templates. `daily_gb` maps alias -> expected GB/day."""
+    templates = []
+    for series in ROLLOVER_SERIES:
+        alias = series["alias"]
+        body = load_mapping(series["base"])
+        shards = shards_for(daily_gb.get(alias, 1))
+        body["index_patterns"] = [f"{alias}-0*"]
+        body["priority"] = ROLLOVER_PRIORITY
+        body["template"]["settings"] = {
+            **body["template"].get("settings", {}),
+            "number_of_shards": shards,
+            "index.lifecycle.name": series["policy"],
+            "index.lifecycle.rollover_alias": alias,
+        }
+        templates.append({
+            "name": f"{alias}-rollover",
+            "body": body,
+            "description": f"{alias}-0* backing indices, {shards} shard(s), ILM {series['policy']}",
+        })
+    return templates
+
+
+def run_concurrently(fn, items):
+    """Apply fn to every item on the pooled session's worker threads; print results in item order."""
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        for lines in pool.map(fn, items):
+            for line in lines:
+                print(line)
+
+
+# ---------------------------------------------------------------------------
+# Create / delete (each returns the lines to print, so threads don't interleave)
+# ---------------------------------------------------------------------------
+def delete_index(name):
+    """Delete an index if it exists."""
+    resp = SESSION.head(f"{ES_URL}/{name}")
+    if resp.status_code != 200:
+        return []
+    del_resp = SESSION.delete(f"{ES_URL}/{name}")
+    if del_resp.status_code == 200:
+        return [f"    Deleted existing index: {name}"]
+    return [f"    Warning: failed to delete {name} (HTTP {del_resp.status_code})"]
 
 
 def create_template(name, body, description):
-    """Create an index template."""
-    print(f"  Creating template: {name} ({description})...")
-    delete_template(name)
-    resp = requests.put(
-        f"{ES_URL}/_index_template/{name}",
-        headers=HEADERS,
-        json=body,
-    )
+    """Create (or overwrite) an index template. PUT replaces it atomically, so no delete is needed."""
+    lines = [f"  Creating template: {name} ({description})..."]
+    resp = SESSION.put(f"{ES_URL}/_index_template/{name}", json=body)
     if resp.status_code == 200:
-        print(f"    [OK] Template '{name}' created")
+        lines.append(f"    [OK] Template '{name}' created")
     else:
-        print(f"    [ERR] HTTP {resp.status_code}: {resp.text[:200]}")
+        lines.append(f"    [ERR] HTTP {resp.status_code}: {resp.text[:200]}")
+    return lines
 
 
-def create_index(name, body, description):
-    """Create a standalone index."""
-    print(f"  Creating index: {name} ({description})...")
-    delete_index(name)
-    resp = requests.put(
-        f"{ES_URL}/{name}",
-        headers=HEADERS,
-        json=body,
-    )
+def create_index(name, body, description, recreate=True):
+    """Create a standalone index, deleting any existing one first when `recreate`."""
+    lines = [f"  Creating index: {name} ({description})..."]
+    if recreate:
+        lines += delete_index(name)
+    resp = SESSION.put(f"{ES_URL}/{name}", json=body)
     if resp.status_code == 200:
-        print(f"    [OK] Index '{name}' created")
+        lines.append(f"    [OK] Index '{name}' created")
     else:
-        print(f"    [ERR] HTTP {resp.status_code}: {resp.text[:200]}")
+        lines.append(f"    [ERR] HTTP {resp.status_code}: {resp.text[:200]}")
+    return lines
+
 
+def create_policy(name, body, description):
+    """Create or update an ILM policy (PUT stores a new version; existing indices follow it)."""
+    resp = SESSION.put(f"{ES_URL}/_ilm/policy/{name}", json=body)
+    if resp.status_code == 200:
+        return [f"  [OK] ILM policy '{name}' ({description})"]
+    return [f"  [ERR] ILM policy '{name}': HTTP {resp.status_code}: {resp.text[:200]}"]
+
+
+def alias_indices(alias):
+    """Backing indices behind `alias` ([] if the alias does not exist)."""
+    resp = SESSION.get(f"{ES_URL}/_alias/{alias}")
+    return sorted(resp.json()) if resp.status_code == 200 else []
+
+
+def delete_series(series):
+    """Delete every backing index of a rollover alias, plus any legacy concrete index of that name."""
+    alias = series["alias"]
+    lines = []
+    for name in alias_indices(alias) + [alias]:
+        lines += delete_index(name)
+    return lines
+
+
+def bootstrap_series(series, migrate_legacy=False):
+    """
+    Ensure `alias` exists as a write alias over <alias>-000001. A legacy concrete
+    index with the alias name is left alone unless `migrate_legacy`, in which case
+    it is reindexed into the first backing index and atomically swapped for the alias.
+    """
+    alias = series["alias"]
+    first = f"{alias}-000001"
+    backing = alias_indices(alias)
+    if backing:
+        return [f"  [OK] '{alias}' is a write alias over {len(backing)} backing index(es)"]
+
+    legacy = SESSION.head(f"{ES_URL}/{alias}").status_code == 200
+    if legacy and not migrate_legacy:
+        return [f"  [WARN] '{alias}' is a concrete index; rerun with --migrate-legacy to move it behind a rollover alias"]
+
+    resp = SESSION.put(f"{ES_URL}/{first}",
+                       json={} if legacy else {"aliases": {alias: {"is_write_index": True}}})
+    if resp.status_code != 200:
+        return [f"  [ERR] {first}: HTTP {resp.status_code}: {resp.text[:200]}"]
+    if not legacy:
+        return [f"  [OK] Created '{first}' behind write alias '{alias}'"]
+
+    resp = SESSION.post(f"{ES_URL}/_reindex", params={"wait_for_completion": "true", "refresh": "true"},
+                        json={"source": {"index": alias}, "dest": {"index": first}}, timeout=3600)
+    if resp.status_code != 200 or resp.json().get("failures"):
+        return [f"  [ERR] reindex {alias} -> {first}: HTTP {resp.status_code}: {resp.text[:200]}"]
+    copied = resp.json().get("total", 0)
+    # remove_index + add in one _aliases call: readers never see the name missing
+    resp = SESSION.post(f"{ES_URL}/_aliases", json={"actions": [
+        {"remove_index": {"index": alias}},
+        {"add": {"index": first, "alias": alias, "is_write_index": True}},
+    ]})
+    if resp.status_code != 200:
+        return [f"  [ERR] alias swap for {alias}: HTTP {resp.status_code}: {resp.text[:200]}"]
+    return [f"  [OK] Migrated {copied} docs from concrete '{alias}' into '{first}' behind write alias"]
+
+
+def update_index(name, body):
+    """Apply additive mapping changes and dynamic settings to a live index in place."""
+    lines = [f"  Updating index in place: {name}..."]
+    resp = SESSION.put(f"{ES_URL}/{name}/_mapping", json=body.get("mappings", {}))
+    if resp.status_code != 200:
+        return lines + [f"    [ERR] mapping HTTP {resp.status_code}: {resp.text[:200]}"]
+    dynamic = {k: v for k, v in flatten_settings(body.get("settings", {})).items() if not is_static(k)}
+    if dynamic:
+        resp = SESSION.put(f"{ES_URL}/{name}/_settings", json={"index": dynamic})
+        if resp.status_code != 200:
+            return lines + [f"    [ERR] settings HTTP {resp.status_code}: {resp.text[:200]}"]
+    return lines + [f"    [OK] Index '{name}' updated"]
+
+
+# ---------------------------------------------------------------------------
+# Diff: normalize live and desired definitions, then check desired is a subset of live
+# ---------------------------------------------------------------------------
+def flatten_settings(settings, prefix=""):
+    """{"index": {"number_of_shards": "1"}} -> {"number_of_shards": "1"} (dotted keys, no index. prefix)."""
+    flat = {}
+    for key, value in settings.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_settings(value, path + "."))
+        else:
+            flat[path.removeprefix("index.")] = value
+    return flat
+
+
+def is_static(setting):
+    return any(setting == s or setting.startswith(s) for s in STATIC_SETTINGS)
+
+
+def expand_properties(properties):
+    """Expand dotted field names into nested objects, as Elasticsearch reports them."""
+    out = {}
+    for name, spec in properties.items():
+        spec = dict(spec)
+        if spec.get("type") == "object":
+            del spec["type"]  # objects are reported without an explicit type
+        if "properties" in spec:
+            spec["properties"] = expand_properties(spec["properties"])
+        *parents, leaf = name.split(".")
+        node = out
+        for parent in parents:
+            node = node.setdefault(parent, {}).setdefault("properties", {})
+        node.setdefault(leaf, {}).update(spec)
+    return out
+
+
+def _scalar(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def diff_subset(desired, live, path=""):
+    """
+    Return [(path, live_value, desired_value)] for everything in `desired` that is
+    absent from or different in `live`. Keys only present in live (server-side
+    defaults such as semantic_text inference ids) are ignored.
+    """
+    diffs = []
+    if isinstance(desired, dict):
+        if not isinstance(live, dict):
+            return [(path, live, desired)]
+        for key, value in desired.items():
+            sub = f"{path}.{key}" if path else key
+            if key not in live:
+                diffs.append((sub, None, value))
+            else:
+                diffs += diff_subset(value, live[key], sub)
+    elif isinstance(desired, list):
+        if [_scalar(v) for v in desired] != [_scalar(v) for v in (live or [])]:
+            diffs.append((path, live, desired))
+    elif _scalar(desired) != _scalar(live):
+        diffs.append((path, live, desired))
+    return diffs
+
+
+def plan_index(idx):
+    """Return (action, reasons) for a standalone index: unchanged / create / update / recreate."""
+    name = idx["name"]
+    resp = SESSION.get(f"{ES_URL}/{name}")
+    if resp.status_code == 404:
+        return "create", []
+    resp.raise_for_status()
+    live = resp.json()[name]
+    desired = load_mapping(idx["file"])
+
+    settings_diff = diff_subset(flatten_settings(desired.get("settings", {})),
+                                flatten_settings(live.get("settings", {})), "settings")
+    mapping_diff = diff_subset(expand_properties(desired.get("mappings", {}).get("properties", {})),
+                               live.get("mappings", {}).get("properties", {}), "mappings")
+    if not settings_diff and not mapping_diff:
+        return "unchanged", []
+
+    reasons = [f"{p}: {json.dumps(old)} -> {json.dumps(new)}" for p, old, new in settings_diff + mapping_diff]
+    # New fields (live value absent) and dynamic settings can be applied in place.
+    breaking = [p for p, old, _ in mapping_diff if old is not None]
+    breaking += [p for p, _, _ in settings_diff if is_static(p.removeprefix("settings."))]
+    return ("recreate" if breaking else "update"), reasons
+
+
+def plan_template(tmpl):
+    """Return (action, reasons) for an index template: unchanged / create / update."""
+    name = tmpl["name"]
+    resp = SESSION.get(f"{ES_URL}/_index_template/{name}")
+    if resp.status_code == 404:
+        return "create", []
+    resp.raise_for_status()
+    live = resp.json()["index_templates"][0]["index_template"]
+    desired = template_body(tmpl)
+    live_tmpl, desired_tmpl = live.get("template", {}), desired.get("template", {})
+
+    diffs = diff_subset({k: v for k, v in desired.items() if k != "template"}, live)
+    diffs += diff_subset(flatten_settings(desired_tmpl.get("settings", {})),
+                         flatten_settings(live_tmpl.get("settings", {})), "template.settings")
+    diffs += diff_subset(expand_properties(desired_tmpl.get("mappings", {}).get("properties", {})),
+                         live_tmpl.get("mappings", {}).get("properties", {}), "template.mappings")
+    if not diffs:
+        return "unchanged", []
+    return "update", [f"{p}: {json.dumps(old)} -> {json.dumps(new)}" for p, old, new in diffs]
+
+
+def plan_policy(policy):
+    """Return (action, reasons) for an ILM policy: unchanged / create / update."""
+    name = policy["name"]
+    resp = SESSION.get(f"{ES_URL}/_ilm/policy/{name}")
+    if resp.status_code == 404:
+        return "create", []
+    resp.raise_for_status()
+    live = resp.json()[name]["policy"]
+    diffs = diff_subset(load_policy(policy["file"])["policy"]["phases"], live.get("phases", {}), "phases")
+    if not diffs:
+        return "unchanged", []
+    return "update", [f"{p}: {json.dumps(old)} -> {json.dumps(new)}" for p, old, new in diffs]
+
+
+def confirm(no_confirm=False):
+    """Ask before deleting data. Exits 1 when there is no terminal to ask on."""
+    if no_confirm:
+        return True
+    if not sys.stdin.isatty():
+        print("stdin is not a terminal; rerun interactively or pass --no-confirm.")
+        sys.exit(1)
+    return input("Continue? [y/N] ").strip().lower() == "y"
+
+
+def run_diff(templates, no_confirm=False, dry_run=False, migrate_legacy=False, allow_recreate=False):
+    """Compare live policies/templates/indices with setup/ and apply only the differences."""
+    print("\n--- Plan (--diff) ---")
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        policy_plans = list(pool.map(plan_policy, ILM_POLICIES))
+        template_plans = list(pool.map(plan_template, templates))
+        index_plans = list(pool.map(plan_index, INDICES))
+
+    groups = (("policy", ILM_POLICIES, policy_plans), ("template", templates, template_plans),
+              ("index", INDICES, index_plans))
+    for kind, items, plans in groups:
+        for item, (action, reasons) in zip(items, plans):
+            print(f"  {kind:<8} {item['name']:<26} {action}")
+            for reason in reasons[:5]:
+                print(f"           {reason}")
+            if len(reasons) > 5:
+                print(f"           ... {len(reasons) - 5} more")
+
+    changed_policies = [p for p, (action, _) in zip(ILM_POLICIES, policy_plans) if action != "unchanged"]
+    changed_templates = [t for t, (action, _) in zip(templates, template_plans) if action != "unchanged"]
+    changed_indices = [(i, action) for i, (action, _) in zip(INDICES, index_plans) if action != "unchanged"]
+    if dry_run:
+        print("\nDry run: no changes applied.")
+        return
+    if not changed_policies and not changed_templates and not changed_indices:
+        print("\nEverything is up to date.")
+    recreates = [i["name"] for i, action in changed_indices if action == "recreate"]
+    if recreates and not allow_recreate:
+        print(f"\n  [WARN] Not recreating {', '.join(recreates)}: their live mapping differs in ways that "
+              "need a delete + create. Rerun with --allow-recreate to replace them (their data is lost).")
+        changed_indices = [(i, action) for i, action in changed_indices if action != "recreate"]
+    elif recreates:
+        print(f"\nRecreating {', '.join(recreates)} will DELETE their data.")
+        if not confirm(no_confirm):
+            print("Aborted.")
+            return
+
+    def apply(change):
+        kind, item, action = change
+        if kind == "policy":
+            return create_policy(item["name"], load_policy(item["file"]), item["description"])
+        if kind == "template":
+            return create_template(item["name"], template_body(item), item["description"])
+        body = load_mapping(item["file"])
+        if action == "update":
+            return update_index(item["name"], body)
+        return create_index(item["name"], body, item["description"], recreate=action == "recreate")
+
+    if changed_policies or changed_templates or changed_indices:
+        print("\n--- Applying changes ---")
+        run_concurrently(apply, [("policy", p, "update") for p in changed_policies]
+                         + [("template", t, "update") for t in changed_templates]
+                         + [("index", i, action) for i, action in changed_indices])
+
+    print("\n--- Rollover Aliases ---")
+    run_concurrently(lambda series: bootstrap_series(series, migrate_legacy), ROLLOVER_SERIES)
+    changed = len(changed_policies) + len(changed_templates) + len(changed_indices)
+    total = len(ILM_POLICIES) + len(templates) + len(INDICES)
+    print(f"\nDone! {changed} definitions changed, {total - changed} unchanged.")
+
+
+def run(no_confirm=False, diff=False, dry_run=False, daily_gb=None, migrate_legacy=False, allow_recreate=False):
+    """Create all policies, templates, indices and rollover aliases."""
+    templates = INDEX_TEMPLATES + rollover_templates(daily_gb or {})
 
-def run(no_confirm=False):
-    """Create all indices and templates."""
     print("=" * 60)
     print("  OpsAgent -- Index & Template Creator")
     print("=" * 60)
     print(f"  ES URL: {ES_URL}")
     print(f"  Auth:   {'API Key configured' if ES_API_KEY else 'No auth (local dev)'}")
-    print(f"  Templates: {len(INDEX_TEMPLATES)}")
-    print(f"  Indices:   {len(INDICES)}")
+    print(f"  Policies:  {len(ILM_POLICIES)}")
+    print(f"  Templates: {len(templates)}")
+    print(f"  Indices:   {len(INDICES)} + {len(ROLLOVER_SERIES)} rollover aliases")
+    print(f"  Mode:      {'diff' if diff else 'recreate all'} ({CONCURRENCY} concurrent requests)")
     print("=" * 60)
 
+    if diff:
+        run_diff(templates, no_confirm=no_confirm, dry_run=dry_run, migrate_legacy=migrate_legacy,
+                 allow_recreate=allow_recreate)
+        return
+
     if not no_confirm:
         print("\nThis will DELETE and recreate existing indices. Data will be lost.")
-        answer = input("Continue? [y/N] ").strip().lower()
-        if answer != "y":
+        if not confirm():
             print("Aborted.")
             return
 
-    # Create index templates
-    print("\n--- Index Templates ---")
-    for tmpl in INDEX_TEMPLATES:
-        body = load_mapping(tmpl["file"])
-        create_template(tmpl["name"], body, tmpl["description"])
-
-    # Create standalone indices
-    print("\n--- Standalone Indices ---")
-    for idx in INDICES:
-        body = load_mapping(idx["file"])
-        create_index(idx["name"], body, idx["description"])
-
-    # Also create the concrete logs-opsagent index so bulk indexing works
-    # (the template only matches logs-opsagent-* patterns, but we use "logs-opsagent" as index name)
-    print("\n--- Concrete Log Index ---")
-    resp = requests.head(f"{ES_URL}/logs-opsagent", headers=HEADERS)
-    if resp.status_code != 200:
-        create_resp = requests.put(
-            f"{ES_URL}/logs-opsagent",
-            headers=HEADERS,
-            json={"settings": {"number_of_shards": 1, "number_of_replicas": 1}},
-        )
-        if create_resp.status_code == 200:
-            print("  [OK] Created concrete index 'logs-opsagent'")
-        else:
-            print(f"  [ERR] HTTP {create_resp.status_code}: {create_resp.text[:200]}")
-    else:
-        print("  [OK] 'logs-opsagent' already exists")
+    # Policies, templates and standalone indices are independent of each other
+    print("\n--- Policies, Index Templates & Standalone Indices ---")
+    run_concurrently(
+        lambda job: job(),
+        [partial(create_policy, p["name"], load_policy(p["file"]), p["description"]) for p in ILM_POLICIES]
+        + [partial(create_template, t["name"], template_body(t), t["description"]) for t in templates]
+        + [partial(create_index, i["name"], load_mapping(i["file"]), i["description"]) for i in INDICES],
+    )
+
+    # The rollover aliases go last so their templates and policy are already in place.
+    print("\n--- Rollover Aliases ---")
+    run_concurrently(lambda series: delete_series(series) + bootstrap_series(series), ROLLOVER_SERIES)
+
+    print(f"\nDone! Created {len(ILM_POLICIES)} policies, {len(templates)} templates, "
+          f"{len(INDICES)} indices and {len(ROLLOVER_SERIES)} rollover aliases.")
 
-    # Create concrete infra-metrics index
-    resp = requests.head(f"{ES_URL}/infra-metrics", headers=HEADERS)
-    if resp.status_code != 200:
-        create_resp = requests.put(
-            f"{ES_URL}/infra-metrics",
-            headers=HEADERS,
-            json={"settings": {"number_of_shards": 1, "number_of_replicas": 1}},
-        )
-        if create_resp.status_code == 200:
-            print("  [OK] Created concrete index 'infra-metrics'")
-        else:
-            print(f"  [ERR] HTTP {create_resp.status_code}: {create_resp.text[:200]}")
-    else:
-        print("  [OK] 'infra-metrics' already exists")
 
-    print(f"\nDone! Created {len(INDEX_TEMPLATES)} templates and {len(INDICES) + 2} indices.")
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Create OpsAgent indices and templates.")
+    parser.add_argument("--no-confirm", action="store_true",
+                        help="Skip the confirmation prompt (for CI/scripts)")
+    parser.add_argument("--diff", action="store_true",
+                        help="Only create/update/recreate what differs from setup/mappings")
+    parser.add_argument("--allow-recreate", action="store_true",
+                        help="With --diff: delete and recreate indices whose mapping changed incompatibly")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="With --diff: print the plan without applying it")
+    parser.add_argument("--logs-daily-gb", type=float, default=1,
+                        help="Expected logs-opsagent GB/day; sizes primary shards per backing index (default: 1)")
+    parser.add_argument("--metrics-daily-gb", type=float, default=1,
+                        help="Expected infra-metrics GB/day (default: 1)")
+    parser.add_argument("--migrate-legacy", action="store_true",
+                        help="With --diff: reindex a concrete logs-opsagent/infra-metrics index behind its alias")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    no_confirm = "--no-confirm" in sys.argv
-    run(no_confirm=no_confirm)
+    args = parse_args()
+    run(no_confirm=args.no_confirm, diff=args.diff, dry_run=args.dry_run,
+        daily_gb={"logs-opsagent": args.logs_daily_gb, "infra-metrics": args.metrics_daily_gb},
+        migrate_legacy=args.migrate_legacy, allow_recreate=args.allow_recreate)
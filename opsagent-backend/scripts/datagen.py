@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+datagen.py -- Shared --seed / --anchor-time / --export-dir options for the data generators.
+
+Every generator draws from the `random` module and anchors its timeline to a
+module-level NOW taken from the wall clock, so two runs never produce the same
+corpus. Pinning both makes a corpus reproducible byte-for-byte, which is what
+lets ES|QL tool latency be compared across code or cluster changes:
+
+    python3 generate-incident-data.py --seed 42 --anchor-time 2025-01-15T12:00:00Z
+
+Generators call datagen.add_arguments(parser) and pass the parsed values to
+their configure(seed, anchor_time), which re-seeds `random` and recomputes
+NOW and the timestamps derived from it.
+
+--export-dir writes the corpus to compressed NDJSON files (see corpus.py)
+instead of indexing it; replay-corpus.py loads such a corpus into a cluster.
+"""
+
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timezone
+
+import corpus
+import es_bulk
+
+
+def parse_anchor_time(value):
+    """Parse an ISO-8601 timestamp ("Z" or offset; naive means UTC) into an aware UTC datetime."""
+    try:
+        ts = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid ISO-8601 timestamp: {value!r}")
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc)
+
+
+def add_arguments(parser):
+    """Add --seed, --anchor-time and the --export-* options to an argparse parser."""
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Seed the random generators so the corpus is reproducible")
+    parser.add_argument("--anchor-time", type=parse_anchor_time, default=None, metavar="ISO8601",
+                        help="Timestamp that stands in for 'now' (default: current time)")
+    parser.add_argument("--export-dir", default=None, metavar="DIR",
+                        help="Write sharded NDJSON files per index under DIR instead of indexing")
+    parser.add_argument("--export-codec", choices=sorted(corpus.CODECS), default="gzip",
+                        help="Compression for --export-dir shards (zstd needs zstandard; default: gzip)")
+    return parser
+
+
+def apply_export(args):
+    """Switch es_bulk to file export when --export-dir was given. The directory must be empty."""
+    if not args.export_dir:
+        return
+    corpus.require_codec(args.export_codec)
+    if os.path.isdir(args.export_dir) and os.listdir(args.export_dir):
+        print(f"Export directory {args.export_dir} is not empty; choose a fresh directory")
+        sys.exit(1)
+    os.makedirs(args.export_dir, exist_ok=True)
+    es_bulk.export_to(args.export_dir, args.export_codec)
+    print(f"Exporting to {args.export_dir} ({args.export_codec}) instead of {es_bulk.ES_URL}")
+
+
+def anchor(anchor_time=None):
+    """Return the timeline anchor: `anchor_time` if given, else the current UTC time."""
+    if anchor_time is None:
+        return datetime.now(timezone.utc)
+    if isinstance(anchor_time, str):
+        return parse_anchor_time(anchor_time)
+    return anchor_time
+
+
+def seed_random(seed=None):
+    """Seed the global `random` state; None leaves it untouched."""
+    if seed is not None:
+        random.seed(seed)
+
+
+def describe(seed=None, anchor_time=None):
+    """One-line banner summary of the reproducibility settings."""
+    seed_text = seed if seed is not None else "random"
+    anchor_text = anchor_time.isoformat() if anchor_time is not None else "now"
+    return f"seed={seed_text}, anchor={anchor_text}"
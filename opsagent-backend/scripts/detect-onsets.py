@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+detect-onsets.py -- Find when host metrics and service error rates changed.
+
+Streams every host's CPU and memory (infra-metrics) and every service's error
+rate (opsagent-error-rollup), bucket by bucket in time order, through two
+changepoint.OnsetDetector instances and writes each onset they report to the
+series-onsets index, which the detect_onsets tool reads. An onset carries the
+estimated start of the change, when it was detected, the direction, the
+baseline and new level, the shift in standard deviations and a confidence.
+
+Series are read with ES|QL in time windows (STATS ... BY host.name / service.name,
+bucket, sorted by bucket); a window that fills the 10,000-row result cap is
+split in half on a bucket boundary and retried (one bucket that fills it on
+its own is an error), so thousands of series stream through in bounded
+memory: the detectors hold a few numbers per series, never the series
+themselves. Only complete buckets are fed; --follow N keeps the detectors
+between passes and continues from the last complete bucket every N seconds.
+
+--benchmark skips Elasticsearch: it generates the incident scenario of
+generate-incident-data.py in memory (--scale N cells, N x 16 series), runs
+the same detectors over it and scores the first onset of every series against
+the phase boundaries the generator injects (see EXPECTED).
+
+Usage:
+    export ES_URL="https://your-es-instance.elastic.cloud:443"
+    export ES_API_KEY="your-api-key"
+    python3 detect-onsets.py                                  # newest 6 hours, 1-minute buckets
+    python3 detect-onsets.py --since "2 days" --bucket "5 minutes"
+    python3 detect-onsets.py --follow 60                      # keep up with live ingest
+    python3 detect-onsets.py --benchmark --scale 200 --seed 42
+"""
+
+import argparse
+import importlib.util
+import os
+import re
+import statistics
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import changepoint
+import datagen
+import es_bulk
+import rollup
+
+ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
+ES_API_KEY = os.environ.get("ES_API_KEY", "")
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ONSETS_INDEX = "series-onsets"
+MAX_ROWS = 10000            # ES|QL result cap; a full window is split on bucket boundaries
+WINDOW_MINUTES = 360
+SINCE = "6 hours"
+BUCKET = "1 minute"
+TOP = 20
+METRICS = {"cpu": "system.cpu.total.pct", "memory": "system.memory.used.pct"}
+HOST_SIGMA = 0.02           # noise floor of a host metric (fraction of capacity)
+RATE_SIGMA = 5.0            # noise floor of an error rate (percentage points)
+
+HOST_QUERY = (
+    "FROM infra-metrics | WHERE @timestamp >= ?start AND @timestamp < ?end "
+    "| EVAL bucket = DATE_TRUNC(?bucket, @timestamp) "
+    f"| STATS {', '.join(f'{name} = AVG({field})' for name, field in METRICS.items())} BY host.name, bucket "
+    f"| SORT bucket | LIMIT {MAX_ROWS}"
+)
+SERVICE_QUERY = (
+    "FROM opsagent-error-rollup | WHERE @timestamp >= ?start AND @timestamp < ?end "
+    "| EVAL bucket = DATE_TRUNC(?bucket, @timestamp) "
+    "| STATS error_count = SUM(error_count), total_count = SUM(total_count) BY service.name, bucket "
+    f"| SORT bucket | LIMIT {MAX_ROWS}"
+)
+UNITS = {"minute": 1, "hour": 60, "day": 1440, "week": 10080}
+
+# Injected phase changes of generate-incident-data.py, in minutes after INCIDENT_START:
+# db hosts degrade from the start, app hosts after minute 12, web hosts after minute 25;
+# payment/order/api-gateway start erroring at minute 10 and inventory-service at 30.
+EXPECTED = {
+    **{(host, metric): 0 for host in ("db-primary-01", "db-replica-01") for metric in METRICS},
+    **{(host, metric): 13 for host in ("app-01", "app-02") for metric in METRICS},
+    **{(host, metric): 26 for host in ("web-01", "web-02") for metric in METRICS},
+    **{(service, "error_rate"): 10 for service in ("payment-service", "order-service", "api-gateway")},
+    ("inventory-service", "error_rate"): 30,
+}
+ONSET_TOLERANCE = 5         # minutes an onset estimate may miss the injected change by
+MAX_DELAY = 20              # minutes after the change by which it must be detected
+
+
+def iso(ms):
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def epoch_ms(timestamp):
+    return int(datetime.fromisoformat(timestamp.replace("Z", "+00:00")).timestamp() * 1000)
+
+
+def parse_minutes(text):
+    """'6 hours' / '90 minutes' / '2d' -> minutes."""
+    match = re.fullmatch(r"\s*(\d+)\s*([a-z]+?)s?\s*", text.lower())
+    unit = match and next((u for u in UNITS if u.startswith(match.group(2))), None)
+    if not unit:
+        raise argparse.ArgumentTypeError(f"expected e.g. '6 hours' or '1 minute', got {text!r}")
+    return int(match.group(1)) * UNITS[unit]
+
+
+def duration(text):
+    """Validate a duration and return it in the ES|QL form ('5 minutes')."""
+    minutes = parse_minutes(text)
+    for unit in ("week", "day", "hour"):
+        if minutes % UNITS[unit] == 0:
+            count = minutes // UNITS[unit]
+            return f"{count} {unit}{'s' if count > 1 else ''}"
+    return f"{minutes} minute{'s' if minutes > 1 else ''}"
+
+
+def esql(session, query, params=None):
+    """Run an ES|QL query. Returns a list of row dicts; raises RuntimeError on failure."""
+    body = {"query": query}
+    if params:
+        body["params"] = [{k: v} for k, v in params.items()]
+    resp = session.post(f"{ES_URL}/_query", json=body, timeout=es_bulk.REQUEST_TIMEOUT)
+    if resp.status_code != 200:
+        raise RuntimeError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+    data = resp.json()
+    names = [c["name"] for c in data["columns"]]
+    return [dict(zip(names, row)) for row in data["values"]]
+
+
+def _load_module(filename):
+    """Import a sibling script by filename (supports hyphens in names)."""
+    filepath = os.path.join(SCRIPT_DIR, filename)
+    module_name = filename.replace("-", "_").removesuffix(".py")
+    spec = importlib.util.spec_from_file_location(module_name, filepath)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+# ---------------------------------------------------------------------------
+# Detection
+# ---------------------------------------------------------------------------
+class Detectors:
+    """The host-metric and error-rate detectors, fed one bucket of rows at a time."""
+
+    def __init__(self):
+        self.hosts = changepoint.OnsetDetector(min_sigma=HOST_SIGMA)
+        self.services = changepoint.OnsetDetector(min_sigma=RATE_SIGMA)
+        self.samples = 0
+
+    def __len__(self):
+        return len(self.hosts) + len(self.services)
+
+    def nbytes(self):
+        return self.hosts.nbytes() + self.services.nbytes()
+
+    def host_step(self, ts, rows):
+        """rows: (host, {metric: value}). Returns onset dicts."""
+        keys = [(host, metric) for host, _ in rows for metric in METRICS]
+        values = [float("nan") if row.get(m) is None else row[m] for _, row in rows for m in METRICS]
+        self.samples += len(keys)
+        return [{**o, "kind": "host", "host.name": o["series"][0], "metric": o["series"][1]}
+                for o in self.hosts.update(ts, keys, values)]
+
+    def service_step(self, ts, rows):
+        """rows: (service, errors, total); buckets without traffic are missing, not 0 %. Returns onset dicts."""
+        rows = [(service, 100.0 * errors / total) for service, errors, total in rows if total]
+        self.samples += len(rows)
+        return [{**o, "kind": "service", "service.name": o["series"][0], "metric": "error_rate"}
+                for o in self.services.update(ts, [(s, "error_rate") for s, _ in rows], [r for _, r in rows])]
+
+
+def by_bucket(rows, key):
+    """Group time-sorted ES|QL rows into (bucket ms, [rows]) in time order."""
+    groups = defaultdict(list)
+    for row in rows:
+        if row[key] is not None:
+            groups[epoch_ms(row["bucket"])].append(row)
+    return sorted(groups.items())
+
+
+def read_window(session, query, start_ms, end_ms, bucket, bucket_ms):
+    """
+    Rows of [start_ms, end_ms), splitting windows that hit MAX_ROWS on bucket
+    boundaries (so no bucket is summed from two halves). Raises RuntimeError
+    when a single bucket still fills the cap: its series would be truncated.
+    """
+    rows = esql(session, query, {"start": iso(start_ms), "end": iso(end_ms), "bucket": bucket})
+    if len(rows) < MAX_ROWS:
+        return rows
+    if end_ms - start_ms <= bucket_ms:
+        raise RuntimeError(f"{MAX_ROWS:,}-row cap reached by the single {bucket} bucket at {iso(start_ms)}; "
+                           "too many series to read in one bucket")
+    middle = start_ms + (end_ms - start_ms) // 2
+    middle = max(middle - middle % bucket_ms, start_ms + bucket_ms)
+    return (read_window(session, query, start_ms, middle, bucket, bucket_ms)
+            + read_window(session, query, middle, end_ms, bucket, bucket_ms))
+
+
+def detect(session, detectors, start_ms, end_ms, bucket, bucket_ms):
+    """Feed the complete buckets of [start_ms, end_ms) to the detectors. Returns the onsets."""
+    onsets = []
+    window_ms = max(WINDOW_MINUTES * 60_000 // bucket_ms, 1) * bucket_ms
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        for window_start in range(start_ms, end_ms, window_ms):
+            window_end = min(end_ms, window_start + window_ms)
+            hosts = pool.submit(read_window, session, HOST_QUERY, window_start, window_end, bucket, bucket_ms)
+            services = pool.submit(read_window, session, SERVICE_QUERY, window_start, window_end, bucket, bucket_ms)
+            for ts, rows in by_bucket(hosts.result(), "host.name"):
+                onsets += detectors.host_step(ts, [(r["host.name"], r) for r in rows])
+            for ts, rows in by_bucket(services.result(), "service.name"):
+                onsets += detectors.service_step(ts, [(r["service.name"], r["error_count"] or 0,
+                                                       r["total_count"] or 0) for r in rows])
+    return onsets
+
+
+def bounds(session, bucket_ms):
+    """(first bucket, end of the last complete bucket) across both series, or None when empty."""
+    row = esql(session, "FROM infra-metrics,opsagent-error-rollup | STATS first = MIN(@timestamp), last = MAX(@timestamp)")[0]
+    if row["first"] is None:
+        return None
+    first, last = epoch_ms(row["first"]), epoch_ms(row["last"])
+    return first - first % bucket_ms, last - last % bucket_ms
+
+
+def onset_doc(onset, bucket):
+    doc = {
+        "@timestamp": iso(onset["onset"]),
+        "detected_at": iso(onset["detected"]),
+        "detection_delay_minutes": (onset["detected"] - onset["onset"]) // 60_000,
+        "kind": onset["kind"],
+        "metric": onset["metric"],
+        "direction": onset["direction"],
+        "baseline": round(onset["baseline"], 4),
+        "level": round(onset["level"], 4),
+        "shift_sigma": onset["shift_sigma"],
+        "confidence": onset["confidence"],
+        "bucket": bucket,
+    }
+    name = "host.name" if onset["kind"] == "host" else "service.name"
+    doc[name] = onset[name]
+    return doc
+
+
+def print_onsets(onsets, top):
+    print(f"\n  {'onset':<20} {'series':<36} {'dir':<4} {'shift':>7} {'conf':>6} {'delay':>7}")
+    for o in sorted(onsets, key=lambda o: (o["onset"], o["series"]))[:top]:
+        series = f"{o['series'][0]} {o['series'][1]}"
+        print(f"  {iso(o['onset'])[:19]:<20} {series:<36} {o['direction']:<4} {o['shift_sigma']:>5.1f}sd "
+              f"{o['confidence']:>6.3f} {(o['detected'] - o['onset']) // 60_000:>4} min")
+    if len(onsets) > top:
+        print(f"  ... {len(onsets) - top} more")
+
+
+def run(detectors, mark=None, since=SINCE, bucket=BUCKET, top=TOP, dry_run=False):
+    """One pass. `mark` is where the previous pass stopped, if any. Returns (mark, failed)."""
+    bucket_ms = parse_minutes(bucket) * 60_000
+    session = es_bulk.get_session(2)
+    started = time.monotonic()
+    try:
+        span = bounds(session, bucket_ms)
+        if span is None:
+            print("  [--] infra-metrics / opsagent-error-rollup: no documents")
+            return mark, False
+        first, end = span
+        start = mark if mark is not None else max(first, end - parse_minutes(since) * 60_000)
+        if start >= end:
+            return mark, False
+        onsets = detect(session, detectors, start, end, bucket, bucket_ms)
+    except RuntimeError as exc:
+        print(f"  [ERR] {exc}")
+        return mark, True
+    finally:
+        session.close()
+    print(f"  [OK] {iso(start)} .. {iso(end)}: {len(detectors):,} series, {detectors.samples:,} samples -> "
+          f"{len(onsets)} onsets in {time.monotonic() - started:.2f}s")
+    if onsets:
+        print_onsets(onsets, top)
+    if dry_run or not onsets:
+        return end, False
+    with es_bulk.BulkClient(es_url=ES_URL, refresh=True) as client:
+        for onset in onsets:
+            doc = onset_doc(onset, bucket)
+            client.index(ONSETS_INDEX, doc, doc_id=f"{doc['kind']}|{onset['series'][0]}|{doc['metric']}|{onset['onset']}")
+    if client.stats.total_failed:
+        print(f"  [ERR] {client.stats.total_failed} onsets failed to write ({client.stats.errors[:1]})")
+        return end, True
+    print(f"  [OK] {len(onsets)} onsets -> {ONSETS_INDEX}")
+    return end, False
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+def scenario_steps(scale, seed, anchor_time):
+    """
+    Generate the incident scenario in memory and return (incident start ms,
+    host steps, service steps): time-ordered (minute ms, rows) lists in the
+    shapes Detectors.host_step / service_step take.
+    """
+    incident = _load_module("generate-incident-data.py")
+    incident.configure(seed, anchor_time)
+    hosts = defaultdict(list)
+    for doc in incident.iter_metrics(scale):
+        hosts[rollup.minute_of(doc["@timestamp"])].append(
+            (doc["host.name"], {m: doc[field] for m, field in METRICS.items()}))
+    errors = rollup.ErrorRollup(incident.LOG_INDEX)
+    for doc in incident.iter_logs(scale):
+        errors.add_doc(doc)
+    services = defaultdict(list)
+    for (service, minute), (error_count, total) in errors.counts.items():
+        services[minute].append((service, error_count, total))
+    return int(incident.INCIDENT_START.timestamp() * 1000), sorted(hosts.items()), sorted(services.items())
+
+
+def classify(onset, truth_ms):
+    """'found', 'early' (alarmed before the change), 'late', 'off' (onset estimate too far) or 'missed'."""
+    if onset is None:
+        return "missed"
+    if onset["detected"] < truth_ms:
+        return "early"
+    if onset["detected"] - truth_ms > MAX_DELAY * 60_000:
+        return "late"
+    if abs(onset["onset"] - truth_ms) > ONSET_TOLERANCE * 60_000:
+        return "off"
+    return "found"
+
+
+def benchmark(scale, seed, anchor_time):
+    """Detect onsets in the generated scenario and print how well the first onset of each series matches EXPECTED."""
+    started = time.monotonic()
+    incident_ms, host_steps, service_steps = scenario_steps(scale, seed, anchor_time)
+    generated = time.monotonic()
+    detectors = Detectors()
+    onsets = []
+    for ts, rows in host_steps:
+        onsets += detectors.host_step(ts, rows)
+    for ts, rows in service_steps:
+        onsets += detectors.service_step(ts, rows)
+    elapsed = time.monotonic() - generated
+
+    first = {}
+    for o in sorted(onsets, key=lambda o: o["detected"]):
+        first.setdefault(o["series"], o)
+    outcomes = defaultdict(lambda: defaultdict(int))
+    errors, delays = defaultdict(list), defaultdict(list)
+    for cell in range(scale):
+        for (name, metric), minute in EXPECTED.items():
+            key = (name if cell == 0 else f"{name}-c{cell}", metric)
+            truth = incident_ms + minute * 60_000
+            outcome = classify(first.get(key), truth)
+            outcomes[(name, metric)][outcome] += 1
+            if outcome == "found":
+                errors[(name, metric)].append((first[key]["onset"] - truth) / 60_000)
+                delays[(name, metric)].append((first[key]["detected"] - truth) / 60_000)
+    unexpected = sum(1 for key in first if (re.sub(r"-c\d+$", "", key[0]), key[1]) not in EXPECTED)
+
+    steps = len(host_steps) + len(service_steps)
+    found = sum(o["found"] for o in outcomes.values())
+    early = sum(o["early"] for o in outcomes.values()) + unexpected
+    print(f"  Scenario:  {scale} cell(s), {len(detectors):,} series, {steps} steps, "
+          f"{detectors.samples:,} samples (generated in {generated - started:.1f}s)")
+    print(f"  Detection: {elapsed:.3f}s ({detectors.samples / max(elapsed, 1e-9):,.0f} samples/s), "
+          f"state {detectors.nbytes() / 1024:,.0f} KiB, {len(onsets):,} onsets")
+    print(f"  Found:     {found}/{len(EXPECTED) * scale} injected changes "
+          f"(onset within {ONSET_TOLERANCE} min, detected within {MAX_DELAY} min); "
+          f"{early} series alarmed before their change")
+    print(f"\n  {'series':<30} {'change':>6} {'found':>6} {'early':>6} {'late':>5} {'off':>5} {'missed':>6} "
+          f"{'onset err':>10} {'delay':>6}")
+    for (name, metric), minute in EXPECTED.items():
+        o = outcomes[(name, metric)]
+        err = f"{statistics.median(errors[(name, metric)]):+.1f}" if errors[(name, metric)] else "-"
+        delay = f"{statistics.median(delays[(name, metric)]):.1f}" if delays[(name, metric)] else "-"
+        print(f"  {name + ' ' + metric:<30} {'+' + str(minute):>6} {o['found']:>6} {o['early']:>6} {o['late']:>5} "
+              f"{o['off']:>5} {o['missed']:>6} {err:>10} {delay:>6}")
+    print("\n  change = minutes after incident start; onset err / delay = medians over found, in minutes")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Detect onsets in host metrics and service error rates.")
+    parser.add_argument("--since", type=duration, default=SINCE,
+                        help=f"Scan the newest DURATION of the series (default: {SINCE})")
+    parser.add_argument("--bucket", type=duration, default=BUCKET,
+                        help=f"Sample interval (default: {BUCKET})")
+    parser.add_argument("--top", type=int, default=TOP, help=f"Onsets to print (default: {TOP})")
+    parser.add_argument("--dry-run", action="store_true", help=f"Print onsets without writing {ONSETS_INDEX}")
+    parser.add_argument("--follow", type=float, default=0, metavar="SECONDS",
+                        help="Repeat every SECONDS from the last complete bucket (Ctrl+C to stop)")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Score the detectors on the generated incident scenario (no Elasticsearch)")
+    parser.add_argument("--scale", type=int, default=1, help="--benchmark: scenario cells (16 series each)")
+    parser.add_argument("--seed", type=int, default=42, help="--benchmark: scenario seed (default: 42)")
+    parser.add_argument("--anchor-time", type=datagen.parse_anchor_time, default=None, metavar="ISO8601",
+                        help="--benchmark: scenario 'now' (default: current time)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    changepoint.require_numpy()
+    print("=" * 60)
+    print("  Onset Detection")
+    print("=" * 60)
+    if args.benchmark:
+        print(f"  Mode:   benchmark (generate-incident-data.py scenario, seed={args.seed})")
+        print(f"  CUSUM:  k={changepoint.K}, h={changepoint.H}, span={changepoint.SPAN}, warmup={changepoint.WARMUP}")
+        print("=" * 60)
+        benchmark(args.scale, args.seed, args.anchor_time)
+        sys.exit(0)
+    print(f"  ES URL: {ES_URL}")
+    print(f"  Auth:   {'API Key configured' if ES_API_KEY else 'No auth (local dev)'}")
+    print(f"  Series: infra-metrics + {rollup.ROLLUP_INDEX} -> {ONSETS_INDEX}, {args.bucket} buckets")
+    print("=" * 60)
+    detectors = Detectors()
+    mark, failed = run(detectors, None, args.since, args.bucket, args.top, args.dry_run)
+    while args.follow:
+        try:
+            time.sleep(args.follow)
+        except KeyboardInterrupt:
+            break
+        mark, failed = run(detectors, mark, args.since, args.bucket, args.top, args.dry_run)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+embedcache.py -- Reuse semantic_text inference results across reindexes.
+
+Elasticsearch embeds every semantic_text value it is sent as plain text, so
+re-running a loader re-embeds and re-chunks the whole knowledge base even
+when no incident changed. A SemanticCache keeps the inference results ES
+computed, keyed by a content hash -- sha256 of the field's inference_id,
+chunking_settings and text -- so an unchanged value is sent back with its
+results attached and ES skips inference for it:
+
+  - 8.x (_source format): the field is sent as {"text": ..., "inference": ...}
+  - 9.x (_inference_fields format): the text as usual, plus the results
+    under _inference_fields.<field>
+
+Values not in the cache go out as plain text; their document ids are kept,
+and close() reads those documents back once indexed and stores the results
+ES produced, so only new or edited text is ever embedded.
+
+Results live in an append-only file (EMBEDDING_CACHE_FILE, default
+../.embedding-cache.bin) read through mmap: a header, then records of
+<32-byte key><uint32 length><zlib JSON>. Opening it scans the keys once;
+lookups decompress one record. Appends and the open-time scan hold an
+exclusive flock (where the platform has one), so loaders running in parallel
+can share the file -- a record another process appends is seen the next time
+the file is opened -- and a record cut short by a crash is dropped on the
+next open.
+
+Usage (from a sibling script):
+    import embedcache
+
+    with embedcache.SemanticCache("incident-knowledge") as cache:
+        with es_bulk.open_writer() as client:
+            for doc_id, doc in docs:
+                client.index("incident-knowledge", cache.fill(doc, doc_id), doc_id=doc_id)
+    print(cache.summary())
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import zlib
+from contextlib import contextmanager
+
+import es_bulk
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are single O_APPEND writes, unlocked
+    fcntl = None
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MAPPINGS_DIR = os.path.join(SCRIPT_DIR, "..", "setup", "mappings")
+CACHE_FILE = os.environ.get("EMBEDDING_CACHE_FILE", os.path.join(SCRIPT_DIR, "..", ".embedding-cache.bin"))
+
+MAGIC = b"OPSEMB1\n"
+RECORD = struct.Struct("<32sI")
+LEGACY = "source"                # 8.x: results inside the field's _source object
+METADATA = "_inference_fields"   # 9.x: results in the _inference_fields metadata field
+FETCH_PAGE = 500
+
+
+@contextmanager
+def locked(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+# ---------------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------------
+class EmbeddingStore:
+    """Append-only key -> JSON file, read through mmap."""
+
+    def __init__(self, path=CACHE_FILE):
+        self.path = path
+        self.offsets = {}        # key -> (payload offset, payload length)
+        self.map = None
+        self.mapped = 0
+        self.appended = 0
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            with locked(fd):
+                if os.fstat(fd).st_size == 0:
+                    os.write(fd, MAGIC)
+                end = self._scan(fd)
+                if end < os.fstat(fd).st_size:
+                    os.ftruncate(fd, end)    # a record cut short by a crash
+        finally:
+            os.close(fd)
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, key):
+        return key in self.offsets
+
+    def get(self, key):
+        where = self.offsets.get(key)
+        if where is None:
+            return None
+        offset, length = where
+        if offset + length > self.mapped:
+            self._remap()
+        return json.loads(zlib.decompress(self.map[offset:offset + length]))
+
+    def put(self, key, value):
+        if key in self.offsets:
+            return
+        payload = zlib.compress(json.dumps(value, separators=(",", ":")).encode())
+        record = RECORD.pack(key, len(payload)) + payload
+        with locked(self.fd):
+            end = os.lseek(self.fd, 0, os.SEEK_END)
+            os.write(self.fd, record)
+        self.offsets[key] = (end + RECORD.size, len(payload))
+        self.appended += 1
+
+    def nbytes(self):
+        return os.path.getsize(self.path)
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        os.close(self.fd)
+
+    def _remap(self):
+        if self.map is not None:
+            self.map.close()
+        with open(self.path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.mapped = len(self.map)
+
+    def _scan(self, fd):
+        """Index every complete record. Returns the offset after the last one."""
+        with open(fd, "rb", closefd=False) as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if data[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{self.path} is not an embedding cache file")
+            pos = len(MAGIC)
+            while pos + RECORD.size <= len(data):
+                key, length = RECORD.unpack_from(data, pos)
+                if pos + RECORD.size + length > len(data):
+                    break
+                self.offsets[key] = (pos + RECORD.size, length)
+                pos += RECORD.size + length
+            return pos
+        finally:
+            data.close()
+
+
+# ---------------------------------------------------------------------------
+# semantic_text fields
+# ---------------------------------------------------------------------------
+def semantic_fields(properties, prefix=""):
+    """Mapping properties -> {semantic_text field: key prefix (inference_id + chunking_settings)}."""
+    fields = {}
+    for name, spec in properties.items():
+        if "properties" in spec:
+            fields.update(semantic_fields(spec["properties"], prefix + name + "."))
+        elif spec.get("type") == "semantic_text":
+            fields[prefix + name] = json.dumps([spec.get("inference_id", "(default)"),
+                                                spec.get("chunking_settings")], sort_keys=True)
+    return fields
+
+
+def index_mapping(session, es_url, index):
+    """The properties of `index` from the cluster, else from setup/mappings/<index>.json."""
+    if not es_bulk.EXPORT_DIR:
+        try:
+            resp = session.get(f"{es_url}/{index}/_mapping", timeout=es_bulk.REQUEST_TIMEOUT)
+            if resp.status_code == 200:
+                (body,) = resp.json().values()
+                return body["mappings"].get("properties", {})
+        except (es_bulk.requests.RequestException, ValueError):
+            pass
+    path = os.path.join(MAPPINGS_DIR, f"{index}.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["mappings"].get("properties", {})
+
+
+def content_key(prefix, text):
+    return hashlib.sha256(f"{prefix}\n{text}".encode()).digest()
+
+
+def extract(hit, field):
+    """(format, inference results) of one semantic_text field of a search hit, or None."""
+    value = hit.get("_source", {}).get(field)
+    if isinstance(value, dict) and value.get("inference"):
+        return LEGACY, value["inference"]
+    results = hit.get("_source", {}).get(METADATA, {}).get(field)
+    if results is None:
+        results = (hit.get("fields", {}).get(METADATA) or [{}])[0].get(field)
+    return (METADATA, results) if results else None
+
+
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+class SemanticCache:
+    """Attaches cached inference results to documents and learns the ones ES computes."""
+
+    def __init__(self, index, path=CACHE_FILE, es_url=None, session=None):
+        self.index = index
+        self.es_url = es_url or es_bulk.ES_URL
+        self.session = session or es_bulk.get_session(1)
+        self.fields = semantic_fields(index_mapping(self.session, self.es_url, index))
+        self.store = EmbeddingStore(path)
+        self.pending = {}        # doc id -> {field: text} sent without results
+        self.hits = self.misses = self.learned = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(learn=exc_type is None)
+        return False
+
+    def fill(self, doc, doc_id=None):
+        """
+        Attach cached results to `doc`'s semantic_text values (in place) and
+        return it. Values missing from the cache are remembered under `doc_id`
+        for close() to learn; without an id they are only counted.
+        """
+        for field, prefix in self.fields.items():
+            text = doc.get(field)
+            if not isinstance(text, str):
+                continue
+            cached = self.store.get(content_key(prefix, text))
+            if cached is None:
+                self.misses += 1
+                if doc_id is not None:
+                    self.pending.setdefault(doc_id, {})[field] = text
+            elif cached["format"] == LEGACY:
+                self.hits += 1
+                doc[field] = {"text": text, "inference": cached["inference"]}
+            else:
+                self.hits += 1
+                doc.setdefault(METADATA, {})[field] = cached["inference"]
+        return doc
+
+    def learn(self):
+        """Read back the documents sent without results and store what ES computed."""
+        if not self.pending or es_bulk.EXPORT_DIR:
+            return 0
+        self.session.post(f"{self.es_url}/{self.index}/_refresh", timeout=es_bulk.REQUEST_TIMEOUT)
+        ids = list(self.pending)
+        learned = 0
+        for start in range(0, len(ids), FETCH_PAGE):
+            for hit in self._fetch(ids[start:start + FETCH_PAGE]):
+                sent = self.pending.get(hit["_id"], {})
+                for field, text in sent.items():
+                    found = extract(hit, field)
+                    if found:
+                        self.store.put(content_key(self.fields[field], text),
+                                       {"format": found[0], "inference": found[1]})
+                        learned += 1
+        self.pending.clear()
+        self.learned += learned
+        return learned
+
+    def close(self, learn=True):
+        try:
+            if learn:
+                self.learn()
+        finally:
+            self.store.close()
+
+    def summary(self):
+        return (f"embedding cache: {self.hits:,} reused, {self.misses:,} embedded by ES, "
+                f"{self.learned:,} learned ({len(self.store):,} entries, {self.store.nbytes() / 1048576:.1f} MiB)")
+
+    # -- internals ---------------------------------------------------------
+    def _fetch(self, ids):
+        body = {"size": len(ids), "query": {"ids": {"values": ids}}, "fields": [METADATA],
+                "_source": {"includes": list(self.fields) + [METADATA], "exclude_vectors": False}}
+        url = f"{self.es_url}/{self.index}/_search"
+        resp = self.session.post(url, json=body, timeout=es_bulk.REQUEST_TIMEOUT)
+        if resp.status_code == 400:
+            # clusters that predate exclude_vectors keep results in _source anyway
+            body["_source"] = {"includes": list(self.fields)}
+            resp = self.session.post(url, json=body, timeout=es_bulk.REQUEST_TIMEOUT)
+        if resp.status_code != 200:
+            print(f"  [WARN] embedding cache: reading back {len(ids)} docs failed: HTTP {resp.status_code}")
+            return []
+        return resp.json()["hits"]["hits"]
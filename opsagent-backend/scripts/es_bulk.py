@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+es_bulk.py -- Shared Elasticsearch bulk client for the OpsAgent data scripts.
+
+Every generator and loader in this directory indexes through BulkClient so that:
+  - one keep-alive connection pool (requests.Session) is reused for all batches
+  - several batches can be in flight at once (ES_BULK_CONCURRENCY, default 4)
+  - batches are cut by payload size (ES_BULK_MAX_BYTES, default 5 MiB) rather
+    than a fixed document count, and shrink/grow adaptively under back-pressure
+  - documents rejected with 429 are retried individually with exponential backoff
+  - request bodies are streamed to the socket as chunked NDJSON (never joined
+    into one big string), optionally gzip-compressed (ES_BULK_GZIP=1)
+
+Setting ES_BULK_EXPORT_DIR (or calling export_to()) redirects open_writer()
+and bulk_index() to compressed NDJSON corpus files instead of the cluster; see
+corpus.py and replay-corpus.py.
+
+Usage (from a sibling script):
+    from es_bulk import BulkClient
+
+    with BulkClient() as client:
+        for doc in docs:
+            client.index("logs-opsagent", doc)
+    print(client.stats.summary())
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    print("Install requests: pip install requests")
+    sys.exit(1)
+
+ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
+ES_API_KEY = os.environ.get("ES_API_KEY", "")
+
+HEADERS = {"Content-Type": "application/json"}
+if ES_API_KEY:
+    HEADERS["Authorization"] = f"ApiKey {ES_API_KEY}"
+
+# ---------------------------------------------------------------------------
+# Tuning (overridable via environment)
+# ---------------------------------------------------------------------------
+MAX_BYTES = int(os.environ.get("ES_BULK_MAX_BYTES", 5 * 1024 * 1024))
+MIN_BYTES = 256 * 1024           # floor when shrinking under back-pressure
+MAX_DOCS = int(os.environ.get("ES_BULK_MAX_DOCS", 10000))
+CONCURRENCY = int(os.environ.get("ES_BULK_CONCURRENCY", 4))
+MAX_RETRIES = int(os.environ.get("ES_BULK_MAX_RETRIES", 6))
+BACKOFF_BASE = 0.5               # seconds, doubled per attempt
+BACKOFF_MAX = 30.0
+REQUEST_TIMEOUT = 120
+CHUNK_BYTES = 64 * 1024          # size of each chunk written to the socket
+COMPRESS = os.environ.get("ES_BULK_GZIP", "").lower() in ("1", "true", "yes")
+GZIP_LEVEL = 3                   # fast level; bulk NDJSON compresses well regardless
+
+RETRYABLE_HTTP = {429, 502, 503, 504}
+
+# Offline export (see corpus.py): when set, writers go to files, not HTTP
+EXPORT_DIR = os.environ.get("ES_BULK_EXPORT_DIR", "")
+EXPORT_CODEC = os.environ.get("ES_BULK_EXPORT_CODEC", "gzip")
+
+# Process-wide per-index totals from every bulk_index() call (run summaries)
+INDEX_TOTALS = {}  # index -> {"indexed": n, "failed": n, "seconds": s}
+
+
+def get_session(pool_size=CONCURRENCY):
+    """Return a requests.Session with a keep-alive pool sized for `pool_size` workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+
+def _backoff(attempt):
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+# ---------------------------------------------------------------------------
+# Streaming NDJSON bodies
+# ---------------------------------------------------------------------------
+def iter_ndjson(entries, chunk_bytes=CHUNK_BYTES):
+    """
+    Yield the bulk body for `entries` ((index, action_line, source_line) tuples)
+    as ~chunk_bytes pieces. Each document is copied once into its chunk, so the
+    cost is linear in the batch size however many documents it holds.
+    """
+    parts = []
+    size = 0
+    for _, action, source in entries:
+        parts.append(action)
+        parts.append(source)
+        size += len(action) + len(source)
+        if size >= chunk_bytes:
+            yield b"".join(parts)
+            parts = []
+            size = 0
+    if parts:
+        yield b"".join(parts)
+
+
+def gzip_chunks(chunks, level=GZIP_LEVEL):
+    """Gzip-compress an iterable of byte chunks incrementally."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+# ---------------------------------------------------------------------------
+# Stats
+# ---------------------------------------------------------------------------
+class BulkStats:
+    """Thread-safe per-index counters for indexed, failed and retried documents."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.indexed = {}
+        self.failed = {}
+        self.retried = 0
+        self.batches = 0
+        self.bytes_sent = 0
+        self.errors = []  # first few error payloads, for diagnostics
+
+    def record(self, index, ok=0, failed=0):
+        with self._lock:
+            self.indexed[index] = self.indexed.get(index, 0) + ok
+            if failed:
+                self.failed[index] = self.failed.get(index, 0) + failed
+
+    def record_batch(self, nbytes, retried=0):
+        with self._lock:
+            self.batches += 1
+            self.bytes_sent += nbytes
+            self.retried += retried
+
+    def record_error(self, error):
+        with self._lock:
+            if len(self.errors) < 10:
+                self.errors.append(error)
+
+    @property
+    def total_indexed(self):
+        return sum(self.indexed.values())
+
+    @property
+    def total_failed(self):
+        return sum(self.failed.values())
+
+    def summary(self):
+        """One-line human readable summary."""
+        mb = self.bytes_sent / (1024 * 1024)
+        return (
+            f"{self.total_indexed} indexed, {self.total_failed} failed, "
+            f"{self.retried} retried, {self.batches} batches, {mb:.1f} MiB sent"
+        )
+
+
+# ---------------------------------------------------------------------------
+# Bulk writers
+# ---------------------------------------------------------------------------
+class BulkWriter:
+    """
+    Buffering and serialization shared by BulkClient and corpus.CorpusWriter.
+
+    Documents are serialized once into (index, action_line, source_line) items
+    and handed to _submit() whenever the buffer reaches the byte or doc target.
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES, max_docs=MAX_DOCS):
+        self.max_bytes = max_bytes
+        self.max_docs = max_docs
+        self.stats = BulkStats()
+
+        self._target_bytes = max_bytes
+        self._actions = {}  # cached action lines for id-less docs, keyed by (op, index)
+        self._buffer = []
+        self._buffer_bytes = 0
+
+    # -- context manager --------------------------------------------------
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    # -- public API -------------------------------------------------------
+    def index(self, index, doc, doc_id=None, op="index"):
+        """Queue one document. `op` may be index, create or update (doc must then be the update body)."""
+        self.index_raw(index, json.dumps(doc), doc_id=doc_id, op=op)
+
+    def index_raw(self, index, source, doc_id=None, op="index"):
+        """Queue one pre-serialized JSON document (str or bytes, no trailing newline)."""
+        if doc_id is None:
+            action = self._actions.get((op, index))
+            if action is None:
+                action = self._actions[(op, index)] = json.dumps({op: {"_index": index}}).encode() + b"\n"
+        else:
+            action = json.dumps({op: {"_index": index, "_id": doc_id}}).encode() + b"\n"
+        if isinstance(source, str):
+            source = source.encode()
+        self.index_entry(index, action, source + b"\n")
+
+    def index_entry(self, index, action, source):
+        """Queue one already-encoded bulk pair (newline-terminated action and source lines)."""
+        self._buffer.append((index, action, source))
+        self._buffer_bytes += len(action) + len(source)
+        if self._buffer_bytes >= self._target_bytes or len(self._buffer) >= self.max_docs:
+            self._submit()
+
+    def index_many(self, index, docs, raw=False, ids=None):
+        """
+        Queue an iterable of documents (or pre-serialized JSON strings if `raw`),
+        under the matching `ids` if given. Returns the number queued.
+        """
+        if ids is not None:
+            n = 0
+            for doc, doc_id in zip(docs, ids):
+                self.index_raw(index, doc if raw else json.dumps(doc), doc_id=doc_id)
+                n += 1
+            return n
+        if raw:
+            return self._index_raw_many(index, docs)
+        n = 0
+        for doc in docs:
+            self.index(index, doc)
+            n += 1
+        return n
+
+    def _index_raw_many(self, index, sources):
+        """Fast path for pre-rendered rows: encode in one pass, then cut into batches."""
+        action = json.dumps({"index": {"_index": index}}).encode() + b"\n"
+        entries = [(index, action, (src + "\n").encode()) for src in sources]
+        action_len = len(action)
+        for entry in entries:
+            self._buffer.append(entry)
+            self._buffer_bytes += action_len + len(entry[2])
+            if self._buffer_bytes >= self._target_bytes or len(self._buffer) >= self.max_docs:
+                self._submit()
+        return len(entries)
+
+    def flush(self):
+        """Hand any buffered documents to _submit()."""
+        if self._buffer:
+            self._submit()
+
+    def close(self):
+        """Flush; subclasses also release their resources here."""
+        self.flush()
+
+    def _submit(self):
+        raise NotImplementedError
+
+
+class BulkClient(BulkWriter):
+    """
+    Buffered, concurrent _bulk writer.
+
+    When the buffer reaches the current byte target it is handed to a thread
+    pool; at most `concurrency` batches are in flight, so memory stays bounded
+    even when the caller produces documents faster than the cluster accepts them.
+    """
+
+    def __init__(self, es_url=None, session=None, max_bytes=MAX_BYTES,
+                 max_docs=MAX_DOCS, concurrency=CONCURRENCY, max_retries=MAX_RETRIES,
+                 refresh=False, compress=COMPRESS):
+        super().__init__(max_bytes=max_bytes, max_docs=max_docs)
+        self.es_url = (es_url or ES_URL).rstrip("/")
+        self.concurrency = max(1, concurrency)
+        self.session = session or get_session(self.concurrency)
+        self.max_retries = max_retries
+        self.refresh = refresh
+        self.compress = compress
+
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        self._slots = threading.Semaphore(self.concurrency)
+        self._futures = []
+        self._lock = threading.Lock()
+
+    def flush(self):
+        """Send everything buffered and wait for all in-flight batches."""
+        if self._buffer:
+            self._submit()
+        futures, self._futures = self._futures, []
+        for fut in futures:
+            fut.result()
+
+    def close(self):
+        """Flush, then release the worker pool and connection pool."""
+        try:
+            self.flush()
+        finally:
+            self._pool.shutdown(wait=True)
+            self.session.close()
+
+    # -- internals --------------------------------------------------------
+    def _submit(self):
+        batch, self._buffer, self._buffer_bytes = self._buffer, [], 0
+        self._slots.acquire()  # back-pressure: block while `concurrency` batches are in flight
+        fut = self._pool.submit(self._run_batch, batch)
+        fut.add_done_callback(lambda _f: self._slots.release())
+        still_running = []
+        for f in self._futures:
+            if f.done():
+                f.result()  # surface worker exceptions early
+            else:
+                still_running.append(f)
+        self._futures = still_running + [fut]
+
+    def _adapt(self, throttled):
+        """AIMD on the batch byte target: halve on 429s, grow 10% after a clean batch."""
+        with self._lock:
+            if throttled:
+                self._target_bytes = max(MIN_BYTES, self._target_bytes // 2)
+            elif self._target_bytes < self.max_bytes:
+                self._target_bytes = min(self.max_bytes, int(self._target_bytes * 1.1) + 1)
+
+    def _post(self, entries):
+        """POST entries as a chunked (and optionally gzipped) NDJSON stream."""
+        params = {"refresh": "true"} if self.refresh else None
+        headers = {"Content-Type": "application/x-ndjson"}
+        body = iter_ndjson(entries)
+        if self.compress:
+            headers["Content-Encoding"] = "gzip"
+            body = gzip_chunks(body)
+        return self.session.post(
+            f"{self.es_url}/_bulk",
+            params=params,
+            headers=headers,
+            data=body,
+            timeout=REQUEST_TIMEOUT,
+        )
+
+    def _run_batch(self, batch):
+        """Send one batch, retrying whole-request 429/5xx and per-item 429 rejections."""
+        pending = batch
+        attempt = 0
+        while pending:
+            nbytes = sum(len(action) + len(source) for _, action, source in pending)
+            try:
+                resp = self._post(pending)
+            except requests.RequestException as exc:
+                resp = None
+                error = str(exc)
+            self.stats.record_batch(nbytes, retried=len(pending) if attempt else 0)
+
+            if resp is None or resp.status_code in RETRYABLE_HTTP:
+                self._adapt(throttled=True)
+                if attempt >= self.max_retries:
+                    self._fail(pending, error if resp is None else f"HTTP {resp.status_code}")
+                    return
+                time.sleep(_backoff(attempt))
+                attempt += 1
+                continue
+            if resp.status_code >= 300:
+                self._fail(pending, f"HTTP {resp.status_code}: {resp.text[:200]}")
+                return
+
+            retry = []
+            for item, entry in zip(resp.json().get("items", []), pending):
+                index = entry[0]
+                result = next(iter(item.values()))
+                status = result.get("status", 0)
+                if status < 300:
+                    self.stats.record(index, ok=1)
+                elif status == 429:
+                    retry.append(entry)
+                else:
+                    self.stats.record(index, failed=1)
+                    self.stats.record_error(result.get("error"))
+
+            self._adapt(throttled=bool(retry))
+            if retry and attempt >= self.max_retries:
+                self._fail(retry, "rejected (429) after max retries")
+                return
+            if retry:
+                time.sleep(_backoff(attempt))
+                attempt += 1
+            pending = retry
+
+    def _fail(self, entries, error):
+        for index, _, _ in entries:
+            self.stats.record(index, failed=1)
+        self.stats.record_error(error)
+
+
+# ---------------------------------------------------------------------------
+# Entry points
+# ---------------------------------------------------------------------------
+def export_to(directory, codec="gzip"):
+    """
+    Route open_writer()/bulk_index() to corpus files under `directory`.
+    Mirrored into the environment so process-pool workers inherit it.
+    """
+    global EXPORT_DIR, EXPORT_CODEC
+    EXPORT_DIR, EXPORT_CODEC = directory, codec
+    os.environ["ES_BULK_EXPORT_DIR"] = directory
+    os.environ["ES_BULK_EXPORT_CODEC"] = codec
+
+
+def open_writer(tag=None, **kwargs):
+    """
+    Return a BulkClient, or a corpus.CorpusWriter when exporting. `tag` names
+    the writer's shard files so parallel writers never collide (export only).
+    """
+    if EXPORT_DIR:
+        import corpus
+        sizing = {k: v for k, v in kwargs.items() if k in ("max_bytes", "max_docs")}
+        return corpus.CorpusWriter(EXPORT_DIR, codec=EXPORT_CODEC, tag=tag, **sizing)
+    return BulkClient(**kwargs)
+
+
+def bulk_index(index, docs, raw=False, tag=None, ids=None, **kwargs):
+    """Index an iterable of documents (under `ids`, if given) into `index` with a short-lived writer. Returns BulkStats."""
+    started = time.monotonic()
+    with open_writer(tag=tag, **kwargs) as client:
+        client.index_many(index, docs, raw=raw, ids=ids)
+    totals = INDEX_TOTALS.setdefault(index, {"indexed": 0, "failed": 0, "seconds": 0.0})
+    totals["indexed"] += client.stats.total_indexed
+    totals["failed"] += client.stats.total_failed
+    totals["seconds"] += time.monotonic() - started
+    return client.stats
@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""
+esql-cache-proxy.py -- Caching proxy in front of Elasticsearch for agent tool calls.
+
+Agent Builder runs the ES|QL tools inside Kibana, so the cache sits on the
+cluster side of that call: point Kibana's elasticsearch.hosts (and ES_URL for
+the workflow and these scripts) at the proxy and it forwards everything to
+the real cluster, answering repeated POST /_query calls from memory. During
+one incident-response.yaml run the triage, investigation and postmortem
+agents call error_trend_analysis, service_error_breakdown and
+hybrid_rag_search with largely the same parameters; only the first call per
+window scans the logs.
+
+  - Key: the tool id (the tools/ definition, primary or fallback tier, whose
+    query text the call carries; "esql" for ad-hoc queries), the query with
+    whitespace collapsed, the params normalised (named params sorted, string
+    values stripped), any other body options and URL parameters, a hash of
+    the caller's Authorization header, and -- for queries that use NOW() --
+    the --now-window bucket the call falls in, so "NOW() - 6 hours" answers
+    are shared for at most one window and never across windows.
+  - Store: LRU over --max-entries responses / --max-mb of response bodies;
+    an entry also expires --ttl seconds after it was fetched.
+  - Invalidation: each entry records the indices its FROM (and LOOKUP JOIN)
+    clauses read. A watcher polls _count on every index pattern the cache
+    has read every --poll seconds and drops the entries of patterns whose
+    count moved; successful writes sent through the proxy (_bulk, _doc,
+    _update_by_query, _reindex, index create/delete, ...) drop the entries
+    of the indices they touch at once; POST /_opsagent_cache/_clear (optionally ?index=PATTERN) drops
+    entries explicitly.
+  - Only 200 answers to synchronous POST /_query are cached. Everything else,
+    _query/async included, is passed through untouched.
+
+Responses carry X-OpsAgent-Cache: hit|miss; GET /_opsagent_cache/_stats
+returns hit/miss counts per tool.
+
+Usage:
+    export ES_URL="https://your-es-instance.elastic.cloud:443"
+    export ES_API_KEY="your-api-key"
+    python3 esql-cache-proxy.py                            # listen on 127.0.0.1:9201
+    python3 esql-cache-proxy.py --port 9201 --ttl 60 --now-window 60 --poll 10
+    curl -XPOST localhost:9201/_opsagent_cache/_clear?index=logs-opsagent*
+"""
+
+import argparse
+import fnmatch
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    print("Install requests: pip install requests")
+    sys.exit(1)
+
+ES_URL = os.environ.get("ES_URL", "http://localhost:9200").rstrip("/")
+ES_API_KEY = os.environ.get("ES_API_KEY", "")
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+TOOLS_DIR = os.path.join(SCRIPT_DIR, "..", "tools")
+
+PORT = 9201
+TTL = 60.0                  # seconds an answer is served for
+NOW_WINDOW = 60.0           # seconds NOW() is quantised to
+POLL = 10.0                 # seconds between index count checks
+MAX_ENTRIES = 512
+MAX_MB = 64
+TIMEOUT = 120
+ADMIN = "_opsagent_cache"
+CACHE_HEADER = "X-OpsAgent-Cache"
+# not forwarded in either direction: per-hop, or recomputed for the body we send
+HOP_HEADERS = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailer",
+               "transfer-encoding", "upgrade", "host", "content-length", "content-encoding", "accept-encoding"}
+# document writes that change what a query on the target index returns
+WRITE_ENDPOINTS = {"_doc", "_create", "_update", "_delete_by_query", "_update_by_query"}
+
+NOW_RE = re.compile(r"\bNOW\s*\(\s*\)", re.IGNORECASE)
+SOURCE_RE = re.compile(r"^\s*(?:FROM\s+(.+?)(?:\s+METADATA\b.*)?|LOOKUP\s+JOIN\s+(\S+)\s+ON\b.*)$",
+                       re.IGNORECASE | re.DOTALL)
+
+
+def normalise_query(query):
+    """Collapse whitespace so formatting differences share an entry."""
+    return " ".join(query.split())
+
+
+def normalise_params(params):
+    """ES|QL params in a canonical order: named params sorted, string values stripped."""
+    def value(v):
+        return v.strip() if isinstance(v, str) else v
+
+    if not params:
+        return []
+    if isinstance(params, dict):
+        return sorted((k, value(v)) for k, v in params.items())
+    if all(isinstance(p, dict) and len(p) == 1 for p in params):
+        return sorted((k, value(v)) for p in params for k, v in p.items())
+    return [value(p) for p in params]
+
+
+def query_targets(query):
+    """Index patterns an ES|QL query reads: its FROM and LOOKUP JOIN sources."""
+    targets = set()
+    for command in query.split("|"):
+        match = SOURCE_RE.match(command)
+        if match:
+            names = match.group(1) or match.group(2)
+            targets.update(n.strip().strip('"') for n in names.split(",") if n.strip())
+    return targets
+
+
+def overlaps(pattern, index):
+    """True if a query target and a written index may name the same data."""
+    pattern, index = pattern.split(":")[-1], index.split(":")[-1]
+    return (pattern == index or fnmatch.fnmatchcase(index, pattern) or fnmatch.fnmatchcase(pattern, index)
+            or pattern.startswith(index + "-") or index.startswith(pattern.rstrip("*")))
+
+
+def load_tool_queries(tools_dir=TOOLS_DIR):
+    """Normalised query text -> tool id, for every tools/ definition (fallbacks share their primary's id)."""
+    tools = {}
+    for path in sorted(glob.glob(os.path.join(tools_dir, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            tool = json.load(f)
+        query = tool.get("configuration", {}).get("query")
+        if query and tool.get("id"):
+            tools.setdefault(normalise_query(query), tool["id"])
+    return tools
+
+
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+class ResultCache:
+    """LRU of ES|QL answers with TTL and per-index invalidation."""
+
+    def __init__(self, ttl=TTL, max_entries=MAX_ENTRIES, max_bytes=MAX_MB * 1024 * 1024):
+        self.ttl, self.max_entries, self.max_bytes = ttl, max_entries, max_bytes
+        self.entries = OrderedDict()     # key -> (expires, targets, tool, status, headers, body)
+        self.by_target = defaultdict(set)
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self.evicted = self.expired = self.invalidated = 0
+
+    def get(self, key, tool):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._drop(key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses[tool] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits[tool] += 1
+            return entry[3:]
+
+    def put(self, key, targets, tool, status, headers, body):
+        if len(body) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = (time.monotonic() + self.ttl, targets, tool, status, headers, body)
+            self.bytes += len(body)
+            for target in targets:
+                self.by_target[target].add(key)
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+                self.evicted += 1
+
+    def invalidate(self, indices=None):
+        """Drop the entries reading any of `indices` (every entry if None). Returns how many."""
+        with self.lock:
+            if indices is None:
+                keys = list(self.entries)
+            else:
+                keys = {key for target, keys in self.by_target.items()
+                        if any(overlaps(target, index) for index in indices) for key in keys}
+            for key in keys:
+                self._drop(key)
+            self.invalidated += len(keys)
+            return len(keys)
+
+    def targets(self):
+        with self.lock:
+            return sorted(self.by_target)
+
+    def stats(self):
+        with self.lock:
+            tools = sorted(set(self.hits) | set(self.misses))
+            return {
+                "entries": len(self.entries), "bytes": self.bytes,
+                "hits": sum(self.hits.values()), "misses": sum(self.misses.values()),
+                "evicted": self.evicted, "expired": self.expired, "invalidated": self.invalidated,
+                "tools": {t: {"hits": self.hits[t], "misses": self.misses[t]} for t in tools},
+            }
+
+    def _drop(self, key):
+        entry = self.entries.pop(key)
+        self.bytes -= len(entry[5])
+        for target in entry[1]:
+            keys = self.by_target.get(target)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_target[target]
+
+
+class CountWatcher(threading.Thread):
+    """
+    Polls _count on every index pattern the cache has read and invalidates
+    the ones whose count moved. A pattern's first count is taken before the
+    query that reads it is sent, so a write racing with that query is caught.
+    """
+
+    def __init__(self, cache, session, upstream, interval=POLL):
+        super().__init__(daemon=True)
+        self.cache, self.session, self.upstream, self.interval = cache, session, upstream, interval
+        self.counts = {}
+        self.stopped = threading.Event()
+
+    def watch(self, targets):
+        for target in targets:
+            if target not in self.counts:
+                self.counts[target] = self._count(target)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            for target in list(self.counts):
+                count = self._count(target)
+                if count is None or count != self.counts[target]:
+                    self.cache.invalidate([target])
+                self.counts[target] = count
+
+    def _count(self, target):
+        try:
+            resp = self.session.get(f"{self.upstream}/{target}/_count", timeout=TIMEOUT)
+            return resp.json()["count"] if resp.status_code == 200 else None
+        except (requests.RequestException, ValueError, KeyError):
+            return None
+
+
+# ---------------------------------------------------------------------------
+# Proxy
+# ---------------------------------------------------------------------------
+def written_indices(method, parts, data):
+    """
+    Indices a request may change: [] for anything but a document write or an
+    index create/delete, None when it cannot tell (a _reindex whose body names
+    no destination), else the index names it targets.
+    """
+    if method in ("GET", "HEAD") or not parts:
+        return []
+    if parts[-1] == "_bulk" and len(parts) <= 2:
+        indices = set(parts[0].split(",")) if len(parts) == 2 else set()
+        for line in data.splitlines():
+            try:
+                action = json.loads(line) if line.strip() else None
+            except ValueError:
+                continue
+            if isinstance(action, dict) and len(action) == 1:
+                meta = next(iter(action.values()))
+                if isinstance(meta, dict) and "_index" in meta:
+                    indices.add(meta["_index"])
+        return sorted(indices)
+    if parts == ["_reindex"]:
+        try:
+            dest = json.loads(data).get("dest", {}).get("index")
+        except (ValueError, AttributeError):
+            dest = None
+        return [dest] if isinstance(dest, str) else None
+    if parts[0].startswith("_"):
+        return []
+    if len(parts) > 1 and parts[1] in WRITE_ENDPOINTS:
+        return parts[0].split(",")
+    if len(parts) == 1 and method in ("PUT", "DELETE"):
+        return parts[0].split(",")
+    return []
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "esql-cache-proxy"
+    disable_nagle_algorithm = True
+    cache = None
+    watcher = None
+    session = None
+    upstream = ES_URL
+    now_window = NOW_WINDOW
+    tools = {}
+    quiet = True
+
+    def log_message(self, fmt, *args):
+        if not self.quiet:
+            super().log_message(fmt, *args)
+
+    def read_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    while self.rfile.readline().strip():
+                        pass
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            data = b"".join(chunks)
+        else:
+            data = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.headers.get("Content-Encoding", "").lower() == "gzip":
+            data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+        return data
+
+    def reply(self, status, headers, payload, cache=None):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        if cache:
+            self.send_header(CACHE_HEADER, cache)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(payload)
+
+    def reply_json(self, status, body):
+        self.reply(status, [("Content-Type", "application/json")], json.dumps(body).encode())
+
+    def forward(self, data):
+        headers = {k: v for k, v in self.headers.items() if k.lower() not in HOP_HEADERS}
+        resp = self.session.request(self.command, self.upstream + self.path, data=data or None,
+                                    headers=headers, timeout=TIMEOUT)
+        kept = [(k, v) for k, v in resp.headers.items() if k.lower() not in HOP_HEADERS]
+        return resp.status_code, kept, resp.content
+
+    def cache_key(self, url, body):
+        """(key, tool id, targets) of an ES|QL request, or None if it is not cacheable."""
+        query = body.get("query")
+        if not isinstance(query, str):
+            return None
+        query = normalise_query(query)
+        tool = self.tools.get(query, "esql")
+        window = int(time.time() // self.now_window) if NOW_RE.search(query) else None
+        rest = {k: v for k, v in body.items() if k not in ("query", "params")}
+        auth = hashlib.sha256(self.headers.get("Authorization", "").encode()).hexdigest()
+        material = json.dumps([tool, query, normalise_params(body.get("params")), rest, url.query, auth, window],
+                              sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(material.encode()).hexdigest(), tool, query_targets(query)
+
+    def dispatch(self):
+        url = urlsplit(self.path)
+        parts = [unquote(p) for p in url.path.split("/") if p]
+        data = self.read_body()
+        if parts[:1] == [ADMIN]:
+            return self.admin(parts[1:], parse_qs(url.query))
+
+        keyed = None
+        if self.command == "POST" and parts == ["_query"]:
+            try:
+                body = json.loads(data) if data.strip() else {}
+                keyed = self.cache_key(url, body) if isinstance(body, dict) else None
+            except ValueError:
+                keyed = None
+        if keyed:
+            key, tool, targets = keyed
+            cached = self.cache.get(key, tool)
+            if cached:
+                return self.reply(*cached, cache="hit")
+            if self.watcher:
+                self.watcher.watch(targets)
+
+        try:
+            status, headers, payload = self.forward(data)
+        except requests.RequestException as exc:
+            return self.reply_json(502, {"error": {"type": "proxy_exception", "reason": str(exc)}, "status": 502})
+        if keyed and status == 200:
+            self.cache.put(key, targets, tool, status, headers, payload)
+        written = written_indices(self.command, parts, data.decode("utf-8", "replace")) if 200 <= status < 300 else []
+        if written is None or written:
+            self.cache.invalidate(written)
+        self.reply(status, headers, payload, cache="miss" if keyed else None)
+
+    def admin(self, parts, query):
+        if parts == ["_stats"]:
+            return self.reply_json(200, self.cache.stats())
+        if parts == ["_clear"] and self.command in ("POST", "DELETE"):
+            indices = query.get("index", [None])[-1]
+            dropped = self.cache.invalidate(indices.split(",") if indices else None)
+            return self.reply_json(200, {"invalidated": dropped})
+        self.reply_json(404, {"error": f"unknown endpoint /{ADMIN}/{'/'.join(parts)}"})
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = dispatch
+
+
+def make_session():
+    """Pooled upstream session; ES_API_KEY authenticates calls that bring no Authorization of their own."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if ES_API_KEY:
+        session.headers["Authorization"] = f"ApiKey {ES_API_KEY}"
+    return session
+
+
+def start(host="127.0.0.1", port=PORT, upstream=ES_URL, ttl=TTL, now_window=NOW_WINDOW, poll=POLL,
+          max_entries=MAX_ENTRIES, max_mb=MAX_MB, quiet=True):
+    """Serve the proxy on a background thread. Returns (server, url); stop with server.shutdown()."""
+    cache = ResultCache(ttl, max_entries, int(max_mb * 1024 * 1024))
+    session = make_session()
+    handler = type("BoundHandler", (Handler,), {
+        "cache": cache, "session": session, "upstream": upstream.rstrip("/"), "now_window": now_window,
+        "tools": load_tool_queries(), "quiet": quiet})
+    if poll:
+        handler.watcher = CountWatcher(cache, session, handler.upstream, poll)
+        handler.watcher.start()
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.cache = cache
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cache repeated ES|QL tool calls in front of Elasticsearch.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT, help=f"Port to listen on (default: {PORT})")
+    parser.add_argument("--upstream", default=ES_URL, help="Elasticsearch to forward to (default: $ES_URL)")
+    parser.add_argument("--ttl", type=float, default=TTL,
+                        help=f"Seconds an answer is served from memory (default: {TTL:g})")
+    parser.add_argument("--now-window", type=float, default=NOW_WINDOW, metavar="SECONDS",
+                        help=f"Quantisation of NOW() in cache keys (default: {NOW_WINDOW:g})")
+    parser.add_argument("--poll", type=float, default=POLL, metavar="SECONDS",
+                        help=f"Check cached indices for new documents every SECONDS, 0 to disable (default: {POLL:g})")
+    parser.add_argument("--max-entries", type=int, default=MAX_ENTRIES,
+                        help=f"Answers kept, least recently used evicted first (default: {MAX_ENTRIES})")
+    parser.add_argument("--max-mb", type=float, default=MAX_MB,
+                        help=f"Response bytes kept, in MiB (default: {MAX_MB})")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print("=" * 60)
+    print("  ES|QL Result Cache Proxy")
+    print("=" * 60)
+    print(f"  ES URL: {args.upstream}")
+    print(f"  Auth:   {'API Key configured' if ES_API_KEY else 'No auth (local dev)'}")
+    print(f"  Cache:  ttl {args.ttl:g}s, NOW() window {args.now_window:g}s, "
+          f"{args.max_entries} entries / {args.max_mb:g} MiB, poll {args.poll:g}s")
+    print("=" * 60)
+    server, url = start(args.host, args.port, args.upstream, args.ttl, args.now_window, args.poll,
+                        args.max_entries, args.max_mb, quiet=not args.verbose)
+    print(f"  Listening on {url} (Ctrl-C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -3,36 +3,47 @@
 generate-alert-rules.py -- Generate percolator alert rules for the alert-rules index.
 
 Creates 5 alert rules that use Elasticsearch percolator queries to match
-incoming log documents against pre-defined alert conditions.
+incoming log documents against pre-defined alert conditions. Every rule is
+stored with the service.name / error.type / log.level values its query
+requires (alerting.rule_prefilter), which percolation filters on before
+running any stored query.
+
+--extra-rules N adds N synthetic per-service rules, mostly for services
+outside the demo fleet, to exercise percolation against a production-sized
+rule set.
 
 Usage:
     export ES_URL="https://your-es-instance.elastic.cloud:443"
     export ES_API_KEY="your-api-key"
     python3 generate-alert-rules.py
+    python3 generate-alert-rules.py --anchor-time 2025-01-15T12:00:00Z  # reproducible created_at
+    python3 generate-alert-rules.py --extra-rules 5000 --seed 42        # thousands of rules
 """
 
-import json
+import argparse
 import os
-import sys
+import random
 from datetime import datetime, timezone
 
-try:
-    import requests
-except ImportError:
-    print("Install requests: pip install requests")
-    sys.exit(1)
+import alerting
+import datagen
+import es_bulk
 
 ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
 ES_API_KEY = os.environ.get("ES_API_KEY", "")
 
-HEADERS = {"Content-Type": "application/json"}
-if ES_API_KEY:
-    HEADERS["Authorization"] = f"ApiKey {ES_API_KEY}"
-
 INDEX = "alert-rules"
 
 NOW = datetime.now(timezone.utc)
 
+
+def configure(seed=None, anchor_time=None):
+    """Seed the synthetic rules and pin the timeline anchor."""
+    global NOW
+    datagen.seed_random(seed)
+    NOW = datagen.anchor(anchor_time)
+
+
 # ---------------------------------------------------------------------------
 # Alert rule definitions
 # ---------------------------------------------------------------------------
@@ -124,47 +135,96 @@ ALERT_RULES = [
 ]
 
 
-def run():
+# ---------------------------------------------------------------------------
+# Synthetic rules (--extra-rules)
+# ---------------------------------------------------------------------------
+FLEET_SERVICES = [
+    "api-gateway", "auth-service", "payment-service", "order-service", "inventory-service",
+    "notification-service", "search-service", "user-service", "analytics-pipeline", "cdn-edge",
+]
+ERROR_TYPES = [
+    "ConnectionTimeout", "DatabaseConnectionError", "CircuitBreakerOpen", "GRPCDeadlineExceeded",
+    "NullPointerException", "RateLimitExceeded", "OutOfMemoryError", "SSLHandshakeError",
+    "KafkaProducerError", "AuthenticationFailure", "RedisConnectionRefused", "DiskSpaceFull",
+]
+FLEET_SHARE = 0.1  # share of synthetic rules watching a demo-fleet service
+
+
+def synthetic_rules(count):
+    """`count` per-service rules (errors, one error type, or 5xx), named <service>-<kind>-NNNNN."""
+    services = max(1, count // 4)
+    rules = []
+    for i in range(count):
+        if random.random() < FLEET_SHARE:
+            service = random.choice(FLEET_SERVICES)
+        else:
+            service = f"svc-{random.randrange(services):04d}"
+        kind = random.choice(("errors", "error-type", "5xx"))
+        if kind == "errors":
+            condition = {"terms": {"log.level": ["ERROR", "FATAL"]}}
+        elif kind == "error-type":
+            condition = {"term": {"error.type": random.choice(ERROR_TYPES)}}
+        else:
+            condition = {"range": {"http.response.status_code": {"gte": 500, "lt": 600}}}
+        rules.append({
+            "rule_name": f"{service}-{kind}-{i:05d}",
+            "rule_description": f"Synthetic {kind} rule for {service}",
+            "severity": random.choice(("critical", "high", "medium")),
+            "category": "synthetic",
+            "owner_team": f"team-{service}",
+            "notification_channel": random.choice(("slack", "pagerduty")),
+            "enabled": True,
+            "cooldown_minutes": random.choice((5, 10, 15, 30)),
+            "query": {"bool": {"must": [{"term": {"service.name": service}}, condition]}},
+        })
+    return rules
+
+
+def run(seed=None, anchor_time=None, extra_rules=0):
     """Generate and index alert rules."""
+    configure(seed, anchor_time)
     print("=" * 60)
     print("  Alert Rules Generator (Percolator Queries)")
     print("=" * 60)
     print(f"  ES URL: {ES_URL}")
     print(f"  Index:  {INDEX}")
+    print(f"  Data:   {datagen.describe(seed, anchor_time)}")
     print("=" * 60)
 
     docs = []
-    for rule in ALERT_RULES:
+    extra = synthetic_rules(extra_rules)
+    for i, rule in enumerate(ALERT_RULES + extra):
         doc = {
-            **rule,
+            **alerting.with_prefilter(rule),
             "created_at": NOW.isoformat(),
-            "created_by": "opsagent-setup",
+            "created_by": "opsagent-setup" if i < len(ALERT_RULES) else "opsagent-synthetic",
             "last_triggered": None,
         }
         docs.append(doc)
 
-    # Bulk index
-    body = ""
-    for doc in docs:
-        body += json.dumps({"index": {"_index": INDEX}}) + "\n"
-        body += json.dumps(doc) + "\n"
-
-    resp = requests.post(
-        f"{ES_URL}/_bulk",
-        headers={**HEADERS, "Content-Type": "application/x-ndjson"},
-        data=body,
-    )
-    result = resp.json()
-    if result.get("errors"):
-        err_count = sum(1 for item in result["items"] if item["index"].get("error"))
-        print(f"\n  Indexed with {err_count} errors")
+    # Bulk index through the shared pooled client
+    stats = es_bulk.bulk_index(INDEX, docs)
+    if stats.total_failed:
+        print(f"\n  Indexed with {stats.total_failed} errors")
     else:
-        print(f"\n  [OK] Indexed {len(docs)} alert rules to '{INDEX}'")
+        print(f"\n  [OK] Indexed {stats.total_indexed} alert rules to '{INDEX}'")
 
     print(f"\nDone! Generated {len(docs)} alert rules")
     for rule in ALERT_RULES:
         print(f"  - {rule['rule_name']} ({rule['severity']}, channel: {rule['notification_channel']})")
+    if extra:
+        print(f"  - {len(extra):,} synthetic rules (--extra-rules)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate percolator alert rules.")
+    parser.add_argument("--extra-rules", type=int, default=0, metavar="N",
+                        help="Also index N synthetic per-service rules (default: 0)")
+    datagen.add_arguments(parser)
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    run()
+    args = parse_args()
+    datagen.apply_export(args)
+    run(seed=args.seed, anchor_time=args.anchor_time, extra_rules=args.extra_rules)
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-generate-all-data.py -- Master script that runs all data generators in order.
+generate-all-data.py -- Master script that runs all data generators.
 
 Generates the complete dataset for OpsAgent:
   1. Service owners (4 records)
@@ -8,15 +8,31 @@ Generates the complete dataset for OpsAgent:
   3. Alert rules with percolator queries (5 rules)
   4. Incident scenario logs + infrastructure metrics (~2,200 docs)
 
+By default the stages run one after another. --parallel runs independent
+stages concurrently on a process pool (see STAGES for the dependency graph),
+so bring-up takes as long as the slowest loader rather than the sum.
+
 Usage:
     export ES_URL="https://your-es-instance.elastic.cloud:443"
     export ES_API_KEY="your-api-key"
     python3 generate-all-data.py
+    python3 generate-all-data.py --parallel                  # independent stages concurrently
+    python3 generate-all-data.py --seed 42 --anchor-time 2025-01-15T12:00:00Z  # reproducible corpus
+    python3 generate-all-data.py --seed 42 --export-dir corpus/  # write files; replay-corpus.py loads them
 """
 
+import argparse
+import contextlib
 import importlib.util
+import io
 import os
 import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import datagen
+import es_bulk
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -31,48 +47,144 @@ def _load_module(filename):
     return mod
 
 
-def main():
+# ---------------------------------------------------------------------------
+# Stages: each loads a sibling script and calls its run(seed=, anchor_time=).
+# "after" names stages that must finish first. The stages write to disjoint
+# indices; incident-data waits for alert-rules because it percolates its logs
+# against them as it indexes (see alerting.py).
+# ---------------------------------------------------------------------------
+STAGES = [
+    {"name": "service-owners", "title": "Service Owners",
+     "script": "generate-service-owners.py", "after": []},
+    {"name": "knowledge-base", "title": "Incident Knowledge Base",
+     "script": "generate-knowledge-base.py", "after": []},
+    {"name": "alert-rules", "title": "Alert Rules",
+     "script": "generate-alert-rules.py", "after": []},
+    {"name": "incident-data", "title": "Incident Data (Logs + Metrics)",
+     "script": "generate-incident-data.py", "after": ["alert-rules"]},
+]
+
+
+def _run_stage(script, seed, anchor_time, capture=False):
+    """
+    Run one stage (in-process or in a pool worker).
+    Returns (error, seconds, per-index totals, captured output); error is None on success.
+    """
+    es_bulk.INDEX_TOTALS.clear()
+    output = io.StringIO()
+    error = None
+    started = time.monotonic()
+    with contextlib.redirect_stdout(output) if capture else contextlib.nullcontext():
+        try:
+            _load_module(script).run(seed=seed, anchor_time=anchor_time)
+        except (Exception, SystemExit) as exc:
+            error = f"{type(exc).__name__}: {exc}"
+            if capture:
+                traceback.print_exc(file=output)
+            else:
+                traceback.print_exc()
+    return error, time.monotonic() - started, dict(es_bulk.INDEX_TOTALS), output.getvalue()
+
+
+def run_sequential(seed, anchor_time):
+    """Run every stage in order in this process, streaming its output."""
+    results = {}
+    for i, stage in enumerate(STAGES, 1):
+        print(f"[{i}/{len(STAGES)}] {stage['title']}")
+        print("-" * 40)
+        results[stage["name"]] = _run_stage(stage["script"], seed, anchor_time)
+        print()
+    return results
+
+
+def run_parallel(seed, anchor_time, workers):
+    """
+    Run stages on a process pool as soon as their dependencies finish. Each
+    stage gets its own process (and so its own `random` state and bulk client),
+    which keeps seeded output identical to a sequential run.
+    """
+    results = {}
+    pending = {stage["name"]: stage for stage in STAGES}
+    running = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                blocked = [dep for dep in stage["after"] if dep in results and results[dep][0]]
+                if blocked:
+                    del pending[name]
+                    results[name] = (f"skipped: {', '.join(blocked)} failed", 0.0, {}, "")
+                    print(f"  [skip]  {name} ({results[name][0]})")
+                elif all(dep in results for dep in stage["after"]):
+                    del pending[name]
+                    running[pool.submit(_run_stage, stage["script"], seed, anchor_time, True)] = name
+                    print(f"  [start] {name}")
+            if not running:
+                if pending:
+                    raise RuntimeError(f"Unsatisfiable stage dependencies: {', '.join(pending)}")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                results[name] = error, seconds, totals, output = fut.result()
+                docs = sum(t["indexed"] for t in totals.values())
+                if error:
+                    print(f"  [FAIL]  {name} after {seconds:.1f}s -- {error}")
+                    print("\n".join("          | " + line for line in output.rstrip().splitlines()))
+                else:
+                    print(f"  [done]  {name} in {seconds:.1f}s ({docs:,} docs) "
+                          f"[{len(results)}/{len(STAGES)}]")
+    return results
+
+
+def print_summary(results, wall_seconds):
+    """Per-index document counts and load times, plus wall time vs. the serial sum."""
+    print("Per-index summary:")
+    print(f"  {'index':<22} {'docs':>9} {'failed':>7} {'seconds':>8}  stage")
+    for stage in STAGES:
+        error, seconds, totals, _ = results.get(stage["name"], ("not run", 0.0, {}, ""))
+        for index, t in sorted(totals.items()):
+            print(f"  {index:<22} {t['indexed']:>9,} {t['failed']:>7,} {t['seconds']:>8.1f}  {stage['name']}")
+        if error:
+            print(f"  {'-':<22} {'-':>9} {'-':>7} {seconds:>8.1f}  {stage['name']} ({error})")
+    serial = sum(r[1] for r in results.values())
+    print(f"  Wall time {wall_seconds:.1f}s (stages sum to {serial:.1f}s)")
+
+
+def main(seed=None, anchor_time=None, parallel=False, workers=None):
+    # Resolve the anchor once so every generator shares the same timeline.
+    anchor_time = datagen.anchor(anchor_time)
     es_url = os.environ.get("ES_URL", "http://localhost:9200")
     es_api_key = os.environ.get("ES_API_KEY", "")
+    workers = workers or len(STAGES)
 
     print("=" * 60)
     print("  OpsAgent -- Complete Data Generator")
     print("=" * 60)
     print(f"  ES URL: {es_url}")
     print(f"  Auth:   {'API Key configured' if es_api_key else 'No auth (local dev)'}")
+    print(f"  Data:   {datagen.describe(seed, anchor_time)}")
+    print(f"  Mode:   {f'parallel ({workers} workers)' if parallel else 'sequential'}")
     print("=" * 60)
     print()
 
-    print("[1/4] Service Owners")
-    print("-" * 40)
-    _load_module("generate-service-owners.py").run()
-    print()
-
-    print("[2/4] Incident Knowledge Base")
-    print("-" * 40)
-    _load_module("generate-knowledge-base.py").run()
-    print()
-
-    print("[3/4] Alert Rules")
-    print("-" * 40)
-    _load_module("generate-alert-rules.py").run()
-    print()
-
-    print("[4/4] Incident Data (Logs + Metrics)")
-    print("-" * 40)
-    _load_module("generate-incident-data.py").run()
-    print()
+    started = time.monotonic()
+    if parallel:
+        results = run_parallel(seed, anchor_time, workers)
+        print()
+    else:
+        results = run_sequential(seed, anchor_time)
+    wall_seconds = time.monotonic() - started
 
+    failed = [name for name, result in results.items() if result[0]]
     print("=" * 60)
-    print("  All data generation complete!")
+    if failed:
+        print(f"  Data generation finished with failures: {', '.join(failed)}")
+    else:
+        print("  All data generation complete!")
     print("=" * 60)
     print()
-    print("Indices populated:")
-    print("  - service-owners       (4 records)")
-    print("  - incident-knowledge   (5 past incidents)")
-    print("  - alert-rules          (5 percolator rules)")
-    print("  - logs-opsagent        (~1,100 log entries)")
-    print("  - infra-metrics        (~1,080 metric data points)")
+    print_summary(results, wall_seconds)
     print()
     print("Incident scenario: Database Connection Pool Exhaustion")
     print("  Phase 1 (0-10 min):  Early warnings on payment-service")
@@ -81,7 +193,21 @@ def main():
     print()
     print("Suggested demo prompt:")
     print('  > "Payment service errors are spiking. What is happening?"')
+    return not failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run all OpsAgent data generators.")
+    parser.add_argument("--parallel", action="store_true",
+                        help="Run independent stages concurrently on a process pool")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes for --parallel (default: one per stage)")
+    datagen.add_arguments(parser)
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    datagen.apply_export(args)
+    ok = main(seed=args.seed, anchor_time=args.anchor_time, parallel=args.parallel, workers=args.workers)
+    sys.exit(0 if ok else 1)
@@ -9,18 +9,25 @@ Generates 10,000+ realistic log entries across 10 services with:
 - Service owner data with dependencies
 - Incident knowledge base with semantic fields
 - Percolator alert rules for reverse-search
+- Per-service, per-minute error rollups of the logs (see rollup.py)
+- Alerts fired by percolating the logs against the rules as they are indexed
 
 Usage:
     export ES_URL="https://your-es-instance.elastic.cloud:443"
     export ES_API_KEY="your-api-key"
     python3 generate-demo-data.py
+    python3 generate-demo-data.py --hours 168 --workers 0 --seed 42  # a week, all cores
+    python3 generate-demo-data.py --engine numpy                     # column-wise generation
+    python3 generate-demo-data.py --seed 42 --anchor-time 2025-01-15T12:00:00Z  # reproducible
 """
 
-import json
+import argparse
+import hashlib
 import math
 import os
 import random
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timedelta, timezone
 
 try:
@@ -29,6 +36,13 @@ except ImportError:
     print("Install requests: pip install requests")
     sys.exit(1)
 
+import alerting
+import columnar
+import datagen
+import embedcache
+import es_bulk
+import rollup
+
 ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
 ES_API_KEY = os.environ.get("ES_API_KEY", "")
 
@@ -41,7 +55,8 @@ if ES_API_KEY:
 # ---------------------------------------------------------------------------
 TOTAL_HOURS = 24          # 24 hours of log data
 TARGET_LOGS = 12000       # Target ~12K log entries
-BATCH_SIZE = 500          # Bulk batch size
+SHARD_MINUTES = 60        # Log generation shard size (unit of parallelism)
+NOW = datetime.now(timezone.utc)  # Timeline anchor (--anchor-time)
 
 HOSTS = [f"host-{i:02d}.prod.internal" for i in range(1, 21)]
 HTTP_METHODS = ["GET", "POST", "PUT", "DELETE"]
@@ -272,26 +287,13 @@ WARN_MESSAGES = [
 
 
 def bulk_index(index, docs):
-    """Index documents using the Bulk API."""
-    body_lines = []
-    for doc in docs:
-        body_lines.append(json.dumps({"index": {"_index": index}}))
-        body_lines.append(json.dumps(doc))
-    body = "\n".join(body_lines) + "\n"
-    resp = requests.post(
-        f"{ES_URL}/_bulk",
-        headers={**HEADERS, "Content-Type": "application/x-ndjson"},
-        data=body,
-    )
-    result = resp.json()
-    errors = result.get("errors", False)
-    items = result.get("items", [])
-    success = sum(1 for i in items if i.get("index", {}).get("status", 0) < 300)
-    if errors:
-        print(f"  Indexed {success}/{len(docs)} docs into {index} (some errors)")
+    """Index documents through the shared pooled bulk client (see es_bulk.py)."""
+    stats = es_bulk.bulk_index(index, docs)
+    if stats.total_failed:
+        print(f"  Indexed {stats.total_indexed}/{len(docs)} docs into {index} (some errors)")
     else:
-        print(f"  Indexed {success}/{len(docs)} docs into {index}")
-    return result
+        print(f"  Indexed {stats.total_indexed}/{len(docs)} docs into {index}")
+    return stats
 
 
 def pick_weighted(options_dict):
@@ -446,28 +448,43 @@ def generate_log_entry(service, ts, is_incident=False):
     elif log_level == "WARN":
         msg_tmpl = random.choice(WARN_MESSAGES)
         val = random.randint(500, 5000)
-        doc["message"] = msg_tmpl.format(val) if "{}" in msg_tmpl else msg_tmpl
+        doc["message"] = msg_tmpl.format(*[val] * msg_tmpl.count("{}"))
         doc["http.response.status_code"] = random.choice([200, 201, 429])
         doc["event.duration"] = random.randint(500, 5000)
     else:
         msg_tmpl = random.choice(NORMAL_MESSAGES)
         val = random.randint(10, 200)
-        doc["message"] = msg_tmpl.format(val) if "{}" in msg_tmpl else msg_tmpl
+        doc["message"] = msg_tmpl.format(*[val] * msg_tmpl.count("{}"))
         doc["http.response.status_code"] = random.choice([200, 201, 204])
         doc["event.duration"] = val
 
     return doc
 
 
-def generate_log_data():
-    """Generate 10,000+ realistic log entries with time-varying patterns."""
-    print("\n[4/5] Generating log data (target: 12,000+ entries)...")
-    now = datetime.now(timezone.utc)
-    total_minutes = TOTAL_HOURS * 60
-    all_docs = []
-    total_generated = 0
+def _shard_seed(master_seed, shard_start):
+    """Derive a worker's deterministic seed from the master seed and its shard position."""
+    digest = hashlib.sha256(f"{master_seed}:{shard_start}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
 
-    for minutes_ago in range(total_minutes, 0, -1):
+def generate_log_shard(shard_start, shard_end, now, total_minutes, seed, concurrency=es_bulk.CONCURRENCY,
+                       alerts=False):
+    """
+    Generate and index logs for minutes_ago in (shard_end, shard_start].
+
+    Runs either in-process or inside a pool worker; each shard reseeds the RNG
+    so the output depends only on (master seed, shard), not on the worker count.
+    The shard's error rollup goes out through the same writer, and with
+    `alerts` its logs are percolated against alert-rules (see alerting.py).
+    Returns (generated, indexed, failed, alerts fired) for the log documents.
+    """
+    random.seed(seed)
+    generated = 0
+    errors = rollup.ErrorRollup("logs-opsagent-demo")
+    client = es_bulk.open_writer(tag=f"m{shard_start:06d}", concurrency=concurrency)
+    stream = alerting.AlertStream() if alerts else None
+
+    for minutes_ago in range(shard_start, shard_end, -1):
         ts_base = now - timedelta(minutes=minutes_ago)
         rps_mult = get_rps_multiplier(minutes_ago)
 
@@ -489,18 +506,201 @@ def generate_log_data():
                 ts = ts_base + timedelta(seconds=random.randint(0, 59))
                 is_err = random.random() < effective_error_rate
                 doc = generate_log_entry(service, ts, is_incident=is_err)
-                all_docs.append(doc)
-                total_generated += 1
-
-            # Flush in batches
-            if len(all_docs) >= BATCH_SIZE:
-                bulk_index("logs-opsagent-demo", all_docs)
-                all_docs = []
-
-    # Flush remaining
-    if all_docs:
-        bulk_index("logs-opsagent-demo", all_docs)
+                client.index("logs-opsagent-demo", doc)
+                errors.add(service, rollup.minute_of(ts), int(doc["log.level"] in rollup.ERROR_LEVELS))
+                if stream:
+                    stream.add(doc)
+                generated += 1
+
+    # Flush remaining batches and wait for in-flight requests
+    errors.index_into(client)
+    client.close()
+    if stream:
+        stream.close()
+    return generated, client.stats.indexed.get("logs-opsagent-demo", 0), client.stats.total_failed, stream.fired if stream else 0
+
+
+def generate_log_shard_columnar(shard_start, shard_end, now, total_minutes, seed, concurrency=es_bulk.CONCURRENCY,
+                                alerts=False):
+    """
+    NumPy twin of generate_log_shard: same distributions, drawn column-wise.
 
+    get_rps_multiplier / get_error_rate_multiplier are evaluated once per
+    (minute, service) to form rate curves; every per-document field is then
+    drawn as a whole array and documents only exist as rendered JSON strings.
+    """
+    rng = columnar.make_rng(seed)
+    np = columnar.np
+    minutes = np.arange(shard_start, shard_end, -1)
+    rps = np.array([get_rps_multiplier(m) for m in minutes.tolist()])
+
+    # Per-(minute, service) document counts and error rates
+    minute_idx, service_idx, rates = [], [], []
+    for s_i, service in enumerate(SERVICES):
+        profile = SERVICE_PROFILES[service]
+        error_mult = np.array([get_error_rate_multiplier(service, m, total_minutes) for m in minutes.tolist()])
+        counts = np.maximum(1, (profile["normal_rps"] * rps * rng.uniform(0.7, 1.3, len(minutes))).astype(int))
+        counts = np.where(error_mult > 2.0, (counts * np.minimum(error_mult * 0.5, 3.0)).astype(int), counts)
+        minute_idx.append(np.repeat(np.arange(len(minutes)), counts))
+        service_idx.append(np.full(counts.sum(), s_i))
+        rates.append(np.repeat(np.minimum(profile["base_error_rate"] * error_mult, 0.85), counts))
+    minute_idx = np.concatenate(minute_idx)
+    service_idx = np.concatenate(service_idx)
+    n = len(minute_idx)
+    is_incident = rng.random(n) < np.concatenate(rates)
+
+    now_ms = int(now.timestamp() * 1000)
+    epoch_ms = now_ms - minutes[minute_idx] * 60_000 + columnar.randint(rng, 0, 59, n) * 1000
+
+    # Log level: incident rows use the incident distribution, others the normal one
+    levels = np.array(["DEBUG", "INFO", "WARN", "ERROR", "FATAL"])
+    normal_level = columnar.choice_indices(rng, 5, n, [3, 60, 25, 10, 2])
+    incident_level = np.array([3, 4, 2])[columnar.choice_indices(rng, 3, n, [70, 15, 15])]
+    level = np.where(is_incident, incident_level, normal_level)
+    is_error = level >= 3
+    is_warn = level == 2
+
+    # Error types: incident-specific profile during incidents, background otherwise
+    error_types = list(ERROR_MESSAGES)
+    error_type = np.full(n, -1)
+    background = list(BACKGROUND_ERRORS)
+    bg_pick = columnar.choice_indices(rng, len(background), n, list(BACKGROUND_ERRORS.values()))
+    error_type[is_error] = np.array([error_types.index(e) for e in background])[bg_pick[is_error]]
+    for s_i, service in enumerate(SERVICES):
+        if service not in INCIDENT_ERRORS:
+            continue
+        rows = is_error & is_incident & (service_idx == s_i)
+        options = INCIDENT_ERRORS[service]
+        pick = columnar.choice_indices(rng, len(options), rows.sum(), list(options.values()))
+        error_type[rows] = np.array([error_types.index(e) for e in options])[pick]
+    # Error messages come from a small vocabulary: JSON-encode each variant once
+    message_flat = np.maximum(error_type, 0) * 3 + columnar.randint(rng, 0, 2, n)
+    message_vocab = [msg for e in error_types for msg in ERROR_MESSAGES[e]]
+    error_message = columnar.json_vocab(message_vocab)[message_flat]
+    error_line = np.stack([
+        columnar.json_vocab([f"[{lvl}] {msg}" for msg in message_vocab]) for lvl in ("ERROR", "FATAL")
+    ])[(level == 4).astype(int), message_flat]
+
+    # Message, status code and duration per level family
+    warn_val = columnar.randint(rng, 500, 5000, n)
+    normal_val = columnar.randint(rng, 10, 200, n)
+    message = columnar.where(
+        is_error,
+        error_line,
+        columnar.where(
+            is_warn,
+            columnar.template_messages(rng, WARN_MESSAGES, warn_val),
+            columnar.template_messages(rng, NORMAL_MESSAGES, normal_val),
+        ),
+    )
+    status = np.where(
+        is_error, np.array([500, 502, 503, 504])[columnar.randint(rng, 0, 3, n)],
+        np.where(is_warn, np.array([200, 201, 429])[columnar.randint(rng, 0, 2, n)],
+                 np.array([200, 201, 204])[columnar.randint(rng, 0, 2, n)]),
+    )
+    duration = np.where(is_error, columnar.randint(rng, 5000, 30000, n), np.where(is_warn, warn_val, normal_val))
+    error_fields = columnar.where(is_error, columnar.json_vocab(error_types)[np.maximum(error_type, 0)], "")
+
+    rows = columnar.render_rows([
+        ("@timestamp", columnar.iso_timestamps(epoch_ms)),
+        ("service.name", columnar.json_vocab(SERVICES)[service_idx]),
+        ("service.environment", np.full(n, '"production"', dtype=object)),
+        ("host.name", columnar.choice(rng, HOSTS, n)),
+        ("host.ip", (columnar.randint(rng, 1, 10, n), columnar.randint(rng, 1, 254, n)), '"10.0.%d.%d"'),
+        ("http.request.method", columnar.choice(rng, HTTP_METHODS, n)),
+        ("url.path", columnar.choice(rng, HTTP_PATHS, n)),
+        ("trace.id", columnar.randint(rng, 100000, 999999, n), '"trace-%06d"'),
+        ("span.id", columnar.randint(rng, 1000, 9999, n), '"span-%04d"'),
+        ("log.level", columnar.json_vocab(levels.tolist())[level]),
+        ("error.type?", error_fields),
+        ("error.message?", columnar.where(is_error, error_message, "")),
+        ("message", message),
+        ("http.response.status_code", status, "%d"),
+        ("event.duration", duration, "%d"),
+    ])
+
+    # Error rollup: one (service, minute) key per row, counted with bincount
+    minute_key = (epoch_ms - epoch_ms % rollup.MINUTE_MS) * len(SERVICES) + service_idx
+    keys, inverse = np.unique(minute_key, return_inverse=True)
+    totals = np.bincount(inverse)
+    error_counts = np.bincount(inverse, weights=is_error).astype(int)
+    errors = rollup.ErrorRollup("logs-opsagent-demo")
+    for key, err, total in zip(keys.tolist(), error_counts.tolist(), totals.tolist()):
+        errors.add(SERVICES[key % len(SERVICES)], key // len(SERVICES), err, total)
+
+    client = es_bulk.open_writer(tag=f"m{shard_start:06d}", concurrency=concurrency)
+    stream = alerting.AlertStream() if alerts else None
+    client.index_many("logs-opsagent-demo", stream.tap(rows, raw=True) if stream else rows, raw=True)
+    errors.index_into(client)
+    client.close()
+    if stream:
+        stream.close()
+    return n, client.stats.indexed.get("logs-opsagent-demo", 0), client.stats.total_failed, stream.fired if stream else 0
+
+
+def generate_log_data(hours=TOTAL_HOURS, workers=1, seed=None, engine="python", alerts=True):
+    """
+    Generate 10,000+ realistic log entries with time-varying patterns over the
+    last `hours`. Shards get the span and anchor as arguments rather than from
+    module globals, so workers started with spawn (macOS, Windows) see them too.
+
+    The time range is split into SHARD_MINUTES shards. With workers > 1 the
+    shards run on a process pool, each worker streaming its own documents into
+    its own bulk client; otherwise they run sequentially in this process.
+    engine="numpy" generates each shard column-wise (see columnar.py). With
+    `alerts` and enabled rules in alert-rules, each shard percolates its logs
+    as it indexes them; shards keep their own cooldowns.
+    """
+    print(f"\n[4/5] Generating log data (target: 12,000+ entries, {workers} worker(s), {engine} engine)...")
+    shard_fn = generate_log_shard
+    if engine == "numpy":
+        columnar.require_numpy()
+        shard_fn = generate_log_shard_columnar
+    now = NOW
+    total_minutes = hours * 60
+    if seed is None:
+        seed = random.SystemRandom().randrange(2 ** 32)
+    print(f"  Master seed: {seed}")
+    alerts = alerts and alerting.has_rules()
+    if not alerts:
+        print("  Alerts: not percolated (--no-alerts, no enabled rules, or exporting)")
+
+    shards = [
+        (start, max(start - SHARD_MINUTES, 0))
+        for start in range(total_minutes, 0, -SHARD_MINUTES)
+    ]
+    total_generated = total_indexed = total_failed = total_fired = 0
+
+    if workers <= 1:
+        results = (
+            shard_fn(start, end, now, total_minutes, _shard_seed(seed, start), alerts=alerts)
+            for start, end in shards
+        )
+    else:
+        # Split the bulk concurrency budget across workers so the cluster sees
+        # roughly the same number of in-flight requests as a single process.
+        per_worker = max(1, es_bulk.CONCURRENCY // workers)
+        pool = ProcessPoolExecutor(max_workers=workers)
+        futures = [
+            pool.submit(shard_fn, start, end, now, total_minutes,
+                        _shard_seed(seed, start), per_worker, alerts)
+            for start, end in shards
+        ]
+        results = (f.result() for f in as_completed(futures))
+
+    for done, (generated, indexed, failed, fired) in enumerate(results, 1):
+        total_generated += generated
+        total_indexed += indexed
+        total_failed += failed
+        total_fired += fired
+        if done % 24 == 0 or done == len(shards):
+            print(f"  Shards {done}/{len(shards)}: {total_generated} generated, {total_indexed} indexed")
+
+    if workers > 1:
+        pool.shutdown()
+    print(f"  Bulk: {total_indexed} indexed, {total_failed} failed")
+    if alerts:
+        print(f"  Alerts fired: {total_fired}")
     print(f"  Total log entries generated: {total_generated}")
 
 
@@ -565,13 +765,7 @@ def generate_service_owners():
             "runbook_url": f"https://wiki.acme.com/runbooks/{svc}",
         })
 
-    for doc in docs:
-        resp = requests.post(
-            f"{ES_URL}/service-owners/_doc",
-            headers=HEADERS,
-            json=doc,
-        )
-        print(f"  Indexed service-owner for {doc['service_name']} (HTTP {resp.status_code})")
+    bulk_index("service-owners", docs)
 
 
 # ---------------------------------------------------------------------------
@@ -693,8 +887,8 @@ INCIDENTS = [
 
 def generate_incident_knowledge():
     print("\n[2/5] Generating incident knowledge base...")
-    now = datetime.now(timezone.utc)
-    docs = []
+    now = NOW
+    docs, ids = [], []
     for i, incident in enumerate(INCIDENTS):
         doc = {
             **incident,
@@ -707,7 +901,11 @@ def generate_incident_knowledge():
             "semantic_resolution": incident["resolution"],
         }
         docs.append(doc)
-    bulk_index("incident-knowledge", docs)
+        ids.append(hashlib.sha1(incident["title"].encode()).hexdigest()[:20])
+    # same ids as generate-knowledge-base.py; unchanged text reuses cached embeddings
+    with embedcache.SemanticCache("incident-knowledge") as cache:
+        stats = es_bulk.bulk_index("incident-knowledge", (cache.fill(d, i) for d, i in zip(docs, ids)), ids=ids)
+    print(f"  Indexed {stats.total_indexed}/{len(docs)} docs into incident-knowledge ({cache.summary()})")
 
 
 # ---------------------------------------------------------------------------
@@ -819,10 +1017,11 @@ ALERT_RULES = [
 
 def generate_alert_rules():
     print("\n[3/5] Generating alert rules (percolator queries)...")
-    now = datetime.now(timezone.utc)
+    now = NOW
     docs = []
     for rule in ALERT_RULES:
-        doc = {**rule, "created_at": now.isoformat(), "created_by": "opsagent-setup", "last_triggered": None}
+        doc = {**alerting.with_prefilter(rule), "created_at": now.isoformat(), "created_by": "opsagent-setup",
+               "last_triggered": None}
         docs.append(doc)
     bulk_index("alert-rules", docs)
 
@@ -832,7 +1031,10 @@ def generate_alert_rules():
 # ---------------------------------------------------------------------------
 def verify():
     print("\n[5/5] Verifying data...")
-    indices = ["incident-knowledge", "alert-rules", "service-owners", "logs-opsagent-demo"]
+    if es_bulk.EXPORT_DIR:
+        print(f"  Skipped: corpus exported to {es_bulk.EXPORT_DIR} (load it with replay-corpus.py)")
+        return
+    indices = ["incident-knowledge", "alert-rules", "service-owners", "logs-opsagent-demo", rollup.ROLLUP_INDEX]
     for idx in indices:
         resp = requests.get(f"{ES_URL}/{idx}/_count", headers=HEADERS)
         if resp.status_code == 200:
@@ -845,21 +1047,26 @@ def verify():
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
-def main():
+def main(hours=TOTAL_HOURS, workers=1, seed=None, engine="python", anchor_time=None, alerts=True):
+    global NOW
+    NOW = datagen.anchor(anchor_time)
+    datagen.seed_random(seed)
+
     print("=" * 60)
     print("  Self-Healing Infrastructure Intelligence")
     print("  Demo Data Generator")
     print("=" * 60)
     print(f"  ES URL:       {ES_URL}")
     print(f"  Auth:         {'API Key configured' if ES_API_KEY else 'No auth (local dev)'}")
-    print(f"  Log hours:    {TOTAL_HOURS}")
+    print(f"  Log hours:    {hours}")
     print(f"  Target logs:  ~{TARGET_LOGS}+")
+    print(f"  Data:         {datagen.describe(seed, anchor_time)}")
     print("=" * 60)
 
     generate_service_owners()
     generate_incident_knowledge()
     generate_alert_rules()
-    generate_log_data()
+    generate_log_data(hours=hours, workers=workers, seed=seed, engine=engine, alerts=alerts)
     verify()
 
     print("\n" + "=" * 60)
@@ -887,5 +1094,22 @@ def main():
     print("  5. Agent identifies cascading impact on order-service")
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the OpsAgent demo dataset.")
+    parser.add_argument("--hours", type=int, default=TOTAL_HOURS,
+                        help="Hours of log data to generate (default: 24)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Log generation processes; 0 = one per CPU core (default: 1)")
+    parser.add_argument("--engine", choices=["python", "numpy"], default="python",
+                        help="Document generation engine; numpy draws fields column-wise (default: python)")
+    parser.add_argument("--no-alerts", dest="alerts", action="store_false",
+                        help="Do not percolate the logs against alert-rules while indexing them")
+    datagen.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    datagen.apply_export(args)
+    main(hours=args.hours, workers=args.workers or os.cpu_count(), seed=args.seed, engine=args.engine,
+         anchor_time=args.anchor_time, alerts=args.alerts)
@@ -9,31 +9,45 @@ Scenario: Database Connection Pool Exhaustion
 - Phase 3 (30-60 min): Cascading failures -- all services affected
 - Also generates infrastructure metrics for the same time window
 
+Scale mode (--scale N) replicates the whole topology into N independent "cells"
+(cell 0 keeps the original names, cell k suffixes services and hosts with -cK),
+so services, hosts and total event rate all grow N-fold. --rate R additionally
+multiplies per-service event counts. Documents are produced lazily and streamed
+into the bulk client as they are generated, so memory stays flat at any volume.
+--engine numpy draws the same distributions column-wise, CELL_BLOCK cells at a
+time, and hands the bulk client rendered source lines (see columnar.py).
+
+Log lines are also counted per service and minute on the way out and written
+to the opsagent-error-rollup index that error_trend_analysis reads (see rollup.py);
+that costs one small counter per service-minute, not per document. When
+alert-rules holds enabled rules, the same stream is percolated against them in
+batches and fired alerts go to the alerts index (see alerting.py; --no-alerts
+skips this).
+
 Usage:
     export ES_URL="https://your-es-instance.elastic.cloud:443"
     export ES_API_KEY="your-api-key"
     python3 generate-incident-data.py
+    ES_BULK_GZIP=1 python3 generate-incident-data.py   # gzip-compress bulk request bodies
+    python3 generate-incident-data.py --scale 500 --rate 4 # ~2.2M logs + 540k metrics, bounded memory
+    python3 generate-incident-data.py --seed 42 --anchor-time 2025-01-15T12:00:00Z  # reproducible
+    python3 generate-incident-data.py --scale 500 --engine numpy  # column-wise generation (needs numpy)
 """
 
-import json
+import argparse
 import os
 import random
-import sys
 from datetime import datetime, timedelta, timezone
 
-try:
-    import requests
-except ImportError:
-    print("Install requests: pip install requests")
-    sys.exit(1)
+import alerting
+import columnar
+import datagen
+import es_bulk
+import rollup
 
 ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
 ES_API_KEY = os.environ.get("ES_API_KEY", "")
 
-HEADERS = {"Content-Type": "application/json"}
-if ES_API_KEY:
-    HEADERS["Authorization"] = f"ApiKey {ES_API_KEY}"
-
 # ---------------------------------------------------------------------------
 # Service topology
 # ---------------------------------------------------------------------------
@@ -48,32 +62,43 @@ NOW = datetime.now(timezone.utc)
 INCIDENT_START = NOW - timedelta(hours=1)   # incident started 1 hour ago
 NORMAL_START = NOW - timedelta(hours=3)     # normal ops started 3 hours ago
 
-BATCH_SIZE = 500
 LOG_INDEX = "logs-opsagent"
 METRICS_INDEX = "infra-metrics"
 
+# Base document counts per cell at --rate 1
+NORMAL_LOG_COUNT = 600
+INCIDENT_LOG_COUNTS = {"early_warning": 60, "active": 200, "cascade": 140, "healthy": 100}
+NORMAL_METRIC_MINUTES = 120
+INCIDENT_METRIC_MINUTES = 60
+
+
+def configure(seed=None, anchor_time=None):
+    """Pin the random state and the timeline anchor (see datagen.py)."""
+    global NOW, INCIDENT_START, NORMAL_START
+    datagen.seed_random(seed)
+    NOW = datagen.anchor(anchor_time)
+    INCIDENT_START = NOW - timedelta(hours=1)
+    NORMAL_START = NOW - timedelta(hours=3)
+
 
-def bulk_index(index, docs):
-    """Bulk index documents in batches."""
-    total = 0
-    for i in range(0, len(docs), BATCH_SIZE):
-        batch = docs[i : i + BATCH_SIZE]
-        body = ""
-        for doc in batch:
-            body += json.dumps({"index": {"_index": index}}) + "\n"
-            body += json.dumps(doc) + "\n"
-        resp = requests.post(
-            f"{ES_URL}/_bulk",
-            headers={**HEADERS, "Content-Type": "application/x-ndjson"},
-            data=body,
-        )
-        result = resp.json()
-        if result.get("errors"):
-            err_count = sum(1 for item in result["items"] if item["index"].get("error"))
-            print(f"  Batch {i // BATCH_SIZE + 1}: {err_count} errors")
-        total += len(batch)
-    print(f"  [OK] Indexed {total} documents to '{index}'")
-    return total
+def _cell_name(name, cell):
+    """Name of a service/host in topology cell `cell` (cell 0 keeps the original name)."""
+    return name if cell == 0 else f"{name}-c{cell}"
+
+
+def bulk_index(index, docs, raw=False, compress=es_bulk.COMPRESS):
+    """
+    Bulk index documents through the shared pooled client (see es_bulk.py).
+
+    Request bodies are streamed as chunked NDJSON rather than concatenated into
+    one string, and gzip-compressed when `compress` is set. With `raw`, docs
+    are pre-rendered JSON source lines.
+    """
+    stats = es_bulk.bulk_index(index, docs, raw=raw, compress=compress)
+    if stats.total_failed:
+        print(f"  {stats.total_failed} errors ({stats.errors[:1]})")
+    print(f"  [OK] Indexed {stats.total_indexed} documents to '{index}'")
+    return stats.total_indexed
 
 
 # ---------------------------------------------------------------------------
@@ -107,16 +132,17 @@ def _format_normal_message():
 # ---------------------------------------------------------------------------
 # Log generators
 # ---------------------------------------------------------------------------
-def generate_normal_logs():
-    """Generate 2 hours of healthy application logs (600 docs)."""
-    logs = []
-    for _ in range(600):
+def generate_normal_logs(cell=0, rate=1):
+    """Yield 2 hours of healthy application logs (600 docs per cell per unit of rate)."""
+    services = [_cell_name(s, cell) for s in SERVICES]
+    app_hosts = [_cell_name(h, cell) for h in APP_HOSTS]
+    for _ in range(NORMAL_LOG_COUNT * rate):
         ts = NORMAL_START + timedelta(seconds=random.randint(0, 7200))
-        service = random.choice(SERVICES)
-        host = random.choice(APP_HOSTS)
+        service = random.choice(services)
+        host = random.choice(app_hosts)
         level = random.choices(["INFO", "DEBUG", "WARN"], weights=[80, 15, 5])[0]
 
-        logs.append({
+        yield {
             "@timestamp": ts.isoformat(),
             "service.name": service,
             "service.environment": "production",
@@ -130,22 +156,22 @@ def generate_normal_logs():
             "event.duration": random.randint(5_000_000, 200_000_000),  # 5-200ms in nanos
             "trace.id": f"trace-{random.randint(100000, 999999):06d}",
             "span.id": f"span-{random.randint(1000, 9999):04d}",
-        })
-    return logs
+        }
 
 
-def generate_incident_logs():
-    """Generate 1 hour of escalating incident logs (~500 docs)."""
-    logs = []
+def generate_incident_logs(cell=0, rate=1):
+    """Yield 1 hour of escalating incident logs (~500 docs per cell per unit of rate)."""
+    services = [_cell_name(s, cell) for s in SERVICES]
+    app_hosts = [_cell_name(h, cell) for h in APP_HOSTS]
 
     # Phase 1: Early warnings (0-10 min) -- connection pool warnings
-    for _ in range(60):
+    for _ in range(INCIDENT_LOG_COUNTS["early_warning"] * rate):
         ts = INCIDENT_START + timedelta(seconds=random.randint(0, 600))
-        logs.append({
+        yield {
             "@timestamp": ts.isoformat(),
-            "service.name": "payment-service",
+            "service.name": _cell_name("payment-service", cell),
             "service.environment": "production",
-            "host.name": "app-01",
+            "host.name": _cell_name("app-01", cell),
             "host.ip": "10.0.2.15",
             "log.level": "WARN",
             "message": random.choice([
@@ -161,23 +187,23 @@ def generate_incident_logs():
             "event.duration": random.randint(800_000_000, 3_000_000_000),
             "trace.id": f"trace-{random.randint(100000, 999999):06d}",
             "span.id": f"span-{random.randint(1000, 9999):04d}",
-        })
+        }
 
     # Phase 2: Active incident (10-30 min) -- errors on payment, order, gateway
-    for _ in range(200):
+    for _ in range(INCIDENT_LOG_COUNTS["active"] * rate):
         ts = INCIDENT_START + timedelta(seconds=random.randint(600, 1800))
-        service = random.choices(
+        service = _cell_name(random.choices(
             ["payment-service", "order-service", "api-gateway"],
             weights=[60, 30, 10],
-        )[0]
-        host = random.choice(["app-01", "app-02"])
+        )[0], cell)
+        host = _cell_name(random.choice(["app-01", "app-02"]), cell)
         error_type = random.choice([
             "ConnectionTimeoutException",
             "SQLException",
             "CircuitBreakerOpenException",
             "HikariPoolTimeoutException",
         ])
-        logs.append({
+        yield {
             "@timestamp": ts.isoformat(),
             "service.name": service,
             "service.environment": "production",
@@ -202,14 +228,14 @@ def generate_incident_logs():
             "event.duration": random.randint(30_000_000_000, 62_000_000_000),
             "trace.id": f"trace-{random.randint(100000, 999999):06d}",
             "span.id": f"span-{random.randint(1000, 9999):04d}",
-        })
+        }
 
     # Phase 3: Cascading failures (30-60 min) -- all services affected
-    for _ in range(140):
+    for _ in range(INCIDENT_LOG_COUNTS["cascade"] * rate):
         ts = INCIDENT_START + timedelta(seconds=random.randint(1800, 3600))
-        service = random.choice(SERVICES)
-        host = random.choice(APP_HOSTS)
-        logs.append({
+        service = random.choice(services)
+        host = random.choice(app_hosts)
+        yield {
             "@timestamp": ts.isoformat(),
             "service.name": service,
             "service.environment": "production",
@@ -235,16 +261,16 @@ def generate_incident_logs():
             "event.duration": random.randint(30_000_000_000, 120_000_000_000),
             "trace.id": f"trace-{random.randint(100000, 999999):06d}",
             "span.id": f"span-{random.randint(1000, 9999):04d}",
-        })
+        }
 
     # Sprinkle in some successful requests during the incident (not everything fails)
-    for _ in range(100):
+    for _ in range(INCIDENT_LOG_COUNTS["healthy"] * rate):
         ts = INCIDENT_START + timedelta(seconds=random.randint(0, 3600))
-        logs.append({
+        yield {
             "@timestamp": ts.isoformat(),
-            "service.name": random.choice(["api-gateway", "inventory-service"]),
+            "service.name": _cell_name(random.choice(["api-gateway", "inventory-service"]), cell),
             "service.environment": "production",
-            "host.name": random.choice(["web-01", "web-02"]),
+            "host.name": _cell_name(random.choice(["web-01", "web-02"]), cell),
             "host.ip": f"10.0.1.{random.randint(1, 20)}",
             "log.level": "INFO",
             "message": random.choice([
@@ -258,25 +284,24 @@ def generate_incident_logs():
             "event.duration": random.randint(1_000_000, 50_000_000),
             "trace.id": f"trace-{random.randint(100000, 999999):06d}",
             "span.id": f"span-{random.randint(1000, 9999):04d}",
-        })
-
-    return logs
+        }
 
 
 # ---------------------------------------------------------------------------
 # Metrics generators
 # ---------------------------------------------------------------------------
-def generate_normal_metrics():
-    """Generate 2 hours of healthy infrastructure metrics (1 point/min/host)."""
-    metrics = []
-    for host in HOSTS:
-        for minute in range(120):
+def generate_normal_metrics(cell=0):
+    """Yield 2 hours of healthy infrastructure metrics (1 point/min/host)."""
+    services = [_cell_name(s, cell) for s in SERVICES]
+    for base_host in HOSTS:
+        host = _cell_name(base_host, cell)
+        for minute in range(NORMAL_METRIC_MINUTES):
             ts = NORMAL_START + timedelta(minutes=minute)
-            is_db = host.startswith("db-")
-            metrics.append({
+            is_db = base_host.startswith("db-")
+            yield {
                 "@timestamp": ts.isoformat(),
                 "host.name": host,
-                "service.name": "postgresql" if is_db else random.choice(SERVICES),
+                "service.name": _cell_name("postgresql", cell) if is_db else random.choice(services),
                 "system.cpu.total.pct": round(random.uniform(0.12, 0.40), 3),
                 "system.memory.used.pct": round(random.uniform(0.35, 0.60), 3),
                 "system.memory.total": 17179869184,  # 16 GiB
@@ -286,14 +311,13 @@ def generate_normal_metrics():
                 "container.name": f"{host}-container",
                 "kubernetes.pod.name": f"{host}-pod-{''.join(random.choices('abcdef0123456789', k=5))}",
                 "cloud.region": "us-east-1",
-            })
-    return metrics
+            }
 
 
-def generate_incident_metrics():
-    """Generate 1 hour of incident metrics -- db-primary-01 under extreme stress."""
-    metrics = []
-    for minute in range(60):
+def generate_incident_metrics(cell=0):
+    """Yield 1 hour of incident metrics -- db-primary-01 under extreme stress."""
+    services = [_cell_name(s, cell) for s in SERVICES]
+    for minute in range(INCIDENT_METRIC_MINUTES):
         ts = INCIDENT_START + timedelta(minutes=minute)
 
         for host in HOSTS:
@@ -316,59 +340,341 @@ def generate_incident_metrics():
                 cpu = round(random.uniform(0.35, 0.55), 3)
                 mem = round(random.uniform(0.50, 0.70), 3)
 
-            metrics.append({
+            yield {
                 "@timestamp": ts.isoformat(),
-                "host.name": host,
-                "service.name": "postgresql" if host.startswith("db-") else random.choice(SERVICES),
+                "host.name": _cell_name(host, cell),
+                "service.name": _cell_name("postgresql", cell) if host.startswith("db-") else random.choice(services),
                 "system.cpu.total.pct": cpu,
                 "system.memory.used.pct": mem,
                 "system.memory.total": 17179869184,
                 "system.disk.used.pct": disk,
                 "system.network.in.bytes": random.randint(100_000, 10_000_000),
                 "system.network.out.bytes": random.randint(100_000, 10_000_000),
-                "container.name": f"{host}-container",
-                "kubernetes.pod.name": f"{host}-pod-{''.join(random.choices('abcdef0123456789', k=5))}",
+                "container.name": f"{_cell_name(host, cell)}-container",
+                "kubernetes.pod.name": f"{_cell_name(host, cell)}-pod-{''.join(random.choices('abcdef0123456789', k=5))}",
                 "cloud.region": "us-east-1",
-            })
-    return metrics
+            }
+
+
+# ---------------------------------------------------------------------------
+# Column-wise engine (--engine numpy): same distributions, one array per field
+# ---------------------------------------------------------------------------
+CELL_BLOCK = 32             # cells drawn per batch of columns (~35k logs at --rate 1)
+LEVELS = ["DEBUG", "INFO", "WARN", "ERROR", "FATAL"]
+
+
+def _epoch_ms(dt):
+    return int(dt.timestamp() * 1000)
+
+
+def _columnar_logs(rng, cells, rate, errors):
+    """
+    Render the normal + incident logs of `cells` as raw JSON source lines and
+    count them into the ErrorRollup `errors`. Each phase draws its columns for
+    every cell at once; rows hold indices into the per-cell name vocabularies.
+    """
+    np = columnar.np
+    n_cells = len(cells)
+    service_names = [_cell_name(s, c) for c in cells for s in SERVICES]
+    host_names = [_cell_name(h, c) for c in cells for h in APP_HOSTS]
+    phases = []
+
+    def const(value, k):
+        return np.full(k, columnar.json_vocab([value])[0], dtype=object)
+
+    def pick(names, vocab, k, weights=None):
+        """Indices into `vocab` of names drawn from `names`, as random.choice(s)."""
+        return np.array([vocab.index(name) for name in names])[columnar.choice_indices(rng, len(names), k, weights)]
+
+    def randint(low, high, k):
+        return columnar.randint(rng, low, high, k)
+
+    def add(per_cell, start, seconds, service, host, ip, level, message, method, status, path, duration,
+            error_type=None, error_message=None):
+        k = per_cell * n_cells
+        cell = np.repeat(np.arange(n_cells), per_cell)
+        phases.append({
+            "epoch_ms": _epoch_ms(start) + randint(seconds[0], seconds[1], k) * 1000,
+            "service": cell * len(SERVICES) + service(k),
+            "host": cell * len(APP_HOSTS) + host(k),
+            "ip_a": ip[0](k), "ip_b": ip[1](k),
+            "level": level(k), "message": message(k),
+            "error_type": error_type(k) if error_type else np.full(k, "", dtype=object),
+            "error_message": error_message(k) if error_message else np.full(k, "", dtype=object),
+            "method": method(k), "status": status(k), "path": path(k), "duration": duration(k),
+        })
+
+    def fixed(value):
+        return lambda k: np.full(k, value)
+
+    # Normal operations: 2 hours, every service and host
+    add(NORMAL_LOG_COUNT * rate, NORMAL_START, (0, 7200),
+        service=lambda k: pick(SERVICES, SERVICES, k), host=lambda k: pick(APP_HOSTS, APP_HOSTS, k),
+        ip=(lambda k: randint(1, 10, k), lambda k: randint(1, 254, k)),
+        level=lambda k: pick(["INFO", "DEBUG", "WARN"], LEVELS, k, [80, 15, 5]),
+        message=lambda k: columnar.pick_messages(rng, [
+            ("Request processed successfully in {}ms", lambda k: randint(10, 9999, k)),
+            ("Cache hit for session {}", lambda k: randint(10, 9999, k)),
+            "Health check passed",
+            ("Database query completed in {}ms", lambda k: randint(10, 9999, k)),
+            ("Payment processed for order #{}", lambda k: randint(10, 9999, k)),
+            ("Inventory check completed for SKU-{}", lambda k: randint(10, 9999, k)),
+            ("User {} authenticated successfully", lambda k: randint(10, 9999, k)),
+            ("Order #{} created, total: ${}", lambda k: randint(10000, 99999, k),
+             lambda k: np.char.mod("%.2f", rng.uniform(10, 500, k))),
+            ("Rate limiter: 42/{} requests this window", lambda k: randint(10, 9999, k)),
+            "Connection pool stats: 12/50 active, 38 idle",
+        ], k),
+        method=lambda k: columnar.choice(rng, HTTP_METHODS, k),
+        status=lambda k: np.array([200, 201, 204, 304])[columnar.choice_indices(rng, 4, k, [60, 20, 10, 10])],
+        path=lambda k: columnar.choice(rng, PATHS, k),
+        duration=lambda k: randint(5_000_000, 200_000_000, k))
+
+    # Phase 1: Early warnings (0-10 min) -- connection pool warnings
+    add(INCIDENT_LOG_COUNTS["early_warning"] * rate, INCIDENT_START, (0, 600),
+        service=fixed(SERVICES.index("payment-service")), host=fixed(APP_HOSTS.index("app-01")),
+        ip=(fixed(2), fixed(15)), level=fixed(LEVELS.index("WARN")),
+        message=lambda k: columnar.pick_messages(rng, [
+            ("Database connection pool nearing capacity - {}/50 connections in use", lambda k: randint(42, 48, k)),
+            ("Slow database query detected: SELECT * FROM transactions took {}ms", lambda k: randint(2000, 5000, k)),
+            ("Connection checkout time: {}ms (threshold: 1000ms)", lambda k: randint(800, 3000, k)),
+            "Thread pool saturation warning: 85% of worker threads blocked on DB I/O",
+        ], k),
+        error_type=lambda k: const("ConnectionPoolWarning", k),
+        method=lambda k: const("POST", k), status=fixed(200), path=lambda k: const("/api/payments", k),
+        duration=lambda k: randint(800_000_000, 3_000_000_000, k))
+
+    # Phase 2: Active incident (10-30 min) -- errors on payment, order, gateway
+    add(INCIDENT_LOG_COUNTS["active"] * rate, INCIDENT_START, (600, 1800),
+        service=lambda k: pick(["payment-service", "order-service", "api-gateway"], SERVICES, k, [60, 30, 10]),
+        host=lambda k: pick(["app-01", "app-02"], APP_HOSTS, k),
+        ip=(fixed(2), lambda k: randint(10, 30, k)), level=fixed(LEVELS.index("ERROR")),
+        message=lambda k: columnar.pick_messages(rng, [
+            "FATAL: connection pool exhausted -- cannot acquire connection after 30000ms timeout",
+            "java.sql.SQLException: Cannot get a connection, pool error Timeout waiting for idle object",
+            "Transaction failed: unable to reach database within timeout period",
+            "Circuit breaker OPEN for database connections -- failing fast",
+            ("HikariPool-1 - Connection is not available, request timed out after {}ms",
+             lambda k: randint(29000, 31000, k)),
+            "org.postgresql.util.PSQLException: Connection to db-primary-01:5432 refused",
+            ("Downstream dependency payment-service returned HTTP 503 after {}s", lambda k: randint(30, 60, k)),
+            "CRITICAL: Payment processing halted -- all database connections exhausted",
+        ], k),
+        error_type=lambda k: columnar.choice(rng, ["ConnectionTimeoutException", "SQLException",
+                                                   "CircuitBreakerOpenException", "HikariPoolTimeoutException"], k),
+        error_message=lambda k: const("Connection pool exhausted on db-primary-01:5432", k),
+        method=lambda k: columnar.choice(rng, ["POST", "PUT"], k),
+        status=lambda k: np.array([500, 503, 504])[columnar.randint(rng, 0, 2, k)],
+        path=lambda k: columnar.choice(rng, ["/api/payments", "/api/orders"], k),
+        duration=lambda k: randint(30_000_000_000, 62_000_000_000, k))
+
+    # Phase 3: Cascading failures (30-60 min) -- all services affected
+    add(INCIDENT_LOG_COUNTS["cascade"] * rate, INCIDENT_START, (1800, 3600),
+        service=lambda k: pick(SERVICES, SERVICES, k), host=lambda k: pick(APP_HOSTS, APP_HOSTS, k),
+        ip=(lambda k: randint(1, 10, k), lambda k: randint(1, 254, k)),
+        level=lambda k: pick(["ERROR", "FATAL"], LEVELS, k, [70, 30]),
+        message=lambda k: columnar.pick_messages(rng, [
+            ("Service degraded -- upstream dependency {} failures detected",
+             lambda k: np.array(["payment-service", "order-service"])[columnar.randint(rng, 0, 1, k)]),
+            "Health check FAILED -- database unreachable from this host",
+            ("Request queue overflow -- dropping requests (queue depth: {})", lambda k: randint(500, 2000, k)),
+            ("GC pause detected: {}ms (threshold: 2000ms)", lambda k: randint(3000, 8000, k)),
+            ("Customer-facing error rate: {}% (threshold: 5%)", lambda k: randint(45, 78, k)),
+            "Circuit breaker for order-service OPEN -- too many failures in window",
+            ("HTTP connection pool to payment-service exhausted ({}/{} connections used)",
+             lambda k: randint(50, 100, k), lambda k: randint(50, 100, k)),
+            "Kubernetes readiness probe failed -- pod will be removed from service",
+            ("Memory pressure critical: {}% heap used, frequent full GCs", lambda k: randint(88, 96, k)),
+        ], k),
+        error_type=lambda k: columnar.choice(rng, ["CascadeFailure", "ServiceDegradation", "HealthCheckFailure"], k),
+        error_message=lambda k: const("Cascading failure originating from database connection pool exhaustion", k),
+        method=lambda k: columnar.choice(rng, HTTP_METHODS, k),
+        status=lambda k: np.array([500, 502, 503, 504])[columnar.randint(rng, 0, 3, k)],
+        path=lambda k: columnar.choice(rng, PATHS, k),
+        duration=lambda k: randint(30_000_000_000, 120_000_000_000, k))
+
+    # Successful requests during the incident (not everything fails)
+    add(INCIDENT_LOG_COUNTS["healthy"] * rate, INCIDENT_START, (0, 3600),
+        service=lambda k: pick(["api-gateway", "inventory-service"], SERVICES, k),
+        host=lambda k: pick(["web-01", "web-02"], APP_HOSTS, k),
+        ip=(fixed(1), lambda k: randint(1, 20, k)), level=fixed(LEVELS.index("INFO")),
+        message=lambda k: columnar.pick_messages(rng, [
+            "Request processed successfully (cached response)",
+            "Static asset served",
+            "Health check passed (no DB dependency)",
+        ], k),
+        method=lambda k: const("GET", k), status=fixed(200),
+        path=lambda k: columnar.choice(rng, ["/health", "/api/inventory", "/static"], k),
+        duration=lambda k: randint(1_000_000, 50_000_000, k))
+
+    col = {key: np.concatenate([phase[key] for phase in phases]) for key in phases[0]}
+    n = len(col["epoch_ms"])
+    rows = columnar.render_rows([
+        ("@timestamp", columnar.iso_timestamps(col["epoch_ms"])),
+        ("service.name", columnar.json_vocab(service_names)[col["service"]]),
+        ("service.environment", const("production", n)),
+        ("host.name", columnar.json_vocab(host_names)[col["host"]]),
+        ("host.ip", (col["ip_a"], col["ip_b"]), '"10.0.%d.%d"'),
+        ("log.level", columnar.json_vocab(LEVELS)[col["level"]]),
+        ("message", col["message"]),
+        ("error.type?", col["error_type"].astype(object)),
+        ("error.message?", col["error_message"].astype(object)),
+        ("http.request.method", col["method"]),
+        ("http.response.status_code", col["status"], "%d"),
+        ("url.path", col["path"]),
+        ("event.duration", col["duration"], "%d"),
+        ("trace.id", randint(100000, 999999, n), '"trace-%06d"'),
+        ("span.id", randint(1000, 9999, n), '"span-%04d"'),
+    ])
+
+    # Error rollup: one (service, minute) key per row, counted with bincount
+    minute_key = (col["epoch_ms"] - col["epoch_ms"] % rollup.MINUTE_MS) * len(service_names) + col["service"]
+    keys, inverse = np.unique(minute_key, return_inverse=True)
+    totals = np.bincount(inverse)
+    error_counts = np.bincount(inverse, weights=col["level"] >= LEVELS.index("ERROR")).astype(int)
+    for key, err, total in zip(keys.tolist(), error_counts.tolist(), totals.tolist()):
+        errors.add(service_names[key % len(service_names)], key // len(service_names), err, total)
+    return rows
+
+
+def _columnar_metrics(rng, cells):
+    """Render the normal + incident metrics of `cells` as raw JSON source lines, one host series at a time."""
+    np = columnar.np
+    n_cells = len(cells)
+    services = columnar.json_vocab([_cell_name(s, c) for c in cells for s in SERVICES])
+    rows = []
+    for base_host in HOSTS:
+        names = [_cell_name(base_host, c) for c in cells]
+        postgres = columnar.json_vocab([_cell_name("postgresql", c) for c in cells])
+        for incident, start, count, net_max in ((False, NORMAL_START, NORMAL_METRIC_MINUTES, 5_000_000),
+                                                (True, INCIDENT_START, INCIDENT_METRIC_MINUTES, 10_000_000)):
+            k = count * n_cells
+            cell = np.repeat(np.arange(n_cells), count)
+            minutes = np.tile(np.arange(count), n_cells)
+            if not incident:
+                cpu = columnar.rounded(rng.uniform(0.12, 0.40, k), 3)
+                mem = columnar.rounded(rng.uniform(0.35, 0.60, k), 3)
+                disk = columnar.rounded(rng.uniform(0.25, 0.45, k), 3)
+            else:
+                cpu, mem, disk = columnar.incident_host_curves(rng, base_host, minutes)
+            service = (postgres[cell] if base_host.startswith("db-")
+                       else services[cell * len(SERVICES) + columnar.randint(rng, 0, len(SERVICES) - 1, k)])
+            host = np.array(names, dtype=object)[cell]
+            rows += columnar.render_rows([
+                ("@timestamp", columnar.iso_timestamps(_epoch_ms(start) + minutes * 60_000)),
+                ("host.name", columnar.json_vocab(names)[cell]),
+                ("service.name", service),
+                ("system.cpu.total.pct", cpu, "%r"),
+                ("system.memory.used.pct", mem, "%r"),
+                ("system.memory.total", np.full(k, 17179869184), "%d"),
+                ("system.disk.used.pct", disk, "%r"),
+                ("system.network.in.bytes", columnar.randint(rng, 100_000, net_max, k), "%d"),
+                ("system.network.out.bytes", columnar.randint(rng, 100_000, net_max, k), "%d"),
+                ("container.name", (host,), '"%s-container"'),
+                ("kubernetes.pod.name", (host, columnar.randint(rng, 0, 16 ** 5 - 1, k)), '"%s-pod-%05x"'),
+                ("cloud.region", np.full(k, '"us-east-1"', dtype=object)),
+            ])
+    return rows
+
+
+def iter_log_rows(rng, scale=1, rate=1, errors=None):
+    """Lazily yield rendered logs for every cell, CELL_BLOCK cells at a time."""
+    for first in range(0, scale, CELL_BLOCK):
+        yield from _columnar_logs(rng, range(first, min(scale, first + CELL_BLOCK)), rate, errors)
+
+
+def iter_metric_rows(rng, scale=1):
+    """Lazily yield rendered metrics for every cell, CELL_BLOCK cells at a time."""
+    for first in range(0, scale, CELL_BLOCK):
+        yield from _columnar_metrics(rng, range(first, min(scale, first + CELL_BLOCK)))
 
 
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
-def run():
-    """Generate and index all incident data."""
+def iter_logs(scale=1, rate=1):
+    """Lazily yield normal + incident logs for every cell."""
+    for cell in range(scale):
+        yield from generate_normal_logs(cell, rate)
+        yield from generate_incident_logs(cell, rate)
+
+
+def iter_metrics(scale=1):
+    """Lazily yield normal + incident metrics for every cell."""
+    for cell in range(scale):
+        yield from generate_normal_metrics(cell)
+        yield from generate_incident_metrics(cell)
+
+
+def run(scale=1, rate=1, seed=None, anchor_time=None, engine="python", alerts=True):
+    """Generate and index all incident data, streaming documents as they are produced."""
+    configure(seed, anchor_time)
+    rng = columnar.make_rng(seed) if engine == "numpy" else None
+    log_estimate = (NORMAL_LOG_COUNT + sum(INCIDENT_LOG_COUNTS.values())) * scale * rate
+    metric_estimate = len(HOSTS) * (NORMAL_METRIC_MINUTES + INCIDENT_METRIC_MINUTES) * scale
+
     print("=" * 60)
     print("  Incident Data Generator")
     print("  Scenario: Database Connection Pool Exhaustion")
     print("=" * 60)
     print(f"  ES URL: {ES_URL}")
     print(f"  Auth:   {'API Key configured' if ES_API_KEY else 'No auth (local dev)'}")
+    print(f"  Scale:  {scale} cell(s) x rate {rate} "
+          f"({len(SERVICES) * scale} services, {len(HOSTS) * scale} hosts)")
+    print(f"  Data:   {datagen.describe(seed, anchor_time)}")
+    print(f"  Engine: {engine}")
     print("=" * 60)
 
-    print("\nPhase 1: Normal operation logs (600 docs)...")
-    normal_logs = generate_normal_logs()
-
-    print("Phase 2: Incident logs (~500 docs)...")
-    incident_logs = generate_incident_logs()
-
-    print("Phase 3: Normal metrics (720 docs)...")
-    normal_metrics = generate_normal_metrics()
-
-    print("Phase 4: Incident metrics (360 docs)...")
-    incident_metrics = generate_incident_metrics()
-
-    print("\nIndexing to Elasticsearch...\n")
-    log_count = bulk_index(LOG_INDEX, normal_logs + incident_logs)
-    metric_count = bulk_index(METRICS_INDEX, normal_metrics + incident_metrics)
+    print(f"\nStreaming logs (~{log_estimate:,} docs) to '{LOG_INDEX}'...")
+    errors = rollup.ErrorRollup(LOG_INDEX)
+    if engine == "numpy":
+        logs = iter_log_rows(rng, scale, rate, errors)
+    else:
+        logs = errors.tap(iter_logs(scale, rate))
+    stream = alerting.AlertStream() if alerts and alerting.has_rules() else None
+    log_count = bulk_index(LOG_INDEX, stream.tap(logs, raw=engine == "numpy") if stream else logs,
+                           raw=engine == "numpy")
+    if stream:
+        stats = stream.close()
+        print(f"  [OK] Alerts: {stream.summary()}"
+              + (f" ({stats.total_failed} writes failed)" if stats.total_failed else ""))
+    elif alerts:
+        print("  [--] Alerts: no enabled rules in alert-rules (or exporting); not percolated")
+
+    print(f"Writing {len(errors):,} per-minute error rollups to '{rollup.ROLLUP_INDEX}'...")
+    rollup_count = bulk_index(rollup.ROLLUP_INDEX, errors.docs())
+
+    print(f"Streaming metrics ({metric_estimate:,} docs) to '{METRICS_INDEX}'...")
+    if engine == "numpy":
+        metric_count = bulk_index(METRICS_INDEX, iter_metric_rows(rng, scale), raw=True)
+    else:
+        metric_count = bulk_index(METRICS_INDEX, iter_metrics(scale))
 
     total = log_count + metric_count
     print(f"\nDone! Generated {total} total documents")
-    print(f"  {LOG_INDEX}: {len(normal_logs) + len(incident_logs)} documents")
-    print(f"  {METRICS_INDEX}: {len(normal_metrics) + len(incident_metrics)} documents")
+    print(f"  {LOG_INDEX}: {log_count} documents")
+    print(f"  {METRICS_INDEX}: {metric_count} documents")
+    print(f"  {rollup.ROLLUP_INDEX}: {rollup_count} rollup rows")
     print(f"\nIncident scenario: Database connection pool exhaustion")
     print(f"  Started: ~1 hour ago | Root cause: db-primary-01")
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the connection-pool exhaustion incident scenario.")
+    parser.add_argument("--scale", type=int, default=1,
+                        help="Replicate services/hosts into N cells (multiplies total volume by N)")
+    parser.add_argument("--rate", type=int, default=1,
+                        help="Multiply per-service log event counts by R")
+    parser.add_argument("--engine", choices=("python", "numpy"), default="python",
+                        help="python: per-document dicts; numpy: column-wise generation (default: python)")
+    parser.add_argument("--no-alerts", dest="alerts", action="store_false",
+                        help="Do not percolate the logs against alert-rules while indexing them")
+    datagen.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    run()
+    args = parse_args()
+    datagen.apply_export(args)
+    run(scale=args.scale, rate=args.rate, seed=args.seed, anchor_time=args.anchor_time, engine=args.engine,
+        alerts=args.alerts)
@@ -13,27 +13,22 @@ Usage:
     export ES_URL="https://your-es-instance.elastic.cloud:443"
     export ES_API_KEY="your-api-key"
     python3 generate-infra-metrics.py
+    python3 generate-infra-metrics.py --engine numpy   # column-wise (needs numpy)
+    python3 generate-infra-metrics.py --seed 42 --anchor-time 2025-01-15T12:00:00Z  # reproducible
 """
 
-import json
+import argparse
 import os
 import random
-import sys
 from datetime import datetime, timedelta, timezone
 
-try:
-    import requests
-except ImportError:
-    print("Install requests: pip install requests")
-    sys.exit(1)
+import columnar
+import datagen
+import es_bulk
 
 ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
 ES_API_KEY = os.environ.get("ES_API_KEY", "")
 
-HEADERS = {"Content-Type": "application/json"}
-if ES_API_KEY:
-    HEADERS["Authorization"] = f"ApiKey {ES_API_KEY}"
-
 # ---------------------------------------------------------------------------
 # Configuration
 # ---------------------------------------------------------------------------
@@ -58,34 +53,26 @@ NOW = datetime.now(timezone.utc)
 INCIDENT_START = NOW - timedelta(hours=1)
 NORMAL_START = NOW - timedelta(hours=3)
 
-BATCH_SIZE = 500
+
+def configure(seed=None, anchor_time=None):
+    """Pin the random state and the timeline anchor (see datagen.py)."""
+    global NOW, INCIDENT_START, NORMAL_START
+    datagen.seed_random(seed)
+    NOW = datagen.anchor(anchor_time)
+    INCIDENT_START = NOW - timedelta(hours=1)
+    NORMAL_START = NOW - timedelta(hours=3)
 
 
 # ---------------------------------------------------------------------------
 # Bulk indexing
 # ---------------------------------------------------------------------------
-def bulk_index(index, docs):
-    """Index documents using the Bulk API."""
-    body_lines = []
-    for doc in docs:
-        body_lines.append(json.dumps({"index": {"_index": index}}))
-        body_lines.append(json.dumps(doc))
-    body = "\n".join(body_lines) + "\n"
-
-    resp = requests.post(
-        f"{ES_URL}/_bulk",
-        headers={**HEADERS, "Content-Type": "application/x-ndjson"},
-        data=body,
-    )
-    result = resp.json()
-    errors = result.get("errors", False)
-    items = result.get("items", [])
-    success = sum(1 for i in items if i.get("index", {}).get("status", 0) < 300)
-    if errors:
-        err_count = sum(1 for i in items if i.get("index", {}).get("error"))
-        print(f"  Indexed {success}/{len(docs)} docs into {index} ({err_count} errors)")
+def bulk_index(index, docs, raw=False):
+    """Index documents through the shared pooled bulk client (see es_bulk.py)."""
+    stats = es_bulk.bulk_index(index, docs, raw=raw)
+    if stats.total_failed:
+        print(f"  Indexed {stats.total_indexed}/{len(docs)} docs into {index} ({stats.total_failed} errors)")
     else:
-        print(f"  Indexed {success}/{len(docs)} docs into {index}")
+        print(f"  Indexed {stats.total_indexed}/{len(docs)} docs into {index}")
 
 
 def get_service_for_host(host):
@@ -175,10 +162,57 @@ def generate_incident_metrics():
     return metrics
 
 
+# ---------------------------------------------------------------------------
+# Column-wise engine (--engine numpy): same distributions, one array per field
+# ---------------------------------------------------------------------------
+def _host_rows(rng, host, start, cpu, mem, disk, net_max):
+    """Render one host's per-minute series as raw JSON source lines."""
+    n = len(cpu)
+    service = get_service_for_host(host)
+    epoch_ms = int(start.timestamp() * 1000) + columnar.np.arange(n) * 60_000
+
+    def const(value):
+        return columnar.np.full(n, columnar.json_vocab([value])[0], dtype=object)
+
+    return columnar.render_rows([
+        ("@timestamp", columnar.iso_timestamps(epoch_ms)),
+        ("host.name", const(host)),
+        ("service.name", const(service)),
+        ("system.cpu.total.pct", cpu, "%r"),
+        ("system.memory.used.pct", mem, "%r"),
+        ("system.memory.total", const(17179869184 if host.startswith("db-") else 8589934592)),
+        ("system.disk.used.pct", disk, "%r"),
+        ("system.network.in.bytes", columnar.randint(rng, 100_000, net_max, n), "%d"),
+        ("system.network.out.bytes", columnar.randint(rng, 100_000, net_max, n), "%d"),
+        ("container.name", const(f"{host}-container")),
+        ("kubernetes.pod.name", const(f"{service}-{host}-pod")),
+        ("cloud.region", const("us-east-1")),
+    ])
+
+
+def generate_metrics_columnar(seed=None):
+    """Return (normal_rows, incident_rows) as raw NDJSON source lines."""
+    rng = columnar.make_rng(seed)
+    normal, incident = [], []
+    minutes = columnar.np.arange(60)
+    for host in HOSTS:
+        normal += _host_rows(
+            rng, host, NORMAL_START,
+            columnar.rounded(rng.uniform(0.12, 0.40, 120), 3),
+            columnar.rounded(rng.uniform(0.35, 0.60, 120), 3),
+            columnar.rounded(rng.uniform(0.25, 0.45, 120), 3),
+            5_000_000,
+        )
+        cpu, mem, disk = columnar.incident_host_curves(rng, host, minutes)
+        incident += _host_rows(rng, host, INCIDENT_START, cpu, mem, disk, 10_000_000)
+    return normal, incident
+
+
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
-def main():
+def main(engine="python", seed=None, anchor_time=None):
+    configure(seed, anchor_time)
     print("=" * 60)
     print("  Infrastructure Metrics Generator")
     print("=" * 60)
@@ -186,22 +220,24 @@ def main():
     print(f"  Auth:      {'API Key configured' if ES_API_KEY else 'No auth (local dev)'}")
     print(f"  Hosts:     {', '.join(HOSTS)}")
     print(f"  Services:  {', '.join(SERVICES)}")
+    print(f"  Data:      {datagen.describe(seed, anchor_time)}")
     print("=" * 60)
 
-    print("\nPhase 1: Normal metrics (2 hours, 720 docs)...")
-    normal_metrics = generate_normal_metrics()
+    if engine == "numpy":
+        print("\nGenerating normal + incident metrics column-wise (numpy engine)...")
+        normal_metrics, incident_metrics = generate_metrics_columnar(seed)
+    else:
+        print("\nPhase 1: Normal metrics (2 hours, 720 docs)...")
+        normal_metrics = generate_normal_metrics()
 
-    print("Phase 2: Incident metrics (1 hour, 360 docs)...")
-    incident_metrics = generate_incident_metrics()
+        print("Phase 2: Incident metrics (1 hour, 360 docs)...")
+        incident_metrics = generate_incident_metrics()
 
     all_metrics = normal_metrics + incident_metrics
     total = len(all_metrics)
     print(f"\nIndexing {total} metric documents to Elasticsearch...\n")
 
-    # Index in batches
-    for i in range(0, len(all_metrics), BATCH_SIZE):
-        batch = all_metrics[i:i + BATCH_SIZE]
-        bulk_index("infra-metrics", batch)
+    bulk_index("infra-metrics", all_metrics, raw=engine == "numpy")
 
     print(f"\nDone! Generated {total} infrastructure metric documents")
     print(f"  Normal period:   {len(normal_metrics)} docs (2 hours baseline)")
@@ -211,5 +247,15 @@ def main():
     print(f"  Cascade: db-primary-01 -> app-01/app-02 -> web-01/web-02")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate infrastructure metrics data")
+    parser.add_argument("--engine", choices=("python", "numpy"), default="python",
+                        help="python: per-document dicts; numpy: column-wise generation (default: python)")
+    datagen.add_arguments(parser)
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    datagen.apply_export(args)
+    main(engine=args.engine, seed=args.seed, anchor_time=args.anchor_time)
@@ -5,35 +5,48 @@ generate-knowledge-base.py -- Generate past incident records for the incident-kn
 Creates 5 realistic past incident entries that the hybrid_rag_search tool
 can query against for similar-incident lookup during triage.
 
+Each incident is indexed under an id derived from its title, so re-running
+overwrites it, and its semantic_text values go through embedcache.py:
+unchanged text is sent with the inference results ES computed last time, so
+only new or edited incidents are embedded.
+
 Usage:
     export ES_URL="https://your-es-instance.elastic.cloud:443"
     export ES_API_KEY="your-api-key"
     python3 generate-knowledge-base.py
+    python3 generate-knowledge-base.py --seed 42 --anchor-time 2025-01-15T12:00:00Z  # reproducible
 """
 
-import json
+import argparse
+import hashlib
 import os
 import random
-import sys
 from datetime import datetime, timedelta, timezone
 
-try:
-    import requests
-except ImportError:
-    print("Install requests: pip install requests")
-    sys.exit(1)
+import datagen
+import embedcache
+import es_bulk
 
 ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
 ES_API_KEY = os.environ.get("ES_API_KEY", "")
 
-HEADERS = {"Content-Type": "application/json"}
-if ES_API_KEY:
-    HEADERS["Authorization"] = f"ApiKey {ES_API_KEY}"
-
 INDEX = "incident-knowledge"
 
 NOW = datetime.now(timezone.utc)
 
+
+def configure(seed=None, anchor_time=None):
+    """Pin the random state and the timeline anchor (see datagen.py)."""
+    global NOW
+    datagen.seed_random(seed)
+    NOW = datagen.anchor(anchor_time)
+
+
+def incident_id(incident):
+    """Stable document id of an incident: re-indexing it overwrites, edits included."""
+    return hashlib.sha1(incident["title"].encode()).hexdigest()[:20]
+
+
 # ---------------------------------------------------------------------------
 # Incident records
 # ---------------------------------------------------------------------------
@@ -147,13 +160,15 @@ INCIDENTS = [
 ]
 
 
-def run():
+def run(seed=None, anchor_time=None):
     """Generate and index incident knowledge base entries."""
+    configure(seed, anchor_time)
     print("=" * 60)
     print("  Incident Knowledge Base Generator")
     print("=" * 60)
     print(f"  ES URL: {ES_URL}")
     print(f"  Index:  {INDEX}")
+    print(f"  Data:   {datagen.describe(seed, anchor_time)}")
     print("=" * 60)
 
     docs = []
@@ -171,28 +186,28 @@ def run():
         }
         docs.append(doc)
 
-    # Bulk index
-    body = ""
-    for doc in docs:
-        body += json.dumps({"index": {"_index": INDEX}}) + "\n"
-        body += json.dumps(doc) + "\n"
-
-    resp = requests.post(
-        f"{ES_URL}/_bulk",
-        headers={**HEADERS, "Content-Type": "application/x-ndjson"},
-        data=body,
-    )
-    result = resp.json()
-    if result.get("errors"):
-        err_count = sum(1 for item in result["items"] if item["index"].get("error"))
-        print(f"\n  Indexed with {err_count} errors")
+    # Bulk index through the shared pooled client, reusing cached embeddings
+    ids = [incident_id(incident) for incident in INCIDENTS]
+    with embedcache.SemanticCache(INDEX) as cache:
+        stats = es_bulk.bulk_index(INDEX, (cache.fill(doc, doc_id) for doc, doc_id in zip(docs, ids)), ids=ids)
+    if stats.total_failed:
+        print(f"\n  Indexed with {stats.total_failed} errors")
     else:
-        print(f"\n  [OK] Indexed {len(docs)} incident records to '{INDEX}'")
+        print(f"\n  [OK] Indexed {stats.total_indexed} incident records to '{INDEX}'")
+    print(f"  [OK] {cache.summary()}")
 
     print(f"\nDone! Generated {len(docs)} incident knowledge entries")
     for inc in INCIDENTS:
         print(f"  - {inc['title']} ({inc['severity']}, MTTR: {inc['mttr_minutes']}min)")
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate past incident records.")
+    datagen.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    run()
+    args = parse_args()
+    datagen.apply_export(args)
+    run(seed=args.seed, anchor_time=args.anchor_time)
@@ -11,23 +11,13 @@ Usage:
     python3 generate-service-owners.py
 """
 
-import json
 import os
-import sys
 
-try:
-    import requests
-except ImportError:
-    print("Install requests: pip install requests")
-    sys.exit(1)
+import es_bulk
 
 ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
 ES_API_KEY = os.environ.get("ES_API_KEY", "")
 
-HEADERS = {"Content-Type": "application/json"}
-if ES_API_KEY:
-    HEADERS["Authorization"] = f"ApiKey {ES_API_KEY}"
-
 INDEX = "service-owners"
 
 # ---------------------------------------------------------------------------
@@ -85,8 +75,8 @@ SERVICE_OWNERS = [
 ]
 
 
-def run():
-    """Generate and index service owner records."""
+def run(seed=None, anchor_time=None):
+    """Generate and index service owner records (static data; the arguments are accepted for a uniform run() signature)."""
     print("=" * 60)
     print("  Service Owners Generator")
     print("=" * 60)
@@ -94,18 +84,12 @@ def run():
     print(f"  Index:  {INDEX}")
     print("=" * 60)
 
-    # Index each service owner individually (small count, simpler to debug)
+    # One bulk request through the shared client (also lets --export-dir capture it)
+    stats = es_bulk.bulk_index(INDEX, SERVICE_OWNERS)
+    if stats.total_failed:
+        print(f"  [ERR] {stats.total_failed} records failed: {stats.errors[:1]}")
     for doc in SERVICE_OWNERS:
-        resp = requests.post(
-            f"{ES_URL}/{INDEX}/_doc",
-            headers=HEADERS,
-            json=doc,
-        )
-        status = resp.status_code
-        if 200 <= status < 300:
-            print(f"  [OK] {doc['service_name']} -> {doc['owner_team']} ({doc['slack_channel']})")
-        else:
-            print(f"  [ERR] {doc['service_name']} -> HTTP {status}: {resp.text[:200]}")
+        print(f"  - {doc['service_name']} -> {doc['owner_team']} ({doc['slack_channel']})")
 
     print(f"\nDone! Generated {len(SERVICE_OWNERS)} service owner records")
 
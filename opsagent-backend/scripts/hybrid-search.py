@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+hybrid-search.py -- Run hybrid incident search and tune its RRF settings.
+
+Search mode runs one query the way hybrid_rag_search does (hybrid.py):
+FORK/FUSE on clusters that support it, otherwise the lexical and semantic
+legs concurrently, fused client-side with the same RRF formula.
+
+--evaluate sweeps --rank-constants x --depths (hits per leg) over a labelled
+query set and measures, for every configuration:
+
+  - recall@k: the share of each query's relevant incidents in the top --k,
+    averaged over queries. Each query's legs are fetched once at the largest
+    depth and fused here at every (depth, rank_constant), so the sweep costs
+    one round trip per query -- fusing a leg list cut to `depth` ranks exactly
+    as FUSE does with LIMIT depth in each branch.
+  - latency: the full search, timed --runs times per query at each depth
+    (p50 and p95, ms, and how far the p50 of one run strays from another's).
+    The rank constant does not change the work done, so configurations at
+    one depth share a timing.
+
+Depths start at 20, the result_count maximum hybrid_rag_search documents:
+shallower legs cannot fill a full page. The configuration chosen is the
+fastest whose recall is within --tolerance of the best one found (ties go to
+the higher recall, then to the rank constant closer to 60) -- unless the one
+tools/hybrid_rag_search.json already uses is also within tolerance and the
+fastest beats its p50 by no more than the run-to-run spread, in which case it
+is kept. --apply writes the choice into the tool; the next
+register-tools-and-agents.py run pushes the changed query.
+
+Query sets:
+  - --queries FILE: {"queries": [{"query": ..., "relevant": [...]}]}, each
+    relevant entry an incident title or _id. The default,
+    setup/eval/hybrid-queries.json, covers the built-in incidents.
+  - --known-item N: N queries made from a run of words in the description
+    of N sampled incidents (--seed), each relevant only to its own incident.
+    Suits a large imported knowledge base with no labels.
+
+Point ES_URL at the cluster itself, not at esql-cache-proxy.py, or repeated
+runs time the cache.
+
+Usage:
+    export ES_URL="https://your-es-instance.elastic.cloud:443"
+    export ES_API_KEY="your-api-key"
+    python3 hybrid-search.py "payment timeouts under peak load"
+    python3 hybrid-search.py "redis failover" --mode client --rank-constant 20 --depth 10 --k 10
+    python3 hybrid-search.py --evaluate
+    python3 hybrid-search.py --evaluate --known-item 200 --seed 7 --output sweep.json --apply
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import re
+import sys
+import time
+
+import hybrid
+
+ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
+ES_API_KEY = os.environ.get("ES_API_KEY", "")
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+TOOL_FILE = os.path.join(SCRIPT_DIR, "..", "tools", "hybrid_rag_search.json")
+QUERIES_FILE = os.path.join(SCRIPT_DIR, "..", "setup", "eval", "hybrid-queries.json")
+
+RANK_CONSTANTS = "1,5,10,20,40,60,100"
+DEPTHS = "20,30,50,100"
+MIN_DEPTH = 20              # hybrid_rag_search's result_count maximum; shallower legs cannot fill it
+K = 5
+RUNS = 3
+TOLERANCE = 0.01
+KNOWN_ITEM_WORDS = 8        # words of description per known-item query
+SAMPLE_ROWS = 10000         # incidents read to sample known items from
+
+
+def _load_module(filename):
+    """Import a sibling script by filename (supports hyphens in names)."""
+    filepath = os.path.join(SCRIPT_DIR, filename)
+    module_name = filename.replace("-", "_").removesuffix(".py")
+    spec = importlib.util.spec_from_file_location(module_name, filepath)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+bench = _load_module("benchmark-tools.py")
+
+
+# ---------------------------------------------------------------------------
+# Query sets
+# ---------------------------------------------------------------------------
+def load_queries(path):
+    """[{"query", "relevant"}] from a labelled query file."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    queries = [{"query": q["query"], "relevant": set(q["relevant"])} for q in data["queries"] if q.get("relevant")]
+    if not queries:
+        raise SystemExit(f"{path}: no labelled queries")
+    return queries
+
+
+def known_items(search, count, seed):
+    """`count` queries cut from the descriptions of sampled incidents, each relevant to its own."""
+    rows = search.esql(f"FROM {search.index} METADATA _id | WHERE description IS NOT NULL "
+                       f"| KEEP _id, description | LIMIT {SAMPLE_ROWS}", {})
+    rng = random.Random(seed)
+    rows = [row for row in rows if len(row["description"].split()) >= KNOWN_ITEM_WORDS]
+    queries = []
+    for row in rng.sample(rows, min(count, len(rows))):
+        words = row["description"].split()
+        start = rng.randrange(len(words) - KNOWN_ITEM_WORDS + 1)
+        queries.append({"query": " ".join(words[start:start + KNOWN_ITEM_WORDS]), "relevant": {row["_id"]}})
+    if not queries:
+        raise SystemExit(f"{search.index}: no incidents with a description of {KNOWN_ITEM_WORDS}+ words")
+    return queries
+
+
+# ---------------------------------------------------------------------------
+# Evaluation
+# ---------------------------------------------------------------------------
+def recall_at(fused, titles, relevant, k):
+    """Share of `relevant` labels (ids or titles) matched by the top `k` fused ids."""
+    found = set()
+    for doc_id, _ in fused[:k]:
+        found.update(label for label in relevant if label in (doc_id, titles.get(doc_id)))
+    return len(found) / len(relevant)
+
+
+def evaluate(search, queries, rank_constants, depths, k, runs):
+    """One result dict per (depth, rank_constant): recall@k and the depth's latency summary."""
+    ranked = []
+    for q in queries:
+        legs = search.legs(q["query"], max(depths))
+        titles = {row["_id"]: row.get("title") for rows in legs.values() for row in rows}
+        ranked.append(([[row["_id"] for row in rows] for rows in legs.values()], titles, q["relevant"]))
+
+    results = []
+    for depth in depths:
+        latencies, run_p50s = [], []
+        for _ in range(runs):
+            run_latencies = []
+            for q in queries:
+                started = time.perf_counter()
+                search.search(q["query"], k, depth=depth)
+                run_latencies.append((time.perf_counter() - started) * 1000)
+            latencies += run_latencies
+            run_p50s.append(bench.percentile(run_latencies, 50))
+        latency = {**bench.summarize(latencies), "p50_spread": round(max(run_p50s) - min(run_p50s), 2)}
+        for rank_constant in rank_constants:
+            recall = sum(recall_at(hybrid.rrf(rankings, rank_constant, depth), titles, relevant, k)
+                         for rankings, titles, relevant in ranked) / len(ranked)
+            results.append({"rank_constant": rank_constant, "depth": depth,
+                            "recall": round(recall, 4), "latency_ms": latency})
+    return results
+
+
+def choose(results, tolerance, current=None):
+    """
+    The fastest configuration whose recall is within `tolerance` of the best,
+    or `current` (depth, rank_constant) when it is within tolerance too and
+    the fastest is not quicker by more than either one's p50 spread.
+    """
+    best = max(r["recall"] for r in results)
+    keep = [r for r in results if r["recall"] >= best - tolerance]
+    fastest = min(keep, key=lambda r: (r["latency_ms"]["p50"], -r["recall"],
+                                       abs(r["rank_constant"] - hybrid.RANK_CONSTANT), r["depth"]))
+    kept = next((r for r in keep if (r["depth"], r["rank_constant"]) == current), None)
+    if kept is None:
+        return fastest
+    gain = kept["latency_ms"]["p50"] - fastest["latency_ms"]["p50"]
+    noise = max(kept["latency_ms"]["p50_spread"], fastest["latency_ms"]["p50_spread"])
+    return kept if gain <= noise else fastest
+
+
+def current_config(path=TOOL_FILE):
+    """(leg depth, rank constant) the hybrid_rag_search query uses now."""
+    with open(path, encoding="utf-8") as f:
+        query = json.load(f)["configuration"]["query"]
+    depth = re.search(r"LIMIT (\d+)\)", query)
+    rank_constant = re.search(r'"rank_constant": (\d+)', query)
+    return (int(depth.group(1)) if depth else hybrid.DEPTH,
+            int(rank_constant.group(1)) if rank_constant else hybrid.RANK_CONSTANT)
+
+
+def apply(config, path=TOOL_FILE):
+    """Write a configuration's leg depth and rank constant into the hybrid_rag_search query."""
+    with open(path, encoding="utf-8") as f:
+        tool = json.load(f)
+    query = tool["configuration"]["query"]
+    query = re.sub(r"LIMIT \d+\)", f"LIMIT {config['depth']})", query)
+    query = re.sub(r'"rank_constant": \d+', f'"rank_constant": {config["rank_constant"]}', query)
+    changed = query != tool["configuration"]["query"]
+    tool["configuration"]["query"] = query
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(tool, f, indent=2)
+        f.write("\n")
+    return changed
+
+
+def print_sweep(results, rank_constants, depths, k, chosen):
+    print(f"\n--- recall@{k} (rows: hits per leg, columns: rank_constant) ---")
+    print("  depth " + "".join(f"{c:>8}" for c in rank_constants) + "    p50 ms    p95 ms")
+    by_key = {(r["depth"], r["rank_constant"]): r for r in results}
+    for depth in depths:
+        cells = ""
+        for c in rank_constants:
+            mark = "*" if (depth, c) == (chosen["depth"], chosen["rank_constant"]) else " "
+            cells += f"{by_key[depth, c]['recall']:>7.3f}{mark}"
+        latency = by_key[depth, rank_constants[0]]["latency_ms"]
+        print(f"  {depth:>5} {cells}{latency['p50']:>10.1f}{latency['p95']:>10.1f}")
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+def int_list(text):
+    try:
+        values = sorted({int(v) for v in text.split(",") if v.strip()})
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated integers, got {text!r}")
+    if not values or values[0] < 1:
+        raise argparse.ArgumentTypeError(f"expected positive integers, got {text!r}")
+    return values
+
+
+def run_search(search, text, k):
+    rows = search.search(text, k)
+    print(f"\n--- {len(rows)} results ({search.mode}-side RRF) ---")
+    for i, row in enumerate(rows, 1):
+        print(f"  {i:>2}. {row['_score']:.4f}  [{row.get('severity') or '-'}] {row.get('title')}")
+        if row.get("resolution"):
+            print(f"      resolution: {str(row['resolution'])[:100]}")
+    return 0 if rows else 1
+
+
+def run_evaluate(search, args):
+    if args.known_item:
+        queries = known_items(search, args.known_item, args.seed)
+        source = f"{len(queries)} known-item queries (seed {args.seed})"
+    else:
+        queries = load_queries(args.queries)
+        source = f"{len(queries)} labelled queries from {os.path.relpath(args.queries)}"
+    print(f"\n  {source}; {len(args.rank_constants)} rank constants x {len(args.depths)} depths, "
+          f"{args.runs} timed runs, {search.mode}-side RRF")
+    results = evaluate(search, queries, args.rank_constants, args.depths, args.k, args.runs)
+    depth, rank_constant = current_config()
+    chosen = choose(results, args.tolerance, (depth, rank_constant))
+    print_sweep(results, args.rank_constants, args.depths, args.k, chosen)
+
+    best = max(results, key=lambda r: r["recall"])
+    current = next((r for r in results if (r["depth"], r["rank_constant"]) == (depth, rank_constant)), None)
+    print(f"\n  Best recall@{args.k}: {best['recall']:.3f}")
+    if current:
+        print(f"  Current (depth {depth}, rank_constant {rank_constant}): "
+              f"recall {current['recall']:.3f}, p50 {current['latency_ms']['p50']:.1f} ms "
+              f"(+/- {current['latency_ms']['p50_spread']:.1f} run to run)")
+    print(f"  Chosen  (depth {chosen['depth']}, rank_constant {chosen['rank_constant']}): "
+          f"recall {chosen['recall']:.3f}, p50 {chosen['latency_ms']['p50']:.1f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"queries": source, "k": args.k, "tolerance": args.tolerance, "mode": search.mode,
+                       "chosen": chosen, "results": results}, f, indent=2)
+        print(f"  [OK] Sweep written to {args.output}")
+    if args.apply:
+        changed = apply(chosen)
+        print(f"  [OK] {os.path.relpath(TOOL_FILE)} "
+              f"{'updated; re-run register-tools-and-agents.py' if changed else 'already uses this configuration'}")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Hybrid incident search with client-side RRF, and RRF tuning.")
+    parser.add_argument("query", nargs="?", help="Search text (omit with --evaluate)")
+    parser.add_argument("--mode", choices=hybrid.MODES, default="auto",
+                        help="server = FORK/FUSE, client = legs fused here, auto = server when supported")
+    parser.add_argument("--k", type=int, default=K, help=f"Results returned / recall cut-off (default: {K})")
+    parser.add_argument("--rank-constant", type=int, default=hybrid.RANK_CONSTANT,
+                        help=f"RRF rank constant for a search (default: {hybrid.RANK_CONSTANT})")
+    parser.add_argument("--depth", type=int, default=hybrid.DEPTH,
+                        help=f"Hits per leg for a search (default: {hybrid.DEPTH})")
+    parser.add_argument("--evaluate", action="store_true", help="Sweep rank constants and depths over a query set")
+    parser.add_argument("--queries", default=QUERIES_FILE, metavar="FILE",
+                        help="Labelled query set (default: setup/eval/hybrid-queries.json)")
+    parser.add_argument("--known-item", type=int, default=0, metavar="N",
+                        help="Evaluate on N queries sampled from indexed descriptions instead")
+    parser.add_argument("--seed", type=int, default=0, help="Sampling seed for --known-item (default: 0)")
+    parser.add_argument("--rank-constants", type=int_list, default=int_list(RANK_CONSTANTS),
+                        help=f"Rank constants to sweep (default: {RANK_CONSTANTS})")
+    parser.add_argument("--depths", type=int_list, default=int_list(DEPTHS),
+                        help=f"Hits per leg to sweep (default: {DEPTHS})")
+    parser.add_argument("--runs", type=int, default=RUNS, help=f"Timed runs per query and depth (default: {RUNS})")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help=f"Recall the chosen configuration may give up against the best (default: {TOLERANCE})")
+    parser.add_argument("--output", metavar="FILE", help="Write every configuration's results as JSON")
+    parser.add_argument("--apply", action="store_true", help="Write the chosen configuration into the tool")
+    args = parser.parse_args(argv)
+    if not args.evaluate and not args.query:
+        parser.error("give a query, or --evaluate")
+    if args.depths[0] < MIN_DEPTH:
+        parser.error(f"--depths below {MIN_DEPTH} cannot fill hybrid_rag_search's result_count maximum")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print("=" * 60)
+    print("  Hybrid Search" + (" Evaluation" if args.evaluate else ""))
+    print("=" * 60)
+    print(f"  ES URL:  {ES_URL}")
+    print(f"  Auth:    {'API Key configured' if ES_API_KEY else 'No auth (local dev)'}")
+    print(f"  Index:   {hybrid.INDEX}")
+    if not args.evaluate:
+        print(f"  Query:   {args.query}")
+        print(f"  RRF:     rank_constant {args.rank_constant}, {args.depth} hits per leg")
+    print("=" * 60)
+    try:
+        with hybrid.HybridSearch(args.rank_constant, args.depth, args.mode) as search:
+            sys.exit(run_evaluate(search, args) if args.evaluate else run_search(search, args.query, args.k))
+    except RuntimeError as exc:
+        print(f"  [ERR] {exc}")
+        sys.exit(1)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+hybrid.py -- Hybrid incident search with a client-side RRF fallback.
+
+hybrid_rag_search runs two retrieval legs over incident-knowledge -- lexical
+MATCH on title and semantic MATCH on semantic_description -- and fuses them
+with Reciprocal Rank Fusion (FORK ... | FUSE RRF). A HybridSearch runs the
+same search from Python on any cluster:
+
+  - "server": the FORK/FUSE query, as the tool runs it.
+  - "client": the two legs as separate ES|QL queries, in flight at once, fused
+    here: a document's score is the sum over the legs that returned it of
+    1 / (rank_constant + rank), rank counted from 1 -- the formula FUSE RRF
+    uses, so both modes rank the same documents the same way.
+  - "auto" (default): probe FORK/FUSE once and use the server when it works.
+
+`depth` is how many hits each leg contributes (the LIMIT inside each FORK
+branch) and `rank_constant` how quickly a lower rank stops counting; a small
+constant lets a leg's top hit dominate, a large one rewards documents both
+legs found. hybrid-search.py --evaluate sweeps the two against labelled
+queries.
+
+Usage (from a sibling script):
+    import hybrid
+
+    with hybrid.HybridSearch(rank_constant=60, depth=20) as search:
+        for row in search.search("payment timeouts under peak load", k=5):
+            print(row["_score"], row["title"])
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import es_bulk
+
+INDEX = "incident-knowledge"
+RANK_CONSTANT = 60
+DEPTH = 20
+FIELDS = ["title", "description", "resolution", "root_cause", "severity", "category",
+          "affected_services", "mttr_minutes"]
+
+# leg name -> field it matches; FORK branch order
+LEGS = {"lexical": "title", "semantic": "semantic_description"}
+
+LEG_QUERY = ("FROM {index} METADATA _score, _id | WHERE MATCH({field}, ?query) | SORT _score DESC "
+             "| LIMIT {depth} | KEEP _id, _score, {fields}")
+FUSED_QUERY = ("FROM {index} METADATA _score, _id, _index | FORK {branches} "
+               "| FUSE RRF WITH {{\"rank_constant\": {rank_constant}}} | SORT _score DESC "
+               "| LIMIT ?result_count | KEEP _id, {fields}, _score")
+BRANCH = "(WHERE MATCH({field}, ?query) | SORT _score DESC | LIMIT {depth})"
+PROBE = ('FROM {index} METADATA _score, _id, _index | FORK (WHERE MATCH(title, "probe")) '
+         '(WHERE MATCH(semantic_description, "probe")) | FUSE RRF | LIMIT 0')
+MODES = ("auto", "server", "client")
+
+
+def rrf(rankings, rank_constant=RANK_CONSTANT, depth=None):
+    """
+    Fuse ranked id lists. Each list counts down to `depth` (all of it when
+    None). Returns [(id, score)], best first; ties keep first-seen order.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking[:depth], start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rank_constant + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+def fused_query(rank_constant=RANK_CONSTANT, depth=DEPTH, index=INDEX):
+    """The FORK/FUSE query for one configuration (?query and ?result_count params)."""
+    branches = " ".join(BRANCH.format(field=field, depth=depth) for field in LEGS.values())
+    return FUSED_QUERY.format(index=index, branches=branches, rank_constant=rank_constant, fields=", ".join(FIELDS))
+
+
+class HybridSearch:
+    """Lexical + semantic search over incident-knowledge, fused with RRF on the server or here."""
+
+    def __init__(self, rank_constant=RANK_CONSTANT, depth=DEPTH, mode="auto", index=INDEX,
+                 es_url=None, session=None):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        self.rank_constant, self.depth, self.index = rank_constant, depth, index
+        self.es_url = es_url or es_bulk.ES_URL
+        self.session = session or es_bulk.get_session(len(LEGS))
+        self.owns_session = session is None
+        self.server = None if mode == "auto" else mode == "server"
+        self.pool = ThreadPoolExecutor(max_workers=len(LEGS))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    @property
+    def mode(self):
+        """The mode in use, "server" or "client"; auto mode probes the cluster on first use."""
+        if self.server is None:
+            resp = self.session.post(f"{self.es_url}/_query", json={"query": PROBE.format(index=self.index)},
+                                     timeout=es_bulk.REQUEST_TIMEOUT)
+            self.server = resp.status_code == 200
+        return "server" if self.server else "client"
+
+    def esql(self, query, params):
+        """Run an ES|QL query. Returns a list of row dicts; raises RuntimeError on failure."""
+        body = {"query": query, "params": [{k: v} for k, v in params.items()]}
+        resp = self.session.post(f"{self.es_url}/_query", json=body, timeout=es_bulk.REQUEST_TIMEOUT)
+        if resp.status_code != 200:
+            raise RuntimeError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+        data = resp.json()
+        names = [c["name"] for c in data["columns"]]
+        return [dict(zip(names, row)) for row in data["values"]]
+
+    def legs(self, text, depth=None):
+        """{leg name: ranked rows} for `text`, every leg in flight at once."""
+        depth = depth or self.depth
+        futures = {
+            name: self.pool.submit(self.esql, LEG_QUERY.format(index=self.index, field=field, depth=depth,
+                                                               fields=", ".join(FIELDS)), {"query": text})
+            for name, field in LEGS.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+    def search(self, text, k=5, depth=None, rank_constant=None):
+        """The top `k` fused rows for `text`, each with its RRF _score and _id."""
+        depth = depth or self.depth
+        rank_constant = self.rank_constant if rank_constant is None else rank_constant
+        if self.mode == "server":
+            return self.esql(fused_query(rank_constant, depth, self.index), {"query": text, "result_count": k})
+        legs = self.legs(text, depth)
+        rows = {}
+        for leg_rows in legs.values():
+            for row in leg_rows:
+                rows.setdefault(row["_id"], row)
+        fused = rrf([[row["_id"] for row in leg_rows] for leg_rows in legs.values()], rank_constant)
+        return [{**{f: rows[doc_id].get(f) for f in FIELDS}, "_id": doc_id, "_score": score}
+                for doc_id, score in fused[:k]]
+
+    def close(self):
+        self.pool.shutdown()
+        if self.owns_session:
+            self.session.close()
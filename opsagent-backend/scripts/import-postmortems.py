@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+import-postmortems.py -- Bulk load directories of postmortems into the incident-knowledge index.
+
+Walks the given files and directories for Markdown (.md, .markdown) and JSON
+(.json, .jsonl, .ndjson) postmortems and streams them into incident-knowledge:
+
+  - parse + normalise + MinHash signature (postmortem.py) run on a pool of
+    --workers processes, files handed out in chunks as the walk finds them
+    (a few chunks per worker in flight, so the walk never runs far ahead)
+  - near-duplicates are dropped as they arrive: a postmortem whose
+    estimated Jaccard similarity to one already kept is at least
+    --threshold is skipped (the first one found wins; --no-dedup keeps all)
+  - kept documents go straight to a pooled, concurrent BulkClient through
+    embedcache.py, so re-importing a directory only embeds new or edited
+    text; each is indexed under its own id, or one derived from its title
+    and date, so re-imports overwrite instead of duplicating
+
+Records without a title and a description are counted as rejected. --dry-run
+parses and deduplicates without writing and --show N prints the first N
+documents; --report FILE writes each rejected file and each duplicate with
+the id it duplicates as JSON lines.
+
+Usage:
+    export ES_URL="https://your-es-instance.elastic.cloud:443"
+    export ES_API_KEY="your-api-key"
+    python3 import-postmortems.py postmortems/
+    python3 import-postmortems.py postmortems/ archive/2023.jsonl --workers 8 --threshold 0.85
+    python3 import-postmortems.py postmortems/ --dry-run --show 3 --report dupes.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import embedcache
+import es_bulk
+import postmortem
+
+ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
+ES_API_KEY = os.environ.get("ES_API_KEY", "")
+
+INDEX = "incident-knowledge"
+CHUNK_FILES = 64            # files per task handed to a worker
+CHUNKS_PER_WORKER = 2       # chunks in flight per worker; bounds memory on huge trees
+PROGRESS_FILES = 5000
+
+
+def walk(paths):
+    """Yield the postmortem files under `paths` (files are taken as given), in a stable order."""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in postmortem.EXTENSIONS:
+                    yield os.path.join(root, name)
+
+
+def chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def bounded_map(pool, fn, items, depth):
+    """
+    pool.map without submitting everything up front: at most `depth` tasks
+    are in flight, and results are yielded in input order.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= depth:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def process(paths, dedup=True):
+    """
+    Parse and normalise a chunk of files (in a worker). Returns a list of
+    (path, doc id, doc, signature) -- doc None when the record was rejected,
+    with the reason in place of the id.
+    """
+    out = []
+    for path in paths:
+        try:
+            records = postmortem.parse_file(path)
+        except (OSError, ValueError) as exc:
+            out.append((path, f"unreadable: {exc}", None, None))
+            continue
+        for raw in records:
+            normalised = postmortem.normalise(raw)
+            if normalised is None:
+                out.append((path, "no title or description", None, None))
+                continue
+            doc_id, doc = normalised
+            out.append((path, doc_id, doc, postmortem.signature(doc) if dedup else None))
+    return out
+
+
+def run(paths, workers=1, dedup=True, threshold=postmortem.THRESHOLD, dry_run=False, show=0, report=None):
+    """Import every postmortem under `paths`. Returns (documents kept, bulk failures)."""
+    if dedup:
+        postmortem.require_numpy()
+    seen = postmortem.Dedup(threshold) if dedup else None
+    report_file = open(report, "w", encoding="utf-8") if report else None
+    files = kept = rejected = duplicates = failed = 0
+    ids = set()
+    progress = PROGRESS_FILES
+    started = time.monotonic()
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    batches = chunks(walk(paths), CHUNK_FILES)
+    if pool:
+        results = bounded_map(pool, partial(process, dedup=dedup), batches, workers * CHUNKS_PER_WORKER)
+    else:
+        results = (process(batch, dedup) for batch in batches)
+
+    cache = writer = None
+    if not dry_run:
+        cache = embedcache.SemanticCache(INDEX)
+        writer = es_bulk.open_writer(tag="postmortems")
+    try:
+        for result in results:
+            files += len({path for path, *_ in result})
+            for path, doc_id, doc, sig in result:
+                if doc is None:
+                    rejected += 1
+                    if report_file:
+                        report_file.write(json.dumps({"file": path, "rejected": doc_id}) + "\n")
+                    continue
+                original = seen.add(doc_id, sig) if seen else None
+                if original is not None:
+                    duplicates += 1
+                    if report_file:
+                        report_file.write(json.dumps({"file": path, "id": doc_id, "duplicate_of": original}) + "\n")
+                    continue
+                kept += 1
+                ids.add(doc_id)
+                if kept <= show:
+                    print(json.dumps({"_id": doc_id, **{k: v for k, v in doc.items()
+                                                          if not k.startswith("semantic_")}}, indent=2))
+                if writer:
+                    writer.index(INDEX, cache.fill(doc, doc_id), doc_id=doc_id)
+            if files >= progress:
+                progress += PROGRESS_FILES
+                print(f"  ... {files:,} files, {kept:,} kept, {duplicates:,} duplicates "
+                      f"({time.monotonic() - started:.0f}s)")
+    finally:
+        if pool:
+            pool.shutdown()
+        if writer:
+            writer.close()
+        if cache:
+            cache.close()
+        if report_file:
+            report_file.close()
+
+    elapsed = time.monotonic() - started
+    print(f"\n  Files:      {files:,} ({files / max(elapsed, 1e-9):,.0f}/s)")
+    print(f"  Kept:       {kept:,} ({len(ids):,} distinct ids)")
+    print(f"  Duplicates: {duplicates:,}" + (f" (threshold {threshold})" if dedup else " (dedup off)"))
+    print(f"  Rejected:   {rejected:,}")
+    if writer:
+        stats = writer.stats
+        failed = stats.total_failed
+        status = f"{stats.total_failed} failed" if stats.total_failed else "OK"
+        print(f"  [{'ERR' if stats.total_failed else 'OK'}] Indexed {stats.total_indexed:,} into {INDEX} ({status})")
+        print(f"  [OK] {cache.summary()}")
+        for error in stats.errors[:3]:
+            print(f"  Error: {error}")
+    print(f"\nDone in {elapsed:.1f}s")
+    return kept, failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk load Markdown/JSON postmortems into incident-knowledge.")
+    parser.add_argument("paths", nargs="+", metavar="PATH", help="Postmortem files or directories (recursive)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Parsing processes; 0 = one per CPU core (default: 0)")
+    parser.add_argument("--threshold", type=float, default=postmortem.THRESHOLD,
+                        help=f"Estimated Jaccard similarity at which a postmortem is a duplicate "
+                             f"(default: {postmortem.THRESHOLD})")
+    parser.add_argument("--no-dedup", dest="dedup", action="store_false", help="Keep near-duplicates")
+    parser.add_argument("--dry-run", action="store_true", help="Parse and deduplicate, write nothing")
+    parser.add_argument("--show", type=int, default=0, metavar="N", help="Print the first N documents")
+    parser.add_argument("--report", metavar="FILE", help="Write rejected files and duplicates as JSON lines")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    workers = args.workers or os.cpu_count()
+    print("=" * 60)
+    print("  Postmortem Import")
+    print("=" * 60)
+    print(f"  ES URL:  {ES_URL}")
+    print(f"  Auth:    {'API Key configured' if ES_API_KEY else 'No auth (local dev)'}")
+    print(f"  Index:   {INDEX}{' (dry run)' if args.dry_run else ''}")
+    print(f"  Sources: {', '.join(args.paths)}")
+    print(f"  Workers: {workers}")
+    print("=" * 60)
+    kept, failed = run(args.paths, workers, args.dedup, args.threshold, args.dry_run, args.show, args.report)
+    sys.exit(0 if kept and not failed else 1)
@@ -5,14 +5,25 @@ load-runbooks.py — Load IT operations runbooks into Elasticsearch
 These runbooks serve as the agent's knowledge base for diagnosis and remediation.
 Ported from ElasticSearch_hack-main/scripts/02_load_runbooks.py.
 
+Each runbook is prepared for the runbook tools at ingest:
+  - category is normalised (trimmed, lowercased, aliases such as "db" mapped
+    to their category), so search_runbooks compares the keyword as stored
+    instead of running TO_LOWER over every document
+  - symptoms is copied to semantic_symptoms (semantic_text, through
+    embedcache.py); the mapping adds symptoms.prefix (edge n-grams) and
+    symptoms.shingles (word pairs and triples) for search_runbooks_by_symptom
+  - the document id is derived from the title, so re-running overwrites
+
 Usage:
     export ES_URL="https://your-es-instance.elastic.cloud:443"
     export ES_API_KEY="your-api-key"
     python3 load-runbooks.py
 """
 
+import hashlib
 import json
 import os
+import re
 import sys
 
 try:
@@ -21,6 +32,9 @@ except ImportError:
     print("Install requests: pip install requests")
     sys.exit(1)
 
+import embedcache
+import es_bulk
+
 ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
 ES_API_KEY = os.environ.get("ES_API_KEY", "")
 
@@ -28,6 +42,20 @@ HEADERS = {"Content-Type": "application/json"}
 if ES_API_KEY:
     HEADERS["Authorization"] = f"ApiKey {ES_API_KEY}"
 
+INDEX = "runbooks"
+
+# Spellings seen in hand-written runbooks -> the category the tools search for.
+CATEGORY_ALIASES = {
+    "db": "database",
+    "databases": "database",
+    "app": "application",
+    "applications": "application",
+    "infra": "infrastructure",
+    "micro-services": "microservices",
+    "microservice": "microservices",
+    "sec": "security",
+}
+
 RUNBOOKS = [
     {
         "title": "Database Connection Pool Exhaustion",
@@ -112,6 +140,28 @@ RUNBOOKS = [
 ]
 
 
+def normalise_category(value):
+    """' Micro Services' -> 'microservices'-style canonical category (None stays None)."""
+    if not isinstance(value, str):
+        return value
+    category = re.sub(r"[\s_]+", "-", value.strip().lower())
+    category = CATEGORY_ALIASES.get(category, category)
+    return CATEGORY_ALIASES.get(category.replace("-", ""), category)
+
+
+def runbook_id(runbook):
+    """Stable document id for a runbook (sha1 of its title)."""
+    return hashlib.sha1(runbook["title"].encode()).hexdigest()[:20]
+
+
+def prepare(runbook):
+    """The document indexed for one runbook: normalised category, semantic_symptoms."""
+    doc = dict(runbook, category=normalise_category(runbook.get("category")))
+    if doc.get("symptoms"):
+        doc["semantic_symptoms"] = doc["symptoms"]
+    return doc
+
+
 def create_index():
     """Create the runbooks index with mappings if it doesn't exist."""
     mapping_path = os.path.join(
@@ -133,6 +183,7 @@ def create_index():
                     "category": {"type": "keyword"},
                     "severity": {"type": "keyword"},
                     "symptoms": {"type": "text"},
+                    "semantic_symptoms": {"type": "semantic_text"},
                     "root_cause": {"type": "text"},
                     "remediation_steps": {"type": "text"},
                     "prevention": {"type": "text"},
@@ -155,27 +206,19 @@ def create_index():
 
 
 def bulk_load():
-    """Load all runbooks using the Bulk API."""
-    body_lines = []
-    for runbook in RUNBOOKS:
-        body_lines.append(json.dumps({"index": {"_index": "runbooks"}}))
-        body_lines.append(json.dumps(runbook))
-    body = "\n".join(body_lines) + "\n"
-
-    resp = requests.post(
-        f"{ES_URL}/_bulk",
-        headers={**HEADERS, "Content-Type": "application/x-ndjson"},
-        data=body,
-    )
-    result = resp.json()
+    """Load all runbooks through the shared pooled bulk client."""
+    ids = [runbook_id(rb) for rb in RUNBOOKS]
+    with embedcache.SemanticCache(INDEX) as cache:
+        docs = (cache.fill(prepare(rb), doc_id) for rb, doc_id in zip(RUNBOOKS, ids))
+        stats = es_bulk.bulk_index(INDEX, docs, ids=ids)
 
-    if result.get("errors"):
+    if stats.total_failed:
         print("[FAIL] Some errors occurred during indexing:")
-        for item in result["items"]:
-            if item["index"].get("error"):
-                print(f"  Error: {item['index']['error']}")
+        for error in stats.errors:
+            print(f"  Error: {error}")
     else:
-        print(f"[OK] Loaded {len(RUNBOOKS)} runbooks into 'runbooks' index")
+        print(f"[OK] Loaded {stats.total_indexed} runbooks into 'runbooks' index")
+    print(f"[OK] {cache.summary()}")
 
 
 def verify():
@@ -0,0 +1,2268 @@
+#!/usr/bin/env python3
+"""
+local_es.py -- In-process Elasticsearch stand-in for running the data scripts offline.
+
+Serves the slice of the Elasticsearch REST API that the scripts in this
+directory and the ES|QL tools in ../tools use, backed by an in-memory
+columnar store (one Python list per field per index):
+
+  - _bulk (chunked and gzip bodies; index / create / update / delete)
+  - index create / delete / HEAD / GET, _mapping, _settings, _count,
+    _search (query DSL subset, including ids and multi-document percolate),
+    _delete_by_query, _refresh
+  - _index_template (applied when an index is auto-created), _ilm/policy,
+    _alias / _aliases, _rollover, _reindex, _cat/indices
+  - _transform: pivot transforms (terms / date_histogram group_by; count,
+    avg, sum, min, max, cardinality, filter, percentiles, bucket_script),
+    batch or continuous with checkpoints every `frequency`, and _stats
+  - semantic_text in the 8.x _source format: indexing plain text runs a
+    stand-in "inference" (token weights, --inference-ms each) and stores it
+    as {"text", "inference"}; indexing that object back reuses it, so
+    precomputed embeddings can be exercised (Index.inferred counts the texts
+    embedded)
+  - _query: an ES|QL subset covering the shapes in tools/*.json -- FROM
+    (wildcards, METADATA), WHERE, EVAL, STATS ... BY, SORT, LIMIT, KEEP, DROP,
+    RENAME and LOOKUP JOIN, with MATCH (BM25), CASE, DATE_TRUNC, BUCKET,
+    CATEGORIZE and the usual scalar/aggregate functions. MATCH splits on word
+    characters and lowercases, then applies the edge_ngram and shingle
+    filters of a field's (or multi-field's) analyzer and search_analyzer
+
+FORK / FUSE are rejected with a parsing_exception, like a cluster that predates
+them, so the *_fallback tools can be exercised too. Nothing is persisted and
+there is no ILM runner (rollover happens only on an explicit _rollover).
+
+_query responses carry `took` and `documents_found` (rows read by FROM), so
+tool cost can be measured without cloud latency. --reject-rate answers a share
+of bulk items with 429 to exercise BulkClient's retry and batch sizing.
+
+Usage:
+    python3 local_es.py --port 9200 --now 2025-01-15T12:00:00Z
+    python3 local_es.py --port 9200 --load-corpus corpus/ --reject-rate 0.05
+
+    export ES_URL=http://localhost:9200
+    python3 create-indices.py --no-confirm
+    python3 generate-all-data.py --seed 42 --anchor-time 2025-01-15T12:00:00Z
+
+--load-corpus indexes straight into the store, before any template exists, so
+fields get dynamic mappings (strings become text); to keep the setup/ mappings,
+run create-indices.py against the server and then replay-corpus.py instead.
+
+From another script (e.g. a benchmark), start it on a free port:
+    import local_es
+    server, url = local_es.start()
+"""
+
+import argparse
+import fnmatch
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import datagen
+
+VERSION = "8.17.0-local"
+DEFAULT_LIMIT = 1000   # ES|QL's implicit LIMIT
+MAX_LIMIT = 10000
+DEFAULT_INFERENCE_ID = ".elser-2-elasticsearch"
+
+TYPES = {
+    "keyword": "keyword", "constant_keyword": "keyword", "wildcard": "keyword",
+    "text": "text", "match_only_text": "text", "semantic_text": "text",
+    "long": "long", "integer": "integer", "short": "integer", "byte": "integer",
+    "double": "double", "float": "double", "half_float": "double", "scaled_float": "double",
+    "date": "date", "date_nanos": "date", "boolean": "boolean", "ip": "ip",
+}
+NUMERIC = ("integer", "long", "double")
+
+
+class EsError(Exception):
+    """An error answered with Elasticsearch's error body and status."""
+
+    def __init__(self, status, type_, reason):
+        super().__init__(reason)
+        self.status = status
+        self.type = type_
+        self.reason = reason
+
+    def body(self):
+        cause = {"type": self.type, "reason": self.reason}
+        return {"error": dict(cause, root_cause=[cause]), "status": self.status}
+
+
+# ---------------------------------------------------------------------------
+# Value helpers
+# ---------------------------------------------------------------------------
+def flatten(doc, prefix="", leaves=()):
+    """
+    {"service": {"name": "x"}} -> {"service.name": "x"}; arrays are kept as
+    values, and so are objects under a mapped leaf field (e.g. a percolator query).
+    """
+    flat = {}
+    for key, value in doc.items():
+        path = prefix + key
+        if isinstance(value, dict) and path not in leaves:
+            flat.update(flatten(value, path + ".", leaves))
+        else:
+            flat[path] = value
+    return flat
+
+
+def parse_date(value):
+    """ISO-8601 string or epoch millis -> epoch millis."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp() * 1000)
+
+
+def format_date(ms):
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def looks_like_date(value):
+    if len(value) < 10 or value[4:5] != "-" or value[7:8] != "-":
+        return False
+    try:
+        parse_date(value)
+        return True
+    except ValueError:
+        return False
+
+
+def convert(value, type_):
+    """Coerce a source value to the stored representation of a field type."""
+    if value is None:
+        return None
+    if isinstance(value, list):
+        values = [convert(v, type_) for v in value if v is not None]
+        return values if len(values) > 1 else (values[0] if values else None)
+    if type_ == "date":
+        return parse_date(value)
+    if type_ in ("long", "integer"):
+        return int(value) if not isinstance(value, str) else int(float(value))
+    if type_ == "double":
+        return float(value)
+    if type_ == "boolean":
+        return value if isinstance(value, bool) else str(value).lower() == "true"
+    if type_ in ("keyword", "text", "ip"):
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        return value if isinstance(value, str) else json.dumps(value) if isinstance(value, dict) else str(value)
+    return value
+
+
+def dynamic_type(value):
+    """Type for an unmapped field, following Elasticsearch's dynamic mapping rules."""
+    if isinstance(value, list):
+        return next((dynamic_type(v) for v in value if v is not None), None)
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "long"
+    if isinstance(value, float):
+        return "double"
+    if isinstance(value, str):
+        return "date" if looks_like_date(value) else "text"
+    return None
+
+
+DURATION_UNITS = {
+    "ms": 1, "millisecond": 1, "milliseconds": 1,
+    "s": 1000, "second": 1000, "seconds": 1000, "sec": 1000,
+    "m": 60000, "minute": 60000, "minutes": 60000, "min": 60000,
+    "h": 3600000, "hour": 3600000, "hours": 3600000,
+    "d": 86400000, "day": 86400000, "days": 86400000,
+    "w": 604800000, "week": 604800000, "weeks": 604800000,
+}
+PERIOD_UNITS = {"month": 1, "months": 1, "quarter": 3, "quarters": 3, "year": 12, "years": 12}
+
+
+def parse_interval(text):
+    """'5 minutes' -> ("ms", 300000); '1 month' -> ("months", 1)."""
+    match = re.fullmatch(r"\s*(\d+)\s*([A-Za-z]+)\s*", str(text))
+    if match:
+        amount, unit = int(match.group(1)), match.group(2).lower()
+        if unit in DURATION_UNITS:
+            return "ms", amount * DURATION_UNITS[unit]
+        if unit in PERIOD_UNITS:
+            return "months", amount * PERIOD_UNITS[unit]
+    raise EsError(400, "verification_exception", f"Cannot convert string [{text}] to time interval")
+
+
+def truncate_date(ms, interval):
+    kind, size = interval
+    if kind == "ms":
+        return ms - ms % size
+    ts = datetime.fromtimestamp(ms / 1000, timezone.utc)
+    months = (ts.year * 12 + ts.month - 1) // size * size
+    return int(datetime(months // 12, months % 12 + 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def shift_date(ms, interval, sign):
+    kind, size = interval
+    if kind == "ms":
+        return ms + sign * size
+    ts = datetime.fromtimestamp(ms / 1000, timezone.utc)
+    months = ts.year * 12 + ts.month - 1 + sign * size
+    return int(ts.replace(year=months // 12, month=months % 12 + 1).timestamp() * 1000)
+
+
+def tokenize(text):
+    return re.findall(r"\w+", text.lower()) if isinstance(text, str) else []
+
+
+# ---------------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------------
+def field_types(properties, prefix=""):
+    """Mapping properties (dotted or nested) -> {field: ES|QL type}, including multi-fields."""
+    types = {}
+    for name, spec in properties.items():
+        path = prefix + name
+        if "properties" in spec:
+            types.update(field_types(spec["properties"], path + "."))
+            continue
+        types[path] = TYPES.get(spec.get("type"), "unsupported")
+        for sub, sub_spec in spec.get("fields", {}).items():
+            types[f"{path}.{sub}"] = TYPES.get(sub_spec.get("type"), "unsupported")
+    return types
+
+
+def semantic_fields(properties, prefix=""):
+    """Mapping properties -> {semantic_text field: inference_id}."""
+    fields = {}
+    for name, spec in properties.items():
+        if "properties" in spec:
+            fields.update(semantic_fields(spec["properties"], prefix + name + "."))
+        elif spec.get("type") == "semantic_text":
+            fields[prefix + name] = spec.get("inference_id", DEFAULT_INFERENCE_ID)
+    return fields
+
+
+def sparse_inference(text, inference_id):
+    """Stand-in for an ELSER call: one chunk weighted by token frequency."""
+    counts = {}
+    for token in tokenize(text):
+        counts[token] = counts.get(token, 0) + 1
+    return {"inference_id": inference_id, "model_settings": {"task_type": "sparse_embedding"},
+            "chunks": [{"text": text, "embeddings": {t: round(1 + math.log(c), 4) for t, c in counts.items()}}]}
+
+
+def edge_ngrams(tokens, min_gram, max_gram):
+    return [t[:n] for t in tokens for n in range(min_gram, min(max_gram, len(t)) + 1)]
+
+
+def shingles(tokens, min_size, max_size, unigrams):
+    out = list(tokens) if unigrams else []
+    for size in range(min_size, max_size + 1):
+        out.extend(" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1))
+    return out
+
+
+TOKEN_FILTERS = {
+    "edge_ngram": lambda tokens, spec: edge_ngrams(tokens, int(spec.get("min_gram", 1)),
+                                                   int(spec.get("max_gram", 2))),
+    "shingle": lambda tokens, spec: shingles(tokens, int(spec.get("min_shingle_size", 2)),
+                                             int(spec.get("max_shingle_size", 2)),
+                                             str(spec.get("output_unigrams", True)).lower() == "true"),
+}
+
+
+def analyzer(name, settings):
+    """
+    text -> tokens for an analyzer named in the mapping: word characters,
+    lowercased, then the custom analyzer's edge_ngram and shingle filters
+    (other filters, and the tokenizer, are ignored).
+    """
+    steps = []
+    for filter_name in settings.get(f"analysis.analyzer.{name}.filter", []):
+        prefix = f"analysis.filter.{filter_name}."
+        spec = {k.removeprefix(prefix): v for k, v in settings.items() if k.startswith(prefix)}
+        step = TOKEN_FILTERS.get(spec.get("type", filter_name))
+        if step:
+            steps.append((step, spec))
+
+    def analyze(text):
+        tokens = tokenize(text)
+        for step, spec in steps:
+            tokens = step(tokens, spec)
+        return tokens
+    return analyze
+
+
+def field_analyzers(properties, settings, prefix=""):
+    """Mapping properties -> {field: (index analyzer, search analyzer)} for fields (and multi-fields) naming one."""
+    analyzers = {}
+    for name, spec in properties.items():
+        path = prefix + name
+        if "properties" in spec:
+            analyzers.update(field_analyzers(spec["properties"], settings, path + "."))
+            continue
+        subfields = [(f"{path}.{sub}", sub_spec) for sub, sub_spec in spec.get("fields", {}).items()]
+        for field, field_spec in [(path, spec)] + subfields:
+            if "analyzer" in field_spec or "search_analyzer" in field_spec:
+                index_side = analyzer(field_spec.get("analyzer", "standard"), settings)
+                search_side = analyzer(field_spec["search_analyzer"], settings) \
+                    if "search_analyzer" in field_spec else index_side
+                analyzers[field] = (index_side, search_side)
+    return analyzers
+
+
+def expand_properties(properties):
+    """Dotted property names -> nested objects, as GET /<index> reports them."""
+    out = {}
+    for name, spec in properties.items():
+        spec = dict(spec)
+        if "properties" in spec:
+            spec["properties"] = expand_properties(spec["properties"])
+        *parents, leaf = name.split(".")
+        node = out
+        for parent in parents:
+            node = node.setdefault(parent, {}).setdefault("properties", {})
+        node.setdefault(leaf, {}).update(spec)
+    return out
+
+
+def merge_properties(target, properties):
+    """Merge `properties` into the expanded mapping `target` in place."""
+    for name, spec in expand_properties(properties).items():
+        if "properties" in spec and "properties" in target.get(name, {}):
+            merge_properties(target[name]["properties"], spec["properties"])
+        else:
+            target[name] = spec
+
+
+def flatten_settings(settings, prefix=""):
+    flat = {}
+    for key, value in settings.items():
+        if isinstance(value, dict):
+            flat.update(flatten_settings(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}".removeprefix("index.")] = value
+    return flat
+
+
+def nest_settings(flat):
+    """Dotted settings -> {"index": {...}} with string (or list of string) values, as Elasticsearch returns them."""
+    out = {}
+    for key, value in flat.items():
+        *parents, leaf = key.split(".")
+        node = out
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[leaf] = setting_string(value)
+    return {"index": out}
+
+
+def setting_string(value):
+    """One setting value as Elasticsearch returns it: strings, lists of strings."""
+    if isinstance(value, (list, tuple)):
+        return [setting_string(v) for v in value]
+    return json.dumps(value) if isinstance(value, bool) else str(value)
+
+
+class Index:
+    """One index: a list per field, positions aligned with `ids`."""
+
+    inference_ms = 0.0   # simulated cost of embedding one semantic_text value
+
+    def __init__(self, name, settings=None, mappings=None):
+        self.name = name
+        self.settings = {"number_of_shards": 1, "number_of_replicas": 1}
+        self.settings.update(flatten_settings(settings or {}))
+        self.mapping = {}
+        self.types = {}
+        self.columns = {}
+        self.ids = []
+        self.positions = {}  # _id -> position
+        self.deleted = 0
+        self.semantic = {}   # semantic_text field -> inference_id
+        self.inference = {}  # position -> {semantic_text field: inference results}
+        self.analyzers = {}  # field -> (index analyzer, search analyzer), for MATCH
+        self.inferred = 0
+        self.put_mapping(mappings or {})
+
+    def put_mapping(self, mappings):
+        merge_properties(self.mapping, mappings.get("properties", {}))
+        self.semantic.update(semantic_fields(mappings.get("properties", {})))
+        self.analyzers.update(field_analyzers(mappings.get("properties", {}), self.settings))
+        for field, type_ in field_types(mappings.get("properties", {})).items():
+            self._add_field(field, type_)
+
+    def _add_field(self, field, type_):
+        self.types[field] = type_
+        if field not in self.columns:
+            parent = field.rsplit(".", 1)[0]
+            if parent in self.columns and self.types.get(parent) in ("text", "keyword"):
+                self.columns[field] = self.columns[parent]  # multi-field shares its parent's values
+            else:
+                self.columns[field] = [None] * len(self.ids)
+
+    def _stored_fields(self):
+        seen = set()
+        for field, column in self.columns.items():
+            if id(column) not in seen:
+                seen.add(id(column))
+                yield field, column
+
+    @property
+    def count(self):
+        return len(self.ids) - self.deleted
+
+    def put(self, doc_id, source, op="index"):
+        """Store one document. Returns (status, result)."""
+        flat = flatten(source, leaves=self.types)
+        inference = {}
+        for field in self.semantic:
+            if flat.get(field) is not None:
+                flat[field], inference[field] = self._infer(field, flat[field])
+        converted = {}
+        for field, value in flat.items():
+            type_ = self.types.get(field)
+            if type_ is None:
+                type_ = dynamic_type(value)
+                if type_ is None:
+                    continue
+                self._add_field(field, type_)
+                merge_properties(self.mapping, {field: {"type": type_}})
+                if type_ == "text":
+                    self._add_field(field + ".keyword", "keyword")
+                    merge_properties(self.mapping, {field: {"type": "text", "fields": {
+                        "keyword": {"type": "keyword", "ignore_above": 256}}}})
+            try:
+                converted[field] = convert(value, type_)
+            except (TypeError, ValueError):
+                raise EsError(400, "document_parsing_exception",
+                              f"failed to parse field [{field}] of type [{type_}]")
+
+        pos = self.positions.get(doc_id)
+        if pos is not None and op == "create":
+            raise EsError(409, "version_conflict_engine_exception",
+                          f"[{doc_id}]: version conflict, document already exists")
+        if pos is None:
+            pos = len(self.ids)
+            self.ids.append(doc_id)
+            self.positions[doc_id] = pos
+            for _, column in self._stored_fields():
+                column.append(None)
+            result, status = "created", 201
+        else:
+            result, status = "updated", 200
+            for _, column in self._stored_fields():
+                column[pos] = None
+        for field, value in converted.items():
+            self.columns[field][pos] = value
+        if inference:
+            self.inference[pos] = inference
+        else:
+            self.inference.pop(pos, None)
+        return status, result
+
+    def _infer(self, field, value):
+        """(text, inference results) of a semantic_text value, reusing results sent with it."""
+        if isinstance(value, dict):
+            results = value.get("inference") or {}
+            if results.get("inference_id") != self.semantic[field]:
+                raise EsError(400, "document_parsing_exception",
+                              f"field [{field}] carries inference results for "
+                              f"[{results.get('inference_id')}], not [{self.semantic[field]}]")
+            return value.get("text"), results
+        text = value if isinstance(value, str) else json.dumps(value)
+        self.inferred += 1
+        if self.inference_ms:
+            time.sleep(self.inference_ms / 1000)
+        return text, sparse_inference(text, self.semantic[field])
+
+    def _with_inference(self, pos, doc):
+        for field, results in self.inference.get(pos, {}).items():
+            if field in doc:
+                doc[field] = {"text": doc[field], "inference": results}
+        return doc
+
+    def get(self, doc_id):
+        """The stored fields of a document as a flat dict, or None."""
+        pos = self.positions.get(doc_id)
+        if pos is None:
+            return None
+        return self._with_inference(pos, {f: c[pos] for f, c in self._stored_fields() if c[pos] is not None})
+
+    def delete(self, doc_id):
+        pos = self.positions.pop(doc_id, None)
+        if pos is None:
+            return False
+        self.ids[pos] = None
+        for _, column in self._stored_fields():
+            column[pos] = None
+        self.inference.pop(pos, None)
+        self.deleted += 1
+        return True
+
+    def source(self, pos):
+        """Rebuild a document (flat dotted keys, JSON-ready values) for _reindex."""
+        doc = {}
+        for field, column in self._stored_fields():
+            value = column[pos]
+            if value is not None:
+                doc[field] = render(value, self.types[field])
+        return self._with_inference(pos, doc)
+
+    def live_positions(self):
+        if not self.deleted:
+            return range(len(self.ids))
+        return [pos for pos, doc_id in enumerate(self.ids) if doc_id is not None]
+
+    def describe(self, aliases):
+        return {"aliases": aliases, "mappings": {"properties": self.mapping},
+                "settings": nest_settings(dict(self.settings, provided_name=self.name))}
+
+
+class Cluster:
+    """Indices, aliases, templates and ILM policies behind one lock."""
+
+    def __init__(self, now=None, reject_rate=0.0, inference_ms=0.0):
+        self.lock = threading.RLock()
+        self.indices = {}
+        self.aliases = {}    # alias -> {index: {"is_write_index": bool}}
+        self.templates = {}
+        self.policies = {}
+        self.transforms = {}
+        self.now = now
+        self.reject_rate = reject_rate
+        self.inference_ms = inference_ms
+
+    # -- name resolution ---------------------------------------------------
+    def resolve(self, expression, missing_ok=False):
+        """Comma-separated names, wildcards and aliases -> concrete index names."""
+        names = []
+        for part in expression.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            if "*" in part or "?" in part:
+                for name in sorted(self.indices):
+                    if fnmatch.fnmatchcase(name, part) and not name.startswith("."):
+                        names.append(name)
+                for alias in sorted(self.aliases):
+                    if fnmatch.fnmatchcase(alias, part):
+                        names.extend(sorted(self.aliases[alias]))
+            elif part in self.indices:
+                names.append(part)
+            elif part in self.aliases:
+                names.extend(sorted(self.aliases[part]))
+            elif not missing_ok:
+                raise EsError(404, "index_not_found_exception", f"no such index [{part}]")
+        return list(dict.fromkeys(names))
+
+    def write_index(self, name):
+        """The index a write to `name` lands in, auto-creating it from templates if needed."""
+        if name in self.indices:
+            return self.indices[name]
+        if name in self.aliases:
+            members = self.aliases[name]
+            writers = [i for i, spec in members.items() if spec.get("is_write_index")]
+            if not writers and len(members) == 1:
+                writers = list(members)
+            if not writers:
+                raise EsError(400, "illegal_argument_exception",
+                              f"no write index is defined for alias [{name}]")
+            return self.indices[writers[0]]
+        return self.create_index(name, {})
+
+    def aliases_of(self, index):
+        return {alias: {k: v for k, v in members[index].items() if v}
+                for alias, members in self.aliases.items() if index in members}
+
+    # -- indices and templates --------------------------------------------
+    def matching_template(self, name):
+        best = None
+        for tmpl_name, tmpl in self.templates.items():
+            if any(fnmatch.fnmatchcase(name, p) for p in tmpl.get("index_patterns", [])):
+                if best is None or tmpl.get("priority", 0) > best[1].get("priority", 0):
+                    best = (tmpl_name, tmpl)
+        return best[1] if best else None
+
+    def create_index(self, name, body):
+        if name in self.indices or name in self.aliases:
+            raise EsError(400, "resource_already_exists_exception", f"index [{name}] already exists")
+        settings, mappings, aliases = {}, {}, {}
+        template = self.matching_template(name)
+        if template:
+            t = template.get("template", {})
+            settings.update(flatten_settings(t.get("settings", {})))
+            mappings = {"properties": dict(t.get("mappings", {}).get("properties", {}))}
+            aliases.update(t.get("aliases", {}))
+        settings.update(flatten_settings(body.get("settings", {})))
+        mappings.setdefault("properties", {}).update(body.get("mappings", {}).get("properties", {}))
+        aliases.update(body.get("aliases", {}))
+        index = Index(name, settings, mappings)
+        index.inference_ms = self.inference_ms
+        self.indices[name] = index
+        for alias, spec in aliases.items():
+            self.aliases.setdefault(alias, {})[name] = {"is_write_index": bool(spec.get("is_write_index"))}
+        return index
+
+    def delete_index(self, expression):
+        names = self.resolve(expression)
+        for name in names:
+            del self.indices[name]
+            for alias in list(self.aliases):
+                self.aliases[alias].pop(name, None)
+                if not self.aliases[alias]:
+                    del self.aliases[alias]
+        return names
+
+    def update_aliases(self, actions):
+        for action in actions:
+            (kind, spec), = action.items()
+            if kind == "remove_index":
+                self.delete_index(spec["index"])
+                continue
+            indices = spec.get("indices") or [spec["index"]]
+            aliases = spec.get("aliases") or [spec["alias"]]
+            for index in indices:
+                for alias in aliases:
+                    if kind == "add":
+                        if index not in self.indices:
+                            raise EsError(404, "index_not_found_exception", f"no such index [{index}]")
+                        self.aliases.setdefault(alias, {})[index] = {
+                            "is_write_index": bool(spec.get("is_write_index"))}
+                    elif kind == "remove":
+                        self.aliases.get(alias, {}).pop(index, None)
+                        if alias in self.aliases and not self.aliases[alias]:
+                            del self.aliases[alias]
+
+    def rollover(self, alias):
+        old = self.write_index(alias).name
+        match = re.fullmatch(r"(.*-)(\d+)", old)
+        if not match or alias not in self.aliases:
+            raise EsError(400, "illegal_argument_exception",
+                          f"index name [{old}] does not match pattern '^.*-\\d+$'")
+        new = f"{match.group(1)}{int(match.group(2)) + 1:0{len(match.group(2))}d}"
+        self.create_index(new, {})
+        self.aliases[alias][old] = {"is_write_index": False}
+        self.aliases[alias][new] = {"is_write_index": True}
+        return {"acknowledged": True, "old_index": old, "new_index": new, "rolled_over": True}
+
+    def reindex(self, body):
+        started = time.monotonic()
+        dest = self.write_index(body["dest"]["index"])
+        created = 0
+        for name in self.resolve(body["source"]["index"]):
+            src = self.indices[name]
+            for pos in list(src.live_positions()):
+                status, _ = dest.put(src.ids[pos], src.source(pos))
+                created += status == 201
+        return {"took": int((time.monotonic() - started) * 1000), "timed_out": False,
+                "total": created, "created": created, "updated": 0, "failures": []}
+
+    # -- documents --------------------------------------------------------
+    def bulk(self, body, default_index=None):
+        started = time.monotonic()
+        lines = iter(body.splitlines())
+        items = []
+        errors = False
+        for line in lines:
+            if not line.strip():
+                continue
+            (op, meta), = json.loads(line).items()
+            source = json.loads(next(lines)) if op in ("index", "create", "update") else None
+            name = meta.get("_index", default_index)
+            doc_id = meta.get("_id")
+            item = {"_index": name, "_id": doc_id}
+            try:
+                if self.reject_rate and random.random() < self.reject_rate:
+                    raise EsError(429, "es_rejected_execution_exception",
+                                  "rejected execution of bulk item (local_es --reject-rate)")
+                item.update(self._bulk_item(op, name, doc_id, source))
+            except EsError as exc:
+                errors = True
+                item.update(status=exc.status, error={"type": exc.type, "reason": exc.reason})
+            items.append({op: item})
+        return {"took": int((time.monotonic() - started) * 1000), "errors": errors, "items": items}
+
+    def _bulk_item(self, op, name, doc_id, source):
+        if op == "delete":
+            index = self.indices.get(name) or self.write_index(name)
+            if not index.delete(doc_id):
+                return {"_index": index.name, "status": 404, "result": "not_found"}
+            return {"_index": index.name, "status": 200, "result": "deleted"}
+        index = self.write_index(name)
+        if op == "update":
+            current = index.get(doc_id)
+            if current is None and not source.get("doc_as_upsert") and "upsert" not in source:
+                raise EsError(404, "document_missing_exception", f"[{doc_id}]: document missing")
+            merged = dict(current or source.get("upsert", {}))
+            merged.update(flatten(source.get("doc", {})))
+            status, result = index.put(doc_id, merged)
+        else:
+            doc_id = doc_id or uuid.uuid4().hex[:20]
+            status, result = index.put(doc_id, source, op)
+        return {"_index": index.name, "_id": doc_id, "status": status, "result": result}
+
+    def count(self, expression, query=None):
+        total = 0
+        for name in self.resolve(expression):
+            index = self.indices[name]
+            if not query or "match_all" in query:
+                total += index.count
+            else:
+                test = compile_dsl(query, index)
+                total += sum(1 for pos in index.live_positions() if test(pos))
+        return total
+
+    def search(self, expression, body):
+        """_search: query (incl. percolate), from and size; hits in index order, score 1."""
+        hits = []
+        total = 0
+        start, size = body.get("from", 0), body.get("size", 10)
+        for name in self.resolve(expression):
+            index = self.indices[name]
+            slots = {}
+            test = compile_dsl(body.get("query") or {"match_all": {}}, index, slots)
+            for pos in index.live_positions():
+                if not test(pos):
+                    continue
+                total += 1
+                if start < total <= start + size:
+                    source = {f: v if index.types[f] == "unsupported" else render(v, index.types[f])
+                              for f, v in index.get(index.ids[pos]).items()}
+                    hit = {"_index": name, "_id": index.ids[pos], "_score": 1.0, "_source": source}
+                    if pos in slots:
+                        hit["fields"] = {"_percolator_document_slot": slots[pos]}
+                    hits.append(hit)
+        return {"took": 0, "timed_out": False, "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+                "hits": {"total": {"value": total, "relation": "eq"}, "max_score": 1.0 if hits else None,
+                         "hits": hits}}
+
+    def delete_by_query(self, expression, query=None):
+        deleted = 0
+        for name in self.resolve(expression):
+            index = self.indices[name]
+            test = compile_dsl(query or {"match_all": {}}, index)
+            for pos in [pos for pos in index.live_positions() if test(pos)]:
+                deleted += index.delete(index.ids[pos])
+        return deleted
+
+
+# ---------------------------------------------------------------------------
+# Query DSL (match_all, term(s), range, exists, match, bool, percolate)
+# ---------------------------------------------------------------------------
+def compile_dsl(query, index, slots=None):
+    """Query -> test(pos). A percolate clause records matching document slots per position in `slots`."""
+    (kind, spec), = query.items()
+    if kind == "match_all":
+        return lambda pos: True
+    if kind == "bool":
+        must = [compile_dsl(q, index, slots) for key in ("must", "filter") for q in _as_list(spec.get(key))]
+        should = [compile_dsl(q, index, slots) for q in _as_list(spec.get("should"))]
+        must_not = [compile_dsl(q, index, slots) for q in _as_list(spec.get("must_not"))]
+        return lambda pos: (all(t(pos) for t in must) and not any(t(pos) for t in must_not)
+                            and (not should or any(t(pos) for t in should)))
+    if kind == "percolate":
+        return compile_percolate(spec, index, slots)
+    if kind == "ids":
+        wanted = set(spec.get("values", []))
+        return lambda pos: index.ids[pos] in wanted
+    (field, arg), = spec.items() if kind != "exists" else ((spec["field"], None),)
+    column = index.columns.get(field, [])
+    type_ = index.types.get(field)
+    value_at = (lambda pos: column[pos]) if column else (lambda pos: None)
+
+    def values(pos):
+        value = value_at(pos)
+        return value if isinstance(value, list) else [] if value is None else [value]
+
+    if kind == "exists":
+        return lambda pos: bool(values(pos))
+    if kind in ("term", "terms"):
+        wanted = arg if kind == "terms" else [arg.get("value") if isinstance(arg, dict) else arg]
+        wanted = {convert(v, type_) if type_ else v for v in wanted}
+        return lambda pos: any(v in wanted for v in values(pos))
+    if kind == "match":
+        terms = set(tokenize(arg.get("query") if isinstance(arg, dict) else arg))
+        return lambda pos: any(terms & set(tokenize(v)) for v in values(pos))
+    if kind == "range":
+        bounds = [(op, convert(v, type_) if type_ else v) for op, v in arg.items()
+                  if op in ("gt", "gte", "lt", "lte")]
+        checks = {"gt": lambda a, b: a > b, "gte": lambda a, b: a >= b,
+                  "lt": lambda a, b: a < b, "lte": lambda a, b: a <= b}
+        return lambda pos: any(all(checks[op](v, b) for op, b in bounds) for v in values(pos))
+    raise EsError(400, "parsing_exception", f"unknown query [{kind}] (local_es supports a subset)")
+
+
+def _as_list(value):
+    return [] if value is None else value if isinstance(value, list) else [value]
+
+
+def compile_percolate(spec, index, slots):
+    """
+    percolate: index `document` / `documents` into a scratch index with the
+    percolator index's mapping, then run each stored query against it.
+    """
+    documents = spec.get("documents") or [spec["document"]]
+    scratch = Index("_percolate", mappings={"properties": index.mapping})
+    for slot, doc in enumerate(documents):
+        scratch.put(str(slot), doc)
+    column = index.columns.get(spec["field"], [])
+    compiled = {}
+
+    def test(pos):
+        stored = column[pos] if column else None
+        if not isinstance(stored, dict):
+            return False
+        key = json.dumps(stored, sort_keys=True)
+        rule = compiled.get(key)
+        if rule is None:
+            rule = compiled[key] = compile_dsl(stored, scratch)
+        matched = [slot for slot in range(len(documents)) if rule(slot)]
+        if slots is not None and matched:
+            slots[pos] = matched
+        return bool(matched)
+
+    return test
+
+
+# ---------------------------------------------------------------------------
+# ES|QL: tokenizer and parser
+# ---------------------------------------------------------------------------
+TOKEN = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<string>\"\"\".*?\"\"\"|"(?:[^"\\]|\\.)*")
+  | (?P<number>\d+\.\d*(?:[eE][+-]?\d+)?|\d+(?:[eE][+-]?\d+)?)
+  | (?P<param>\?[A-Za-z_][A-Za-z0-9_]*|\?\d*)
+  | (?P<ident>`[^`]+`|[A-Za-z_@][A-Za-z0-9_@.]*)
+  | (?P<op>==|!=|<=|>=|[<>+\-*/%(),=])
+""", re.VERBOSE | re.DOTALL)
+
+KEYWORDS = {"AND", "OR", "NOT", "IN", "IS", "NULL", "TRUE", "FALSE", "LIKE", "RLIKE",
+            "BY", "ASC", "DESC", "NULLS", "FIRST", "LAST", "AS", "ON"}
+AGGREGATES = {"COUNT", "COUNT_DISTINCT", "SUM", "AVG", "MIN", "MAX", "MEDIAN", "PERCENTILE", "VALUES"}
+COMMANDS = {"FROM", "WHERE", "EVAL", "STATS", "SORT", "LIMIT", "KEEP", "DROP", "RENAME", "LOOKUP"}
+
+
+def split_pipes(query):
+    """Split a query on top-level | (outside strings and parentheses)."""
+    parts, depth, start, i, quote = [], 0, 0, 0, None
+    while i < len(query):
+        ch = query[i]
+        if quote:
+            if query.startswith(quote, i):
+                i += len(quote) - 1
+                quote = None
+            elif ch == "\\":
+                i += 1
+        elif query.startswith('"""', i):
+            quote = '"""'
+            i += 2
+        elif ch in "\"`":
+            quote = ch
+        elif ch in "({[":
+            depth += 1
+        elif ch in ")}]":
+            depth -= 1
+        elif ch == "|" and depth == 0:
+            parts.append(query[start:i].strip())
+            start = i + 1
+        i += 1
+    parts.append(query[start:].strip())
+    return [p for p in parts if p]
+
+
+class Parser:
+    """Recursive-descent parser for one command's arguments. Expressions are tuples."""
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = []
+        pos = 0
+        while pos < len(text):
+            match = TOKEN.match(text, pos)
+            if not match:
+                raise EsError(400, "parsing_exception", f"line 1:{pos + 1}: token recognition error at: '{text[pos]}'")
+            if match.lastgroup != "ws":
+                self.tokens.append((match.lastgroup, match.group(), pos, match.end()))
+            pos = match.end()
+        self.i = 0
+
+    def peek(self, offset=0):
+        i = self.i + offset
+        return self.tokens[i] if i < len(self.tokens) else ("eof", "", len(self.text), len(self.text))
+
+    def at(self, *words):
+        kind, value = self.peek()[:2]
+        return (kind == "op" and value in words) or (kind == "ident" and value.upper() in words)
+
+    def take(self, *words):
+        if words and not self.at(*words):
+            kind, value, pos, _ = self.peek()
+            raise EsError(400, "parsing_exception",
+                          f"line 1:{pos + 1}: mismatched input '{value or '<EOF>'}' expecting {' or '.join(words)}")
+        token = self.peek()
+        self.i += 1
+        return token
+
+    def done(self):
+        return self.i >= len(self.tokens)
+
+    def field_name(self):
+        kind, value = self.take()[:2]
+        if kind != "ident":
+            raise EsError(400, "parsing_exception", f"expected a field name, found '{value}'")
+        return value.strip("`")
+
+    # -- expressions -------------------------------------------------------
+    def expression(self):
+        start = self.peek()[2]
+        node = self.or_expr()
+        return node, self.text[start:self.tokens[self.i - 1][3]].strip()
+
+    def or_expr(self):
+        node = self.and_expr()
+        while self.at("OR"):
+            self.take()
+            node = ("or", node, self.and_expr())
+        return node
+
+    def and_expr(self):
+        node = self.not_expr()
+        while self.at("AND"):
+            self.take()
+            node = ("and", node, self.not_expr())
+        return node
+
+    def not_expr(self):
+        if self.at("NOT"):
+            self.take()
+            return ("not", self.not_expr())
+        return self.predicate()
+
+    def predicate(self):
+        node = self.additive()
+        if self.at("==", "!=", "<", "<=", ">", ">="):
+            return ("cmp", self.take()[1], node, self.additive())
+        negate = False
+        if self.at("NOT") and self.peek(1)[1].upper() in ("IN", "LIKE", "RLIKE"):
+            self.take()
+            negate = True
+        if self.at("IN"):
+            self.take()
+            self.take("(")
+            items = [self.additive()]
+            while self.at(","):
+                self.take()
+                items.append(self.additive())
+            self.take(")")
+            node = ("in", node, items)
+        elif self.at("LIKE", "RLIKE"):
+            kind = self.take()[1].upper()
+            node = (kind.lower(), node, self.primary())
+        elif self.at("IS"):
+            self.take()
+            is_not = bool(self.at("NOT")) and self.take()
+            self.take("NULL")
+            return ("notnull" if is_not else "isnull", node)
+        return ("not", node) if negate else node
+
+    def additive(self):
+        node = self.multiplicative()
+        while self.at("+", "-"):
+            node = ("arith", self.take()[1], node, self.multiplicative())
+        return node
+
+    def multiplicative(self):
+        node = self.unary()
+        while self.at("*", "/", "%"):
+            node = ("arith", self.take()[1], node, self.unary())
+        return node
+
+    def unary(self):
+        if self.at("-"):
+            self.take()
+            return ("neg", self.unary())
+        return self.primary()
+
+    def primary(self):
+        kind, value, pos, _ = self.take()
+        if kind == "number":
+            number = float(value) if any(c in value for c in ".eE") else int(value)
+            nkind, nvalue = self.peek()[:2]
+            if nkind == "ident" and (nvalue.lower() in DURATION_UNITS or nvalue.lower() in PERIOD_UNITS):
+                self.take()
+                return ("const", parse_interval(f"{value} {nvalue}"), "interval")
+            return ("const", number, "double" if isinstance(number, float) else "integer")
+        if kind == "string":
+            return ("const", value[3:-3] if value.startswith('"""') else json.loads(value), "keyword")
+        if kind == "param":
+            return ("param", value[1:])
+        if kind == "op" and value == "(":
+            node = self.or_expr()
+            self.take(")")
+            return node
+        if kind == "ident":
+            word = value.upper()
+            if word == "NULL":
+                return ("const", None, "null")
+            if word in ("TRUE", "FALSE"):
+                return ("const", word == "TRUE", "boolean")
+            if self.at("(") and not value.startswith("`"):
+                self.take("(")
+                args = []
+                if self.at("*"):
+                    self.take()
+                    args.append(("star",))
+                elif not self.at(")"):
+                    args.append(self.or_expr())
+                    while self.at(","):
+                        self.take()
+                        args.append(self.or_expr())
+                self.take(")")
+                return ("call", word, args)
+            return ("field", value.strip("`"))
+        raise EsError(400, "parsing_exception", f"line 1:{pos + 1}: extraneous input '{value}'")
+
+    def assignments(self):
+        """`a = expr, expr, ...` -> [(name, node)]; unnamed expressions are named by their text."""
+        out = []
+        while True:
+            name = None
+            if self.peek()[0] == "ident" and self.peek(1)[1] == "=":
+                name = self.field_name()
+                self.take("=")
+            node, text = self.expression()
+            out.append((name or (node[1] if node[0] == "field" else text), node))
+            if not self.at(","):
+                return out
+            self.take()
+
+
+def parse_query(query):
+    """ES|QL text -> [(command, args)]."""
+    commands = []
+    for part in split_pipes(query):
+        head, _, rest = part.partition(" ")
+        word = head.upper()
+        if word not in COMMANDS:
+            raise EsError(400, "parsing_exception",
+                          f"line 1:1: mismatched input '{head}' (local_es does not implement {word})")
+        if word == "FROM":
+            sources, *metadata = re.split(r"\s+METADATA\s+", rest, maxsplit=1, flags=re.I)
+            fields = [m.strip() for m in "".join(metadata).split(",") if m.strip()]
+            commands.append(("FROM", (sources.strip(), fields)))
+        elif word in ("KEEP", "DROP"):
+            commands.append((word, [p.strip().strip("`") for p in rest.split(",") if p.strip()]))
+        elif word == "LOOKUP":
+            match = re.fullmatch(r"JOIN\s+(\S+)\s+ON\s+(.+)", rest.strip(), re.I | re.S)
+            if not match:
+                raise EsError(400, "parsing_exception", "expected LOOKUP JOIN <index> ON <field>")
+            keys = [k.strip().strip("`") for k in match.group(2).split(",")]
+            commands.append(("LOOKUP", (match.group(1), keys)))
+        else:
+            parser = Parser(rest)
+            if word == "WHERE":
+                args = parser.expression()[0]
+            elif word == "EVAL":
+                args = parser.assignments()
+            elif word == "STATS":
+                aggs = [] if parser.at("BY") else parser.assignments()
+                groups = []
+                if parser.at("BY"):
+                    parser.take()
+                    groups = parser.assignments()
+                args = (aggs, groups)
+            elif word == "SORT":
+                args = []
+                while True:
+                    node = parser.expression()[0]
+                    desc = bool(parser.at("ASC", "DESC")) and parser.take()[1].upper() == "DESC"
+                    nulls_first = desc
+                    if parser.at("NULLS"):
+                        parser.take()
+                        nulls_first = parser.take("FIRST", "LAST")[1].upper() == "FIRST"
+                    args.append((node, desc, nulls_first))
+                    if not parser.at(","):
+                        break
+                    parser.take()
+            elif word == "LIMIT":
+                args = parser.primary()
+            elif word == "RENAME":
+                args = []
+                while True:
+                    old = parser.field_name()
+                    parser.take("AS")
+                    args.append((old, parser.field_name()))
+                    if not parser.at(","):
+                        break
+                    parser.take()
+            if not parser.done():
+                kind, value, pos, _ = parser.peek()
+                raise EsError(400, "parsing_exception", f"line 1:{pos + 1}: extraneous input '{value}'")
+            commands.append((word, args))
+    if not commands or commands[0][0] != "FROM":
+        raise EsError(400, "parsing_exception", "queries must start with FROM")
+    return commands
+
+
+# ---------------------------------------------------------------------------
+# ES|QL: expression compiler. compile_expr returns (fn(row) -> value, type).
+# ---------------------------------------------------------------------------
+class Frame:
+    """Intermediate result: equally long columns plus their types, in output order."""
+
+    def __init__(self, columns, types, n, analyzers=None):
+        self.columns = columns
+        self.types = types
+        self.n = n
+        self.analyzers = analyzers or {}   # field -> (index analyzer, search analyzer)
+
+    def gather(self, rows):
+        return Frame({k: [c[r] for r in rows] for k, c in self.columns.items()}, dict(self.types), len(rows),
+                     self.analyzers)
+
+
+def _scalar_or_none(value):
+    return None if isinstance(value, list) else value
+
+
+def _arith(op, a, b, type_):
+    if a is None or b is None:
+        return None
+    if op == "+":
+        return a + b
+    if op == "-":
+        return a - b
+    if op == "*":
+        return a * b
+    if b == 0:
+        return None
+    if type_ == "double":
+        return a / b if op == "/" else math.fmod(a, b)
+    quotient = abs(a) // abs(b)  # integer division truncates toward zero, as in ES|QL
+    if (a < 0) != (b < 0):
+        quotient = -quotient
+    return quotient if op == "/" else a - quotient * b
+
+
+COMPARE = {
+    "==": lambda a, b: a == b, "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b, "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b, ">=": lambda a, b: a >= b,
+}
+
+
+class Compiler:
+    """Compiles expression tuples against a Frame, resolving params and constant-folding."""
+
+    def __init__(self, frame, params, now_ms, scorers=None):
+        self.frame = frame
+        self.params = params
+        self.now_ms = now_ms
+        self.scorers = scorers  # MATCH score columns collected by WHERE
+
+    def const(self, node):
+        """Return (True, value, type) when `node` is constant."""
+        if node[0] == "const":
+            return True, node[1], node[2]
+        if node[0] == "param":
+            name = node[1]
+            if name not in self.params:
+                raise EsError(400, "verification_exception", f"Unknown query parameter [{name}]")
+            value = self.params[name]
+            type_ = ("null" if value is None else "boolean" if isinstance(value, bool) else
+                     "integer" if isinstance(value, int) else "double" if isinstance(value, float) else "keyword")
+            return True, value, type_
+        if node[0] == "call" and node[1] == "NOW":
+            return True, self.now_ms, "date"
+        return False, None, None
+
+    def compile(self, node):
+        is_const, value, type_ = self.const(node)
+        if is_const:
+            return (lambda row: value), type_
+        kind = node[0]
+        if kind == "field":
+            name = node[1]
+            if name not in self.frame.columns:
+                raise EsError(400, "verification_exception", f"Unknown column [{name}]")
+            column = self.frame.columns[name]
+            return column.__getitem__, self.frame.types[name]
+        if kind in ("and", "or"):
+            left, _ = self.compile(node[1])
+            right, _ = self.compile(node[2])
+            if kind == "and":
+                def fn(row):
+                    a = left(row)
+                    if a is False:
+                        return False
+                    b = right(row)
+                    return False if b is False else (None if a is None or b is None else True)
+            else:
+                def fn(row):
+                    a = left(row)
+                    if a is True:
+                        return True
+                    b = right(row)
+                    return True if b is True else (None if a is None or b is None else False)
+            return fn, "boolean"
+        if kind == "not":
+            inner, _ = self.compile(node[1])
+            return (lambda row: None if (v := inner(row)) is None else not v), "boolean"
+        if kind in ("isnull", "notnull"):
+            inner, _ = self.compile(node[1])
+            want_null = kind == "isnull"
+            return (lambda row: (inner(row) is None) == want_null), "boolean"
+        if kind == "neg":
+            inner, type_ = self.compile(node[1])
+            return (lambda row: None if (v := _scalar_or_none(inner(row))) is None else -v), type_
+        if kind == "cmp":
+            return self.compile_compare(node)
+        if kind == "in":
+            return self.compile_in(node)
+        if kind in ("like", "rlike"):
+            inner, _ = self.compile(node[1])
+            ok, pattern, _ = self.const(node[2])
+            regex = (re.compile(pattern, re.S) if kind == "rlike"
+                     else re.compile(fnmatch.translate(pattern), re.S))
+            return (lambda row: None if (v := _scalar_or_none(inner(row))) is None
+                    else bool(regex.fullmatch(v))), "boolean"
+        if kind == "arith":
+            return self.compile_arith(node)
+        if kind == "call":
+            return self.compile_call(node)
+        raise EsError(400, "verification_exception", f"Unsupported expression [{kind}]")
+
+    def _coerce_const(self, node, type_):
+        """Constant strings compared with dates become epoch millis, as ES|QL casts them."""
+        is_const, value, const_type = self.const(node)
+        if is_const and const_type == "keyword" and type_ == "date":
+            return (lambda row, v=parse_date(value): v), "date"
+        return None
+
+    def compile_compare(self, node):
+        _, op, left_node, right_node = node
+        left, ltype = self.compile(left_node)
+        right, rtype = self.compile(right_node)
+        left, ltype = self._coerce_const(left_node, rtype) or (left, ltype)
+        right, rtype = self._coerce_const(right_node, ltype) or (right, rtype)
+        test = COMPARE[op]
+
+        def fn(row):
+            a = left(row)
+            b = right(row)
+            if a is None or b is None or isinstance(a, list) or isinstance(b, list):
+                return None
+            return test(a, b)
+        return fn, "boolean"
+
+    def compile_in(self, node):
+        inner, type_ = self.compile(node[1])
+        consts = [self.const(item) for item in node[2]]
+        if all(c[0] for c in consts):
+            values = {parse_date(v) if type_ == "date" and t == "keyword" else v for _, v, t in consts}
+            return (lambda row: None if (v := _scalar_or_none(inner(row))) is None else v in values), "boolean"
+        items = [self.compile(item)[0] for item in node[2]]
+        return (lambda row: None if (v := _scalar_or_none(inner(row))) is None
+                else any(v == item(row) for item in items)), "boolean"
+
+    def compile_arith(self, node):
+        _, op, left_node, right_node = node
+        left, ltype = self.compile(left_node)
+        right, rtype = self.compile(right_node)
+        # date +/- interval; interval strings such as ?time_range are cast like ES|QL does
+        if ltype == "date" and op in "+-":
+            is_const, value, const_type = self.const(right_node)
+            if not is_const or const_type not in ("interval", "keyword"):
+                raise EsError(400, "verification_exception", f"[{op}] needs a time interval on the right")
+            interval = value if const_type == "interval" else parse_interval(value)
+            sign = 1 if op == "+" else -1
+            return (lambda row: None if (v := _scalar_or_none(left(row))) is None
+                    else shift_date(v, interval, sign)), "date"
+        if ltype not in NUMERIC + ("null",) or rtype not in NUMERIC + ("null",):
+            raise EsError(400, "verification_exception",
+                          f"[{op}] has arguments with incompatible types [{ltype}] and [{rtype}]")
+        type_ = "double" if "double" in (ltype, rtype) else "long" if "long" in (ltype, rtype) else "integer"
+        return (lambda row: _arith(op, _scalar_or_none(left(row)), _scalar_or_none(right(row)), type_)), type_
+
+    def compile_call(self, node):
+        _, name, args = node
+        if name in AGGREGATES:
+            raise EsError(400, "verification_exception", f"aggregate function [{name}] is only allowed in STATS")
+        if name == "MATCH":
+            return self.compile_match(args)
+        if name == "CASE":
+            pairs = [(self.compile(args[i])[0], self.compile(args[i + 1])) for i in range(0, len(args) - 1, 2)]
+            default = self.compile(args[-1]) if len(args) % 2 else ((lambda row: None), "null")
+            type_ = next((t for _, (_, t) in pairs if t != "null"), default[1])
+            default_fn = default[0]
+
+            def case(row):
+                for cond, (value, _) in pairs:
+                    if cond(row) is True:
+                        return value(row)
+                return default_fn(row)
+            return case, type_
+        if name in ("DATE_TRUNC", "BUCKET"):
+            interval_node, field_node = (args[0], args[1]) if name == "DATE_TRUNC" else (args[1], args[0])
+            if name == "BUCKET" and len(args) != 2:
+                raise EsError(400, "verification_exception", "local_es supports BUCKET(date, interval) only")
+            is_const, value, const_type = self.const(interval_node)
+            if not is_const:
+                raise EsError(400, "verification_exception", f"{name} needs a constant interval")
+            interval = value if const_type == "interval" else parse_interval(value)
+            inner, type_ = self.compile(field_node)
+            return (lambda row: None if (v := _scalar_or_none(inner(row))) is None
+                    else truncate_date(v, interval)), "date"
+        compiled = [self.compile(a) for a in args]
+        fns = [fn for fn, _ in compiled]
+        if name == "ROUND":
+            decimals = fns[1] if len(fns) > 1 else (lambda row: 0)
+            type_ = compiled[0][1]
+            return (lambda row: None if (v := _scalar_or_none(fns[0](row))) is None
+                    else round(v, decimals(row)) if type_ == "double" else v), type_
+        if name in ("TO_LOWER", "TO_UPPER"):
+            method = str.lower if name == "TO_LOWER" else str.upper
+            return (lambda row: None if (v := _scalar_or_none(fns[0](row))) is None else method(v)), compiled[0][1]
+        if name == "ABS":
+            return (lambda row: None if (v := _scalar_or_none(fns[0](row))) is None else abs(v)), compiled[0][1]
+        if name == "LENGTH":
+            return (lambda row: None if (v := _scalar_or_none(fns[0](row))) is None else len(v)), "integer"
+        if name == "COALESCE":
+            type_ = next((t for _, t in compiled if t != "null"), "null")
+            return (lambda row: next((v for fn in fns if (v := fn(row)) is not None), None)), type_
+        if name == "CONCAT":
+            def concat(row):
+                values = [_scalar_or_none(fn(row)) for fn in fns]
+                return None if any(v is None for v in values) else "".join(map(str, values))
+            return concat, "keyword"
+        if name == "TO_STRING":
+            type_ = compiled[0][1]
+            return (lambda row: None if (v := fns[0](row)) is None else render(v, type_)
+                    if not isinstance(v, str) else v), "keyword"
+        if name == "CATEGORIZE":
+            raise EsError(400, "verification_exception", "CATEGORIZE is only allowed in STATS ... BY")
+        raise EsError(400, "verification_exception", f"Unknown function [{name}] (not in local_es)")
+
+    def compile_match(self, args):
+        """MATCH(field, query): OR of the query's terms (per the field's analyzers), scored with BM25 into _score."""
+        if self.scorers is None:
+            raise EsError(400, "verification_exception", "MATCH is only allowed in WHERE")
+        if args[0][0] != "field":
+            raise EsError(400, "verification_exception", "MATCH needs a field as first argument")
+        column, _ = self.compile(args[0])
+        is_const, text, _ = self.const(args[1])
+        if not is_const:
+            raise EsError(400, "verification_exception", "MATCH needs a constant query")
+        analyze, search = self.frame.analyzers.get(args[0][1], (tokenize, tokenize))
+        terms = set(search(text))
+        n = self.frame.n
+        docs = []
+        for row in range(n):
+            value = column(row)
+            tokens = analyze(" ".join(value) if isinstance(value, list) else value)
+            docs.append(tokens)
+        avg_len = sum(len(d) for d in docs) / n if n else 0
+        df = {t: 0 for t in terms}
+        counts = []
+        for tokens in docs:
+            tf = {}
+            for token in tokens:
+                if token in df:
+                    tf[token] = tf.get(token, 0) + 1
+            for token in tf:
+                df[token] += 1
+            counts.append(tf)
+        idf = {t: math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5)) for t in terms}
+        k1, b = 1.2, 0.75
+        scores = [sum(idf[t] * f * (k1 + 1) / (f + k1 * (1 - b + b * len(docs[row]) / (avg_len or 1)))
+                      for t, f in counts[row].items()) if counts[row] else 0.0
+                  for row in range(n)]
+        self.scorers.append(scores)
+        return (lambda row: scores[row] > 0), "boolean"
+
+
+def render(value, type_):
+    """Stored value -> JSON response value."""
+    if value is None:
+        return None
+    if isinstance(value, list):
+        return [render(v, type_) for v in value]
+    if type_ == "date":
+        return format_date(value)
+    if type_ == "double":
+        return float(value)
+    if type_ == "unsupported":
+        return None
+    return value
+
+
+# ---------------------------------------------------------------------------
+# ES|QL: aggregation
+# ---------------------------------------------------------------------------
+def categorize(message):
+    """Crude stand-in for CATEGORIZE: keep word tokens, drop ones carrying ids or numbers."""
+    if not isinstance(message, str):
+        return None
+    words = [w for w in re.findall(r"[A-Za-z_][\w.\-]*", message) if not re.search(r"\d", w)]
+    return ".*?" + ".+?".join(re.escape(w) for w in words) + ".*?"
+
+
+def aggregate(name, values, arg=None):
+    present = []
+    for v in values:
+        if isinstance(v, list):
+            present.extend(v)
+        elif v is not None:
+            present.append(v)
+    if name == "COUNT":
+        return len(present)
+    if name == "COUNT_DISTINCT":
+        return len(set(present))
+    if not present:
+        return None
+    if name == "VALUES":
+        return sorted(set(present))
+    if name == "SUM":
+        return sum(present)
+    if name == "AVG":
+        return sum(present) / len(present)
+    if name == "MIN":
+        return min(present)
+    if name == "MAX":
+        return max(present)
+    ordered = sorted(present)
+    q = 50.0 if name == "MEDIAN" else float(arg)
+    rank = (len(ordered) - 1) * q / 100
+    lo = int(rank)
+    hi = min(lo + 1, len(ordered) - 1)
+    return float(ordered[lo] + (ordered[hi] - ordered[lo]) * (rank - lo))
+
+
+def agg_type(name, type_):
+    if name in ("COUNT", "COUNT_DISTINCT"):
+        return "long"
+    if name in ("AVG", "MEDIAN", "PERCENTILE"):
+        return "double"
+    if name == "SUM":
+        return "double" if type_ == "double" else "long"
+    return type_
+
+
+def extract_aggregates(node, found):
+    """Replace aggregate calls in `node` with ("field", slot) refs, collecting them in `found`."""
+    if node[0] == "call" and node[1] in AGGREGATES:
+        slot = f"$agg{len(found)}"
+        found.append((slot, node))
+        return ("field", slot)
+    if node[0] in ("and", "or"):
+        return (node[0], extract_aggregates(node[1], found), extract_aggregates(node[2], found))
+    if node[0] in ("not", "neg", "isnull", "notnull"):
+        return (node[0], extract_aggregates(node[1], found))
+    if node[0] in ("cmp", "arith"):
+        return (node[0], node[1], extract_aggregates(node[2], found), extract_aggregates(node[3], found))
+    if node[0] == "call":
+        return ("call", node[1], [extract_aggregates(a, found) for a in node[2]])
+    return node
+
+
+def run_stats(frame, aggs, groups, compiler):
+    found = []
+    outputs = [(name, extract_aggregates(node, found)) for name, node in aggs]
+    if not aggs and not groups:
+        raise EsError(400, "parsing_exception", "STATS needs at least one aggregate or grouping")
+
+    # Group keys
+    key_columns = []
+    for name, node in groups:
+        if node[0] == "call" and node[1] == "CATEGORIZE":
+            inner, _ = compiler.compile(node[2][0])
+            key_columns.append((name, (lambda row, f=inner: categorize(_scalar_or_none(f(row)))), "keyword"))
+        else:
+            fn, type_ = compiler.compile(node)
+            key_columns.append((name, fn, type_))
+    buckets = {}
+    for row in range(frame.n):
+        key = tuple(tuple(v) if isinstance(v := fn(row), list) else v for _, fn, _ in key_columns)
+        buckets.setdefault(key, []).append(row)
+    if not groups and not buckets:
+        buckets[()] = []
+
+    # Aggregate inputs, evaluated once per row
+    agg_columns = {}
+    agg_types = {}
+    for slot, (_, agg_name, args) in found:
+        if args and args[0][0] == "star":
+            fn, type_ = (lambda row: 1), "long"
+        else:
+            fn, type_ = compiler.compile(args[0])
+        arg = compiler.const(args[1])[1] if agg_name == "PERCENTILE" else None
+        values = [fn(row) for row in range(frame.n)]
+        agg_columns[slot] = (agg_name, values, arg)
+        agg_types[slot] = agg_type(agg_name, type_)
+
+    columns = {slot: [] for slot in agg_columns}
+    columns.update({name: [] for name, _, _ in key_columns})
+    for key, rows in buckets.items():
+        for slot, (agg_name, values, arg) in agg_columns.items():
+            columns[slot].append(aggregate(agg_name, [values[r] for r in rows], arg))
+        for (name, _, _), value in zip(key_columns, key):
+            columns[name].append(list(value) if isinstance(value, tuple) else value)
+    types = dict(agg_types)
+    types.update({name: type_ for name, _, type_ in key_columns})
+    grouped = Frame(columns, types, len(buckets))
+
+    # Output: aggregates (possibly wrapped in scalar expressions) first, then groups
+    final = Compiler(grouped, compiler.params, compiler.now_ms)
+    out_columns, out_types = {}, {}
+    for name, node in outputs:
+        fn, type_ = final.compile(node)
+        out_columns[name] = [fn(row) for row in range(grouped.n)]
+        out_types[name] = type_
+    for name, _, type_ in key_columns:
+        out_columns.pop(name, None)
+        out_columns[name] = columns[name]
+        out_types[name] = type_
+    return Frame(out_columns, out_types, grouped.n)
+
+
+# ---------------------------------------------------------------------------
+# ES|QL: execution
+# ---------------------------------------------------------------------------
+def sort_rows(frame, keys, compiler):
+    rows = list(range(frame.n))
+    for node, desc, nulls_first in reversed(keys):
+        fn, _ = compiler.compile(node)
+        values = [fn(row) for row in range(frame.n)]
+        values = [(max(v) if desc else min(v)) if isinstance(v, list) and v else v for v in values]
+        present = [r for r in rows if values[r] is not None]
+        missing = [r for r in rows if values[r] is None]
+        present.sort(key=values.__getitem__, reverse=desc)
+        rows = missing + present if nulls_first else present + missing
+    return rows
+
+
+def pattern_select(names, patterns, keep):
+    selected = []
+    for pattern in patterns:
+        matched = [n for n in names if fnmatch.fnmatchcase(n, pattern)]
+        if not matched and "*" not in pattern:
+            raise EsError(400, "verification_exception", f"Unknown column [{pattern}]")
+        selected.extend(m for m in matched if m not in selected)
+    return selected if keep else [n for n in names if n not in selected]
+
+
+def run_query(cluster, query, params=None, now_ms=None):
+    """Execute an ES|QL query. Returns (Frame, documents_found)."""
+    commands = parse_query(query)
+    now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+    sources, metadata = commands[0][1]
+    try:
+        names = cluster.resolve(sources)
+    except EsError:
+        raise EsError(400, "verification_exception", f"Unknown index [{sources}]")
+    if not names:
+        raise EsError(400, "verification_exception", f"Unknown index [{sources}]")
+
+    # FROM: concatenate the indices' columns (columns of a single index are used as-is)
+    types = {}
+    analyzers = {}
+    for name in names:
+        for field, type_ in cluster.indices[name].types.items():
+            types.setdefault(field, type_)
+        for field, pair in cluster.indices[name].analyzers.items():
+            analyzers.setdefault(field, pair)
+    columns = {}
+    if len(names) == 1 and not cluster.indices[names[0]].deleted:
+        index = cluster.indices[names[0]]
+        n = len(index.ids)
+        columns = {field: index.columns[field] for field in types}
+        if "_id" in metadata:
+            columns["_id"] = index.ids
+        if "_index" in metadata:
+            columns["_index"] = [index.name] * n
+    else:
+        columns = {field: [] for field in types}
+        columns.update({m: [] for m in ("_id", "_index") if m in metadata})
+        n = 0
+        for name in names:
+            index = cluster.indices[name]
+            positions = index.live_positions()
+            for field in types:
+                column = index.columns.get(field)
+                columns[field].extend([column[p] for p in positions] if column else [None] * len(positions))
+            if "_id" in metadata:
+                columns["_id"].extend(index.ids[p] for p in positions)
+            if "_index" in metadata:
+                columns["_index"].extend([name] * len(positions))
+            n += len(positions)
+    if "_score" in metadata:
+        columns["_score"] = [0.0] * n
+    types.update({"_id": "keyword", "_index": "keyword", "_score": "double"})
+    frame = Frame(columns, {k: types[k] for k in columns}, n, analyzers)
+    documents_found = n
+    limit = None
+
+    for word, args in commands[1:]:
+        compiler = Compiler(frame, params or {}, now_ms)
+        if word == "WHERE":
+            compiler.scorers = []
+            test, _ = compiler.compile(args)
+            rows = [row for row in range(frame.n) if test(row) is True]
+            scores = compiler.scorers
+            frame = frame.gather(rows)
+            if scores and "_score" in frame.columns:
+                base = frame.columns["_score"]
+                frame.columns["_score"] = [base[i] + sum(s[row] for s in scores) for i, row in enumerate(rows)]
+        elif word == "EVAL":
+            for name, node in args:
+                fn, type_ = compiler.compile(node)
+                frame.columns.pop(name, None)
+                frame.columns[name] = [fn(row) for row in range(frame.n)]
+                frame.types[name] = type_
+                compiler = Compiler(frame, params or {}, now_ms)
+        elif word == "STATS":
+            frame = run_stats(frame, args[0], args[1], compiler)
+        elif word == "SORT":
+            rows = sort_rows(frame, args, compiler)
+            if limit is not None:
+                rows = rows[:limit]
+            frame = frame.gather(rows)
+        elif word == "LIMIT":
+            is_const, value, _ = compiler.const(args)
+            if not is_const or not isinstance(value, int) or value < 0:
+                raise EsError(400, "verification_exception", "LIMIT needs a non-negative integer")
+            limit = min(value, MAX_LIMIT) if limit is None else min(limit, value)
+            frame = frame.gather(range(min(limit, frame.n)))
+        elif word in ("KEEP", "DROP"):
+            keep = pattern_select(list(frame.columns), args, word == "KEEP")
+            frame = Frame({k: frame.columns[k] for k in keep}, {k: frame.types[k] for k in keep}, frame.n)
+        elif word == "RENAME":
+            for old, new in args:
+                if old not in frame.columns:
+                    raise EsError(400, "verification_exception", f"Unknown column [{old}]")
+                frame.columns = {(new if k == old else k): v for k, v in frame.columns.items() if k != new}
+                frame.types[new] = frame.types.pop(old)
+        elif word == "LOOKUP":
+            frame = lookup_join(cluster, frame, *args)
+
+    if limit is None and frame.n > DEFAULT_LIMIT:
+        frame = frame.gather(range(DEFAULT_LIMIT))
+    return frame, documents_found
+
+
+def lookup_join(cluster, frame, index_name, keys):
+    if index_name not in cluster.indices:
+        raise EsError(400, "verification_exception", f"Unknown index [{index_name}]")
+    index = cluster.indices[index_name]
+    for key in keys:
+        if key not in frame.columns:
+            raise EsError(400, "verification_exception", f"Unknown column [{key}] in left side of join")
+        if key not in index.types:
+            raise EsError(400, "verification_exception", f"Unknown column [{key}] in right side of join")
+    fields = [f for f, _ in index._stored_fields() if f not in keys]
+    table = {}
+    for pos in index.live_positions():
+        table.setdefault(tuple(index.columns[k][pos] for k in keys), []).append(pos)
+    rows, matches = [], []
+    for row in range(frame.n):
+        hits = table.get(tuple(frame.columns[k][row] for k in keys), [None])
+        rows.extend([row] * len(hits))
+        matches.extend(hits)
+    joined = frame.gather(rows)
+    for field in fields:
+        column = index.columns[field]
+        joined.columns.pop(field, None)
+        joined.columns[field] = [None if pos is None else column[pos] for pos in matches]
+        joined.types[field] = index.types[field]
+    return joined
+
+
+def esql_response(frame, took_ms, documents_found, columnar=False):
+    names = list(frame.columns)
+    types = [frame.types[n] if frame.types[n] != "null" else "null" for n in names]
+    rendered = [[render(v, t) for v in frame.columns[n]] for n, t in zip(names, types)]
+    return {
+        "took": took_ms,
+        "documents_found": documents_found,
+        "columns": [{"name": n, "type": t} for n, t in zip(names, types)],
+        "values": rendered if columnar else [list(row) for row in zip(*rendered)],
+    }
+
+
+def bind_params(params):
+    """ES|QL request params: [{"name": value}, ...] or positional [value, ...] -> dict."""
+    bound = {}
+    for i, param in enumerate(params or [], 1):
+        if isinstance(param, dict) and "value" not in param:
+            bound.update(param)
+        else:
+            bound[str(i)] = bound[""] = param.get("value") if isinstance(param, dict) else param
+    return bound
+
+
+# ---------------------------------------------------------------------------
+# Transforms: pivot (terms / date_histogram group_by) in batch or continuous mode
+# ---------------------------------------------------------------------------
+def _percent_key(percent):
+    """Transform output key for a percent: 95.0 -> "95", 99.9 -> "99_9"."""
+    return str(int(percent)) if float(percent).is_integer() else str(percent).replace(".", "_")
+
+
+class Transform:
+    """
+    One _transform. A checkpoint finds the group-by keys of source documents
+    that arrived in (last upper bound, now - delay], recomputes those buckets
+    in full and writes them to dest under ids derived from the key, so
+    overlapping runs overwrite rather than duplicate. Continuous transforms repeat every `frequency` on a
+    timer thread.
+    """
+
+    def __init__(self, cluster, transform_id, config):
+        self.cluster = cluster
+        self.id = transform_id
+        self.config = config
+        self.state = "stopped"
+        self.reason = None
+        self.checkpoint = 0
+        self.upper = None
+        self.timer = None
+        self.stats = {k: 0 for k in (
+            "pages_processed", "documents_processed", "documents_indexed", "documents_deleted",
+            "trigger_count", "index_time_in_ms", "index_total", "index_failures", "search_time_in_ms",
+            "search_total", "search_failures", "processing_time_in_ms", "processing_total",
+            "exponential_avg_checkpoint_duration_ms", "exponential_avg_documents_indexed",
+            "exponential_avg_documents_processed")}
+        pivot = config.get("pivot")
+        if not pivot:
+            raise EsError(400, "action_request_validation_exception", "local_es supports pivot transforms only")
+        self.group_by = []
+        for name, spec in pivot["group_by"].items():
+            (kind, args), = spec.items()
+            if kind == "terms":
+                self.group_by.append((name, args["field"], None))
+            elif kind == "date_histogram":
+                interval = args.get("fixed_interval") or args.get("calendar_interval")
+                self.group_by.append((name, args["field"], parse_interval(interval)))
+            else:
+                raise EsError(400, "action_request_validation_exception", f"unsupported group_by [{kind}]")
+        sync = config.get("sync", {}).get("time")
+        self.sync_field = sync["field"] if sync else None
+        self.delay = parse_interval(sync.get("delay", "60s"))[1] if sync else 0
+        self.frequency = parse_interval(config.get("frequency", "1m"))[1] / 1000
+
+    @property
+    def continuous(self):
+        return self.sync_field is not None
+
+    def now_ms(self):
+        return self.cluster.now if self.cluster.now is not None else int(time.time() * 1000)
+
+    # -- lifecycle ---------------------------------------------------------
+    def start(self):
+        if self.state in ("started", "indexing"):
+            raise EsError(409, "status_exception", f"Cannot start transform [{self.id}] as it is already started.")
+        self.state = "started"
+        self.reason = None
+        self.run_checkpoint()
+        if self.state == "failed":
+            return
+        if self.continuous:
+            self._schedule()
+        else:
+            self.state = "stopped"
+
+    def stop(self):
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        self.state = "stopped"
+
+    def _schedule(self):
+        self.timer = threading.Timer(self.frequency, self._tick)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _tick(self):
+        with self.cluster.lock:
+            if self.state != "started":
+                return
+            self.run_checkpoint()
+            if self.state == "started":
+                self._schedule()
+
+    # -- checkpoint --------------------------------------------------------
+    def run_checkpoint(self):
+        started = time.monotonic()
+        self.stats["trigger_count"] += 1
+        upper = self.now_ms() - self.delay if self.continuous else None
+        lower = self.upper
+        try:
+            processed, buckets = self._changed_buckets(lower, upper)
+            if lower is not None and not buckets:
+                self.upper = upper
+                return
+            indexed = self._write(buckets, upper)
+        except EsError as exc:
+            self.state, self.reason = "failed", exc.reason
+            self.stats["index_failures"] += 1
+            return
+        elapsed_ms = (time.monotonic() - started) * 1000
+        self.checkpoint += 1
+        self.upper = upper
+        self.last_checkpoint_ms = self.now_ms()
+        alpha = 0.1 if self.checkpoint > 1 else 1.0
+        for key, value in (("checkpoint_duration_ms", elapsed_ms), ("documents_indexed", indexed),
+                           ("documents_processed", processed)):
+            name = f"exponential_avg_{key}"
+            self.stats[name] = self.stats[name] * (1 - alpha) + value * alpha
+        self.stats["documents_processed"] += processed
+        self.stats["documents_indexed"] += indexed
+        self.stats["index_total"] += 1
+        self.stats["search_total"] += 1
+        self.stats["pages_processed"] += max(1, -(-indexed // self.page_size))
+        self.stats["processing_time_in_ms"] += int(elapsed_ms)
+        self.stats["processing_total"] += 1
+
+    @property
+    def page_size(self):
+        return self.config.get("settings", {}).get("max_page_search_size") or 500
+
+    def _source_positions(self):
+        """(index, matching positions) for every source index."""
+        source = self.config["source"]
+        indices = source["index"] if isinstance(source["index"], list) else [source["index"]]
+        for name in self.cluster.resolve(",".join(indices), missing_ok=True):
+            index = self.cluster.indices[name]
+            test = compile_dsl(source.get("query") or {"match_all": {}}, index)
+            yield index, [pos for pos in index.live_positions() if test(pos)]
+
+    def _key(self, index, pos):
+        key = []
+        for _, field, interval in self.group_by:
+            column = index.columns.get(field)
+            value = column[pos] if column else None
+            if isinstance(value, list):
+                value = value[0]
+            if value is None:
+                return None
+            key.append(truncate_date(value, interval) if interval else value)
+        return tuple(key)
+
+    def _changed_buckets(self, lower, upper):
+        """Count documents in (lower, upper] and group every document of the buckets they touch."""
+        changed = set()
+        members = {}
+        processed = 0
+        for index, positions in self._source_positions():
+            times = index.columns.get(self.sync_field) if self.sync_field else None
+            for pos in positions:
+                ts = times[pos] if times else None
+                if upper is not None and (ts is None or ts > upper):
+                    continue
+                key = self._key(index, pos)
+                if key is None:
+                    continue
+                members.setdefault(key, []).append((index, pos))
+                if lower is None or ts > lower:
+                    changed.add(key)
+                    processed += 1
+        return processed, {key: members[key] for key in changed}
+
+    def _write(self, buckets, upper):
+        aggregations = self.config["pivot"].get("aggregations") or self.config["pivot"].get("aggs") or {}
+        dest = self.cluster.write_index(self.config["dest"]["index"])
+        for key, docs in buckets.items():
+            out = {}
+            for (name, _, interval), value in zip(self.group_by, key):
+                out[name] = format_date(value) if interval else value
+            pipelines = []
+            for name, spec in aggregations.items():
+                (kind, args), = spec.items()
+                if kind == "bucket_script":
+                    pipelines.append((name, args))
+                else:
+                    out[name] = self._aggregate(kind, args, docs)
+            for name, args in pipelines:
+                out[name] = self._bucket_script(args, out, len(docs))
+            doc_id = uuid.uuid5(uuid.NAMESPACE_URL, json.dumps(list(key), default=str)).hex[:20]
+            dest.put(doc_id, out)
+        return len(buckets)
+
+    def _aggregate(self, kind, args, docs):
+        if kind == "filter":
+            tests = {}
+            count = 0
+            for index, pos in docs:
+                test = tests.get(index.name) or tests.setdefault(index.name, compile_dsl(args, index))
+                count += bool(test(pos))
+            return count
+        field = args.get("field")
+        values = []
+        for index, pos in docs:
+            column = index.columns.get(field)
+            value = column[pos] if column else None
+            if value is not None:
+                values.extend(value if isinstance(value, list) else [value])
+        if kind == "value_count":
+            return len(values)
+        if kind == "cardinality":
+            return len(set(values))
+        if kind == "percentiles":  # exact here; Elasticsearch keeps a TDigest sketch per bucket
+            percents = args.get("percents", [1, 5, 25, 50, 75, 95, 99])
+            return {_percent_key(p): aggregate("PERCENTILE", values, p) for p in percents}
+        if not values:
+            return None
+        if kind == "avg":
+            return sum(values) / len(values)
+        if kind in ("sum", "min", "max"):
+            return {"sum": sum, "min": min, "max": max}[kind](values)
+        raise EsError(400, "action_request_validation_exception", f"unsupported aggregation [{kind}] (local_es)")
+
+    def _bucket_script(self, args, out, doc_count):
+        params = {}
+        for var, path in args["buckets_path"].items():
+            if path == "_count":
+                params[var] = doc_count
+                continue
+            name, _, sub = path.replace(">", ".").replace("[", ".").rstrip("]").partition(".")
+            value = out.get(name)
+            if sub and sub != "_count":
+                value = value.get(_percent_key(float(sub))) if isinstance(value, dict) else None
+            params[var] = value
+        if any(v is None for v in params.values()):
+            return None
+        script = args["script"]
+        source = script["source"] if isinstance(script, dict) else script
+        if not re.fullmatch(r"[\sA-Za-z0-9_.+\-*/()]*", source):
+            raise EsError(400, "script_exception", "local_es bucket_script supports arithmetic on params only")
+        try:
+            return eval(source.replace("params.", ""), {"__builtins__": {}}, params)
+        except ZeroDivisionError:
+            return None
+
+    def describe(self):
+        config = dict(self.config, id=self.id)
+        config.setdefault("settings", {})
+        config.setdefault("frequency", "1m")
+        return config
+
+    def stats_body(self):
+        now = self.now_ms()
+        last = {"checkpoint": self.checkpoint}
+        if self.checkpoint:
+            last["timestamp_millis"] = getattr(self, "last_checkpoint_ms", now)
+            if self.upper is not None:
+                last["time_upper_bound_millis"] = self.upper
+        checkpointing = {"last": last, "operations_behind": 0}
+        if self.continuous:
+            checkpointing["changes_last_detected_at"] = last.get("timestamp_millis")
+            checkpointing["last_search_time"] = now
+        body = {"id": self.id, "state": self.state, "stats": dict(self.stats), "checkpointing": checkpointing,
+                "health": {"status": "red" if self.state == "failed" else "green"}}
+        if self.reason:
+            body["reason"] = self.reason
+        return body
+
+
+def route_transform(cluster, method, parts, query, body):
+    """/_transform[/<id>[/_start|_stop|_stats]]."""
+    transforms = cluster.transforms
+    ids = parts[1] if len(parts) > 1 else "_all"
+    action = parts[2] if len(parts) > 2 else None
+
+    def matching():
+        if ids in ("_all", "*"):
+            return [transforms[t] for t in sorted(transforms)]
+        found = [transforms[t] for t in sorted(transforms)
+                 if any(fnmatch.fnmatchcase(t, p) for p in ids.split(","))]
+        if not found and query.get("allow_no_match") != "true":
+            raise EsError(404, "resource_not_found_exception", f"Transform with id [{ids}] could not be found")
+        return found
+
+    if action is None and method == "PUT":
+        if ids in transforms:
+            raise EsError(409, "resource_already_exists_exception",
+                          f"Transform with id [{ids}] already exists")
+        transforms[ids] = Transform(cluster, ids, body)
+        return 200, {"acknowledged": True}
+    if action is None and method == "DELETE":
+        transform = matching()[0]
+        if transform.state != "stopped" and query.get("force") != "true":
+            raise EsError(409, "status_exception",
+                          f"Cannot delete transform [{ids}] as the task is running. Stop the task first")
+        transform.stop()
+        del transforms[transform.id]
+        return 200, {"acknowledged": True}
+    if action is None and method == "GET":
+        found = matching()
+        return 200, {"count": len(found), "transforms": [t.describe() for t in found]}
+    if action == "_start" and method == "POST":
+        matching()[0].start()
+        return 200, {"acknowledged": True}
+    if action == "_stop" and method == "POST":
+        for transform in matching():
+            transform.stop()
+        return 200, {"acknowledged": True}
+    if action == "_stats":
+        found = matching()
+        return 200, {"count": len(found), "transforms": [t.stats_body() for t in found]}
+    raise EsError(400, "illegal_argument_exception", f"no handler for /{'/'.join(parts)} [{method}] (local_es)")
+
+
+# ---------------------------------------------------------------------------
+# HTTP
+# ---------------------------------------------------------------------------
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "local-es"
+    disable_nagle_algorithm = True  # header and body go out as separate writes
+    cluster = None
+    latency = 0.0
+    quiet = True
+
+    def log_message(self, fmt, *args):
+        if not self.quiet:
+            super().log_message(fmt, *args)
+
+    def read_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    while self.rfile.readline().strip():
+                        pass
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            data = b"".join(chunks)
+        else:
+            data = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.headers.get("Content-Encoding", "").lower() == "gzip":
+            data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+        return data
+
+    def reply(self, status, body=None):
+        payload = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(payload)
+
+    def dispatch(self):
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = [unquote(p) for p in url.path.split("/") if p]
+        data = self.read_body()
+        if self.latency:
+            time.sleep(self.latency)
+        try:
+            is_bulk = parts[-1:] == ["_bulk"]
+            body = data.decode() if is_bulk else json.loads(data) if data.strip() else {}
+            with self.cluster.lock:
+                status, response = route(self.cluster, self.command, parts, query, body)
+        except EsError as exc:
+            status, response = exc.status, exc.body()
+        except (ValueError, KeyError, TypeError) as exc:
+            err = EsError(400, "illegal_argument_exception", f"{type(exc).__name__}: {exc}")
+            status, response = err.status, err.body()
+        self.reply(status, response)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = dispatch
+
+
+def route(cluster, method, parts, query, body):
+    """Map one REST call onto the cluster. Returns (status, body)."""
+    head = parts[0] if parts else ""
+    if not parts:
+        return 200, {"name": "local-es", "cluster_name": "local", "version": {"number": VERSION},
+                     "tagline": "You Know, for Search"}
+    if head == "_bulk":
+        return 200, cluster.bulk(body)
+    if head == "_query" and method == "POST":
+        started = time.monotonic()
+        now_ms = cluster.now if cluster.now is not None else None
+        frame, found = run_query(cluster, body["query"], bind_params(body.get("params")), now_ms)
+        took = int((time.monotonic() - started) * 1000)
+        return 200, esql_response(frame, took, found, body.get("columnar", False))
+    if head == "_index_template" and len(parts) == 2:
+        name = parts[1]
+        if method == "PUT":
+            cluster.templates[name] = body
+            return 200, {"acknowledged": True}
+        if name not in cluster.templates:
+            raise EsError(404, "resource_not_found_exception", f"index template matching [{name}] not found")
+        if method == "DELETE":
+            del cluster.templates[name]
+            return 200, {"acknowledged": True}
+        tmpl = json.loads(json.dumps(cluster.templates[name]))
+        t = tmpl.get("template", {})
+        if "mappings" in t:
+            t["mappings"]["properties"] = expand_properties(t["mappings"].get("properties", {}))
+        if "settings" in t:
+            t["settings"] = nest_settings(flatten_settings(t["settings"]))
+        return 200, {"index_templates": [{"name": name, "index_template": tmpl}]}
+    if head == "_ilm" and parts[1:2] == ["policy"] and len(parts) == 3:
+        name = parts[2]
+        if method == "PUT":
+            cluster.policies[name] = {"version": cluster.policies.get(name, {}).get("version", 0) + 1,
+                                      "modified_date": format_date(int(time.time() * 1000)),
+                                      "policy": body.get("policy", {})}
+            return 200, {"acknowledged": True}
+        if name not in cluster.policies:
+            raise EsError(404, "resource_not_found_exception", f"Lifecycle policy not found: {name}")
+        if method == "DELETE":
+            del cluster.policies[name]
+            return 200, {"acknowledged": True}
+        return 200, {name: cluster.policies[name]}
+    if head == "_alias" and len(parts) == 2:
+        names = cluster.resolve(parts[1], missing_ok=True) if parts[1] in cluster.aliases else []
+        if not names:
+            raise EsError(404, "alias_not_found_exception", f"alias [{parts[1]}] missing")
+        return 200, {i: {"aliases": {parts[1]: {k: v for k, v in cluster.aliases[parts[1]][i].items() if v}}}
+                     for i in names}
+    if head == "_aliases" and method == "POST":
+        cluster.update_aliases(body.get("actions", []))
+        return 200, {"acknowledged": True}
+    if head == "_transform":
+        return route_transform(cluster, method, parts, query, body)
+    if head == "_reindex" and method == "POST":
+        return 200, cluster.reindex(body)
+    if head == "_cat" and parts[1:2] == ["indices"]:
+        return 200, [{"health": "green", "status": "open", "index": name, "docs.count": str(index.count)}
+                     for name, index in sorted(cluster.indices.items())]
+    if head.startswith("_"):
+        raise EsError(400, "illegal_argument_exception",
+                      f"no handler found for uri [/{'/'.join(parts)}] and method [{method}] (local_es)")
+
+    # /<index>[/<endpoint>...]
+    target = head
+    endpoint = parts[1] if len(parts) > 1 else None
+    if endpoint is None:
+        if method == "HEAD":
+            return (200 if target in cluster.indices or target in cluster.aliases else 404), None
+        if method == "PUT":
+            cluster.create_index(target, body)
+            return 200, {"acknowledged": True, "shards_acknowledged": True, "index": target}
+        if method == "DELETE":
+            cluster.delete_index(target)
+            return 200, {"acknowledged": True}
+        return 200, {name: cluster.indices[name].describe(cluster.aliases_of(name))
+                     for name in cluster.resolve(target)}
+    if endpoint == "_bulk":
+        return 200, cluster.bulk(body, default_index=target)
+    if endpoint == "_count":
+        return 200, {"count": cluster.count(target, body.get("query")),
+                     "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0}}
+    if endpoint == "_search" and method in ("GET", "POST"):
+        return 200, cluster.search(target, body)
+    if endpoint == "_delete_by_query" and method == "POST":
+        deleted = cluster.delete_by_query(target, body.get("query"))
+        return 200, {"took": 0, "timed_out": False, "total": deleted, "deleted": deleted, "failures": []}
+    if endpoint == "_refresh":
+        cluster.resolve(target)
+        return 200, {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+    if endpoint == "_rollover" and method == "POST":
+        return 200, cluster.rollover(target)
+    if endpoint == "_mapping":
+        names = cluster.resolve(target)
+        if method == "PUT":
+            for name in names:
+                cluster.indices[name].put_mapping(body)
+            return 200, {"acknowledged": True}
+        return 200, {name: {"mappings": {"properties": cluster.indices[name].mapping}} for name in names}
+    if endpoint == "_settings":
+        names = cluster.resolve(target)
+        if method == "PUT":
+            for name in names:
+                cluster.indices[name].settings.update(flatten_settings(body))
+            return 200, {"acknowledged": True}
+        return 200, {name: {"settings": nest_settings(cluster.indices[name].settings)} for name in names}
+    if endpoint in ("_doc", "_create"):
+        doc_id = parts[2] if len(parts) > 2 else None
+        if method in ("PUT", "POST"):
+            op = "create" if endpoint == "_create" or query.get("op_type") == "create" else "index"
+            item = cluster._bulk_item(op, target, doc_id, body)
+            return item.pop("status"), item
+        index = cluster.indices.get(target) or cluster.write_index(target)
+        if method == "DELETE":
+            found = index.delete(doc_id)
+            return (200 if found else 404), {"_index": index.name, "_id": doc_id,
+                                             "result": "deleted" if found else "not_found"}
+        doc = index.get(doc_id)
+        if doc is None:
+            return 404, {"_index": index.name, "_id": doc_id, "found": False}
+        source = {f: render(v, index.types.get(f)) for f, v in doc.items()}
+        return 200, {"_index": index.name, "_id": doc_id, "found": True, "_source": source}
+    raise EsError(400, "illegal_argument_exception",
+                  f"no handler found for uri [/{'/'.join(parts)}] and method [{method}] (local_es)")
+
+
+# ---------------------------------------------------------------------------
+# Entry points
+# ---------------------------------------------------------------------------
+def load_corpus(cluster, corpus_dir):
+    """Index a corpus written by --export-dir straight into the store (no HTTP). Returns doc count."""
+    import corpus
+    loaded = 0
+    with cluster.lock:
+        for index, path in corpus.list_shards(corpus_dir):
+            body = b"".join(action + source for action, source in corpus.iter_pairs(path))
+            result = cluster.bulk(body.decode(), default_index=index)
+            loaded += sum(1 for item in result["items"] if next(iter(item.values()))["status"] < 300)
+    return loaded
+
+
+def start(host="127.0.0.1", port=0, cluster=None, latency_ms=0, quiet=True):
+    """Serve a Cluster on a background thread. Returns (server, url); stop with server.shutdown()."""
+    handler = type("BoundHandler", (Handler,), {
+        "cluster": cluster or Cluster(), "latency": latency_ms / 1000, "quiet": quiet})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.cluster = handler.cluster
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run an in-memory Elasticsearch stand-in for the data scripts.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--now", type=datagen.parse_anchor_time, default=None, metavar="ISO8601",
+                        help="Pin ES|QL NOW() (use the generators' --anchor-time)")
+    parser.add_argument("--load-corpus", default=None, metavar="DIR",
+                        help="Preload a corpus written with --export-dir")
+    parser.add_argument("--reject-rate", type=float, default=0.0,
+                        help="Share of bulk items answered with 429 (default: 0)")
+    parser.add_argument("--latency-ms", type=float, default=0,
+                        help="Delay added to every request, to mimic network latency")
+    parser.add_argument("--inference-ms", type=float, default=0,
+                        help="Delay per semantic_text value embedded, to mimic model inference")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    now = int(args.now.timestamp() * 1000) if args.now else None
+    cluster = Cluster(now=now, reject_rate=args.reject_rate, inference_ms=args.inference_ms)
+    if args.load_corpus:
+        started = time.monotonic()
+        print(f"Loaded {load_corpus(cluster, args.load_corpus)} documents from {args.load_corpus} "
+              f"in {time.monotonic() - started:.1f}s")
+    server, url = start(args.host, args.port, cluster, args.latency_ms, quiet=not args.verbose)
+    print(f"local_es listening on {url} (Ctrl-C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
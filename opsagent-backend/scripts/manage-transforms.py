@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+manage-transforms.py -- Deploy, backfill and monitor the service-health-summary transform.
+
+transforms/service-health-summary.json pivots logs-opsagent-* into one
+service-health-realtime document per (service.name, 5-minute bucket). This
+script runs it the way the realtime index needs it:
+
+  deploy   stop and delete any previous transform, then
+             1. profile the source (documents, services, ingest rate over the
+                newest hour) and tune the continuous settings: frequency is
+                shortened when a checkpoint would read more than
+                CHECKPOINT_DOCS documents, and max_page_search_size covers
+                every bucket a checkpoint can touch in one page
+             2. backfill history in parallel: everything before the cutover
+                (now - delay, aligned down to the bucket interval) is split
+                into interval-aligned windows, each run by its own batch
+                transform <id>-backfill-NN with a range query; --workers of
+                them run at once and each is deleted when it stops
+             3. create the continuous transform (sync on @timestamp with the
+                configured delay) starting at the cutover and start it
+           Destination ids derive from the group-by key, so a window that is
+           backfilled twice is overwritten rather than double-counted.
+  status   one line of checkpoint stats
+  watch    poll _stats and report checkpoint lag (now - the newest
+           checkpoint's upper time bound), documents processed per second
+           against the source's ingest rate, operations behind and the average
+           checkpoint duration. Warns when lag exceeds --lag-budget or a
+           checkpoint takes longer than the frequency; exits 1 if it fails.
+  stop     stop the transform and remove leftover backfill transforms
+
+Latency percentiles come from one percentiles aggregation (a TDigest sketch
+per bucket) instead of one per percent.
+
+Usage:
+    export ES_URL="https://your-es-instance.elastic.cloud:443"
+    export ES_API_KEY="your-api-key"
+    python3 manage-transforms.py deploy                   # tune, backfill, start
+    python3 manage-transforms.py deploy --dry-run         # print the plan only
+    python3 manage-transforms.py deploy --workers 8 --frequency 30s
+    python3 manage-transforms.py deploy --skip-backfill   # continuous from the first document
+    python3 manage-transforms.py status
+    python3 manage-transforms.py watch --every 30 --lag-budget 5m
+    python3 manage-transforms.py stop
+"""
+
+import argparse
+import copy
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import es_bulk
+
+ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
+ES_API_KEY = os.environ.get("ES_API_KEY", "")
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+TRANSFORM_FILE = os.path.join(SCRIPT_DIR, "..", "transforms", "service-health-summary.json")
+
+WORKERS = 4
+MIN_PAGE_SIZE = 500          # Elasticsearch default for max_page_search_size
+MAX_PAGE_SIZE = 10000        # upper limit of max_page_search_size
+CHECKPOINT_DOCS = 200_000    # keep one continuous checkpoint's read below this
+MIN_FREQUENCY_S = 10
+POLL_SECONDS = 1.0
+UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def iso(ms):
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def parse_ms(value):
+    """ES|QL date (ISO string) -> epoch ms."""
+    return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() * 1000)
+
+
+def parse_duration(text):
+    """'60s' / '5m' / '1h' -> seconds."""
+    match = re.fullmatch(r"\s*(\d+)\s*(ms|s|m|h|d)\s*", str(text))
+    if not match:
+        raise argparse.ArgumentTypeError(f"expected e.g. '30s', '5m' or '1h', got {text!r}")
+    return int(match.group(1)) * UNITS[match.group(2)]
+
+
+def format_duration(seconds):
+    """Seconds -> the shortest exact Elasticsearch time value ('90s', '5m')."""
+    seconds = int(seconds)
+    for unit in ("d", "h", "m"):
+        if seconds % UNITS[unit] == 0:
+            return f"{seconds // UNITS[unit]}{unit}"
+    return f"{seconds}s"
+
+
+def clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+def call(session, method, path, body=None, ok=(200,), **params):
+    """One REST call. Returns the decoded body; raises RuntimeError on an unexpected status."""
+    resp = session.request(method, f"{ES_URL}{path}", json=body, params=params or None,
+                           timeout=es_bulk.REQUEST_TIMEOUT)
+    if resp.status_code not in ok:
+        raise RuntimeError(f"{method} {path}: HTTP {resp.status_code}: {resp.text[:300]}")
+    return resp.json() if resp.content else {}
+
+
+def esql(session, query, params=None):
+    """Run an ES|QL query. Returns a list of row dicts."""
+    body = {"query": query}
+    if params:
+        body["params"] = [{k: v} for k, v in params.items()]
+    data = call(session, "POST", "/_query", body)
+    names = [c["name"] for c in data["columns"]]
+    return [dict(zip(names, row)) for row in data["values"]]
+
+
+def load_config(path=TRANSFORM_FILE):
+    """The transform definition: (id, body without id/description)."""
+    with open(path) as f:
+        config = json.load(f)
+    transform_id = config.pop("id")
+    config.pop("description", None)
+    return transform_id, config
+
+
+def interval_seconds(config):
+    """The date_histogram bucket width of the pivot, in seconds."""
+    for spec in config["pivot"]["group_by"].values():
+        if "date_histogram" in spec:
+            return parse_duration(spec["date_histogram"]["fixed_interval"])
+    raise ValueError("the pivot has no fixed_interval date_histogram to backfill by")
+
+
+def with_range(config, start_ms=None, end_ms=None):
+    """A copy of `config` whose source query is limited to [start_ms, end_ms) on the sync field."""
+    config = copy.deepcopy(config)
+    bounds = {}
+    if start_ms is not None:
+        bounds["gte"] = iso(start_ms)
+    if end_ms is not None:
+        bounds["lt"] = iso(end_ms)
+    if bounds:
+        field = config.get("sync", {}).get("time", {}).get("field", "@timestamp")
+        clauses = [{"range": {field: bounds}}]
+        if "query" in config["source"]:
+            clauses.append(config["source"]["query"])
+        config["source"]["query"] = {"bool": {"filter": clauses}}
+    return config
+
+
+# ---------------------------------------------------------------------------
+# Profile and tune
+# ---------------------------------------------------------------------------
+def profile_source(session, source):
+    """Documents, services, first/last timestamp (epoch ms) and ingest rate (docs/s over the newest hour)."""
+    row = esql(session, f"FROM {source} | STATS docs = COUNT(*), services = COUNT_DISTINCT(service.name), "
+                        "first = MIN(@timestamp), last = MAX(@timestamp)")[0]
+    if not row["docs"]:
+        return None
+    first = parse_ms(row["first"])
+    last = parse_ms(row["last"])
+    recent = esql(session, f"FROM {source} | WHERE @timestamp >= ?start | STATS docs = COUNT(*)",
+                  {"start": iso(max(first, last - 3_600_000))})[0]["docs"]
+    window_s = max(1.0, min(3600.0, (last - first) / 1000))
+    return {"docs": row["docs"], "services": max(1, row["services"]), "first": first, "last": last,
+            "ingest_rate": recent / window_s}
+
+
+def tune(config, profile, frequency=None, delay=None, page_size=None):
+    """Continuous settings for the measured volume: (frequency s, delay s, page size, notes)."""
+    interval = interval_seconds(config)
+    delay = delay if delay is not None else parse_duration(config["sync"]["time"].get("delay", "60s"))
+    notes = []
+    if frequency is None:
+        frequency = parse_duration(config.get("frequency", "1m"))
+        rate = profile["ingest_rate"] if profile else 0
+        if rate * frequency > CHECKPOINT_DOCS:
+            notes.append(f"frequency shortened from {format_duration(frequency)}: {rate:,.0f} docs/s "
+                         f"would put {rate * frequency:,.0f} docs in one checkpoint")
+            frequency = max(MIN_FREQUENCY_S, int(CHECKPOINT_DOCS / rate))
+    if page_size is None:
+        services = profile["services"] if profile else 1
+        # buckets one checkpoint can change: every service x each bucket its (frequency + delay) span touches
+        touched = services * (-(-(frequency + delay) // interval) + 1)
+        page_size = clamp(touched, MIN_PAGE_SIZE, MAX_PAGE_SIZE)
+        notes.append(f"max_page_search_size {page_size}: {services} services x "
+                     f"{touched // services} buckets per checkpoint")
+    return frequency, delay, page_size, notes
+
+
+def backfill_windows(start_ms, end_ms, interval_s, count):
+    """Split [start_ms, end_ms) into at most `count` windows aligned to the bucket interval."""
+    step = interval_s * 1000
+    start_ms -= start_ms % step
+    buckets = -(-(end_ms - start_ms) // step)
+    per_window = max(1, -(-buckets // count))
+    return [(lo, min(end_ms, lo + per_window * step)) for lo in range(start_ms, end_ms, per_window * step)]
+
+
+# ---------------------------------------------------------------------------
+# Transform API
+# ---------------------------------------------------------------------------
+def transform_stats(session, transform_id):
+    """The _stats entry of one transform, or None if it does not exist."""
+    data = call(session, "GET", f"/_transform/{transform_id}/_stats", ok=(200, 404))
+    return (data.get("transforms") or [None])[0]
+
+
+def remove_transform(session, transform_id):
+    """Stop and delete a transform if it exists. Returns True if one was removed."""
+    if transform_stats(session, transform_id) is None:
+        return False
+    call(session, "POST", f"/_transform/{transform_id}/_stop", force="true", wait_for_completion="true")
+    call(session, "DELETE", f"/_transform/{transform_id}", force="true")
+    return True
+
+
+def backfill_ids(session, transform_id):
+    data = call(session, "GET", f"/_transform/{transform_id}-backfill-*", ok=(200, 404), allow_no_match="true")
+    return [t["id"] for t in data.get("transforms", [])]
+
+
+def run_backfill(session, transform_id, config, window, page_size, docs_per_second):
+    """Run one batch transform over [start, end) to completion, then delete it. Returns a result dict."""
+    number, (start_ms, end_ms) = window
+    backfill_id = f"{transform_id}-backfill-{number:02d}"
+    body = with_range(config, start_ms, end_ms)
+    body.pop("sync", None)
+    body.pop("frequency", None)
+    body["settings"] = {"max_page_search_size": page_size}
+    if docs_per_second:
+        body["settings"]["docs_per_second"] = docs_per_second
+    started = time.monotonic()
+    result = {"id": backfill_id, "start": start_ms, "end": end_ms, "error": None}
+    try:
+        remove_transform(session, backfill_id)
+        call(session, "PUT", f"/_transform/{backfill_id}", body)
+        call(session, "POST", f"/_transform/{backfill_id}/_start")
+        while True:
+            stats = transform_stats(session, backfill_id)
+            if stats["state"] in ("stopped", "failed"):
+                break
+            time.sleep(POLL_SECONDS)
+        if stats["state"] == "failed":
+            result["error"] = stats.get("reason", "failed")
+        result["processed"] = stats["stats"]["documents_processed"]
+        result["indexed"] = stats["stats"]["documents_indexed"]
+        call(session, "DELETE", f"/_transform/{backfill_id}", force="true")
+    except RuntimeError as exc:
+        result["error"] = str(exc)
+    result["seconds"] = time.monotonic() - started
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Actions
+# ---------------------------------------------------------------------------
+def deploy(session, args):
+    transform_id, config = load_config(args.file)
+    source = config["source"]["index"]
+    source = ",".join(source) if isinstance(source, list) else source
+    interval = interval_seconds(config)
+    profile = profile_source(session, source)
+    frequency, delay, page_size, notes = tune(config, profile, args.frequency, args.delay, args.page_size)
+
+    if profile:
+        print(f"  Source:    {source}: {profile['docs']:,} docs, {profile['services']} services, "
+              f"{iso(profile['first'])} .. {iso(profile['last'])}, {profile['ingest_rate']:,.1f} docs/s ingest")
+    else:
+        print(f"  Source:    {source}: no documents yet")
+    print(f"  Settings:  frequency {format_duration(frequency)}, delay {format_duration(delay)}, "
+          f"max_page_search_size {page_size}, bucket {format_duration(interval)}")
+    for note in notes:
+        print(f"             {note}")
+
+    cutover = None
+    windows = []
+    if profile and not args.skip_backfill:
+        step = interval * 1000
+        horizon = min(int(time.time() * 1000) - delay * 1000, profile["last"] + 1)
+        cutover = horizon - horizon % step
+        if cutover > profile["first"]:
+            windows = backfill_windows(profile["first"], cutover, interval, args.windows or args.workers * 2)
+    if windows:
+        print(f"  Backfill:  {iso(windows[0][0])} .. {iso(cutover)} in {len(windows)} windows, "
+              f"{args.workers} at a time")
+    print(f"  Live:      continuous from {iso(cutover) if cutover else 'the first document'}")
+    if args.dry_run:
+        return 0
+
+    if remove_transform(session, transform_id):
+        print(f"  [OK] removed previous {transform_id}")
+    for leftover in backfill_ids(session, transform_id):
+        remove_transform(session, leftover)
+
+    failures = 0
+    if windows:
+        backfill_pages = clamp(profile["services"] * -(-(windows[0][1] - windows[0][0]) // (interval * 1000)),
+                               MIN_PAGE_SIZE, MAX_PAGE_SIZE)
+        started = time.monotonic()
+        processed = 0
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            jobs = [pool.submit(run_backfill, session, transform_id, config, window, backfill_pages,
+                                args.backfill_docs_per_second) for window in enumerate(windows, 1)]
+            for job in jobs:
+                result = job.result()
+                span = f"{iso(result['start'])} .. {iso(result['end'])}"
+                if result["error"]:
+                    failures += 1
+                    print(f"    [ERR] {result['id']} {span}: {result['error']}")
+                    continue
+                processed += result["processed"]
+                print(f"    [OK] {result['id']} {span}: {result['processed']:,} docs -> "
+                      f"{result['indexed']:,} buckets in {result['seconds']:.1f}s")
+        elapsed = time.monotonic() - started
+        print(f"  Backfill:  {processed:,} docs in {elapsed:.1f}s ({processed / max(elapsed, 1e-9):,.0f} docs/s)")
+        if failures:
+            print(f"  [ERR] {failures} backfill windows failed; not starting the continuous transform")
+            return 1
+
+    body = with_range(config, cutover)
+    body["sync"]["time"]["delay"] = format_duration(delay)
+    body["frequency"] = format_duration(frequency)
+    body.setdefault("settings", {})["max_page_search_size"] = page_size
+    call(session, "PUT", f"/_transform/{transform_id}", body)
+    call(session, "POST", f"/_transform/{transform_id}/_start")
+    print(f"  [OK] {transform_id} started")
+    return 0
+
+
+def describe(stats, now_ms):
+    """Checkpoint, lag (s), operations behind and average checkpoint duration (s) from a _stats entry."""
+    checkpointing = stats.get("checkpointing", {})
+    last = checkpointing.get("last", {})
+    upper = last.get("time_upper_bound_millis")
+    return {
+        "state": stats["state"],
+        "checkpoint": last.get("checkpoint", 0),
+        "lag": (now_ms - upper) / 1000 if upper else None,
+        "behind": checkpointing.get("operations_behind", 0),
+        "duration": stats["stats"].get("exponential_avg_checkpoint_duration_ms", 0) / 1000,
+        "processed": stats["stats"]["documents_processed"],
+        "avg_processed": stats["stats"].get("exponential_avg_documents_processed", 0),
+    }
+
+
+def source_count(session, config):
+    source = config["source"]["index"]
+    source = ",".join(source) if isinstance(source, list) else source
+    return call(session, "POST", f"/{source}/_count", {"query": {"match_all": {}}})["count"]
+
+
+def monitor(session, args, polls):
+    """Print `polls` stats lines (0 = until interrupted). Returns 1 if the transform failed, else 0."""
+    transform_id, _ = load_config(args.file)
+    live = call(session, "GET", f"/_transform/{transform_id}", ok=(200, 404)).get("transforms")
+    if not live:
+        print(f"  [ERR] transform {transform_id} does not exist (run: manage-transforms.py deploy)")
+        return 1
+    config = live[0]
+    frequency = parse_duration(config.get("frequency", "1m"))
+    delay = parse_duration(config.get("sync", {}).get("time", {}).get("delay", "60s"))
+    budget = args.lag_budget or 2 * (delay + frequency)
+    previous = None
+    n = 0
+    while True:
+        stats = transform_stats(session, transform_id)
+        now = time.time()
+        info = describe(stats, int(now * 1000))
+        ingested = source_count(session, config)
+        if previous:
+            seconds = now - previous[0]
+            rate = (info["processed"] - previous[1]) / seconds
+            ingest = (ingested - previous[2]) / seconds
+            throughput = f"{rate:,.0f} docs/s (ingest {ingest:,.0f} docs/s)"
+        else:
+            throughput = f"~{info['avg_processed'] / frequency:,.0f} docs/s"
+        lag = f"{info['lag']:.0f}s" if info["lag"] is not None else "-"
+        print(f"  {time.strftime('%H:%M:%S')}  {info['state']:<8} checkpoint {info['checkpoint']:<5} "
+              f"lag {lag:<7} {throughput}, {info['behind']:,} ops behind, "
+              f"checkpoint {info['duration']:.2f}s")
+
+        if info["state"] == "failed":
+            print(f"  [ERR] {transform_id} failed: {stats.get('reason', 'no reason given')}")
+            return 1
+        if info["lag"] is not None and info["lag"] > budget:
+            print(f"  [WARN] lag {info['lag']:.0f}s exceeds the {budget:.0f}s budget")
+        if info["duration"] > frequency:
+            print(f"  [WARN] checkpoints take {info['duration']:.1f}s, longer than the "
+                  f"{format_duration(frequency)} frequency -- raise --frequency or --page-size")
+        previous = (now, info["processed"], ingested)
+        n += 1
+        if polls and n >= polls:
+            return 0
+        try:
+            time.sleep(args.every)
+        except KeyboardInterrupt:
+            return 0
+
+
+def stop(session, args):
+    transform_id, _ = load_config(args.file)
+    removed = [t for t in backfill_ids(session, transform_id) if remove_transform(session, t)]
+    if removed:
+        print(f"  [OK] removed {len(removed)} leftover backfill transforms")
+    if transform_stats(session, transform_id) is None:
+        print(f"  [--] {transform_id} does not exist")
+        return 0
+    call(session, "POST", f"/_transform/{transform_id}/_stop", wait_for_completion="true")
+    print(f"  [OK] {transform_id} stopped")
+    if args.delete:
+        call(session, "DELETE", f"/_transform/{transform_id}")
+        print(f"  [OK] {transform_id} deleted")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Deploy, backfill and monitor the service-health-summary transform.")
+    parser.add_argument("action", nargs="?", default="deploy", choices=["deploy", "status", "watch", "stop"])
+    parser.add_argument("--file", default=TRANSFORM_FILE, help="Transform definition (default: %(default)s)")
+    deploy_opts = parser.add_argument_group("deploy")
+    deploy_opts.add_argument("--frequency", type=parse_duration, default=None, metavar="DURATION",
+                             help="Checkpoint frequency (default: from the definition, shortened for high volume)")
+    deploy_opts.add_argument("--delay", type=parse_duration, default=None, metavar="DURATION",
+                             help="Sync delay for late-arriving documents (default: from the definition)")
+    deploy_opts.add_argument("--page-size", type=int, default=None,
+                             help="max_page_search_size (default: buckets per checkpoint, 500..10000)")
+    deploy_opts.add_argument("--workers", type=int, default=WORKERS,
+                             help=f"Backfill windows run at once (default: {WORKERS})")
+    deploy_opts.add_argument("--windows", type=int, default=None,
+                             help="Backfill windows (default: 2 x --workers)")
+    deploy_opts.add_argument("--backfill-docs-per-second", type=float, default=None,
+                             help="Throttle each backfill transform (default: unthrottled)")
+    deploy_opts.add_argument("--skip-backfill", action="store_true",
+                             help="No batch backfill; the continuous transform starts from the first document")
+    deploy_opts.add_argument("--dry-run", action="store_true", help="Print the plan, change nothing")
+    watch_opts = parser.add_argument_group("watch")
+    watch_opts.add_argument("--every", type=float, default=30, metavar="SECONDS",
+                            help="Seconds between polls (default: 30)")
+    watch_opts.add_argument("--count", type=int, default=0, help="Stop after COUNT polls (default: never)")
+    watch_opts.add_argument("--lag-budget", type=parse_duration, default=None, metavar="DURATION",
+                            help="Warn above this checkpoint lag (default: 2 x (delay + frequency))")
+    stop_opts = parser.add_argument_group("stop")
+    stop_opts.add_argument("--delete", action="store_true", help="Delete the transform after stopping it")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print("=" * 60)
+    print(f"  Service Health Transform ({args.action})")
+    print("=" * 60)
+    print(f"  ES URL: {ES_URL}")
+    print(f"  Auth:   {'API Key configured' if ES_API_KEY else 'No auth (local dev)'}")
+    print("=" * 60)
+    session = es_bulk.get_session(max(args.workers, 1))
+    try:
+        if args.action == "deploy":
+            code = deploy(session, args)
+        elif args.action == "stop":
+            code = stop(session, args)
+        else:
+            code = monitor(session, args, 1 if args.action == "status" else args.count)
+    except RuntimeError as exc:
+        print(f"  [ERR] {exc}")
+        code = 1
+    session.close()
+    sys.exit(code)
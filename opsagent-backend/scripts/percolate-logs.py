@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+percolate-logs.py -- Stream log documents through the alert-rules percolator into the alerts index.
+
+The data generators already percolate their logs as they index them (see
+alerting.AlertStream.tap); this script covers logs that arrive any other way,
+re-runs after rules change, and live ingest with --follow.
+
+Reads the log indices as one time-ordered stream and feeds them to an
+alerting.AlertStream, which percolates them in batches of --batch-size
+documents (one multi-document percolate search per batch), applies each
+rule's cooldown_minutes / last_triggered, and writes fired alerts to the
+alerts index.
+
+Logs are read with ES|QL in time windows (KEEP-ing only the fields rules can
+match on, sorted by @timestamp); a window that fills the 10,000-row result cap
+is split in half and retried. By default the newest --since is percolated;
+--full percolates everything and --follow N keeps going every N seconds from
+where the previous pass stopped (minus --lag-minutes, to pick up late lines --
+re-percolated documents fall inside the cooldown of the alerts they already
+raised, so they do not fire twice).
+
+Usage:
+    export ES_URL="https://your-es-instance.elastic.cloud:443"
+    export ES_API_KEY="your-api-key"
+    python3 percolate-logs.py                      # newest 15 minutes of the log indices
+    python3 percolate-logs.py --full               # all history (e.g. after loading data)
+    python3 percolate-logs.py --follow 30          # keep up with live ingest
+    python3 percolate-logs.py --source logs-opsagent --since "2 hours" --batch-size 1000
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+
+import alerting
+import es_bulk
+
+ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
+ES_API_KEY = os.environ.get("ES_API_KEY", "")
+
+SOURCES = ["logs-opsagent", "logs-opsagent-demo"]
+MAX_ROWS = 10000            # ES|QL result cap; a full window is split and retried
+WINDOW_MINUTES = 60
+SINCE_MINUTES = 15
+LAG_MINUTES = 2
+MINUTE_MS = 60_000
+
+READ_QUERY = (
+    "FROM {source} | WHERE @timestamp >= ?start AND @timestamp < ?end "
+    f"| KEEP {', '.join(alerting.PERCOLATE_FIELDS)} | SORT @timestamp | LIMIT {MAX_ROWS}"
+)
+UNITS = {"minute": 1, "hour": 60, "day": 1440, "week": 10080}
+
+
+def iso(ms):
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def parse_minutes(text):
+    """'3 days' / '90 minutes' / '12h' -> minutes."""
+    match = re.fullmatch(r"\s*(\d+)\s*([a-z]+?)s?\s*", text.lower())
+    unit = match and next((u for u in UNITS if u.startswith(match.group(2))), None)
+    if not unit:
+        raise argparse.ArgumentTypeError(f"expected e.g. '3 days' or '90 minutes', got {text!r}")
+    return int(match.group(1)) * UNITS[unit]
+
+
+def esql(session, query, params=None):
+    """Run an ES|QL query. Returns a list of row dicts; raises RuntimeError on failure."""
+    body = {"query": query}
+    if params:
+        body["params"] = [{k: v} for k, v in params.items()]
+    resp = session.post(f"{ES_URL}/_query", json=body, timeout=es_bulk.REQUEST_TIMEOUT)
+    if resp.status_code != 200:
+        raise RuntimeError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+    data = resp.json()
+    names = [c["name"] for c in data["columns"]]
+    return [dict(zip(names, row)) for row in data["values"]]
+
+
+# ---------------------------------------------------------------------------
+# Read
+# ---------------------------------------------------------------------------
+def existing_sources(session, sources):
+    """The `sources` that exist on the cluster, as (present, missing)."""
+    present, missing = [], []
+    for source in sources:
+        resp = session.head(f"{ES_URL}/{source}", timeout=es_bulk.REQUEST_TIMEOUT)
+        (present if resp.status_code == 200 else missing).append(source)
+    return present, missing
+
+
+def source_bounds(session, source):
+    """(first, last + 1 ms) of a source index in epoch ms, or None if it is empty."""
+    row = esql(session, f"FROM {source} | STATS first = MIN(@timestamp), last = MAX(@timestamp)")[0]
+    if row["first"] is None:
+        return None
+    return alerting.epoch_ms(row["first"]), alerting.epoch_ms(row["last"]) + 1
+
+
+def read_window(session, source, start_ms, end_ms):
+    """Yield the log documents of [start_ms, end_ms) in time order, splitting windows that hit MAX_ROWS."""
+    rows = esql(session, READ_QUERY.format(source=source), {"start": iso(start_ms), "end": iso(end_ms)})
+    if len(rows) >= MAX_ROWS and end_ms - start_ms > 1:
+        middle = start_ms + (end_ms - start_ms) // 2
+        yield from read_window(session, source, start_ms, middle)
+        yield from read_window(session, source, middle, end_ms)
+        return
+    yield from rows
+
+
+def percolate(session, stream, source, start_ms, end_ms, window=WINDOW_MINUTES):
+    """Feed [start_ms, end_ms) of one source to `stream`. Returns the number of documents read."""
+    read = 0
+    for window_start in range(start_ms, end_ms, window * MINUTE_MS):
+        for doc in read_window(session, source, window_start, min(end_ms, window_start + window * MINUTE_MS)):
+            stream.add(doc)
+            read += 1
+    return read
+
+
+def run(sources, mark=None, full=False, since=SINCE_MINUTES, lag=LAG_MINUTES, batch_size=alerting.BATCH_DOCS,
+        workers=alerting.WORKERS, prefilter=True):
+    """
+    One pass over the sources, read as one time-ordered stream so cooldowns
+    see every source's documents in order. `mark` is the end of the previous
+    pass, if any. `sources` None reads whichever of SOURCES exist
+    (logs-opsagent-demo only exists after generate-demo-data.py); a named
+    source that does not exist fails the pass. Returns (end of this pass, failed).
+    """
+    session = es_bulk.get_session(1)
+    started = time.monotonic()
+    stream = alerting.AlertStream(batch_size=batch_size, workers=workers, prefilter=prefilter)
+    failed = False
+    source = ",".join(sources or SOURCES)
+    try:
+        present, missing = existing_sources(session, sources or SOURCES)
+        for name in missing:
+            print(f"  [{'ERR' if sources else '--'}] {name}: no such index or alias")
+        failed = bool(sources and missing)
+        source = ",".join(present)
+        bounds = source_bounds(session, source) if present else None
+        if bounds is None:
+            print(f"  [--] {source or 'no log indices'}: no documents")
+        else:
+            first, end = bounds
+            if mark is not None:
+                start = max(first, mark - lag * MINUTE_MS)
+            elif full:
+                start = first
+            else:
+                start = max(first, end - since * MINUTE_MS)
+            read = percolate(session, stream, source, start, end)
+            mark = end
+            print(f"  [OK] {source}: {iso(start)} .. {iso(end)} -> {read:,} docs")
+    except RuntimeError as exc:
+        print(f"  [ERR] {source}: {exc}")
+        failed = True
+    finally:
+        stats = stream.close()
+        session.close()
+    if stats.total_failed:
+        print(f"  [ERR] {stats.total_failed} alert/rule writes failed ({stats.errors[:1]})")
+        failed = True
+    print(f"  {stream.summary()} in {time.monotonic() - started:.1f}s")
+    return mark, failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Percolate log documents against alert-rules into the alerts index.")
+    parser.add_argument("--source", action="append", dest="sources", metavar="INDEX",
+                        help=f"Log index or alias to read (repeatable, read together; default: {', '.join(SOURCES)})")
+    parser.add_argument("--full", action="store_true", help="Percolate every document, not just the newest --since")
+    parser.add_argument("--since", type=parse_minutes, default=SINCE_MINUTES, metavar="DURATION",
+                        help=f"Percolate the newest DURATION of the sources (default: {SINCE_MINUTES} minutes)")
+    parser.add_argument("--batch-size", type=int, default=alerting.BATCH_DOCS,
+                        help=f"Documents per percolate search (default: {alerting.BATCH_DOCS})")
+    parser.add_argument("--workers", type=int, default=alerting.WORKERS,
+                        help=f"Percolate searches in flight (default: {alerting.WORKERS})")
+    parser.add_argument("--no-prefilter", dest="prefilter", action="store_false",
+                        help="Run every enabled rule's query, not just the rules whose terms fit the batch")
+    parser.add_argument("--lag-minutes", type=int, default=LAG_MINUTES,
+                        help=f"--follow passes re-read this many minutes before the previous end (default: {LAG_MINUTES})")
+    parser.add_argument("--follow", type=float, default=0, metavar="SECONDS",
+                        help="Repeat every SECONDS from where the previous pass stopped (Ctrl+C to stop)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print("=" * 60)
+    print("  Alert Percolation")
+    print("=" * 60)
+    print(f"  ES URL: {ES_URL}")
+    print(f"  Auth:   {'API Key configured' if ES_API_KEY else 'No auth (local dev)'}")
+    print(f"  Rules:  {alerting.RULES_INDEX} -> {alerting.ALERTS_INDEX}")
+    print("=" * 60)
+    sources = args.sources
+    mark, failed = run(sources, None, args.full, args.since, args.lag_minutes, args.batch_size, args.workers,
+                       args.prefilter)
+    while args.follow:
+        try:
+            time.sleep(args.follow)
+        except KeyboardInterrupt:
+            break
+        mark, failed = run(sources, mark, False, args.since, args.lag_minutes, args.batch_size, args.workers,
+                       args.prefilter)
+    sys.exit(1 if failed else 0)
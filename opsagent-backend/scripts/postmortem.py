@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+postmortem.py -- Parse postmortem documents into incident-knowledge records and find near-duplicates.
+
+parse_file() reads one Markdown or JSON postmortem (a .json file may hold one
+object or a list of them; .jsonl/.ndjson one object per line) and returns its
+raw records, {field: value} with values as written:
+
+  - Markdown: the first "# " heading is the title; "## " sections are
+    matched to fields by name (Summary / Impact / What happened ->
+    description, Resolution / Remediation / Fix -> resolution, Root cause,
+    Affected services, Severity, MTTR / Time to resolve, Tags, Category,
+    Date). "Key: value" lines in a --- front matter block, or
+    "**Key:** value" lines anywhere, fill the same fields. Text before the
+    first section is the description when no section names one.
+  - JSON: keys are matched to fields with the same aliases.
+
+normalise() turns the result into the incident-knowledge schema: severity
+P1-P4 (sev1 / critical / high / ... mapped), affected_services and tags as
+lower-case lists, mttr_minutes from "48", "1h 20m", "2 hours" or "95 min",
+incident_date as ISO-8601, and the semantic_text copies of title,
+description and resolution. Records without a title and a description are
+rejected.
+
+MinHash finds near-duplicate postmortems (the same incident written up twice,
+a copy with a typo fixed): each record is shingled into word 3-grams of its
+title, description and resolution, hashed with NUM_PERM universal hash
+functions, and banded into BANDS buckets of ROWS rows for locality-sensitive
+lookup. Dedup.add() keeps a record unless a kept one sharing a bucket agrees
+on at least `threshold` of their minhashes (the estimated Jaccard
+similarity of their shingle sets). Signatures are computed where records are
+parsed (worker processes), dedup runs in one place, so memory is
+NUM_PERM x 8 bytes per kept record.
+
+NumPy is required for MinHash: pip install numpy.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import zlib
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NUM_PERM = 128
+BANDS, ROWS = 16, 8              # a pair becomes a candidate above ~0.7 Jaccard
+THRESHOLD = 0.8
+SHINGLE = 3
+PRIME = 4294967311               # > 2^32; a < 2^31 keeps a * crc32 within uint64
+EXTENSIONS = {".md": "markdown", ".markdown": "markdown", ".json": "json", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+FIELDS = {
+    "title": ("title", "name", "incident", "headline"),
+    "description": ("description", "summary", "impact", "what happened", "overview", "incident summary",
+                    "details"),
+    "resolution": ("resolution", "remediation", "fix", "mitigation", "how it was fixed", "resolution steps",
+                   "action items", "actions"),
+    "root_cause": ("root cause", "root_cause", "rootcause", "cause", "root cause analysis"),
+    "affected_services": ("affected services", "affected_services", "services", "impacted services", "service"),
+    "severity": ("severity", "sev", "priority"),
+    "mttr_minutes": ("mttr", "mttr_minutes", "mttr minutes", "time to resolve", "time to recovery", "duration",
+                     "time to mitigate"),
+    "tags": ("tags", "labels", "keywords"),
+    "category": ("category", "type"),
+    "incident_date": ("date", "incident_date", "incident date", "started", "start time", "occurred"),
+    "author": ("author", "owner", "written by"),
+    "runbook_url": ("runbook", "runbook_url", "runbook url"),
+    "id": ("id", "incident id", "incident_id"),
+}
+ALIASES = {alias: field for field, aliases in FIELDS.items() for alias in aliases}
+# text sections that add to a field already named by an earlier section
+APPEND = {"description", "resolution"}
+
+SEVERITIES = {
+    "p1": "P1", "sev1": "P1", "sev 1": "P1", "sev-1": "P1", "critical": "P1", "1": "P1",
+    "p2": "P2", "sev2": "P2", "sev 2": "P2", "sev-2": "P2", "high": "P2", "major": "P2", "2": "P2",
+    "p3": "P3", "sev3": "P3", "sev 3": "P3", "sev-3": "P3", "medium": "P3", "moderate": "P3", "3": "P3",
+    "p4": "P4", "sev4": "P4", "sev 4": "P4", "sev-4": "P4", "low": "P4", "minor": "P4", "4": "P4",
+}
+DURATION_UNITS = {"d": 1440, "day": 1440, "h": 60, "hr": 60, "hour": 60, "m": 1, "min": 1, "minute": 1,
+                  "s": 1 / 60, "sec": 1 / 60, "second": 1 / 60}
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+KEY_LINE_RE = re.compile(r"^\s*(?:[-*]\s*)?(?:\*\*|__)?([A-Za-z][A-Za-z _/-]{1,40}?)(?:\*\*|__)?\s*:\s*(?:\*\*|__)?\s*(.+)$")
+DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)\s*([a-z]*)")
+
+
+def require_numpy():
+    """Exit with an install hint when NumPy is missing."""
+    if np is None:
+        print("Install numpy for near-duplicate detection (or pass --no-dedup): pip install numpy")
+        sys.exit(1)
+
+
+def field_for(name):
+    """Schema field a heading or key names, or None."""
+    key = re.sub(r"[^a-z0-9_ ]+", " ", name.lower()).strip()
+    key = re.sub(r"\s+", " ", key)
+    return ALIASES.get(key) or ALIASES.get(key.replace("_", " "))
+
+
+# ---------------------------------------------------------------------------
+# Parsing
+# ---------------------------------------------------------------------------
+def parse_markdown(text):
+    """One postmortem in Markdown -> raw {field: value} (values still text)."""
+    record = {}
+    lines = text.splitlines()
+    if lines and lines[0].strip() == "---":
+        end = next((i for i, line in enumerate(lines[1:], 1) if line.strip() == "---"), None)
+        if end is not None:
+            for line in lines[1:end]:
+                match = KEY_LINE_RE.match(line)
+                field = match and field_for(match.group(1))
+                if field:
+                    record[field] = match.group(2).strip().strip("\"'")
+            lines = lines[end + 1:]
+
+    section, body, preamble, sectioned = None, [], [], False
+
+    def close():
+        value = "\n".join(body).strip()
+        if section and value:
+            if section in APPEND and section in record:
+                record[section] += "\n\n" + value
+            else:
+                record.setdefault(section, value)
+
+    for line in lines:
+        heading = HEADING_RE.match(line)
+        if heading:
+            close()
+            body = []
+            if len(heading.group(1)) == 1 and "title" not in record:
+                record["title"], section = heading.group(2).strip(), None
+            else:
+                section, sectioned = field_for(heading.group(2)), True   # None: a section no field wants
+            continue
+        match = KEY_LINE_RE.match(line)
+        field = match and field_for(match.group(1))
+        if field and field not in APPEND and field != section:
+            record.setdefault(field, match.group(2).strip().strip("*_"))
+            continue
+        if section:
+            body.append(line)
+        elif not sectioned:
+            preamble.append(line)
+    close()
+    if "description" not in record and "\n".join(preamble).strip():
+        record["description"] = "\n".join(preamble).strip()
+    return record
+
+
+def parse_json(obj):
+    """One postmortem as a JSON object -> raw {field: value}."""
+    record = {}
+    for key, value in obj.items():
+        field = field_for(key)
+        if field and value not in (None, "", []):
+            record.setdefault(field, value)
+    return record
+
+
+def parse_file(path):
+    """Raw records of one postmortem file (several for JSON lists / JSON lines)."""
+    kind = EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    with open(path, encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    if kind == "markdown":
+        record = parse_markdown(text)
+        record.setdefault("title", os.path.splitext(os.path.basename(path))[0].replace("-", " ").replace("_", " "))
+        return [record]
+    if kind == "jsonl":
+        objects = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        data = json.loads(text)
+        objects = data if isinstance(data, list) else data.get("postmortems", [data]) if isinstance(data, dict) else []
+    return [parse_json(obj) for obj in objects if isinstance(obj, dict)]
+
+
+# ---------------------------------------------------------------------------
+# Normalisation
+# ---------------------------------------------------------------------------
+def strip_markdown(text):
+    """Plain text of a Markdown fragment: no emphasis, links, code fences or list bullets."""
+    text = re.sub(r"```.*?```", " ", text, flags=re.DOTALL)
+    text = re.sub(r"!?\[([^\]]*)\]\([^)]*\)", r"\1", text)
+    text = re.sub(r"(\*\*|__|`)", "", text)
+    text = re.sub(r"^\s*(?:[-*+]|\d+[.)])\s+", "", text, flags=re.MULTILINE)
+    return re.sub(r"[ \t]*\n[ \t]*\n\s*", "\n\n", re.sub(r"[ \t]+", " ", text)).strip()
+
+
+def as_list(value):
+    """'a, b' / '- a\\n- b' / ['A'] -> ['a', 'b']."""
+    if isinstance(value, str):
+        value = re.split(r"[,;\n]", value)
+    items = (strip_markdown(str(v)).strip().strip("`").lower() for v in (value or []))
+    return list(dict.fromkeys(i for i in items if i))
+
+
+def severity(value):
+    key = re.sub(r"[()]", "", str(value).strip().lower())
+    return SEVERITIES.get(key) or SEVERITIES.get(key.split()[0] if key else "")
+
+
+def minutes(value):
+    """48 / '48' / '1h 20m' / '2 hours' / '95 min' -> whole minutes, or None."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(round(value))
+    total, found = 0.0, False
+    for number, unit in DURATION_RE.findall(str(value).lower()):
+        unit = unit.rstrip("s") if unit not in ("s", "") else unit
+        scale = DURATION_UNITS.get(unit, 1 if unit == "" else None)
+        if scale is None:
+            continue
+        total += float(number) * scale
+        found = True
+    return int(round(total)) if found else None
+
+
+def iso_date(value):
+    """A date or datetime in common formats (or epoch seconds/ms) -> ISO-8601 UTC, or None."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value / 1000 if value > 1e11 else value, timezone.utc).isoformat()
+    text = str(value).strip().replace("Z", "+00:00")
+    for parse in (datetime.fromisoformat, lambda t: datetime.strptime(t, "%Y/%m/%d"),
+                  lambda t: datetime.strptime(t, "%d %b %Y"), lambda t: datetime.strptime(t, "%B %d, %Y")):
+        try:
+            ts = parse(text)
+        except ValueError:
+            continue
+        return (ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)).isoformat()
+    return None
+
+
+def doc_id(record):
+    """The postmortem's own id if it has one, else one derived from its title and date."""
+    if record.get("id"):
+        return str(record["id"])
+    key = record["title"] + (f"|{record['incident_date']}" if record.get("incident_date") else "")
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def normalise(raw):
+    """Raw record -> (doc id, incident-knowledge document), or None without a title and description."""
+    text = {f: strip_markdown(str(raw[f])) for f in ("title", "description", "resolution", "root_cause")
+            if raw.get(f)}
+    if not text.get("title") or not text.get("description"):
+        return None
+    doc = dict(text)
+    doc["title"] = " ".join(doc["title"].split())
+    if raw.get("severity") is not None and severity(raw["severity"]):
+        doc["severity"] = severity(raw["severity"])
+    for field in ("affected_services", "tags"):
+        if raw.get(field):
+            doc[field] = as_list(raw[field])
+    if as_list(raw.get("category")):
+        doc["category"] = as_list(raw["category"])[0]
+    if raw.get("mttr_minutes") is not None and minutes(raw["mttr_minutes"]) is not None:
+        doc["mttr_minutes"] = minutes(raw["mttr_minutes"])
+    if raw.get("incident_date") and iso_date(raw["incident_date"]):
+        doc["incident_date"] = iso_date(raw["incident_date"])
+    for field in ("author", "runbook_url"):
+        if raw.get(field):
+            doc[field] = strip_markdown(str(raw[field]))
+    doc["semantic_title"] = doc["title"]
+    doc["semantic_description"] = doc["description"]
+    if doc.get("resolution"):
+        doc["semantic_resolution"] = doc["resolution"]
+    return doc_id({"id": raw.get("id"), "title": doc["title"], "incident_date": doc.get("incident_date")}), doc
+
+
+# ---------------------------------------------------------------------------
+# MinHash near-duplicate detection
+# ---------------------------------------------------------------------------
+_PERMUTATIONS = None
+
+
+def permutations():
+    """NUM_PERM (a, b) universal hash coefficients, fixed so signatures agree across processes."""
+    global _PERMUTATIONS
+    if _PERMUTATIONS is None:
+        rng = np.random.default_rng(1)
+        _PERMUTATIONS = (rng.integers(1, 2 ** 31, NUM_PERM, dtype=np.uint64)[:, None],
+                         rng.integers(0, 2 ** 31, NUM_PERM, dtype=np.uint64)[:, None])
+    return _PERMUTATIONS
+
+
+def shingles(doc, size=SHINGLE):
+    """crc32 of the word `size`-grams of a document's title, description and resolution."""
+    words = re.findall(r"\w+", " ".join(doc.get(f, "") for f in ("title", "description", "resolution")).lower())
+    grams = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    return np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def signature(doc):
+    """The NUM_PERM-value MinHash signature of a document (uint64 array)."""
+    a, b = permutations()
+    return ((a * shingles(doc)[None, :] + b) % PRIME).min(axis=1)
+
+
+class Dedup:
+    """Streaming near-duplicate filter over MinHash signatures, banded for LSH lookup."""
+
+    def __init__(self, threshold=THRESHOLD, bands=BANDS, rows=ROWS):
+        require_numpy()
+        if bands * rows != NUM_PERM:
+            raise ValueError(f"bands x rows must equal {NUM_PERM}")
+        self.threshold, self.bands, self.rows = threshold, bands, rows
+        self.buckets = [{} for _ in range(bands)]   # band -> {band hash: [kept slot]}
+        self.signatures = []
+        self.ids = []
+        self.duplicates = 0
+
+    def add(self, key, sig):
+        """Keep `key` unless a kept record is a near-duplicate. Returns the id it duplicates, or None."""
+        bands = [sig[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+        seen = set()
+        for band, bucket in zip(bands, self.buckets):
+            for slot in bucket.get(band, ()):
+                if slot in seen:
+                    continue
+                seen.add(slot)
+                if np.count_nonzero(self.signatures[slot] == sig) >= self.threshold * NUM_PERM:
+                    self.duplicates += 1
+                    return self.ids[slot]
+        slot = len(self.ids)
+        self.ids.append(key)
+        self.signatures.append(sig)
+        for band, bucket in zip(bands, self.buckets):
+            bucket.setdefault(band, []).append(slot)
+        return None
@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+register-tools-and-agents.py -- Register Agent Builder tools, agents and workflows.
+
+Replaces register-tools-and-agents.ps1 and setup.sh's one-curl-per-file loops:
+
+  - Tools: the cluster is probed once for the ES|QL features the tool tiers
+    depend on (FORK/FUSE, MATCH on text and semantic_text, EVAL CASE,
+    DATE_TRUNC, MAX on text, CATEGORIZE, LOOKUP JOIN, the error rollup
+    index), every supported tier of
+    hybrid_rag_search, error_trend_analysis, service_error_breakdown and
+    search_runbooks_by_symptom (FALLBACKS.md) is timed on sample parameters, and the richest
+    tier that works is registered under the tool's id. Tiers that return the
+    same result (a shared "shape") compete on speed: the tier registered last
+    time is kept unless another is at least --min-gain percent faster, so
+    timing noise does not flip tiers between deploys. Optional tools whose feature probe fails are
+    skipped instead of being registered to fail at call time.
+  - Incremental: each definition is hashed (sha256 of its canonical JSON or
+    YAML text) and compared with the hash recorded after the last successful
+    push to the same Kibana (--state file), so unchanged definitions are not
+    sent. --force pushes everything.
+  - Concurrent: changed definitions are pushed in parallel over one pooled
+    session, retrying 429/5xx and connection errors with backoff. Tools go
+    first, then agents (they reference tools), then workflows (they reference
+    agents). Existing objects are updated in place.
+
+Usage:
+    export ES_URL="https://your-es-instance.elastic.cloud:443"
+    export KIBANA_URL="https://your-kibana.kb.cloud.elastic.co"
+    export ES_API_KEY="your-api-key"
+    python3 register-tools-and-agents.py
+    python3 register-tools-and-agents.py --dry-run                 # probe, time, show what would change
+    python3 register-tools-and-agents.py --skip discover_log_patterns --skip ops-agent
+    python3 register-tools-and-agents.py --no-probe --force        # primaries as-is, push everything
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import random
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import es_bulk
+
+try:
+    import requests
+except ImportError:
+    print("Install requests: pip install requests")
+    sys.exit(1)
+
+ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
+KIBANA_URL = os.environ.get("KIBANA_URL", "").rstrip("/")
+ES_API_KEY = os.environ.get("ES_API_KEY", "")
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(SCRIPT_DIR, "..")
+TOOLS_DIR = os.path.join(BACKEND_DIR, "tools")
+AGENTS_DIR = os.path.join(BACKEND_DIR, "agents")
+WORKFLOWS_DIR = os.path.join(BACKEND_DIR, "workflows")
+STATE_FILE = os.environ.get("REGISTER_STATE_FILE", os.path.join(BACKEND_DIR, ".registration-state.json"))
+CONCURRENCY = int(os.environ.get("KIBANA_CONCURRENCY", 6))
+
+
+def _load_module(filename):
+    """Import a sibling script by filename (supports hyphens in names)."""
+    filepath = os.path.join(SCRIPT_DIR, filename)
+    module_name = filename.replace("-", "_").removesuffix(".py")
+    spec = importlib.util.spec_from_file_location(module_name, filepath)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+bench = _load_module("benchmark-tools.py")
+
+# ---------------------------------------------------------------------------
+# Capability probes: feature -> LIMIT 0 query that fails where it is unsupported
+# ---------------------------------------------------------------------------
+PROBES = {
+    "fork_fuse": 'FROM incident-knowledge METADATA _score, _id, _index | FORK (WHERE MATCH(title, "probe")) '
+                 '(WHERE MATCH(description, "probe")) | FUSE RRF | LIMIT 0',
+    "match": 'FROM incident-knowledge METADATA _score | WHERE MATCH(title, "probe") | LIMIT 0',
+    "semantic_match": 'FROM incident-knowledge METADATA _score | WHERE MATCH(semantic_description, "probe") | LIMIT 0',
+    "eval_case": 'FROM logs-opsagent-* | EVAL is_error = CASE(log.level IN ("ERROR", "FATAL"), 1, 0) | LIMIT 0',
+    "date_trunc": "FROM logs-opsagent-* | EVAL b = DATE_TRUNC(1 hour, @timestamp) | LIMIT 0",
+    "error_rollup": "FROM opsagent-error-rollup | STATS total = SUM(total_count) BY service.name | LIMIT 0",
+    "max_text": "FROM logs-opsagent-* | STATS m = MAX(error.message) | LIMIT 0",
+    "categorize": "FROM logs-opsagent-* | STATS c = COUNT(*) BY category = CATEGORIZE(message) | LIMIT 0",
+    "lookup_join": "FROM logs-opsagent-* | LOOKUP JOIN service-owners ON service.name | LIMIT 0",
+}
+
+# ---------------------------------------------------------------------------
+# Tiers (FALLBACKS.md), richest first. "file" is a tools/ definition; "query"
+# and "description" replace the primary's (params are trimmed to the ones the
+# query uses), so the agent is told what the registered tier actually returns.
+# "nonempty" tiers only count as working if the sample call returns rows.
+# Tiers with the same "shape" return the same columns and values, so the
+# fastest of them may replace the richest; any other tier is only used when
+# every richer one is unsupported or fails.
+# ---------------------------------------------------------------------------
+KEEP_KB = "KEEP title, description, resolution, root_cause, severity, category, affected_services, mttr_minutes, _score"
+TIERS = {
+    "hybrid_rag_search": [
+        {"tier": "primary", "file": "hybrid_rag_search.json",
+         "requires": ["fork_fuse", "match", "semantic_match"]},
+        {"tier": "semantic", "requires": ["semantic_match"],
+         "description": "Search the incident knowledge base for similar past incidents using semantic search on "
+                        "descriptions, ranked by similarity. Use this when investigating incidents to find past "
+                        "resolutions and root causes.",
+         "query": "FROM incident-knowledge METADATA _score | WHERE MATCH(semantic_description, ?query) "
+                  f"| SORT _score DESC | LIMIT ?result_count | {KEEP_KB}"},
+        {"tier": "keyword", "file": "hybrid_rag_search_fallback.json", "requires": ["match"]},
+    ],
+    "error_trend_analysis": [
+        {"tier": "rollup", "file": "error_trend_analysis.json", "requires": ["error_rollup", "date_trunc"],
+         "nonempty": True, "shape": "error-rate"},
+        {"tier": "raw-scan", "requires": ["eval_case", "date_trunc"], "shape": "error-rate",
+         "description": "Analyze error rate trends over time buckets for a service to determine if the situation is "
+                        "improving, stable, or worsening. Computes error counts, total request counts, and error "
+                        "rate percentage per time bucket from the raw logs. Use this to assess incident trajectory "
+                        "and whether remediation actions are working.",
+         "query": "FROM logs-opsagent-* | WHERE service.name == ?service_name AND @timestamp > NOW() - ?time_range "
+                  '| EVAL is_error = CASE(log.level IN ("ERROR", "FATAL"), 1, 0) '
+                  "| EVAL time_bucket = DATE_TRUNC(?bucket_size, @timestamp) "
+                  "| STATS error_count = SUM(is_error), total_count = COUNT(*) BY time_bucket "
+                  "| EVAL error_rate_pct = ROUND(error_count * 100.0 / total_count, 2) "
+                  "| SORT time_bucket ASC | LIMIT 100"},
+        {"tier": "errors-only", "file": "error_trend_analysis_fallback.json", "requires": ["date_trunc"]},
+        {"tier": "by-level", "requires": ["eval_case"],
+         "description": "Count a service's log lines and error lines by log level over the time range (one row per "
+                        "level, no time buckets). Use this to see how much of the service's traffic is failing; it "
+                        "cannot show whether the error rate is rising or falling.",
+         "query": "FROM logs-opsagent-* | WHERE service.name == ?service_name AND @timestamp > NOW() - ?time_range "
+                  '| STATS total = COUNT(*), errors = SUM(CASE(log.level IN ("ERROR", "FATAL"), 1, 0)) '
+                  "BY log.level | SORT errors DESC | LIMIT 20"},
+    ],
+    "service_error_breakdown": [
+        {"tier": "primary", "file": "service_error_breakdown.json", "requires": ["max_text"]},
+        {"tier": "by-type", "requires": [],
+         "description": "Break down errors for a service by error type, showing the count of each error type. Use "
+                        "this to understand WHICH errors are happening, not just how many.",
+         "query": "FROM logs-opsagent-* | WHERE service.name == ?service_name AND log.level IN (\"ERROR\", \"FATAL\") "
+                  "AND @timestamp > NOW() - ?time_range | STATS error_count = COUNT(*) BY error.type "
+                  "| SORT error_count DESC | LIMIT ?result_count"},
+        {"tier": "by-level", "file": "service_error_breakdown_fallback.json", "requires": []},
+    ],
+    "search_runbooks_by_symptom": [
+        {"tier": "primary", "file": "search_runbooks_by_symptom.json",
+         "requires": ["fork_fuse", "match", "semantic_match"]},
+        {"tier": "lexical", "file": "search_runbooks_by_symptom_fallback.json", "requires": ["match"]},
+        {"tier": "plain", "requires": ["match"],
+         "description": "Search runbooks by symptom description using keyword matching on the symptoms text. Use "
+                        "this to find relevant runbooks when you have a description of the symptoms being observed, "
+                        "such as error messages or performance degradation patterns.",
+         "query": "FROM runbooks METADATA _score | WHERE MATCH(symptoms, ?symptom_text) | SORT _score DESC | LIMIT 5 "
+                  "| KEEP title, severity, symptoms, root_cause, remediation_steps, prevention, _score"},
+    ],
+}
+
+# Untiered tools that need a probed feature; skipped when it is missing.
+REQUIRES = {
+    "discover_log_patterns": ["categorize"],
+    "service_owner_lookup": ["lookup_join"],
+}
+
+
+def load_definition(path):
+    """Read a tool/agent JSON file, dropping annotation keys such as _NOTE and _STATUS."""
+    with open(path) as f:
+        definition = json.load(f)
+    return {k: v for k, v in definition.items() if not k.startswith("_")}
+
+
+def tier_definition(tool_id, tier):
+    """The full tool definition for one tier, registered under the primary's id."""
+    if "file" in tier:
+        definition = load_definition(os.path.join(TOOLS_DIR, tier["file"]))
+    else:
+        definition = load_definition(os.path.join(TOOLS_DIR, TIERS[tool_id][0]["file"]))
+        definition["description"] = tier["description"]
+        params = definition["configuration"]["params"]
+        definition["configuration"] = {
+            "query": tier["query"],
+            "params": {k: v for k, v in params.items() if re.search(rf"\?{k}\b", tier["query"])},
+        }
+    definition["id"] = tool_id
+    return definition
+
+
+def content_hash(definition):
+    """sha256 of a definition's canonical JSON (or of a workflow's YAML text)."""
+    text = definition if isinstance(definition, str) else json.dumps(definition, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Probe and time
+# ---------------------------------------------------------------------------
+def probe(session):
+    """Run every capability probe once. Returns {feature: error or None}."""
+    results = {}
+    for feature, query in PROBES.items():
+        resp = session.post(f"{ES_URL}/_query", json={"query": query}, timeout=es_bulk.REQUEST_TIMEOUT)
+        if resp.status_code == 200:
+            results[feature] = None
+        else:
+            try:
+                results[feature] = resp.json()["error"]["reason"][:160]
+            except (ValueError, KeyError, TypeError):
+                results[feature] = f"HTTP {resp.status_code}"
+    return results
+
+
+def choose_tier(tool_id, capabilities, session, runs, warmup, min_gain, previous=None):
+    """
+    Time the supported tiers of one tool and pick the richest working one. A
+    tier of the same shape replaces it if it is the `previous` tier or at
+    least `min_gain` percent faster than the one kept. Returns (chosen tier
+    dict, rows for the report).
+    """
+    rows = []
+    timed = []
+    for tier in TIERS[tool_id]:
+        missing = [f for f in tier["requires"] if capabilities.get(f)]
+        if missing:
+            rows.append((tier["tier"], f"unsupported ({', '.join(missing)})", None))
+            continue
+        definition = tier_definition(tool_id, tier)
+        definition["name"] = f"{tool_id}@{tier['tier']}"
+        result = bench.bench_tool(session, ES_URL, definition, bench.bind_params(definition, {}), runs, warmup)
+        if result["error"]:
+            rows.append((tier["tier"], f"failed: {result['error'][:80]}", None))
+            continue
+        if tier.get("nonempty") and not result["rows"]:
+            rows.append((tier["tier"], "no rows for the sample parameters", None))
+            continue
+        p50 = result["latency_ms"]["p50"]
+        rows.append((tier["tier"], "ok", p50))
+        timed.append((tier, p50))
+    if not timed:
+        return None, rows
+    shape = timed[0][0].get("shape")
+    peers = [t for t in timed if t is timed[0] or (shape and t[0].get("shape") == shape)]
+    best = next((t for t in peers if t[0]["tier"] == previous), peers[0])
+    fastest = min(peers, key=lambda t: t[1])
+    if fastest[1] < best[1] * (1 - min_gain / 100):
+        best = fastest
+    return best[0], rows
+
+
+def select_tools(skip, probe_cluster, runs, warmup, min_gain, previous):
+    """
+    Return ([(tool_id, tier, definition)], ids not registered) for every primary
+    tool file. `previous` maps tool id -> tier registered last time.
+    """
+    chosen = {}
+    capabilities = {}
+    if probe_cluster:
+        es = es_bulk.get_session(1)
+        print("\n--- Capability probes ---")
+        capabilities = probe(es)
+        for feature, error in capabilities.items():
+            print(f"  {feature:<16} {'supported' if error is None else 'unsupported: ' + error}")
+
+        print(f"\n--- Tier timing ({runs} runs, p50 ms) ---")
+        for tool_id in TIERS:
+            if tool_id in skip:
+                continue
+            tier, rows = choose_tier(tool_id, capabilities, es, runs, warmup, min_gain, previous.get(tool_id))
+            print(f"  {tool_id}")
+            for name, status, p50 in rows:
+                marker = "->" if tier and name == tier["tier"] else "  "
+                print(f"    {marker} {name:<12} {status:<40} {'' if p50 is None else f'{p50:.1f}'}")
+            chosen[tool_id] = tier
+        es.close()
+
+    selected, dropped = [], set(skip)
+    names = sorted(n for n in os.listdir(TOOLS_DIR) if n.endswith(".json") and not n.endswith("_fallback.json"))
+    for filename in names:
+        tool_id = filename.removesuffix(".json")
+        if tool_id in skip:
+            continue
+        if tool_id in TIERS and probe_cluster:
+            if chosen[tool_id] is None:
+                print(f"  [WARN] {tool_id}: no tier works on this cluster; not registered")
+                dropped.add(tool_id)
+                continue
+            selected.append((tool_id, chosen[tool_id]["tier"], tier_definition(tool_id, chosen[tool_id])))
+            continue
+        missing = [f for f in REQUIRES.get(tool_id, []) if capabilities.get(f)]
+        if missing:
+            print(f"  [SKIP] {tool_id}: needs {', '.join(missing)}")
+            dropped.add(tool_id)
+            continue
+        tier = "primary" if tool_id in TIERS else "-"
+        selected.append((tool_id, tier, load_definition(os.path.join(TOOLS_DIR, filename))))
+    return selected, dropped
+
+
+def select_agents(skip, dropped_tools):
+    """Agent definitions, minus references to tools this run does not register."""
+    agents = []
+    for filename in sorted(n for n in os.listdir(AGENTS_DIR) if n.endswith(".json")):
+        definition = load_definition(os.path.join(AGENTS_DIR, filename))
+        if definition["id"] in skip:
+            continue
+        groups = definition.get("configuration", {}).get("tools", [])
+        for group in groups:
+            removed = [t for t in group.get("tool_ids", []) if t in dropped_tools]
+            if removed:
+                print(f"  [NOTE] {definition['id']}: dropping unregistered tool(s) {', '.join(removed)}")
+                group["tool_ids"] = [t for t in group["tool_ids"] if t not in dropped_tools]
+        if groups:
+            definition["configuration"]["tools"] = [g for g in groups if g.get("tool_ids", True)]
+        agents.append(definition)
+    return agents
+
+
+def select_workflows(skip):
+    """(name, yaml text) per workflows/*.yaml; the name comes from its top-level `name:`."""
+    workflows = []
+    for filename in sorted(n for n in os.listdir(WORKFLOWS_DIR) if n.endswith((".yaml", ".yml"))):
+        with open(os.path.join(WORKFLOWS_DIR, filename)) as f:
+            text = f.read()
+        match = re.search(r"^name:\s*(.+?)\s*$", text, re.M)
+        name = match.group(1).strip("\"'") if match else filename.rsplit(".", 1)[0]
+        if name not in skip and filename.rsplit(".", 1)[0] not in skip:
+            workflows.append((name, text))
+    return workflows
+
+
+# ---------------------------------------------------------------------------
+# Kibana
+# ---------------------------------------------------------------------------
+def kibana_session():
+    session = es_bulk.get_session(CONCURRENCY)
+    session.headers["kbn-xsrf"] = "true"
+    return session
+
+
+def call(session, method, path, body):
+    """One Kibana API call, retrying 429/5xx and connection errors with jittered backoff."""
+    for attempt in range(es_bulk.MAX_RETRIES + 1):
+        try:
+            resp = session.request(method, f"{KIBANA_URL}{path}", json=body, timeout=es_bulk.REQUEST_TIMEOUT)
+            if resp.status_code not in es_bulk.RETRYABLE_HTTP:
+                return resp
+            error = f"HTTP {resp.status_code}"
+        except requests.RequestException as exc:
+            error = str(exc)
+        if attempt < es_bulk.MAX_RETRIES:
+            time.sleep(random.uniform(0, min(es_bulk.BACKOFF_MAX, es_bulk.BACKOFF_BASE * 2 ** attempt)))
+    raise RuntimeError(f"{method} {path}: {error} after {es_bulk.MAX_RETRIES} retries")
+
+
+def push_definition(session, kind, definition):
+    """Create a tool/agent, or update it in place if it exists. Returns (status, None)."""
+    resp = call(session, "POST", f"/api/agent_builder/{kind}", definition)
+    if resp.status_code < 300:
+        return "created", None
+    if resp.status_code == 409 or "already exists" in resp.text:
+        update = {k: v for k, v in definition.items() if k not in ("id", "type")}
+        resp = call(session, "PUT", f"/api/agent_builder/{kind}/{definition['id']}", update)
+        if resp.status_code < 300:
+            return "updated", None
+    raise RuntimeError(f"HTTP {resp.status_code}: {resp.text[:160]}")
+
+
+def push_workflow(session, workflow_id, text):
+    """Update a workflow we created before, else create it. Returns (status, workflow id)."""
+    if workflow_id:
+        resp = call(session, "PUT", f"/api/workflows/{workflow_id}", {"yaml": text})
+        if resp.status_code < 300:
+            return "updated", workflow_id
+        if resp.status_code != 404:
+            raise RuntimeError(f"HTTP {resp.status_code}: {resp.text[:160]}")
+    resp = call(session, "POST", "/api/workflows", {"yaml": text})
+    if resp.status_code >= 300:
+        raise RuntimeError(f"HTTP {resp.status_code}: {resp.text[:160]}")
+    return "created", resp.json().get("id")
+
+
+# ---------------------------------------------------------------------------
+# State: hashes of the last successful push, per Kibana URL
+# ---------------------------------------------------------------------------
+def load_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f).get(KIBANA_URL, {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(path, state):
+    try:
+        with open(path) as f:
+            everything = json.load(f)
+    except (OSError, ValueError):
+        everything = {}
+    everything[KIBANA_URL] = state
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(everything, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def push_phase(session, title, kind, items, state, force, dry_run):
+    """
+    Push the changed items of one kind concurrently. `items` are (key, label,
+    payload, extra); tools and agents are JSON definitions, workflows YAML text,
+    and `extra` is recorded in `state` alongside the hash of every successful
+    push. Returns the failure count.
+    """
+    recorded = state.setdefault(kind, {})
+    changed, unchanged = [], []
+    for key, label, payload, extra in items:
+        digest = content_hash(payload)
+        if not force and recorded.get(key, {}).get("hash") == digest:
+            unchanged.append((key, label))
+        else:
+            changed.append((key, label, payload, dict(extra, hash=digest)))
+    print(f"\n--- {title}: {len(changed)} changed, {len(unchanged)} unchanged ---")
+    for key, label in unchanged:
+        print(f"  [--] {key:<32} {label:<12} unchanged")
+    if dry_run or not changed:
+        for key, label, _, _ in changed:
+            print(f"  [..] {key:<32} {label:<12} would push")
+        return 0
+
+    def push(entry):
+        key, label, payload, _ = entry
+        try:
+            if kind == "workflows":
+                status, object_id = push_workflow(session, recorded.get(key, {}).get("id"), payload)
+            else:
+                status, object_id = push_definition(session, kind, payload)
+            return entry, status, object_id, None
+        except RuntimeError as exc:
+            return entry, None, None, str(exc)
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        for (key, label, _, record), status, object_id, error in pool.map(push, changed):
+            if error:
+                failures += 1
+                print(f"  [FAIL] {key:<30} {label:<12} {error}")
+                continue
+            recorded[key] = dict(record, id=object_id) if object_id else record
+            print(f"  [OK] {key:<32} {label:<12} {status}")
+    return failures
+
+
+def run(dry_run=False, skip=(), probe_cluster=True, force=False, workflows=True, state_file=STATE_FILE,
+        runs=5, warmup=1, min_gain=20.0):
+    """Select, diff and push every definition. Returns True when nothing failed."""
+    print("=" * 60)
+    print("  Agent Builder Registration")
+    print("=" * 60)
+    print(f"  ES URL:     {ES_URL if probe_cluster else '(not probed)'}")
+    print(f"  Kibana URL: {KIBANA_URL or '(not set)'}")
+    print(f"  Auth:       {'API Key configured' if ES_API_KEY else 'No auth (local dev)'}")
+    print(f"  Mode:       {'dry run' if dry_run else 'register'}{', force' if force else ''} "
+          f"({CONCURRENCY} concurrent requests)")
+    print("=" * 60)
+    if not dry_run and not KIBANA_URL:
+        print("Set KIBANA_URL (or use --dry-run)")
+        sys.exit(1)
+
+    state = load_state(state_file)
+    previous = {tool_id: entry.get("tier") for tool_id, entry in state.get("tools", {}).items()}
+    tools, dropped = select_tools(skip, probe_cluster, runs, warmup, min_gain, previous)
+    agents = select_agents(skip, dropped)
+    flows = select_workflows(skip) if workflows else []
+
+    session = None if dry_run else kibana_session()
+    failures = 0
+    try:
+        failures += push_phase(session, "Tools", "tools",
+                               [(tool_id, f"tier={tier}", d, {"tier": tier}) for tool_id, tier, d in tools],
+                               state, force, dry_run)
+        failures += push_phase(session, "Agents", "agents",
+                               [(d["id"], "", d, {}) for d in agents], state, force, dry_run)
+        if flows:
+            failures += push_phase(session, "Workflows", "workflows",
+                                   [(name, "", text, {}) for name, text in flows], state, force, dry_run)
+    finally:
+        if session:
+            session.close()
+            save_state(state_file, state)
+
+    print(f"\nDone{' (dry run)' if dry_run else ''}: {len(tools)} tools, {len(agents)} agents, "
+          f"{len(flows)} workflows{f', {failures} failed' if failures else ''}.")
+    return failures == 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Register Agent Builder tools, agents and workflows.")
+    parser.add_argument("--dry-run", action="store_true", help="Probe and diff without pushing anything")
+    parser.add_argument("--skip", action="append", default=[], metavar="ID",
+                        help="Do not register this tool, agent or workflow (repeatable)")
+    parser.add_argument("--no-probe", action="store_true",
+                        help="Register primary tools as-is, without probing or timing the cluster")
+    parser.add_argument("--force", action="store_true", help="Push every definition, changed or not")
+    parser.add_argument("--no-workflows", action="store_true", help="Leave workflows/*.yaml alone")
+    parser.add_argument("--state", default=STATE_FILE, metavar="FILE",
+                        help="Hashes of pushed definitions (default: opsagent-backend/.registration-state.json)")
+    parser.add_argument("--runs", type=int, default=5, help="Timed runs per tier (default: 5)")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed runs per tier first (default: 1)")
+    parser.add_argument("--min-gain", type=float, default=20.0, metavar="PCT",
+                        help="Only prefer a tier of the same shape if it is this much faster (default: 20)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    ok = run(dry_run=args.dry_run, skip=set(args.skip), probe_cluster=not args.no_probe, force=args.force,
+             workflows=not args.no_workflows, state_file=args.state, runs=args.runs, warmup=args.warmup,
+             min_gain=args.min_gain)
+    sys.exit(0 if ok else 1)
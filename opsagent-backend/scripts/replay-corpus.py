@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+replay-corpus.py -- Stream a pre-built NDJSON corpus into Elasticsearch.
+
+Loads a corpus written by any generator's --export-dir (see corpus.py) with a
+pool of worker processes. Each worker decompresses one shard at a time and
+feeds its bulk pairs, byte-for-byte, into its own pooled BulkClient, so no
+generation logic or JSON serialization runs at replay time.
+
+Create the target indices first (create-indices.py); the corpus only holds
+documents. Corpora exported before the opsagent-error-rollup index existed carry
+no error rollups; replay them and run rollup-errors.py afterwards.
+
+Usage:
+    export ES_URL="https://your-es-instance.elastic.cloud:443"
+    export ES_API_KEY="your-api-key"
+    python3 generate-all-data.py --seed 42 --anchor-time 2025-01-15T12:00:00Z --export-dir corpus/
+    python3 replay-corpus.py corpus/
+    python3 replay-corpus.py corpus/ --workers 8 --index logs-opsagent
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import corpus
+import es_bulk
+
+ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
+ES_API_KEY = os.environ.get("ES_API_KEY", "")
+
+
+def replay_shard(index, path, concurrency=es_bulk.CONCURRENCY):
+    """Replay one shard file. Returns (index, indexed, failed, bytes_sent, errors)."""
+    with es_bulk.BulkClient(concurrency=concurrency) as client:
+        for action, source in corpus.iter_pairs(path):
+            client.index_entry(index, action, source)
+    stats = client.stats
+    return index, stats.total_indexed, stats.total_failed, stats.bytes_sent, stats.errors[:3]
+
+
+def run(corpus_dir, workers=1, indices=None):
+    """Replay every shard in `corpus_dir` (optionally only `indices`) and print a per-index summary."""
+    shards = corpus.list_shards(corpus_dir, indices)
+    if not shards:
+        print(f"No corpus shards found under {corpus_dir}")
+        sys.exit(1)
+    workers = max(1, min(workers, len(shards)))
+    # Split the bulk concurrency budget across workers, as generate-demo-data.py does.
+    per_worker = max(1, es_bulk.CONCURRENCY // workers)
+
+    print("=" * 60)
+    print("  Corpus Replay")
+    print("=" * 60)
+    print(f"  ES URL:  {ES_URL}")
+    print(f"  Auth:    {'API Key configured' if ES_API_KEY else 'No auth (local dev)'}")
+    print(f"  Corpus:  {corpus_dir} ({len(shards)} shards)")
+    print(f"  Workers: {workers} x {per_worker} in-flight bulk requests")
+    print("=" * 60)
+
+    totals = {}
+    errors = []
+    sent = 0
+    started = time.monotonic()
+
+    if workers == 1:
+        results = (replay_shard(index, path, per_worker) for index, path in shards)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        futures = [pool.submit(replay_shard, index, path, per_worker) for index, path in shards]
+        results = (f.result() for f in as_completed(futures))
+
+    for done, (index, indexed, failed, nbytes, shard_errors) in enumerate(results, 1):
+        ok, bad = totals.get(index, (0, 0))
+        totals[index] = (ok + indexed, bad + failed)
+        sent += nbytes
+        errors.extend(shard_errors)
+        print(f"  [{done}/{len(shards)}] {index}: +{indexed} docs"
+              + (f" ({failed} failed)" if failed else ""))
+
+    if workers > 1:
+        pool.shutdown()
+
+    elapsed = time.monotonic() - started
+    total = sum(ok for ok, _ in totals.values())
+    print(f"\nDone! Replayed {total} documents in {elapsed:.1f}s "
+          f"({total / max(elapsed, 1e-9):,.0f} docs/s, {sent / (1024 * 1024):.1f} MiB sent)")
+    for index, (ok, bad) in sorted(totals.items()):
+        print(f"  {index}: {ok} indexed" + (f", {bad} failed" if bad else ""))
+    for error in errors[:5]:
+        print(f"  Error: {error}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay an exported NDJSON corpus into Elasticsearch.")
+    parser.add_argument("corpus_dir", help="Directory written by a generator's --export-dir")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Replay processes; 0 = one per CPU core (default: 0)")
+    parser.add_argument("--index", action="append", dest="indices", metavar="NAME",
+                        help="Only replay this index (repeatable)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.corpus_dir, workers=args.workers or os.cpu_count(), indices=args.indices)
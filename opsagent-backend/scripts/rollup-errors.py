@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+rollup-errors.py -- Rebuild the per-minute error rollups from the raw log indices.
+
+The generators write opsagent-error-rollup while they stream logs (see rollup.py).
+This companion stage covers logs that reach the cluster any other way --
+shippers, corpora exported before the rollup existed -- by recounting minutes
+straight from the raw indices:
+
+  - each source index is recounted in time windows, one ES|QL
+    STATS ... BY service.name, minute per window. A window that fills the
+    10,000-row result cap is split in half and retried, so window size adapts
+    to the number of services.
+  - recounted minutes are written with deterministic ids (rerunning a window
+    overwrites it), then the generator-written rollups of the same window are
+    deleted, so a minute is never counted twice. Readers see the window
+    double-counted for a moment, never missing.
+  - incremental by default: a source restarts from its newest recounted
+    minute minus --lag-minutes, so late-arriving lines are picked up.
+    --full recounts everything; --follow N repeats every N seconds.
+
+Usage:
+    export ES_URL="https://your-es-instance.elastic.cloud:443"
+    export ES_API_KEY="your-api-key"
+    python3 rollup-errors.py                              # incremental, all log indices
+    python3 rollup-errors.py --full                       # recount everything
+    python3 rollup-errors.py --source logs-opsagent --since "3 days"
+    python3 rollup-errors.py --follow 60                  # keep up with live ingest
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+
+import es_bulk
+import rollup
+
+ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
+ES_API_KEY = os.environ.get("ES_API_KEY", "")
+
+SOURCES = ["logs-opsagent", "logs-opsagent-demo"]
+MAX_ROWS = 10000            # ES|QL result cap; a full window is split and retried
+WINDOW_MINUTES = 360
+LAG_MINUTES = 5
+
+COUNT_QUERY = (
+    "FROM {source} | WHERE @timestamp >= ?start AND @timestamp < ?end "
+    "| EVAL minute = DATE_TRUNC(1 minute, @timestamp), is_error = CASE(log.level IN (\"ERROR\", \"FATAL\"), 1, 0) "
+    "| STATS error_count = SUM(is_error), total_count = COUNT(*) BY service.name, minute "
+    f"| LIMIT {MAX_ROWS}"
+)
+UNITS = {"minute": 1, "hour": 60, "day": 1440, "week": 10080}
+
+
+def iso(ms):
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def parse_minutes(text):
+    """'3 days' / '90 minutes' / '12h' -> minutes."""
+    match = re.fullmatch(r"\s*(\d+)\s*([a-z]+?)s?\s*", text.lower())
+    unit = match and next((u for u in UNITS if u.startswith(match.group(2))), None)
+    if not unit:
+        raise argparse.ArgumentTypeError(f"expected e.g. '3 days' or '90 minutes', got {text!r}")
+    return int(match.group(1)) * UNITS[unit]
+
+
+def esql(session, query, params=None):
+    """Run an ES|QL query. Returns a list of row dicts; raises RuntimeError on failure."""
+    body = {"query": query}
+    if params:
+        body["params"] = [{k: v} for k, v in params.items()]
+    resp = session.post(f"{ES_URL}/_query", json=body, timeout=es_bulk.REQUEST_TIMEOUT)
+    if resp.status_code != 200:
+        raise RuntimeError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+    data = resp.json()
+    names = [c["name"] for c in data["columns"]]
+    return [dict(zip(names, row)) for row in data["values"]]
+
+
+# ---------------------------------------------------------------------------
+# Recount
+# ---------------------------------------------------------------------------
+def source_bounds(session, source):
+    """(first minute, end minute exclusive) of a source index in epoch ms, or None if it is empty."""
+    row = esql(session, f"FROM {source} | STATS first = MIN(@timestamp), last = MAX(@timestamp)")[0]
+    if row["first"] is None:
+        return None
+    return rollup.minute_of(row["first"]), rollup.minute_of(row["last"]) + rollup.MINUTE_MS
+
+
+def watermark(session, source):
+    """Newest minute recounted for `source` (epoch ms), or None."""
+    row = esql(session, f'FROM {rollup.ROLLUP_INDEX} | WHERE source_index == ?source AND writer == "rebuild" '
+                        "| STATS last = MAX(@timestamp)", {"source": source})[0]
+    return rollup.minute_of(row["last"]) if row["last"] else None
+
+
+def count_window(session, source, start_ms, end_ms):
+    """Yield rollup rows for [start_ms, end_ms), splitting windows that hit MAX_ROWS."""
+    rows = esql(session, COUNT_QUERY.format(source=source), {"start": iso(start_ms), "end": iso(end_ms)})
+    minutes = (end_ms - start_ms) // rollup.MINUTE_MS
+    if len(rows) >= MAX_ROWS and minutes > 1:
+        middle = start_ms + minutes // 2 * rollup.MINUTE_MS
+        yield from count_window(session, source, start_ms, middle)
+        yield from count_window(session, source, middle, end_ms)
+        return
+    yield from rows
+
+
+def delete_generator_rollups(session, source, start_ms, end_ms):
+    """Drop generator-written rollups of `source` in [start_ms, end_ms). Returns the number deleted."""
+    query = {"bool": {"filter": [
+        {"term": {"source_index": source}},
+        {"term": {"writer": "generator"}},
+        {"range": {"@timestamp": {"gte": iso(start_ms), "lt": iso(end_ms)}}},
+    ]}}
+    resp = session.post(f"{ES_URL}/{rollup.ROLLUP_INDEX}/_delete_by_query",
+                        params={"refresh": "true", "conflicts": "proceed"},
+                        json={"query": query}, timeout=es_bulk.REQUEST_TIMEOUT)
+    if resp.status_code != 200:
+        raise RuntimeError(f"delete_by_query HTTP {resp.status_code}: {resp.text[:200]}")
+    return resp.json().get("deleted", 0)
+
+
+def rebuild(session, source, full=False, since=None, lag=LAG_MINUTES, window=WINDOW_MINUTES):
+    """Recount one source index. Returns (start_ms, end_ms, rows written, rows deleted) or None if empty."""
+    bounds = source_bounds(session, source)
+    if bounds is None:
+        return None
+    first, end = bounds
+    start = first
+    if since is not None:
+        start = max(first, end - since * rollup.MINUTE_MS)
+    elif not full:
+        last = watermark(session, source)
+        if last is not None:
+            start = max(first, last - lag * rollup.MINUTE_MS)
+
+    written = 0
+    with es_bulk.BulkClient(refresh=True) as client:
+        for window_start in range(start, end, window * rollup.MINUTE_MS):
+            window_end = min(end, window_start + window * rollup.MINUTE_MS)
+            for row in count_window(session, source, window_start, window_end):
+                minute = rollup.minute_of(row["minute"])
+                service = row["service.name"]
+                doc = rollup.rollup_doc(source, service, minute, row["error_count"], row["total_count"], "rebuild")
+                client.index(rollup.ROLLUP_INDEX, doc, doc_id=f"{source}|{service}|{minute}")
+                written += 1
+    if client.stats.total_failed:
+        raise RuntimeError(f"{client.stats.total_failed} rollup writes failed ({client.stats.errors[:1]})")
+    return start, end, written, delete_generator_rollups(session, source, start, end)
+
+
+def index_exists(session, name):
+    """True if `name` is an index or alias on the cluster."""
+    return session.head(f"{ES_URL}/{name}", timeout=es_bulk.REQUEST_TIMEOUT).status_code == 200
+
+
+def run(sources=None, full=False, since=None, lag=LAG_MINUTES, window=WINDOW_MINUTES):
+    """
+    Recount every source once and print what changed. Returns the number of
+    sources that failed. Default sources missing from the cluster are skipped
+    (logs-opsagent-demo only exists after generate-demo-data.py); a missing
+    --source is an error.
+    """
+    session = es_bulk.get_session(1)
+    failures = 0
+    for source in sources or SOURCES:
+        started = time.monotonic()
+        if not index_exists(session, source):
+            if sources:
+                print(f"  [ERR] {source}: no such index or alias")
+                failures += 1
+            else:
+                print(f"  [--] {source}: no such index, skipped")
+            continue
+        try:
+            result = rebuild(session, source, full, since, lag, window)
+        except RuntimeError as exc:
+            print(f"  [ERR] {source}: {exc}")
+            failures += 1
+            continue
+        if result is None:
+            print(f"  [--] {source}: no documents")
+            continue
+        start, end, written, deleted = result
+        print(f"  [OK] {source}: {iso(start)} .. {iso(end)} -> {written} rollup rows"
+              f" ({deleted} generator rows replaced) in {time.monotonic() - started:.1f}s")
+    session.close()
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild opsagent-error-rollup from the raw log indices.")
+    parser.add_argument("--source", action="append", dest="sources", metavar="INDEX",
+                        help=f"Log index or alias to recount (repeatable; default: {', '.join(SOURCES)})")
+    parser.add_argument("--full", action="store_true",
+                        help="Recount every minute, not just those since the last rebuild")
+    parser.add_argument("--since", type=parse_minutes, default=None, metavar="DURATION",
+                        help="Recount only the newest DURATION of each source, e.g. '3 days'")
+    parser.add_argument("--lag-minutes", type=int, default=LAG_MINUTES,
+                        help=f"Incremental runs recount this many minutes before the last rebuild (default: {LAG_MINUTES})")
+    parser.add_argument("--window-minutes", type=int, default=WINDOW_MINUTES,
+                        help=f"Minutes per ES|QL query before adaptive splitting (default: {WINDOW_MINUTES})")
+    parser.add_argument("--follow", type=float, default=0, metavar="SECONDS",
+                        help="Repeat an incremental rebuild every SECONDS (Ctrl+C to stop)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print("=" * 60)
+    print("  Error Rollup Rebuild")
+    print("=" * 60)
+    print(f"  ES URL: {ES_URL}")
+    print(f"  Auth:   {'API Key configured' if ES_API_KEY else 'No auth (local dev)'}")
+    print(f"  Target: {rollup.ROLLUP_INDEX}")
+    print("=" * 60)
+    failed = run(args.sources, args.full, args.since, args.lag_minutes, args.window_minutes)
+    while args.follow:
+        try:
+            time.sleep(args.follow)
+        except KeyboardInterrupt:
+            break
+        failed = run(args.sources, False, None, args.lag_minutes, args.window_minutes)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+rollup.py -- Per-service, per-minute error rollups of the OpsAgent log indices.
+
+error_trend_analysis reads opsagent-error-rollup instead of scanning raw logs:
+one document per (log index, service.name, minute) holding error_count (ERROR
+and FATAL lines) and total_count. DATE_TRUNC(?bucket_size, @timestamp) plus SUM()
+re-buckets the minutes to any coarser bucket, so a 3-day trend reads
+services x 4,320 rows however many raw lines those minutes held.
+
+Two writers keep the index in step with the raw logs:
+
+  - the generators fold every log document into an ErrorRollup while they
+    stream it, then index the rollup next to the logs (through the same
+    writer, so --export-dir corpora carry it too). These documents have
+    auto ids and writer "generator": like the raw lines they summarize, a
+    second run adds to the first.
+  - rollup-errors.py recounts minutes from the raw indices for logs that
+    arrive any other way (shippers, older corpora). Its documents have
+    deterministic ids and writer "rebuild", and it deletes the "generator"
+    documents of the window it recounted, so a minute is never counted twice.
+
+Usage (from a sibling script):
+    import rollup
+
+    errors = rollup.ErrorRollup("logs-opsagent")
+    es_bulk.bulk_index("logs-opsagent", errors.tap(docs))
+    errors.write()
+"""
+
+from datetime import datetime, timezone
+
+import es_bulk
+
+# Outside logs-*-*, which Elasticsearch's built-in templates claim for data streams.
+ROLLUP_INDEX = "opsagent-error-rollup"
+ERROR_LEVELS = ("ERROR", "FATAL")
+MINUTE_MS = 60_000
+
+
+def minute_of(timestamp):
+    """Epoch ms of the UTC minute holding `timestamp` (ISO string, aware datetime or epoch ms)."""
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if isinstance(timestamp, datetime):
+        timestamp = int(timestamp.timestamp() * 1000)
+    return timestamp - timestamp % MINUTE_MS
+
+
+def rollup_doc(source_index, service, minute_ms, errors, total, writer):
+    """One rollup document."""
+    return {
+        "@timestamp": datetime.fromtimestamp(minute_ms / 1000, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        "source_index": source_index,
+        "service.name": service,
+        "error_count": errors,
+        "total_count": total,
+        "writer": writer,
+    }
+
+
+class ErrorRollup:
+    """Accumulates (service, minute) -> [errors, total] for one source log index."""
+
+    def __init__(self, source_index):
+        self.source_index = source_index
+        self.counts = {}
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, service, minute_ms, errors, total=1):
+        """Count `total` lines (`errors` of them ERROR/FATAL) for a service in a minute."""
+        cell = self.counts.get((service, minute_ms))
+        if cell is None:
+            self.counts[(service, minute_ms)] = [errors, total]
+        else:
+            cell[0] += errors
+            cell[1] += total
+
+    def add_doc(self, doc):
+        """Count one log document."""
+        self.add(doc["service.name"], minute_of(doc["@timestamp"]), int(doc.get("log.level") in ERROR_LEVELS))
+
+    def tap(self, docs):
+        """Yield `docs` unchanged, counting each one on the way through."""
+        for doc in docs:
+            self.add_doc(doc)
+            yield doc
+
+    def docs(self):
+        """The rollup documents, in (service, minute) order."""
+        for (service, minute_ms), (errors, total) in sorted(self.counts.items()):
+            yield rollup_doc(self.source_index, service, minute_ms, errors, total, "generator")
+
+    def index_into(self, writer):
+        """Queue the rollup documents on an open bulk writer. Returns the number queued."""
+        return writer.index_many(ROLLUP_INDEX, self.docs())
+
+    def write(self, tag=None, **kwargs):
+        """Index the rollup documents with a short-lived writer (see es_bulk.bulk_index). Returns BulkStats."""
+        return es_bulk.bulk_index(ROLLUP_INDEX, self.docs(), tag=tag, **kwargs)
@@ -11,6 +11,7 @@
 #   export ES_API_KEY="your-api-key"
 #   ./setup.sh          # Full setup (all tools including OPTIONAL)
 #   ./setup.sh --mvp    # MVP setup (only MUST HAVE tools, skips CATEGORIZE/LOOKUP JOIN)
+#   POSTMORTEM_DIR=~/postmortems ./setup.sh   # also import postmortems into incident-knowledge
 # =============================================================================
 
 set -euo pipefail
@@ -30,15 +31,9 @@ fi
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 MAPPINGS_DIR="${SCRIPT_DIR}/setup/mappings"
-TOOLS_DIR="${SCRIPT_DIR}/tools"
-AGENTS_DIR="${SCRIPT_DIR}/agents"
-WORKFLOWS_DIR="${SCRIPT_DIR}/workflows"
-TRANSFORMS_DIR="${SCRIPT_DIR}/transforms"
 
 ES_AUTH="Authorization: ApiKey ${ES_API_KEY}"
-KBN_AUTH="Authorization: ApiKey ${ES_API_KEY}"
 CONTENT_TYPE="Content-Type: application/json"
-KBN_HEADER="kbn-xsrf: true"
 
 # Colors for output
 RED='\033[0;31m'
@@ -63,26 +58,15 @@ es_call() {
     "$@"
 }
 
-# ---------------------------------------------------------------------------
-# Helper: make a Kibana API call
-# ---------------------------------------------------------------------------
-kbn_call() {
-  local method="$1" path="$2"
-  shift 2
-  curl -s -X "${method}" \
-    "${KIBANA_URL}${path}" \
-    -H "${KBN_AUTH}" \
-    -H "${CONTENT_TYPE}" \
-    -H "${KBN_HEADER}" \
-    "$@"
-}
-
 # ---------------------------------------------------------------------------
 # 1. Create Indices (delegates to Python script for full coverage)
 # ---------------------------------------------------------------------------
 create_indices() {
   log_info "Creating Elasticsearch indices via create-indices.py..."
-  python3 "${SCRIPT_DIR}/scripts/create-indices.py" --no-confirm
+  # --diff: only create/update what changed, so redeploys keep populated indices.
+  # Indices whose mapping changed incompatibly are reported, not recreated; run
+  # create-indices.py --diff --allow-recreate by hand to replace them.
+  python3 "${SCRIPT_DIR}/scripts/create-indices.py" --diff
   echo
   log_info "All indices created."
 }
@@ -97,152 +81,69 @@ load_data() {
   python3 "${SCRIPT_DIR}/scripts/load-runbooks.py"
   echo
 
+  # generate-incident-data.py percolates its logs against the alert rules as it
+  # indexes them, so the alerts index is filled without a percolate-logs.py pass.
   log_info "  Loading incident data (logs + metrics + knowledge base + alerts + service owners)..."
-  python3 "${SCRIPT_DIR}/scripts/generate-all-data.py"
+  python3 "${SCRIPT_DIR}/scripts/generate-all-data.py" --parallel
+  echo
+
+  if [[ -n "${POSTMORTEM_DIR:-}" ]]; then
+    log_info "  Importing postmortems from ${POSTMORTEM_DIR}..."
+    python3 "${SCRIPT_DIR}/scripts/import-postmortems.py" "${POSTMORTEM_DIR}" \
+      || log_warn "Postmortem import failed (see above)"
+    echo
+  fi
+
+  log_info "  Ranking host metrics against service error rates..."
+  python3 "${SCRIPT_DIR}/scripts/correlate-hosts.py" \
+    || log_warn "Host/error correlation failed (see above)"
+  echo
+
+  log_info "  Detecting onsets in host metrics and service error rates..."
+  python3 "${SCRIPT_DIR}/scripts/detect-onsets.py" \
+    || log_warn "Onset detection failed (see above)"
   echo
 
   log_info "All data loaded."
 }
 
 # ---------------------------------------------------------------------------
-# 2. Register Tools
-# MVP mode: only MUST HAVE tools (skip OPTIONAL and fallback files)
-# Full mode: registers all tools including OPTIONAL ones
+# 2. Register Tools, Agents and Workflows
+# register-tools-and-agents.py probes the cluster's ES|QL features, picks the
+# richest working tier of each tool that has fallbacks (see FALLBACKS.md), and
+# pushes only definitions that changed since the last run.
+# MVP mode: skip the OPTIONAL tools and the single-agent fallback
 # ---------------------------------------------------------------------------
-# MUST HAVE tools (always registered)
-MVP_TOOLS=(
-  "hybrid_rag_search"
-  "error_trend_analysis"
-  "service_error_breakdown"
-  "anomaly_detector"
-  "search_runbooks"
-  "search_runbooks_by_symptom"
-  "analyze_host_metrics"
-  "correlate_host_timeline"
-)
 # OPTIONAL tools (skipped in MVP mode - CATEGORIZE and LOOKUP JOIN are risky)
 OPTIONAL_TOOLS=(
   "discover_log_patterns"
   "service_owner_lookup"
 )
-
-register_tools() {
-  log_info "Registering Agent Builder tools..."
-
-  # Always register MUST HAVE tools
-  for tool_name in "${MVP_TOOLS[@]}"; do
-    local tool_file="${TOOLS_DIR}/${tool_name}.json"
-    if [[ -f "${tool_file}" ]]; then
-      log_info "  [MUST HAVE] Registering tool: ${tool_name}..."
-      kbn_call POST "/api/agent_builder/tools" -d @"${tool_file}"
-      echo
-    fi
-  done
-
-  # Register OPTIONAL tools only in full mode
-  if [[ "${MVP_MODE}" == "false" ]]; then
-    for tool_name in "${OPTIONAL_TOOLS[@]}"; do
-      local tool_file="${TOOLS_DIR}/${tool_name}.json"
-      if [[ -f "${tool_file}" ]]; then
-        log_info "  [OPTIONAL] Registering tool: ${tool_name}..."
-        kbn_call POST "/api/agent_builder/tools" -d @"${tool_file}"
-        echo
-      fi
-    done
-    log_info "All tools registered (${#MVP_TOOLS[@]} must-have + ${#OPTIONAL_TOOLS[@]} optional)."
-  else
-    log_warn "MVP mode: skipped OPTIONAL tools (discover_log_patterns, service_owner_lookup)"
-    log_info "Registered ${#MVP_TOOLS[@]} must-have tools."
-  fi
-}
-
-# ---------------------------------------------------------------------------
-# 3. Register Agents (multi-agent system: triage + investigation + postmortem)
-# ---------------------------------------------------------------------------
-# Multi-agent agents (registered in order)
-MULTI_AGENT_LIST=(
-  "triage-agent"
-  "investigation-agent"
-  "postmortem-agent"
-)
 # Fallback: single-agent (only in full mode)
 FALLBACK_AGENT="ops-agent"
 
-register_agents() {
-  log_info "Registering Agent Builder agents (multi-agent system)..."
-
-  for agent_name in "${MULTI_AGENT_LIST[@]}"; do
-    local agent_file="${AGENTS_DIR}/${agent_name}.json"
-    if [[ -f "${agent_file}" ]]; then
-      log_info "  Registering agent: ${agent_name}..."
-      kbn_call POST "/api/agent_builder/agents" -d @"${agent_file}"
-      echo
-    else
-      log_error "  Agent file not found: ${agent_file}"
-    fi
-  done
+register_kibana() {
+  log_info "Registering Agent Builder tools, agents and workflows..."
 
-  if [[ "${MVP_MODE}" == "false" ]]; then
-    local fallback_file="${AGENTS_DIR}/${FALLBACK_AGENT}.json"
-    if [[ -f "${fallback_file}" ]]; then
-      log_info "  [FALLBACK] Registering single-agent fallback: ${FALLBACK_AGENT}..."
-      kbn_call POST "/api/agent_builder/agents" -d @"${fallback_file}"
-      echo
-    fi
-    log_info "All agents registered (${#MULTI_AGENT_LIST[@]} multi-agent + 1 fallback)."
-  else
-    log_info "Registered ${#MULTI_AGENT_LIST[@]} agents (multi-agent system)."
+  local skip_args=()
+  if [[ "${MVP_MODE}" == "true" ]]; then
+    for name in "${OPTIONAL_TOOLS[@]}" "${FALLBACK_AGENT}"; do
+      skip_args+=(--skip "${name}")
+    done
+    log_warn "MVP mode: skipping OPTIONAL tools (${OPTIONAL_TOOLS[*]}) and ${FALLBACK_AGENT}"
   fi
-}
-
-# ---------------------------------------------------------------------------
-# 4. Create Transform
-# ---------------------------------------------------------------------------
-create_transform() {
-  log_info "Creating service-health-summary transform..."
-
-  local transform_body
-  transform_body=$(cat "${TRANSFORMS_DIR}/service-health-summary.json")
-
-  local transform_id
-  transform_id=$(echo "${transform_body}" | python3 -c "import sys,json; d=json.load(sys.stdin); print(d['id'])")
-
-  local body_without_id
-  body_without_id=$(echo "${transform_body}" | python3 -c "
-import sys, json
-d = json.load(sys.stdin)
-del d['id']
-del d['description']
-print(json.dumps(d))
-")
 
-  es_call PUT "/_transform/${transform_id}" -d "${body_without_id}"
-  echo
-
-  log_info "Starting transform..."
-  es_call POST "/_transform/${transform_id}/_start"
-  echo
-
-  log_info "Transform created and started."
+  python3 "${SCRIPT_DIR}/scripts/register-tools-and-agents.py" ${skip_args[@]+"${skip_args[@]}"} \
+    || log_warn "Some definitions failed to register (see above)"
 }
 
 # ---------------------------------------------------------------------------
-# 5. Workflow Instructions
+# 3. Create Transform
 # ---------------------------------------------------------------------------
-upload_workflows() {
-  log_info "Workflow YAML ready in ${WORKFLOWS_DIR}/"
-  log_info "To register the workflow:"
-  log_info "  1. Navigate to Kibana > Stack Management > Workflows"
-  log_info "  2. Click 'Create Workflow' and paste the YAML"
-  log_info "  3. Or use the Workflows API if available:"
-  log_info ""
-
-  for wf_file in "${WORKFLOWS_DIR}"/*.yaml; do
-    local wf_name
-    wf_name="$(basename "${wf_file}" .yaml)"
-    log_info "  - ${wf_name}: ${wf_file}"
-  done
-  echo
+create_transform() {
+  log_info "Deploying service-health-summary transform (backfill + continuous)..."
+  python3 "${SCRIPT_DIR}/scripts/manage-transforms.py" deploy \
+    || log_warn "Transform deployment failed (see above)"
 }
 
 # ---------------------------------------------------------------------------
@@ -280,22 +181,14 @@ main() {
   load_data
   echo
 
-  # Step 5: Register Kibana tools
-  register_tools
-  echo
-
-  # Step 6: Register Kibana agents
-  register_agents
+  # Step 5: Register Kibana tools, agents and workflows
+  register_kibana
   echo
 
-  # Step 7: Create transform
+  # Step 6: Create transform
   create_transform
   echo
 
-  # Step 8: Workflow instructions
-  upload_workflows
-  echo
-
   log_info "Setup complete!"
   log_info ""
   log_info "Data loaded into indices:"